@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+"""Compares per-frame depth operations against their batched variants.
+
+Each operation is timed on a stack of depth images, once calling the per-frame method in a Python
+loop and once calling the batch method with a preallocated output, for several thread counts. By
+default the synthetic backend is used and no camera is needed. Pass --sdk to use the first
+attached device instead.
+"""
+
+import argparse
+import timeit
+
+from mt import np
+
+import synexens as s
+from synexens.backends import SyntheticBackend
+from synexens.const import RESOLUTION_SIZES
+
+
+def make_depth_images(width: int, height: int, n: int):
+    x = np.arange(width, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+    depth = (500 + (x * 7 + y * 3) % 6500).astype(np.uint16)[:, :, np.newaxis]
+    return np.ascontiguousarray(np.broadcast_to(depth, (n,) + depth.shape))
+
+
+def report(name: str, func, n_iters: int, n_frames: int):
+    elapsed = min(timeit.repeat(func, number=n_iters, repeat=3)) / n_iters
+    print(f"{name:>40}: {elapsed * 1e3 / n_frames:8.3f} ms/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sdk", action="store_true")
+    args = parser.parse_args()
+
+    backend = None if args.sdk else SyntheticBackend()
+    with s.Device(backend=backend) as device:
+        width, height = RESOLUTION_SIZES[device.resolution]
+        images = make_depth_images(width, height, args.batch)
+        out_color = np.empty(images.shape[:3] + (3,), dtype=np.uint8)
+        out_points = np.empty(images.shape[:3] + (3,), dtype=np.float32)
+        out_depth = np.empty_like(images)
+
+        ops = [
+            (
+                "depth color",
+                lambda x: device.get_depth_color(x),
+                lambda n: device.get_depth_color_batch(images, out_color, n),
+            ),
+            (
+                "point cloud",
+                lambda x: device.get_depth_point_cloud(x, True),
+                lambda n: device.get_depth_point_cloud_batch(
+                    images, True, out_points, n
+                ),
+            ),
+            (
+                "undistort depth",
+                lambda x: device.undistort_depth(x),
+                lambda n: device.undistort_depth_batch(images, out_depth, n),
+            ),
+        ]
+        for name, single, batch in ops:
+            report(
+                f"{name}, per frame",
+                lambda: [single(x) for x in images],
+                args.iters,
+                args.batch,
+            )
+            for n_threads in args.threads:
+                report(
+                    f"{name}, batch of {args.batch}, {n_threads} thread(s)",
+                    lambda: batch(n_threads),
+                    args.iters,
+                    args.batch,
+                )
+
+
+if __name__ == "__main__":
+    main()
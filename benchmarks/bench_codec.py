@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+"""Measures the compression ratio and the speed of the depth codec.
+
+Depth and IR images come from the synthetic backend, or from a recording given with
+`--recording`. Each configuration of :class:`synexens.codec.DepthCodec` encodes and decodes the
+whole image sequence of every frame type, and is compared to plain zlib on the raw images. Speeds
+are in MB/s of raw images.
+"""
+
+import argparse
+import time
+import zlib
+
+from mt import np
+
+import synexens as s
+from synexens.backends import SyntheticBackend
+from synexens.codec import DepthCodec
+from synexens.const import SYFRAMETYPE_DEPTH, SYFRAMETYPE_IR
+from synexens.recording import Playback
+
+
+CONFIGS = [
+    ("spatial", dict(temporal=False)),
+    ("temporal", dict(temporal=True)),
+    ("lossy 1 mm", dict(max_error=1)),
+    ("lossy 5 mm", dict(max_error=5)),
+]
+
+
+def get_synthetic_images(n_frames: int, noise: float):
+    rng = np.random.default_rng(0)
+    images = {SYFRAMETYPE_DEPTH: [], SYFRAMETYPE_IR: []}
+    with s.Device(backend=SyntheticBackend()) as device:
+        device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+        while len(images[SYFRAMETYPE_DEPTH]) < n_frames:
+            frames = device.wait_for_frame(1.0)
+            if frames is None:
+                continue
+            for frame_type, lst in images.items():
+                img = frames[frame_type].astype(np.float32)
+                if noise > 0:
+                    # sensor noise, which the synthetic frames lack
+                    img += rng.normal(0.0, noise, img.shape)
+                img = np.clip(img, 0, 0xFFFF).astype(np.uint16)
+                img[frames[frame_type] == 0] = 0
+                lst.append(img)
+    return images
+
+
+def get_recorded_images(filepath: str, n_frames: int):
+    images = {}
+    with Playback(filepath) as playback:
+        for frame_type in (SYFRAMETYPE_DEPTH, SYFRAMETYPE_IR):
+            if frame_type not in playback.frame_types:
+                continue
+            images[frame_type] = [
+                np.array(playback[i][frame_type])
+                for i in range(min(n_frames, len(playback)))
+            ]
+    return images
+
+
+def run_zlib(images: list):
+    t0 = time.perf_counter()
+    packets = [zlib.compress(img, 1) for img in images]
+    t1 = time.perf_counter()
+    for packet in packets:
+        zlib.decompress(packet)
+    t2 = time.perf_counter()
+    return packets, t1 - t0, t2 - t1, 0
+
+
+def run_codec(images: list, kwargs: dict):
+    encoder = DepthCodec(**kwargs)
+    decoder = DepthCodec()
+    t0 = time.perf_counter()
+    packets = [encoder.encode(img) for img in images]
+    t1 = time.perf_counter()
+    decoded = [decoder.decode(packet) for packet in packets]
+    t2 = time.perf_counter()
+    max_error = max(
+        int(np.abs(a.astype(np.int32) - b).max()) for a, b in zip(images, decoded)
+    )
+    return packets, t1 - t0, t2 - t1, max_error
+
+
+def report(name: str, images: list, result: tuple):
+    packets, encode_time, decode_time, max_error = result
+    raw_size = sum(img.nbytes for img in images)
+    ratio = raw_size / sum(len(packet) for packet in packets)
+    print(
+        f"{name:>12}: ratio {ratio:6.2f}, encode {raw_size / encode_time / 1e6:8.1f} MB/s, "
+        f"decode {raw_size / decode_time / 1e6:8.1f} MB/s, max error {max_error}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--noise", type=float, default=2.0)
+    parser.add_argument(
+        "--recording", help="path to a recording to take the frames from"
+    )
+    args = parser.parse_args()
+
+    if args.recording:
+        images = get_recorded_images(args.recording, args.frames)
+    else:
+        images = get_synthetic_images(args.frames, args.noise)
+
+    for frame_type, lst in images.items():
+        print(f"frame type {frame_type}, {len(lst)} images of shape {lst[0].shape}")
+        report("zlib", lst, run_zlib(lst))
+        for name, kwargs in CONFIGS:
+            report(name, lst, run_codec(lst, kwargs))
+
+
+if __name__ == "__main__":
+    main()
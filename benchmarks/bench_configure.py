@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+
+"""Compares reconfiguring a streaming device setting by setting against one transaction.
+
+The device alternates between two configurations, differing in resolution, stream type, filter
+list, mirror and integral time. Each switch is made once through the individual setters of
+:class:`synexens.Device` and once through :meth:`synexens.Device.configure`, counting the SDK calls
+and the stream restarts and timing the switch. By default the synthetic backend is used, whose
+calls cost next to nothing, so only the counts are meaningful. Pass --sdk to use the first
+attached device instead.
+"""
+
+import argparse
+import time
+
+import synexens as s
+from synexens import const
+from synexens.backends import SyntheticBackend, get_default_backend
+from synexens.metrics import InstrumentedBackend, Metrics
+
+
+CONFIGS = [
+    {
+        "resolution": const.SYRESOLUTION_640_480,
+        "stream_type": const.SYSTREAMTYPE_DEPTHIR,
+        "filter_list": [const.SYFILTERTYPE_MEDIAN, const.SYFILTERTYPE_SPECKLE],
+        "mirror": False,
+        "integral_time": 1000,
+    },
+    {
+        "resolution": const.SYRESOLUTION_320_240,
+        "stream_type": const.SYSTREAMTYPE_DEPTH,
+        "filter_list": [const.SYFILTERTYPE_MEDIAN],
+        "mirror": True,
+        "integral_time": 500,
+    },
+]
+
+
+def configure_with_setters(device, config: dict):
+    # SetFrameResolution() restarts the stream internally for every frame type
+    for frame_type in device.get_frame_types():
+        device.backend.set_frame_resolution(
+            device.index, frame_type, config["resolution"]
+        )
+    device.clear_filter()
+    for filter_type in config["filter_list"]:
+        device.add_filter(filter_type)
+    device.mirror = config["mirror"]
+    device.integral_time = config["integral_time"]
+    device.stream_type = config["stream_type"]
+    return len(device.get_frame_types())
+
+
+def configure_with_transaction(device, config: dict):
+    with device.configure() as cfg:
+        cfg.resolution = config["resolution"]
+        cfg.stream_type = config["stream_type"]
+        cfg.filter_list = config["filter_list"]
+        cfg.mirror = config["mirror"]
+        cfg.integral_time = config["integral_time"]
+    return int(cfg.restarted)
+
+
+def count_calls(metrics: Metrics):
+    devices = metrics.snapshot()["devices"]
+    return sum(
+        call["count"]
+        for device in devices.values()
+        for call in device["calls"].values()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--switches", type=int, default=20)
+    parser.add_argument("--sdk", action="store_true")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    backend = InstrumentedBackend(
+        get_default_backend() if args.sdk else SyntheticBackend(), metrics
+    )
+    with s.Device(backend=backend) as device:
+        device.stream_on(const.SYSTREAMTYPE_DEPTHIR)
+        for name, func in (
+            ("setters", configure_with_setters),
+            ("transaction", configure_with_transaction),
+        ):
+            metrics.reset()
+            restarts = 0
+            start = time.perf_counter()
+            for i in range(args.switches):
+                restarts += func(device, CONFIGS[i % len(CONFIGS)])
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>12}: {count_calls(metrics) / args.switches:5.1f} SDK calls, "
+                f"{restarts / args.switches:4.1f} stream restarts, "
+                f"{elapsed / args.switches * 1e3:8.3f} ms per switch"
+            )
+
+
+if __name__ == "__main__":
+    main()
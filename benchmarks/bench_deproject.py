@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+"""Compares host-side deprojection against the SDK's GetDepthPointCloud.
+
+The host-side paths run on synthetic intrinsics and need no camera. Pass --sdk to also time
+Device.get_depth_point_cloud on the first attached device, in which case the device's own
+intrinsics are used for the host-side paths too.
+"""
+
+import argparse
+import timeit
+
+from mt import np
+
+from synexens.const import SYRESOLUTION_640_480
+from synexens.deproject import Deprojector
+from synexens.intrinsics import make_intrinsics
+
+
+def make_depth_image(width: int, height: int, n: int = 0):
+    x = np.arange(width, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+    depth = (500 + (x * 7 + y * 3) % 6500).astype(np.uint16)[:, :, np.newaxis]
+    return (
+        depth
+        if n == 0
+        else np.ascontiguousarray(np.broadcast_to(depth, (n,) + depth.shape))
+    )
+
+
+def report(name: str, func, n_iters: int, n_frames: int = 1):
+    elapsed = min(timeit.repeat(func, number=n_iters, repeat=3)) / n_iters
+    print(f"{name:>28}: {elapsed * 1e3 / n_frames:8.3f} ms/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--sdk", action="store_true")
+    args = parser.parse_args()
+
+    resolution = SYRESOLUTION_640_480
+    device = None
+    if args.sdk:
+        import synexens as s
+
+        device = s.Device()
+        device.open()
+        resolutions = device.info["resolutions"]
+    else:
+        resolutions = {
+            resolution: {
+                "intrinsics": make_intrinsics(
+                    resolution, distortion_coeffs=[-0.1, 0.02, 0.0, 0.0, 0.0]
+                )
+            }
+        }
+
+    try:
+        depth = make_depth_image(640, 480)
+        batch = make_depth_image(640, 480, args.batch)
+
+        deprojector = Deprojector(resolutions)
+        deprojector.get_ray_table(resolution)  # warm up the cache
+        out = np.empty((480, 640, 3), dtype=np.float32)
+        out_batch = np.empty((args.batch, 480, 640, 3), dtype=np.float32)
+
+        report("host, new array", lambda: deprojector.deproject(depth), args.iters)
+        report("host, out=", lambda: deprojector.deproject(depth, out=out), args.iters)
+        report(
+            f"host, batch of {args.batch}, out=",
+            lambda: deprojector.deproject(batch, out=out_batch),
+            args.iters,
+            args.batch,
+        )
+        metres = Deprojector(resolutions, unit="m")
+        metres.get_ray_table(resolution)
+        report(
+            "host, metres, out=", lambda: metres.deproject(depth, out=out), args.iters
+        )
+        if device is not None:
+            report(
+                "SDK GetDepthPointCloud",
+                lambda: device.get_depth_point_cloud(depth, True),
+                args.iters,
+            )
+    finally:
+        if device is not None:
+            device.close()
+
+
+if __name__ == "__main__":
+    main()
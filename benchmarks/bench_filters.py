@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+"""Times every stage of the host-side depth filter engine on live or replayed frames.
+
+Frames come from a backend given as for `SYNEXENS_BACKEND`, i.e. 'sdk', 'synthetic' (the default)
+or 'replay:<path>'. The engine runs the median, amplitude, flying pixel, speckle, temporal and
+hole filling filters with their default parameters, and the mean time of each stage is reported.
+"""
+
+import argparse
+
+import synexens as s
+from synexens.backends import make_backend
+from synexens.const import SYFRAMETYPE_DEPTH
+from synexens.filters import (
+    FilterEngine,
+    MedianFilter,
+    AmplitudeFilter,
+    FlyingPixelFilter,
+    SpeckleFilter,
+    TemporalFilter,
+    HoleFillingFilter,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="synthetic")
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    engine = FilterEngine(
+        [
+            MedianFilter(),
+            AmplitudeFilter(),
+            FlyingPixelFilter(),
+            SpeckleFilter(),
+            TemporalFilter(),
+            HoleFillingFilter(),
+        ]
+    )
+    with s.Device(backend=make_backend(args.backend)) as device:
+        device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+        n_frames = 0
+        while n_frames < args.frames:
+            frames = device.wait_for_frame(1.0)
+            if frames is None or SYFRAMETYPE_DEPTH not in frames:
+                continue
+            engine.apply_frames(frames)
+            n_frames += 1
+
+    total = 0.0
+    for name, timing in engine.stats.items():
+        mean = timing["total"] / timing["calls"]
+        total += mean
+        print(f"{name:>14}: {mean * 1e3:8.3f} ms/frame")
+    print(f"{'total':>14}: {total * 1e3:8.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
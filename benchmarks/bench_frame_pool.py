@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+"""Compares the allocating, out= and pooled paths of Device.get_last_frame_data.
+
+Each mode polls the first device until it has received a given number of frames and reports the
+mean time spent inside get_last_frame_data per received frame.
+"""
+
+import argparse
+import time
+
+import synexens as s
+
+
+def bench(device, n_frames: int, mode: str):
+    out = {}
+    n_received = 0
+    elapsed = 0.0
+    while n_received < n_frames:
+        start = time.perf_counter()
+        if mode == "alloc":
+            frames = device.get_last_frame_data()
+        elif mode == "out":
+            frames = device.get_last_frame_data(out=out)
+        else:
+            frames = device.get_last_frame_data(pooled=True)
+        if frames is None:
+            time.sleep(0.001)
+            continue
+        if mode == "pooled":
+            frames.release()
+        elapsed += time.perf_counter() - start
+        n_received += 1
+    return elapsed / n_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=4)
+    args = parser.parse_args()
+
+    with s.Device() as device:
+        device.resolution = s.SYRESOLUTION_640_480
+        device.enable_frame_pool(args.slots)
+        device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+        for mode in ("alloc", "out", "pooled"):
+            mean = bench(device, args.frames, mode)
+            print(f"{mode:>6}: {mean * 1e6:8.1f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+"""Measures the import-time cost of the synexens package with `python -X importtime`.
+
+Every statement is run several times in a fresh interpreter. The total import time, i.e. the sum
+of the cumulative times of the top-level imports not done by the interpreter at startup, is
+reported along with the slowest modules of the fastest run. Pass --check to fail if
+`import synexens` alone loads a module that must only be loaded on demand.
+"""
+
+import argparse
+import subprocess
+import sys
+
+
+DEFAULT_STATEMENTS = [
+    "import synexens",
+    "import synexens; synexens.SYRESOLUTION_640_480",
+    "from synexens import Device",
+]
+
+# modules that `import synexens` must not load
+LAZY_MODULES = ["numpy", "mt", "v4l2py", "synexens_sdk", "synexens.base"]
+
+
+def run_importtime(statement: str):
+    """Runs a statement in a fresh interpreter and parses the `-X importtime` report.
+
+    Returns
+    -------
+    list
+        a list of `(module, self_us, cumulative_us, level)` tuples in import order, where the level
+        is the nesting depth of the import
+    """
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return entries
+
+
+def drop_startup_imports(entries: list, startup_names: set):
+    """Drops the imports done by the interpreter at startup, along with their nested imports."""
+    res = []
+    skipping = False
+    # nested imports are reported before the import containing them
+    for entry in reversed(entries):
+        if entry[3] == 0:
+            skipping = entry[0] in startup_names
+        if not skipping:
+            res.append(entry)
+    return res[::-1]
+
+
+def get_total_us(entries: list):
+    return sum(x[2] for x in entries if x[3] == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "statements",
+        nargs="*",
+        help="statements to time, by default a few typical uses of the package",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    startup_names = {x[0] for x in run_importtime("pass") if x[3] == 0}
+    failed = False
+    for statement in args.statements or DEFAULT_STATEMENTS:
+        runs = [
+            drop_startup_imports(run_importtime(statement), startup_names)
+            for _ in range(args.repeat)
+        ]
+        entries = min(runs, key=get_total_us)
+        print(statement)
+        print(f"  total import time: {get_total_us(entries) / 1e3:8.2f} ms")
+        print(f"  modules imported:  {len(entries):8d}")
+        for name, _, cumulative_us, level in sorted(entries, key=lambda x: -x[2])[
+            : args.top
+        ]:
+            print(f"    {cumulative_us / 1e3:8.2f} ms  {name} (level {level})")
+
+        if args.check and statement == "import synexens":
+            names = {x[0] for x in entries}
+            loaded = [name for name in LAZY_MODULES if name in names]
+            if loaded:
+                print(f"  ERROR: 'import synexens' loads {loaded}.")
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
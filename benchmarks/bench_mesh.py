@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+
+"""Times the CPU meshing of an organized 640x480 point cloud, stage by stage.
+
+The point cloud is a synthetic scene of slanted planes with depth steps and invalid pixels,
+deprojected with synthetic intrinsics. The target is at least 30 meshes per second on one core.
+Pass --ply to also write the last mesh to a PLY file.
+"""
+
+import argparse
+import timeit
+
+from mt import np
+
+from synexens.const import SYRESOLUTION_640_480
+from synexens.deproject import Deprojector
+from synexens.intrinsics import make_intrinsics
+from synexens.mesh import OrganizedMesher
+
+
+def make_point_cloud(width: int, height: int, seed: int = 0):
+    x = np.arange(width, dtype=np.float32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.float32)[:, np.newaxis]
+    depth = 1500 + 2 * x + y + 500 * ((x // 160 + y // 120) % 2)
+    depth[np.random.default_rng(seed).random((height, width)) < 0.02] = 0
+    depth = depth.astype(np.uint16)[:, :, np.newaxis]
+    resolution = SYRESOLUTION_640_480
+    resolutions = {resolution: {"intrinsics": make_intrinsics(resolution)}}
+    return Deprojector(resolutions).deproject(depth)
+
+
+def report(name: str, func, n_iters: int):
+    elapsed = min(timeit.repeat(func, number=n_iters, repeat=3)) / n_iters
+    print(f"{name:>24}: {elapsed * 1e3:8.3f} ms  {1 / elapsed:8.1f} /s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--ply", help="path of a PLY file to write")
+    args = parser.parse_args()
+
+    points = make_point_cloud(640, 480)
+    colors = np.zeros(points.shape, dtype=np.uint8)
+    mesher = OrganizedMesher()
+    mesh = mesher.mesh(points, colors)
+    print(mesh)
+
+    report("quad mask", lambda: mesher.get_quad_mask(points), args.iters)
+    report("triangulate", lambda: mesher.triangulate(points), args.iters)
+    report("normals", lambda: mesher.compute_normals(points), args.iters)
+    report("mesh, no normals", lambda: mesher.mesh(points, normals=False), args.iters)
+    report("mesh", lambda: mesher.mesh(points, colors), args.iters)
+    if args.ply:
+        report("write binary PLY", lambda: mesh.write_ply(args.ply), args.iters)
+
+
+if __name__ == "__main__":
+    main()
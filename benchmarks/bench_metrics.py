@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+"""Measures the per-call overhead of the instrumentation of :mod:`synexens.metrics`.
+
+Cheap calls of a synthetic device are timed through the plain backend, through an instrumented
+backend whose metrics are disabled, and through one whose metrics are enabled. The last section
+prints a snapshot of what was recorded.
+"""
+
+import argparse
+import json
+import timeit
+
+import synexens as s
+from synexens.backends import SyntheticBackend
+from synexens.metrics import InstrumentedBackend, Metrics
+
+
+def report(name: str, func, number: int):
+    times = timeit.repeat(func, number=number, repeat=5)
+    per_call = min(times) / number * 1e9
+    print(f"{name:>50}: {per_call:8.0f} ns")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--snapshot", action="store_true", help="print the snapshot")
+    args = parser.parse_args()
+
+    backend = SyntheticBackend(fps=1000.0, resolution=s.SYRESOLUTION_320_240)
+    metrics = Metrics(enabled=False)
+    instrumented = InstrumentedBackend(backend, metrics=metrics)
+    device = s.Device(1, backend=backend)
+    device.open()
+    device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+
+    for func_name in ("get_current_stream_type", "get_last_frame_data"):
+        base = None
+        for name, b, enabled in (
+            ("plain", backend, False),
+            ("instrumented, disabled", instrumented, False),
+            ("instrumented, enabled", instrumented, True),
+        ):
+            metrics.enabled = enabled
+            func = getattr(b, func_name)
+            per_call = report(f"{func_name}, {name}", lambda: func(1), args.number)
+            if base is None:
+                base = per_call
+            else:
+                print(f"{'overhead':>50}: {per_call - base:8.0f} ns")
+
+    if args.snapshot:
+        print(json.dumps(metrics.snapshot(), indent=2, default=str))
+
+    device.close()
+
+
+if __name__ == "__main__":
+    main()
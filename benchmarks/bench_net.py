@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+"""Measures the throughput and latency of frame streaming over localhost.
+
+Synthetic devices are served by a :class:`synexens.net.FrameServer` on the loopback interface and
+received by :class:`synexens.net.RemoteDevice` clients, one per device and per `--clients`. Each
+client reports its frame rate, throughput and mean/max latency, and the server reports the frames
+dropped for slow clients.
+"""
+
+import argparse
+import time
+
+import synexens as s
+from synexens.backends import SyntheticBackend
+from synexens.net import FrameServer, RemoteDevice
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument(
+        "--max-error",
+        type=int,
+        default=None,
+        help="encode depth and IR with this maximum error, 0 meaning lossless",
+    )
+    parser.add_argument("--resolution", type=int, default=s.SYRESOLUTION_640_480)
+    args = parser.parse_args()
+
+    backend = SyntheticBackend(
+        fps=args.fps, resolution=args.resolution, n_devices=args.devices
+    )
+    devices = [s.Device(i + 1, backend=backend) for i in range(args.devices)]
+    for device in devices:
+        device.open()
+        device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+
+    server = FrameServer(devices, port=0, max_error=args.max_error)
+    with server:
+        host, port = server.address
+        clients = [
+            RemoteDevice(host, port, serial=serial)
+            for serial in server.infos
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.open()
+        time.sleep(args.duration)
+        for client in clients:
+            stats = client.stats
+            print(
+                f"{client.serial} client: {stats['fps']:6.1f} fps, "
+                f"{stats['throughput'] / 1e6:7.1f} MB/s decoded, "
+                f"{stats['wire_bytes'] / stats['elapsed'] / 1e6:7.1f} MB/s on the wire, "
+                f"latency mean {stats['latency_mean'] * 1e3:6.2f} ms, "
+                f"max {stats['latency_max'] * 1e3:6.2f} ms"
+            )
+        for address, stats in server.stats["connected"].items():
+            print(
+                f"server -> {address}: sent {stats['sent']}, dropped {stats['dropped']}"
+            )
+        for client in clients:
+            client.close()
+
+    for device in devices:
+        device.close()
+
+
+if __name__ == "__main__":
+    main()
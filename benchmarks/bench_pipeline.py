@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+"""Measures how a shared-memory processing pipeline scales with the number of worker processes.
+
+Frames of a synthetic source are submitted as fast as the pipeline accepts them, and every worker
+deprojects each depth image and smooths the point cloud a few times. The
+throughput is reported for each number of workers, along with the speedup over one worker and the
+latency percentiles. Pass --paced to submit frames of several cameras at their frame rate instead,
+and report how many frames were dropped.
+"""
+
+import argparse
+import time
+
+from mt import np
+
+from synexens.const import SYFRAMETYPE_DEPTH, SYRESOLUTION_640_480
+from synexens.deproject import Deprojector
+from synexens.intrinsics import make_intrinsics
+from synexens.pipeline import Pipeline
+
+
+RESOLUTION = SYRESOLUTION_640_480
+WIDTH, HEIGHT = 640, 480
+N_SMOOTHING_PASSES = 4
+
+_deprojector = None
+
+
+def deproject_stage(frames: dict, outputs: dict):
+    global _deprojector
+    if _deprojector is None:
+        resolutions = {RESOLUTION: {"intrinsics": make_intrinsics(RESOLUTION)}}
+        _deprojector = Deprojector(resolutions)
+    _deprojector.deproject(frames[SYFRAMETYPE_DEPTH], out=outputs["points"])
+
+
+def smooth_stage(frames: dict, outputs: dict):
+    points = outputs["points"]
+    for _ in range(N_SMOOTHING_PASSES):
+        points[1:-1] = (points[:-2] + points[1:-1] + points[2:]) / 3
+    return float(points[..., 2].mean())
+
+
+def make_frames(n: int):
+    x = np.arange(WIDTH, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(HEIGHT, dtype=np.uint32)[:, np.newaxis]
+    return [
+        {
+            SYFRAMETYPE_DEPTH: (500 + (x * 7 + y * 3 + i * 11) % 6500).astype(
+                np.uint16
+            )[:, :, np.newaxis]
+        }
+        for i in range(n)
+    ]
+
+
+def run(n_workers: int, frames: list, n_frames: int, rate: float, n_cameras: int):
+    """Runs a pipeline and returns (frames/s, dropped, latencies)."""
+    pipeline = Pipeline(
+        [deproject_stage, smooth_stage],
+        {"points": ((HEIGHT, WIDTH, 3), np.float32)},
+        RESOLUTION,
+        [SYFRAMETYPE_DEPTH],
+        n_workers=n_workers,
+    )
+    latencies = []
+    with pipeline:
+        # warm up the workers
+        for i in range(n_workers):
+            pipeline.submit(frames[0])
+        for i in range(n_workers):
+            pipeline.get().release()
+        pipeline.reset_stats()
+
+        def consume(timeout):
+            result = pipeline.get(timeout)
+            if result is not None:
+                latencies.append(result.latency)
+                result.release()
+            return result
+
+        t0 = time.perf_counter()
+        n_done = 0
+        n_dropped = 0
+        for i in range(n_frames):
+            if rate:
+                delay = t0 + i / rate - time.perf_counter()
+                while delay > 0 and consume(delay) is not None:
+                    n_done += 1
+                    delay = t0 + i / rate - time.perf_counter()
+            # unpaced, wait for a slot to be released instead of dropping the frame
+            while (
+                pipeline.submit(frames[i % len(frames)], source=i % n_cameras) is None
+                and not rate
+            ):
+                n_dropped -= 1
+                n_done += consume(None) is not None
+        for _ in range(pipeline.stats["submitted"] - n_done):
+            consume(None)
+        elapsed = time.perf_counter() - t0
+        stats = pipeline.stats
+    return stats["completed"] / elapsed, stats["dropped"] + n_dropped, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--paced", action="store_true")
+    parser.add_argument("--cameras", type=int, default=3)
+    parser.add_argument("--fps", type=float, default=30.0)
+    args = parser.parse_args()
+
+    frames = make_frames(8)
+    t0 = time.perf_counter()
+    outputs = {"points": np.empty((HEIGHT, WIDTH, 3), dtype=np.float32)}
+    for i in range(args.frames // 10):
+        deproject_stage(frames[i % len(frames)], outputs)
+        smooth_stage(frames[i % len(frames)], outputs)
+    serial = (args.frames // 10) / (time.perf_counter() - t0)
+    print(f"in-process, serial: {serial:8.1f} frames/s")
+
+    rate = args.cameras * args.fps if args.paced else 0.0
+    if rate:
+        print(f"offered load: {args.cameras} camera(s) at {args.fps} fps")
+    baseline = None
+    for n_workers in args.workers:
+        fps, dropped, latencies = run(
+            n_workers, frames, args.frames, rate, args.cameras
+        )
+        baseline = fps if baseline is None else baseline
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+        print(
+            f"{n_workers:2d} worker(s): {fps:8.1f} frames/s, speedup {fps / baseline:5.2f}, "
+            f"dropped {dropped:4d}, latency p50 {p50:6.2f} ms, p99 {p99:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+"""Times voxel-grid downsampling and grid index queries on a synthetic point cloud.
+
+The hash-based binning of synexens.pointcloud is compared against binning with `numpy.unique`,
+which sorts the points.
+"""
+
+import argparse
+import timeit
+
+from mt import np
+
+from synexens.pointcloud import get_valid_mask, VoxelGrid, GridIndex
+
+
+def make_point_cloud(width: int, height: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((height, width, 3)) * [4000, 3000, 5000] - [2000, 1500, 0]
+    points[rng.random((height, width)) < 0.1] = 0  # invalid pixels
+    colors = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return points.astype(np.float32), colors
+
+
+def downsample_unique(points: np.ndarray, voxel_size: float):
+    points = points.reshape(-1, 3)
+    points = points[get_valid_mask(points)]
+    cells = np.floor(points / voxel_size).astype(np.int64)
+    _, ids, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    ids = ids.ravel()
+    return np.stack([np.bincount(ids, points[:, c]) / counts for c in range(3)], 1)
+
+
+def report(name: str, func, n_iters: int):
+    elapsed = min(timeit.repeat(func, number=n_iters, repeat=3)) / n_iters
+    print(f"{name:>36}: {elapsed * 1e3:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--voxel-size", type=float, default=50.0)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    points, colors = make_point_cloud(640, 480)
+    grid = VoxelGrid(args.voxel_size)
+    centroids, _, _ = grid.downsample(points)
+    print(f"{points.shape[0] * points.shape[1]} points -> {len(centroids)} voxels")
+
+    report(
+        "numpy.unique binning",
+        lambda: downsample_unique(points, args.voxel_size),
+        args.iters,
+    )
+    report("VoxelGrid.downsample", lambda: grid.downsample(points), args.iters)
+    report(
+        "VoxelGrid.downsample, colours",
+        lambda: grid.downsample(points, colors),
+        args.iters,
+    )
+
+    index = GridIndex(args.voxel_size)
+    report("GridIndex.build", lambda: index.build(points), args.iters)
+    valid = points.reshape(-1, 3)[get_valid_mask(points.reshape(-1, 3))]
+    queries = valid[np.random.default_rng(1).integers(0, len(valid), args.queries)]
+    report(
+        f"query_knn, {args.queries} queries, k={args.k}",
+        lambda: index.query_knn(queries, args.k),
+        args.iters,
+    )
+    report(
+        f"query_radius, {args.queries} queries",
+        lambda: index.query_radius(queries, args.voxel_size),
+        args.iters,
+    )
+
+
+if __name__ == "__main__":
+    main()
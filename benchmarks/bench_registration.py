@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+"""Times the host-side depth-to-RGB registration on synthetic frames with known intrinsics.
+
+A 640x480 depth image of a plane with a nearer box is registered to a 1920x1080 RGB image, with
+and without a translation between the cameras. Without translation, the pixel mapping is fully
+cached; with one, it depends on the depth and only the rays are cached.
+"""
+
+import argparse
+import timeit
+
+from mt import np
+
+from synexens import const
+from synexens.intrinsics import make_intrinsics
+from synexens.registration import Registration
+
+
+def report(name: str, func, number: int):
+    times = timeit.repeat(func, number=number, repeat=5)
+    print(f"{name:>40}: {min(times) / number * 1e3:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=10)
+    parser.add_argument("--baseline", type=float, default=25.0, help="in millimetres")
+    args = parser.parse_args()
+
+    depth_resolution = const.SYRESOLUTION_640_480
+    color_resolution = const.SYRESOLUTION_1920_1080
+    resolutions = {
+        x: {"intrinsics": make_intrinsics(x)}
+        for x in (depth_resolution, color_resolution)
+    }
+    depth = np.full((480, 640, 1), 1500, dtype=np.uint16)
+    depth[160:320, 240:400] = 800
+    depth[::7, ::11] = 0
+    color = np.random.default_rng(0).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+
+    for translation in (None, [args.baseline, 0.0, 0.0]):
+        registration = Registration(resolutions, translation=translation)
+        out_depth = registration.align_depth(depth, color_resolution)
+        out_color = registration.align_color(depth, color)
+        suffix = "no translation" if translation is None else "translation"
+        report(
+            f"align_depth, {suffix}",
+            lambda: registration.align_depth(depth, color_resolution, out=out_depth),
+            args.number,
+        )
+        report(
+            f"align_color, {suffix}",
+            lambda: registration.align_color(depth, color, out=out_color),
+            args.number,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+
+"""Runs every per-frame hot path at every resolution and saves machine-readable results.
+
+The paths are `get_last_frame_data`, with and without an output dictionary to reuse,
+`get_depth_point_cloud`, `get_depth_color`, `undistort_depth` and `check_depth_image`. Each one is
+measured at each resolution of `RESOLUTION_SIZES` for:
+
+- latency: the distribution of the wall time of single calls
+- throughput: the number of calls per second sustained over `--duration` seconds
+- allocations: the memory allocated per call according to `tracemalloc`, both at peak and retained
+  by the result
+- thread scaling: the aggregate throughput of 1, 2, 4... threads calling the path concurrently
+
+By default the synthetic backend is used and no camera is needed. Pass --sdk to use the first
+attached device instead, in which case the resolutions it does not support are skipped.
+
+The results are written as JSON with `--output`, along with the commit, the versions and the
+machine they were measured on. Pass `--compare` with a previous output to print the relative
+change of the median latency and of the throughput of every path, and `--threshold` to exit with
+status 1 if any path got slower by more than that fraction.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from mt import np
+
+import synexens as s
+from synexens.backends import SyntheticBackend
+from synexens.base import check_depth_image
+from synexens.const import RESOLUTION_SIZES, SYRESOLUTION_NULL
+
+
+def make_depth_image(width: int, height: int):
+    x = np.arange(width, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+    depth = 500 + (x * 7 + y * 3) % 6500
+    depth[::13, ::17] = 0  # invalid pixels
+    return np.ascontiguousarray(depth.astype(np.uint16)[:, :, np.newaxis])
+
+
+def get_paths(device, depth_image: np.ndarray):
+    """Gets the `(name, function)` pairs of the hot paths, for one resolution."""
+    out = device.get_last_frame_data()
+    return [
+        ("get_last_frame_data", lambda: device.get_last_frame_data()),
+        ("get_last_frame_data_out", lambda: device.get_last_frame_data(out)),
+        (
+            "get_depth_point_cloud",
+            lambda: device.get_depth_point_cloud(depth_image, True),
+        ),
+        ("get_depth_color", lambda: device.get_depth_color(depth_image)),
+        ("undistort_depth", lambda: device.undistort_depth(depth_image)),
+        ("check_depth_image", lambda: check_depth_image(depth_image)),
+    ]
+
+
+def measure_latency(func, n_calls: int):
+    times = np.empty(n_calls)
+    perf_counter = time.perf_counter
+    for i in range(n_calls):
+        t0 = perf_counter()
+        func()
+        times[i] = perf_counter() - t0
+    return {
+        "n_calls": n_calls,
+        "min": float(times.min()),
+        "mean": float(times.mean()),
+        "median": float(np.median(times)),
+        "p90": float(np.percentile(times, 90)),
+        "p99": float(np.percentile(times, 99)),
+        "max": float(times.max()),
+        "std": float(times.std()),
+    }
+
+
+def measure_throughput(func, duration: float, n_bytes: int):
+    n_calls = 0
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    end = start + duration
+    while True:
+        for _ in range(10):
+            func()
+        n_calls += 10
+        now = perf_counter()
+        if now >= end:
+            break
+    rate = n_calls / (now - start)
+    return {
+        "n_calls": n_calls,
+        "elapsed": now - start,
+        "calls_per_second": rate,
+        "bytes_per_second": rate * n_bytes,
+    }
+
+
+def measure_allocations(func, n_calls: int):
+    func()  # warm up the caches
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(n_calls):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+
+        results = []
+        before = tracemalloc.take_snapshot()
+        for _ in range(n_calls):
+            results.append(func())
+        after = tracemalloc.take_snapshot()
+        stats = after.compare_to(before, "filename")
+        del results
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes": max(peaks),
+        "retained_bytes": sum(x.size_diff for x in stats) / n_calls,
+        "retained_blocks": sum(x.count_diff for x in stats) / n_calls,
+    }
+
+
+def measure_scaling(func, thread_counts: list, n_calls: int):
+    res = []
+    base_rate = None
+    for n_threads in thread_counts:
+        barrier = threading.Barrier(n_threads + 1)
+
+        def worker():
+            barrier.wait()
+            for _ in range(n_calls):
+                func()
+
+        threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        rate = n_threads * n_calls / (time.perf_counter() - start)
+        if base_rate is None:
+            base_rate = rate
+        res.append(
+            {
+                "threads": n_threads,
+                "calls_per_second": rate,
+                "speedup": rate / base_rate,
+                "efficiency": rate / base_rate / n_threads,
+            }
+        )
+    return res
+
+
+def get_commit():
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = (
+            subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, check=True
+            )
+            .stdout.decode()
+            .strip()
+        )
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=cwd,
+                capture_output=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def get_meta(args):
+    commit, dirty = get_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "synexens": s.version.version,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "backend": "sdk" if args.sdk else "synthetic",
+        "args": vars(args),
+    }
+
+
+def compare(results: list, baseline: list):
+    """Prints the relative changes against a baseline and returns the worst latency change."""
+    baseline = {(x["path"], x["resolution"]): x for x in baseline}
+    worst = 0.0
+    for result in results:
+        old = baseline.get((result["path"], result["resolution"]))
+        if old is None:
+            continue
+        latency = result["latency"]["median"] / old["latency"]["median"] - 1
+        throughput = (
+            result["throughput"]["calls_per_second"]
+            / old["throughput"]["calls_per_second"]
+            - 1
+        )
+        worst = max(worst, latency)
+        print(
+            f"{result['path']:>24} {result['size']:>9}: "
+            f"median latency {latency * 100:+7.1f}%, throughput {throughput * 100:+7.1f}%"
+        )
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--resolutions",
+        type=int,
+        nargs="+",
+        default=[x for x in RESOLUTION_SIZES if x != SYRESOLUTION_NULL],
+    )
+    parser.add_argument("--paths", nargs="+", default=None, help="default: all")
+    parser.add_argument("--calls", type=int, default=50, help="calls per measurement")
+    parser.add_argument("--duration", type=float, default=1.0, help="in seconds")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sdk", action="store_true")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON file of baseline results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="maximum relative slowdown of the median latency before failing",
+    )
+    args = parser.parse_args()
+
+    backend = (
+        None
+        if args.sdk
+        else SyntheticBackend(
+            fps=1000.0, resolution=args.resolutions[0], resolutions=args.resolutions
+        )
+    )
+    results = []
+    with s.Device(backend=backend) as device:
+        supported = device.info["resolutions"]
+        device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+        for resolution in args.resolutions:
+            if resolution not in supported:
+                print(f"Skipping unsupported resolution {resolution}.")
+                continue
+            device.resolution = resolution
+            width, height = RESOLUTION_SIZES[resolution]
+            depth_image = make_depth_image(width, height)
+            while device.get_last_frame_data() is None:  # wait for the stream
+                time.sleep(0.01)
+            for name, func in get_paths(device, depth_image):
+                if args.paths is not None and name not in args.paths:
+                    continue
+                func()  # warm up
+                result = {
+                    "path": name,
+                    "resolution": resolution,
+                    "size": f"{width}x{height}",
+                    "latency": measure_latency(func, args.calls),
+                    "throughput": measure_throughput(
+                        func, args.duration, depth_image.nbytes
+                    ),
+                    "allocations": measure_allocations(func, args.calls),
+                    "threads": measure_scaling(func, args.threads, args.calls),
+                }
+                results.append(result)
+                scaling = ", ".join(
+                    f"{x['threads']}t {x['speedup']:.2f}x" for x in result["threads"]
+                )
+                print(
+                    f"{name:>24} {result['size']:>9}: "
+                    f"median {result['latency']['median'] * 1e3:8.3f} ms, "
+                    f"p99 {result['latency']['p99'] * 1e3:8.3f} ms, "
+                    f"{result['throughput']['calls_per_second']:9.1f} calls/s, "
+                    f"peak {result['allocations']['peak_bytes'] / 1e6:7.2f} MB, "
+                    f"retained {result['allocations']['retained_bytes'] / 1e6:7.2f} MB, "
+                    f"{scaling}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": get_meta(args), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared to commit {baseline['meta']['commit']}:")
+        worst = compare(results, baseline["results"])
+        if args.threshold is not None and worst > args.threshold:
+            print(f"Median latency regressed by {worst * 100:.1f}%.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
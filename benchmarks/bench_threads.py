@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+"""Measures how the GIL-free SDK wrappers scale over worker threads.
+
+Each worker thread repeatedly converts a synthetic depth frame into a point cloud, a depth colour
+image and an undistorted depth image through the SDK. If several devices are attached, the workers
+are spread over them. Otherwise they all share the first device.
+"""
+
+import argparse
+import threading
+import time
+
+import synexens as s
+from mt import np
+
+
+def make_depth_image(width: int, height: int):
+    x = np.arange(width, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+    depth = 500 + (x * 7 + y * 3) % 6500
+    return np.ascontiguousarray(depth.astype(np.uint16)[:, :, np.newaxis])
+
+
+def worker(device, depth_image, n_iters: int, barrier):
+    barrier.wait()
+    for _ in range(n_iters):
+        device.get_depth_point_cloud(depth_image, True)
+        device.get_depth_color(depth_image)
+        device.undistort_depth(depth_image)
+
+
+def run(devices, depth_image, n_threads: int, n_iters: int):
+    barrier = threading.Barrier(n_threads + 1)
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(devices[i % len(devices)], depth_image, n_iters, barrier),
+        )
+        for i in range(n_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--iters", type=int, default=100)
+    args = parser.parse_args()
+
+    devices = [s.Device(device_id) for device_id in s.find_devices()]
+    for device in devices:
+        device.open()
+        device.resolution = s.SYRESOLUTION_640_480
+
+    try:
+        depth_image = make_depth_image(640, 480)
+        base_rate = None
+        for n_threads in args.threads:
+            elapsed = run(devices, depth_image, n_threads, args.iters)
+            rate = n_threads * args.iters / elapsed
+            if base_rate is None:
+                base_rate = rate
+            print(
+                f"{n_threads} thread(s) on {min(n_threads, len(devices))} device(s): "
+                f"{rate:.1f} frames/s, speedup {rate / base_rate:.2f}x"
+            )
+    finally:
+        for device in devices:
+            device.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+"""Measures host-side undistortion throughput and checks its parity with the SDK.
+
+Without arguments, the host-side paths are timed on synthetic intrinsics and frames, with no
+camera, and checked against a synthetic scene whose distorted image is known exactly: every
+undistorted pixel must land within 1 pixel of its true position and, with bilinear interpolation,
+within 1 LSB of its true value on a smooth image. The script exits with status 1 otherwise. With
+--sdk, the first attached device is opened, its intrinsics are used and every frame is
+also undistorted by the SDK's Undistort to compare results. The frames come from the device or,
+with --frames, from an .npz file holding `depth` and `ir` stacks of shape (N, H, W, 1) saved from
+get_last_frame_data.
+"""
+
+import argparse
+import sys
+import timeit
+
+from mt import np
+
+from synexens.const import SYRESOLUTION_640_480
+from synexens.intrinsics import (
+    make_intrinsics,
+    find_resolution,
+    get_distortion_coeffs,
+    get_pixel_grid,
+    distort_normalized,
+    undistort_normalized,
+)
+from synexens.undistort import Undistorter
+
+
+def make_stack(width: int, height: int, n: int):
+    x = np.arange(width, dtype=np.uint32)[np.newaxis, :]
+    y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+    frames = [
+        (500 + (x * 7 + y * 3 + i * 11) % 6500).astype(np.uint16)[:, :, np.newaxis]
+        for i in range(n)
+    ]
+    return np.stack(frames)
+
+
+def report(name: str, func, n_iters: int, n_frames: int):
+    elapsed = min(timeit.repeat(func, number=n_iters, repeat=3)) / n_iters
+    print(
+        f"{name:>32}: {elapsed * 1e3 / n_frames:8.3f} ms/frame, "
+        f"{n_frames / elapsed:8.1f} frames/s"
+    )
+
+
+def grab_stacks(device, n: int):
+    import synexens as s
+
+    depths, irs = [], []
+    device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+    while len(depths) < n:
+        frames = device.wait_for_frame(1.0)
+        if frames is not None:
+            depths.append(frames[s.SYFRAMETYPE_DEPTH])
+            irs.append(frames[s.SYFRAMETYPE_IR])
+    device.stream_off()
+    return np.stack(depths), np.stack(irs)
+
+
+def check_parity(name: str, host: np.ndarray, sdk: np.ndarray):
+    diff = np.abs(host.astype(np.int32) - sdk.astype(np.int32))
+    print(
+        f"{name:>32}: {(diff == 0).mean() * 100:6.2f}% identical, "
+        f"{(diff <= 1).mean() * 100:6.2f}% within 1, max diff {diff.max()}"
+    )
+
+
+def get_scene_coordinates(intrinsics: dict):
+    """Gets where every pixel of the distorted image comes from in the undistorted image.
+
+    The inverse of the distortion is computed independently of the remap tables, by fixed-point
+    iteration, and checked against `distort_normalized`.
+    """
+    fx, fy = intrinsics["focal_length_x"], intrinsics["focal_length_y"]
+    cx, cy = intrinsics["center_point_x"], intrinsics["center_point_y"]
+    coeffs = get_distortion_coeffs(intrinsics)
+    xd, yd = get_pixel_grid(intrinsics)
+    x, y = undistort_normalized(xd, yd, coeffs, n_iters=50)
+    xr, yr = distort_normalized(x, y, coeffs)
+    err = max(np.abs(xr - xd).max() * fx, np.abs(yr - yd).max() * fy)
+    if err > 1e-3:
+        raise RuntimeError(f"The inverse distortion did not converge: {err:.3g} px.")
+    return x * fx + cx, y * fy + cy
+
+
+def check_host_parity(intrinsics: dict):
+    """Checks that the remap tables invert `distort_normalized` on synthetic scenes.
+
+    Returns
+    -------
+    bool
+        whether every check passed
+    """
+    width, height = intrinsics["width"], intrinsics["height"]
+    u_src, v_src = get_scene_coordinates(intrinsics)
+    u_dst, v_dst = np.meshgrid(
+        np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64)
+    )
+    resolutions = {find_resolution(height, width): {"intrinsics": intrinsics}}
+
+    def smooth(u, v):
+        return 2000 + 1000 * np.sin(u * (2 * np.pi / width)) * np.cos(
+            v * (2 * np.pi / height)
+        )
+
+    def to_image(values):
+        return np.rint(values).astype(np.uint16)[:, :, np.newaxis]
+
+    passed = True
+    for interpolation in ("nearest", "bilinear"):
+        undistorter = Undistorter(resolutions, interpolation)
+        valid = np.ones(width * height, dtype=bool)
+        valid[undistorter.get_remap_table(find_resolution(height, width)).invalid] = 0
+        valid = valid.reshape(height, width)
+        valid[[0, -1], :] = valid[:, [0, -1]] = False  # clamped at the borders
+
+        # the scene encodes its own coordinates, in 1/16 pixel, offset to stay positive
+        u_out = undistorter.undistort(to_image((u_src + width) * 16))[:, :, 0]
+        v_out = undistorter.undistort(to_image((v_src + height) * 16))[:, :, 0]
+        u_out = u_out / 16 - width
+        v_out = v_out / 16 - height
+        err_px = max(
+            np.abs(u_out - u_dst)[valid].max(), np.abs(v_out - v_dst)[valid].max()
+        )
+        ok = err_px <= 1.0
+        msg = f"max position error {err_px:.3f} px"
+        if interpolation == "bilinear":
+            out = undistorter.undistort(to_image(smooth(u_src, v_src)))[:, :, 0]
+            err_lsb = np.abs(
+                out.astype(np.int32) - to_image(smooth(u_dst, v_dst))[:, :, 0]
+            )[valid].max()
+            ok = ok and err_lsb <= 1
+            msg += f", max value error {err_lsb} LSB"
+        print(
+            f"{'host parity (' + interpolation + ')':>32}: {msg}, "
+            f"{'ok' if ok else 'FAILED'}"
+        )
+        passed = passed and ok
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--sdk", action="store_true")
+    parser.add_argument("--frames", type=str, default=None)
+    args = parser.parse_args()
+
+    device = None
+    if args.sdk:
+        import synexens as s
+
+        device = s.Device()
+        device.open()
+        device.resolution = SYRESOLUTION_640_480
+        resolutions = device.info["resolutions"]
+    else:
+        resolutions = {
+            SYRESOLUTION_640_480: {
+                "intrinsics": make_intrinsics(
+                    SYRESOLUTION_640_480, distortion_coeffs=[-0.1, 0.02, 0.0, 0.0, 0.0]
+                )
+            }
+        }
+
+    try:
+        if args.frames is not None:
+            data = np.load(args.frames)
+            depths, irs = data["depth"], data["ir"]
+        elif device is not None:
+            depths, irs = grab_stacks(device, args.batch)
+        else:
+            depths = make_stack(640, 480, args.batch)
+            irs = depths >> 2
+        resolution = find_resolution(depths.shape[1], depths.shape[2], resolutions)
+
+        passed = True
+        if device is None:
+            passed = check_host_parity(resolutions[resolution]["intrinsics"])
+
+        nearest = Undistorter(resolutions, "nearest")
+        bilinear = Undistorter(resolutions, "bilinear")
+        nearest.get_remap_table(resolution)
+        bilinear.get_remap_table(resolution)
+        out = np.empty_like(depths[0])
+        out_batch = np.empty_like(depths)
+
+        report(
+            "nearest, out=",
+            lambda: nearest.undistort(depths[0], out=out),
+            args.iters,
+            1,
+        )
+        report(
+            "bilinear, out=", lambda: bilinear.undistort(irs[0], out=out), args.iters, 1
+        )
+        report(
+            f"nearest, batch of {len(depths)}, out=",
+            lambda: nearest.undistort(depths, out=out_batch),
+            args.iters,
+            len(depths),
+        )
+        report(
+            f"bilinear, batch of {len(irs)}, out=",
+            lambda: bilinear.undistort(irs, out=out_batch),
+            args.iters,
+            len(irs),
+        )
+
+        if device is not None:
+            report(
+                "SDK Undistort",
+                lambda: device.undistort_depth(depths[0]),
+                args.iters,
+                1,
+            )
+            sdk_depths = np.stack([device.undistort_depth(d) for d in depths])
+            sdk_irs = np.stack([device.undistort_ir(ir) for ir in irs])
+            check_parity(
+                "depth parity (nearest)", nearest.undistort(depths), sdk_depths
+            )
+            check_parity("IR parity (bilinear)", bilinear.undistort(irs), sdk_irs)
+    finally:
+        if device is not None:
+            device.close()
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
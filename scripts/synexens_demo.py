@@ -1,8 +1,24 @@
 #!/usr/bin/python3
 
+"""Point cloud viewer.
+
+By default, only the raw uint16 depth and IR images are uploaded to the GPU, as R16UI textures
+streamed through double-buffered pixel buffer objects, and the geometry shader deprojects and
+colours the points using the intrinsics of the current resolution. With `--cpu`, the point cloud
+and the colours are computed on the CPU and uploaded as float textures, like before. Frames are
+captured on a background thread, and the window title shows the frame times of either path.
+"""
+
+import argparse
+import ctypes
+import threading
+import time
+
 import glm
 
 import synexens as s
+from synexens.backends import make_backend
+from synexens.intrinsics import get_distortion_coeffs
 from mt import np, geo3d, gl, glfw, pd, ctx
 
 
@@ -55,11 +71,7 @@ def framebuffer_size(window, width: int, height: int):
     gl.glViewport(0, 0, width, height)
 
 
-def update_point_cloud(device):
-    frame = device.get_last_frame_data()
-    if frame is None:
-        return
-
+def update_point_cloud(device, frame: dict):
     depth_image = frame[s.SYFRAMETYPE_DEPTH]  # range from 0 to 7000
     point_image = device.get_depth_point_cloud(
         depth_image, True
@@ -299,6 +311,303 @@ void main()
     return gl.compileProgram(*compiled_shaders)
 
 
+def load_shaders_gpu():
+    shader_srcs = {
+        gl.GL_VERTEX_SHADER: """
+#version 330
+
+layout(location = 0) in vec4 imgcoord;
+
+void main()
+{
+gl_Position = vec4(imgcoord.xy, 0, 1);
+}
+        """,
+        gl.GL_GEOMETRY_SHADER: """
+#version 330
+
+layout (points) in;
+layout (triangle_strip, max_vertices = 4) out;
+
+uniform ivec2 imgres;
+uniform usampler2D depth;  // raw depth in millimetres
+uniform usampler2D infra;  // raw IR
+uniform sampler2D depth_lut;  // 256x256 depth colours, indexed by depth
+uniform vec2 focal_length;
+uniform vec2 center_point;
+uniform vec3 radial_coeffs;  // k1, k2, k3
+uniform vec2 tangential_coeffs;  // p1, p2
+uniform float ir_scale;
+uniform mat4 view;
+uniform mat4 projection;
+
+out vec3 v_color;
+
+// the undistorted ray of a pixel, by fixed-point iteration like synexens.intrinsics
+vec3 get_ray(ivec2 px)
+{
+    vec2 xd = (vec2(px) - center_point) / focal_length;
+    vec2 x = xd;
+    for(int i = 0; i < 8; ++i) {
+        float r2 = dot(x, x);
+        float radial = 1.0 + r2 * (radial_coeffs.x + r2 * (radial_coeffs.y + r2 * radial_coeffs.z));
+        vec2 delta = vec2(
+            2.0 * tangential_coeffs.x * x.x * x.y + tangential_coeffs.y * (r2 + 2.0 * x.x * x.x),
+            tangential_coeffs.x * (r2 + 2.0 * x.y * x.y) + 2.0 * tangential_coeffs.y * x.x * x.y
+        );
+        x = (xd - delta) / radial;
+    }
+    return vec3(x, 1.0);
+}
+
+vec3 get_color(ivec2 px, uint d)
+{
+    float ir = float(texelFetch(infra, px, 0).r) * ir_scale;
+    vec3 c = texelFetch(depth_lut, ivec2(int(d & 255u), int(d >> 8)), 0).rgb;
+    return (vec3(ir) + c * 0.3) / 1.3;
+}
+
+void main()
+{
+    ivec2 tl = ivec2(round(gl_in[0].gl_Position.xy * vec2(imgres)));
+    if(tl.x < 0 || tl.x+1 >= imgres.x || tl.y < 0 || tl.y+1 >= imgres.y)
+        return;
+
+    ivec2 tr = ivec2(tl.x+1, tl.y);
+    ivec2 bl = ivec2(tl.x, tl.y+1);
+    ivec2 br = ivec2(tr.x, tr.y+1);
+    uint d_tl = texelFetch(depth, tl, 0).r;
+    uint d_tr = texelFetch(depth, tr, 0).r;
+    uint d_bl = texelFetch(depth, bl, 0).r;
+    uint d_br = texelFetch(depth, br, 0).r;
+    if(d_tl == 0u || d_tr == 0u || d_bl == 0u || d_br == 0u)
+        return;
+
+    vec3 p_tl = get_ray(tl) * (float(d_tl) * 0.001);  // 1m per unit
+    vec3 p_tr = get_ray(tr) * (float(d_tr) * 0.001);
+    vec3 p_bl = get_ray(bl) * (float(d_bl) * 0.001);
+    vec3 p_br = get_ray(br) * (float(d_br) * 0.001);
+    vec3 p_max = max(max(p_tl, p_tr), max(p_bl, p_br));
+    vec3 p_min = min(min(p_tl, p_tr), min(p_bl, p_br));
+    vec3 d_max = p_max - p_min;
+    float v_max = max(max(d_max.x, d_max.y), d_max.z);
+    if(v_max > 0.05f) // larger than 5cm
+        return;
+
+    gl_Position = projection * view * vec4(p_tl, 1.0);
+    v_color = get_color(tl, d_tl);
+    EmitVertex();
+
+    gl_Position = projection * view * vec4(p_tr, 1.0);
+    v_color = get_color(tr, d_tr);
+    EmitVertex();
+
+    gl_Position = projection * view * vec4(p_bl, 1.0);
+    v_color = get_color(bl, d_bl);
+    EmitVertex();
+
+    gl_Position = projection * view * vec4(p_br, 1.0);
+    v_color = get_color(br, d_br);
+    EmitVertex();
+
+    EndPrimitive();
+}
+        """,
+        gl.GL_FRAGMENT_SHADER: """
+#version 330
+
+in vec3 v_color;
+layout(location = 0) out vec4 color;
+
+void main()
+{
+    color = vec4(v_color, 1.0);
+}
+        """,
+    }
+
+    compiled_shaders = [gl.compileShader(v, k) for k, v in shader_srcs.items()]
+    return gl.compileProgram(*compiled_shaders)
+
+
+def set_intrinsics_uniforms(program, intrinsics: dict):
+    k1, k2, p1, p2, k3 = get_distortion_coeffs(intrinsics)
+    program.set_uniform(
+        "focal_length",
+        glm.vec2(intrinsics["focal_length_x"], intrinsics["focal_length_y"]),
+    )
+    program.set_uniform(
+        "center_point",
+        glm.vec2(intrinsics["center_point_x"], intrinsics["center_point_y"]),
+    )
+    program.set_uniform("radial_coeffs", glm.vec3(k1, k2, k3))
+    program.set_uniform("tangential_coeffs", glm.vec2(p1, p2))
+
+
+class TextureStream:
+    """A R16UI texture updated through double-buffered pixel buffer objects.
+
+    Each upload writes the image into the next buffer, orphaning its previous storage so that the
+    driver never stalls on a transfer still in flight, and the texture is then updated from the
+    buffer with `glTexSubImage2D`, which returns without waiting for the copy.
+    """
+
+    def __init__(self, width: int, height: int, n_buffers: int = 2):
+        self.width = width
+        self.height = height
+        self.nbytes = width * height * 2
+
+        self.texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glTexImage2D(
+            gl.GL_TEXTURE_2D,
+            0,
+            gl.GL_R16UI,
+            width,
+            height,
+            0,
+            gl.GL_RED_INTEGER,
+            gl.GL_UNSIGNED_SHORT,
+            None,
+        )
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+        self.pbos = list(np.atleast_1d(gl.glGenBuffers(n_buffers)))
+        for pbo in self.pbos:
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+            gl.glBufferData(
+                gl.GL_PIXEL_UNPACK_BUFFER, self.nbytes, None, gl.GL_STREAM_DRAW
+            )
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+        self.index = 0
+
+    def upload(self, image: np.ndarray):
+        image = np.ascontiguousarray(image, dtype=np.uint16)
+        pbo = self.pbos[self.index]
+        self.index = (self.index + 1) % len(self.pbos)
+
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+        ptr = gl.glMapBufferRange(
+            gl.GL_PIXEL_UNPACK_BUFFER,
+            0,
+            self.nbytes,
+            gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT,
+        )
+        ctypes.memmove(ptr, image.ctypes.data, self.nbytes)
+        gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 2)
+        gl.glTexSubImage2D(
+            gl.GL_TEXTURE_2D,
+            0,
+            0,
+            0,
+            self.width,
+            self.height,
+            gl.GL_RED_INTEGER,
+            gl.GL_UNSIGNED_SHORT,
+            ctypes.c_void_p(0),  # offset into the bound pixel buffer
+        )
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteBuffers(len(self.pbos), self.pbos)
+        gl.glDeleteTextures(1, [self.texture])
+
+
+def create_lut_texture(device):
+    """Uploads the SDK's depth colours once, as a 256x256 RGB8 texture indexed by depth."""
+    lut = device.get_depth_colorizer().lut.reshape(256, 256, 3)
+    texture = gl.glGenTextures(1)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+    gl.glTexImage2D(
+        gl.GL_TEXTURE_2D,
+        0,
+        gl.GL_RGB8,
+        256,
+        256,
+        0,
+        gl.GL_RGB,
+        gl.GL_UNSIGNED_BYTE,
+        glm.array.as_reference(np.ascontiguousarray(lut)).ptr,
+    )
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+    return texture
+
+
+class FrameGrabber(threading.Thread):
+    """Captures frames on a background thread, so that rendering never waits for the camera."""
+
+    def __init__(self, device):
+        super().__init__(daemon=True)
+        self.device = device
+        self.sequence = 0
+        self._frames = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            frames = self.device.wait_for_frame(0.1)
+            if frames is None:
+                continue
+            with self._lock:
+                self._frames = frames
+                self.sequence += 1
+
+    def get_frames(self, last_sequence: int):
+        """Gets the latest frames and their sequence number, or None if not newer."""
+        with self._lock:
+            if self.sequence == last_sequence:
+                return None, last_sequence
+            return self._frames, self.sequence
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class FrameTimer:
+    """Averages the frame time and the frame update time, and shows them in the window title."""
+
+    def __init__(self, window, path: str, period: float = 1.0):
+        self.window = window
+        self.path = path
+        self.period = period
+        self._reset(time.perf_counter())
+
+    def _reset(self, now: float):
+        self._start = now
+        self._n_frames = 0
+        self._n_updates = 0
+        self._update_time = 0.0
+
+    def add_update(self, elapsed: float):
+        self._n_updates += 1
+        self._update_time += elapsed
+
+    def tick(self):
+        self._n_frames += 1
+        now = time.perf_counter()
+        elapsed = now - self._start
+        if elapsed < self.period:
+            return
+        update_ms = self._update_time / max(self._n_updates, 1) * 1e3
+        title = (
+            f"Synexens Viewer [{self.path}] frame {elapsed / self._n_frames * 1e3:.2f} ms, "
+            f"update {update_ms:.2f} ms, camera {self._n_updates / elapsed:.1f} fps"
+        )
+        glfw.set_window_title(self.window, title)
+        print(title)
+        self._reset(now)
+
+
 @ctx.contextmanager
 def create_textures():
     posit_tex, color_tex = gl.glGenTextures(2)
@@ -352,10 +661,37 @@ def update_textures(posits, colors, posit_tex, color_tex):
 
 
 def main():
-    with s.Device() as device:
+    global width, height
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--cpu",
+        action="store_true",
+        help="deproject and colour on the CPU and upload float textures, the former path",
+    )
+    parser.add_argument(
+        "--backend",
+        default=None,
+        help="'sdk', 'synthetic' or 'replay:<path>'. Default is the default backend.",
+    )
+    parser.add_argument(
+        "--swap-interval",
+        type=int,
+        default=1,
+        help="0 disables vsync, to measure the actual frame time",
+    )
+    args = parser.parse_args()
+    path = "cpu" if args.cpu else "gpu"
+    backend = None if args.backend is None else make_backend(args.backend)
+
+    with s.Device(backend=backend) as device:
         print(device.info)
         device.resolution = s.SYRESOLUTION_640_480
+        intrinsics = device.info["resolutions"][device.resolution]["intrinsics"]
+        width, height = intrinsics["width"], intrinsics["height"]
         device.stream_on(s.SYSTREAMTYPE_DEPTHIR)
+        grabber = FrameGrabber(device)
+        grabber.start()
 
         # OpenGL Boilerplate setup
         glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
@@ -367,6 +703,7 @@ def main():
         ) as window:
             glfw.set_window_pos(window, 100, 100)
             glfw.make_context_current(window)
+            glfw.swap_interval(args.swap_interval)
 
             # Assign mode specific display function
             glfw.set_key_callback(window, on_key)
@@ -378,7 +715,7 @@ def main():
             gl.glDepthFunc(gl.GL_LESS)
             gl.glEnable(gl.GL_DEPTH_TEST)
 
-            program = load_shaders()
+            program = load_shaders() if args.cpu else load_shaders_gpu()
 
             vao = gl.VAO()
             vbo = gl.VBO()
@@ -392,22 +729,38 @@ def main():
 
             with create_textures() as texes:
                 posit_tex, color_tex = texes
-                posits, colors = initial_point_cloud()
-                update_textures(posits, colors, posit_tex, color_tex)
+                if args.cpu:
+                    posits, colors = initial_point_cloud()
+                    update_textures(posits, colors, posit_tex, color_tex)
+                else:
+                    depth_stream = TextureStream(width, height)
+                    ir_stream = TextureStream(width, height)
+                    lut_tex = create_lut_texture(device)
 
                 with program:
-                    program.set_uniform("imgres", glm.ivec2(640, 480))
+                    program.set_uniform("imgres", glm.ivec2(width, height))
                     projection = glm.perspective(
                         glm.radians(50), width / height, 0.1, 100.0
                     )
                     program.set_uniform("projection", projection)
+                    if not args.cpu:
+                        set_intrinsics_uniforms(program, intrinsics)
+                        program.set_uniform("ir_scale", 1.0 / 2048)
 
                     # Render Loop
+                    timer = FrameTimer(window, path)
+                    sequence = 0
                     while not glfw.window_should_close(window):
-                        ret = update_point_cloud(device)
-                        if ret:
-                            posits, colors = ret
-                            update_textures(posits, colors, posit_tex, color_tex)
+                        frame, sequence = grabber.get_frames(sequence)
+                        if frame is not None:
+                            t0 = time.perf_counter()
+                            if args.cpu:
+                                posits, colors = update_point_cloud(device, frame)
+                                update_textures(posits, colors, posit_tex, color_tex)
+                            else:
+                                depth_stream.upload(frame[s.SYFRAMETYPE_DEPTH])
+                                ir_stream.upload(frame[s.SYFRAMETYPE_IR])
+                            timer.add_update(time.perf_counter() - t0)
 
                         # measure time
                         ts = pd.Timestamp.utcnow()
@@ -427,14 +780,36 @@ def main():
                         gl.glClearColor(0.2, 0.3, 0.3, 1.0)
                         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
-                        program.set_uniform_texture_unit("position", 0)
-                        program.set_uniform_texture_unit("color", 1)
+                        if args.cpu:
+                            program.set_uniform_texture_unit("position", 0)
+                            program.set_uniform_texture_unit("color", 1)
+                            gl.glActiveTexture(gl.GL_TEXTURE0)
+                            gl.glBindTexture(gl.GL_TEXTURE_2D, posit_tex)
+                            gl.glActiveTexture(gl.GL_TEXTURE0 + 1)
+                            gl.glBindTexture(gl.GL_TEXTURE_2D, color_tex)
+                        else:
+                            program.set_uniform_texture_unit("depth", 0)
+                            program.set_uniform_texture_unit("infra", 1)
+                            program.set_uniform_texture_unit("depth_lut", 2)
+                            for unit, tex in enumerate(
+                                [depth_stream.texture, ir_stream.texture, lut_tex]
+                            ):
+                                gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+                                gl.glBindTexture(gl.GL_TEXTURE_2D, tex)
                         program.set_uniform("view", camera.pose.affine)
                         with vao:
                             gl.glDrawArrays(gl.GL_POINTS, 0, width * height)
 
                         glfw.swap_buffers(window)
                         glfw.poll_events()
+                        timer.tick()
+
+                if not args.cpu:
+                    depth_stream.delete()
+                    ir_stream.delete()
+                    gl.glDeleteTextures(1, [lut_tex])
+
+        grabber.stop()
 
 
 if __name__ == "__main__":
@@ -53,7 +53,6 @@ setup(
         "mtbase",  # for numpy access
         "mtopengl",  # for rendering dynamic depth images live
         "cython",  # for wrapping purposes
-        "v4l2py",  # for the interface
     ],
     scripts=[
         "scripts/synexens_demo.py",
@@ -1,14 +1,45 @@
 from .version import version as __version__
-from .base import get_sdk_version, find_devices, Device
 
 __api__ = [
     "get_sdk_version",
     "find_devices",
     "Device",
+    "DeviceGroup",
 ]
 
-import synexens_sdk as _sdk
+# name -> submodule defining it
+_API_MODULES = {
+    "get_sdk_version": "base",
+    "find_devices": "base",
+    "Device": "base",
+    "DeviceGroup": "group",
+}
 
-for key in _sdk.__dict__:
-    if key.startswith("SY"):
-        globals()[key] = getattr(_sdk, key)
+
+def _get_enum_module():
+    try:
+        import synexens_sdk as sdk
+    except ImportError:  # no vendor SDK, only the host backends are available
+        from . import const as sdk
+    return sdk
+
+
+def __getattr__(name: str):
+    # The interface and the SY* enums are resolved on first access, so that importing the package
+    # loads neither numpy nor the SDK.
+    if name in _API_MODULES:
+        import importlib
+
+        module = importlib.import_module(f".{_API_MODULES[name]}", __name__)
+        value = getattr(module, name)
+    elif name.startswith("SY") and hasattr(_get_enum_module(), name):
+        value = getattr(_get_enum_module(), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    names = [key for key in _get_enum_module().__dict__ if key.startswith("SY")]
+    return sorted(set(globals()) | set(__api__) | set(names))
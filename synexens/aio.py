@@ -0,0 +1,354 @@
+"""Asyncio interface.
+
+:class:`AsyncFrameStream` turns the frames published to a :class:`synexens.observer.FrameObserver`
+into an async iterator with a bounded queue, so that frames are awaited rather than polled.
+:class:`AsyncDevice` wraps a :class:`synexens.Device`, running its blocking calls in a dedicated
+executor, and streams its frames with ``async for frames in device.frames()``.
+"""
+
+
+import asyncio
+import concurrent.futures
+import functools
+
+from mt import tp
+
+from .base import Device
+from .observer import FrameObserver
+
+
+__all__ = ["POLICIES", "AsyncFrameStream", "AsyncDevice"]
+
+
+# what to do with a new frame when the queue is full
+POLICIES = ["drop-oldest", "drop-newest", "block"]
+
+
+class AsyncFrameStream:
+    """An async iterator over the frames published to a frame observer.
+
+    The stream subscribes to the observer on the first iteration and unsubscribes when it is
+    closed, either explicitly, by exiting its `async with` block, or by being garbage-collected.
+
+    Parameters
+    ----------
+    source : FrameObserver or function
+        the frame observer, or a function without arguments returning it, run in `executor`
+    queue_size : int
+        maximum number of frames waiting to be consumed
+    policy : {'drop-oldest', 'drop-newest', 'block'}
+        what to do with a new frame when the queue is full: drop the oldest frame in the queue,
+        drop the new frame, or block the thread publishing frames until there is room
+    executor : concurrent.futures.Executor, optional
+        the executor running `source` if it is a function. None means the default executor of the
+        event loop.
+    """
+
+    def __init__(
+        self,
+        source: tp.Union[FrameObserver, tp.Callable[[], FrameObserver]],
+        queue_size: int = 4,
+        policy: str = "drop-oldest",
+        executor: tp.Optional[concurrent.futures.Executor] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Expected one of {POLICIES}.")
+        if queue_size < 1:
+            raise ValueError(
+                f"Argument 'queue_size' must be positive. Got: {queue_size}."
+            )
+        self.source = source
+        self.queue_size = queue_size
+        self.policy = policy
+        self.executor = executor
+        self.n_received = 0
+        self.n_dropped = 0
+        self._loop = None
+        self._queue = None
+        self._space = None
+        self._unsubscribe = None
+        self._closed = False
+
+    def __del__(self):
+        if self._unsubscribe is not None:
+            self._closed = True
+            self._unsubscribe()
+
+    async def _start(self):
+        self._loop = asyncio.get_running_loop()
+        # the size is bounded by the put functions, so that the end sentinel always fits
+        self._queue = asyncio.Queue()
+        self._space = asyncio.Event()
+        observer = self.source
+        if not isinstance(observer, FrameObserver):
+            observer = await self._loop.run_in_executor(self.executor, observer)
+        self._unsubscribe = observer.subscribe(self._on_frame)
+
+    def _on_frame(self, frames: dict):
+        """Invoked from the thread publishing frames."""
+        if self._closed:
+            return
+        try:
+            if self.policy != "block":
+                self._loop.call_soon_threadsafe(self._put_nowait, frames)
+                return
+            future = asyncio.run_coroutine_threadsafe(self._put(frames), self._loop)
+        except RuntimeError:  # the event loop is closed
+            return
+        while not self._closed:
+            try:
+                future.result(0.1)
+                return
+            except concurrent.futures.TimeoutError:
+                pass
+        future.cancel()
+
+    async def _put(self, frames: dict):
+        while self._queue.qsize() >= self.queue_size and not self._closed:
+            self._space.clear()
+            await self._space.wait()
+        if not self._closed:
+            self.n_received += 1
+            self._queue.put_nowait(frames)
+
+    def _put_nowait(self, frames: dict):
+        if self._closed:
+            return
+        self.n_received += 1
+        if self._queue.qsize() >= self.queue_size:
+            self.n_dropped += 1
+            if self.policy == "drop-newest":
+                return
+            self._queue.get_nowait()
+        self._queue.put_nowait(frames)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        if self._queue is None:
+            await self._start()
+        frames = await self._queue.get()
+        self._space.set()
+        if frames is None:
+            raise StopAsyncIteration
+        return frames
+
+    async def aclose(self):
+        """Unsubscribes from the observer and ends the iteration."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+            self._space.set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+class AsyncDevice:
+    """A device whose blocking calls run in a dedicated executor.
+
+    The device is created, which looks it up through the SDK, and opened in the executor by
+    :meth:`open`, which the `async with` statement calls on entry. Methods of
+    :class:`synexens.Device` not defined here are available as coroutines too, e.g.
+    ``await device.add_filter(filter_type)``. Properties are read and written with the `get_*` and
+    `set_*` coroutines.
+
+    Parameters
+    ----------
+    device_id : int, optional
+        the device id. If not provided, the first device found is used.
+    backend : object, optional
+        the backend serving the device. If not provided, the default backend is used.
+    executor : concurrent.futures.Executor, optional
+        the executor running the blocking calls. If not provided, a single-threaded executor is
+        created, so that calls to the device are serialized, and shut down by :meth:`close`.
+    device : synexens.Device, optional
+        an existing device to wrap instead of creating one
+    """
+
+    def __init__(
+        self,
+        device_id: tp.Optional[int] = None,
+        backend=None,
+        executor: tp.Optional[concurrent.futures.Executor] = None,
+        device: tp.Optional[Device] = None,
+    ):
+        self._device_id = device_id
+        self._backend = backend
+        self.executor = executor
+        self._owns_executor = executor is None
+        self.device = device
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.device}>"
+
+    async def run(self, func: tp.Callable, *args, **kwargs):
+        """Runs a blocking function in the executor of the device."""
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="synexens-control"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    @staticmethod
+    def _is_device_property(device, name: str):
+        device_type = Device if device is None else type(device)
+        return isinstance(getattr(device_type, name, None), property)
+
+    def __getattr__(self, name: str):
+        if name == "device":  # not set yet
+            raise AttributeError(name)
+        if self._is_device_property(self.device, name):
+            # reading a property may call the SDK, which must not block the event loop
+            if hasattr(type(self), f"get_{name}"):
+                hint = f"await self.get_{name}()"
+            else:
+                hint = f"await self.run(getattr, self.device, {name!r})"
+            raise AttributeError(
+                f"Property '{name}' of the device cannot be read on the event loop. Use "
+                f"'{hint}' instead."
+            )
+        if self.device is None:
+            raise AttributeError(
+                f"Cannot get '{name}' before the device is created. Use 'await self.open()' or "
+                f"an 'async with' block first."
+            )
+        attr = getattr(self.device, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    def __setattr__(self, name: str, value):
+        if self._is_device_property(self.__dict__.get("device"), name):
+            # writing a property calls the SDK, which must not block the event loop
+            if hasattr(type(self), f"set_{name}"):
+                hint = f"await self.set_{name}(...)"
+            else:
+                hint = f"await self.run(setattr, self.device, {name!r}, ...)"
+            raise AttributeError(
+                f"Property '{name}' of the device cannot be written on the event loop. Use "
+                f"'{hint}' instead."
+            )
+        super().__setattr__(name, value)
+
+    async def _get(self, name: str):
+        return await self.run(getattr, self.device, name)
+
+    async def _set(self, name: str, value):
+        await self.run(setattr, self.device, name, value)
+
+    async def get_stream_type(self):
+        """Gets the current stream type."""
+        return await self._get("stream_type")
+
+    async def get_resolution(self):
+        """Gets the current resolution."""
+        return await self._get("resolution")
+
+    async def set_resolution(self, resolution: int):
+        """Sets the resolution."""
+        await self._set("resolution", resolution)
+
+    async def get_filter(self):
+        """Gets whether the filter is on or off."""
+        return await self._get("filter")
+
+    async def set_filter(self, bFilter: bool):
+        """Turns the filter on or off."""
+        await self._set("filter", bFilter)
+
+    async def get_mirror(self):
+        """Gets whether the mirror is on or off."""
+        return await self._get("mirror")
+
+    async def set_mirror(self, bMirror: bool):
+        """Turns the mirror on or off."""
+        await self._set("mirror", bMirror)
+
+    async def get_flip(self):
+        """Gets whether the flip is on or off."""
+        return await self._get("flip")
+
+    async def set_flip(self, bFlip: bool):
+        """Turns the flip on or off."""
+        await self._set("flip", bFlip)
+
+    async def get_integral_time(self):
+        """Gets the integral time."""
+        return await self._get("integral_time")
+
+    async def set_integral_time(self, itime: int):
+        """Sets the integral time."""
+        await self._set("integral_time", itime)
+
+    async def get_distance_user_range(self):
+        """Gets the user distance range as a `(min, max)` pair."""
+        return await self._get("distance_user_range")
+
+    async def set_distance_user_range(self, distance_range: tp.Tuple[int, int]):
+        """Sets the user distance range."""
+        await self._set("distance_user_range", distance_range)
+
+    def frames(self, queue_size: int = 4, policy: str = "drop-oldest"):
+        """Streams the frames pushed by the device.
+
+        The device must be streaming, see :meth:`synexens.Device.stream_on`.
+
+        Parameters
+        ----------
+        queue_size : int
+            maximum number of frames waiting to be consumed
+        policy : {'drop-oldest', 'drop-newest', 'block'}
+            what to do with a new frame when the queue is full, see :class:`AsyncFrameStream`
+
+        Returns
+        -------
+        AsyncFrameStream
+            an async iterator of dictionaries mapping each frame type to an image
+        """
+        return AsyncFrameStream(
+            lambda: self.device.frame_observer, queue_size, policy, self.executor
+        )
+
+    async def open(self):
+        """Creates the device if needed and opens it, in the executor."""
+        if self.device is None:
+            self.device = await self.run(Device, self._device_id, backend=self._backend)
+        await self.run(self.device.open)
+
+    async def close(self):
+        """Closes the device and shuts down the executor if it was created here."""
+        if self.device is not None:
+            await self.run(self.device.close)
+        if self._owns_executor and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
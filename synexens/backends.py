@@ -0,0 +1,796 @@
+"""Backends behind :class:`synexens.Device`.
+
+A backend provides the functions of the `synexens_sdk` module that take a device id as first
+argument, e.g. `open_device`, `start_streaming`, `get_last_frame_data` or `wait_frame_notify`.
+Three backends are available:
+
+- :class:`SDKBackend` forwards every call to the vendor SDK and talks to real cameras.
+- :class:`SyntheticBackend` generates depth/IR frames at a configurable rate and resolution.
+- :class:`ReplayBackend` streams a recording made with :class:`synexens.recording.Recorder`,
+  respecting its original timing.
+
+The host backends mimic the SDK closely, including its errors, so that everything built on top of
+:class:`synexens.Device` can be run, tested and benchmarked without a camera or the SDK. The
+default backend is the SDK backend, unless environment variable `SYNEXENS_BACKEND` is set to
+`synthetic` or to `replay:<path to a recording>`. It is instrumented with
+:class:`synexens.metrics.InstrumentedBackend` if environment variable `SYNEXENS_METRICS` is set to
+1.
+"""
+
+
+import atexit
+import os
+import threading
+import time
+
+from mt import tp, np
+
+from . import const
+from .colorize import DepthColorizer
+from .deproject import Deprojector
+from .intrinsics import make_intrinsics, find_resolution
+from .registration import Registration
+from .undistort import Undistorter
+
+
+__all__ = [
+    "SDKBackend",
+    "HostBackend",
+    "SyntheticBackend",
+    "ReplayBackend",
+    "make_backend",
+    "get_default_backend",
+    "set_default_backend",
+]
+
+
+class SDKBackend:
+    """The backend forwarding every call to the vendor SDK.
+
+    The SDK is initialized when the backend is created and uninitialized at exit. An event
+    observer is registered to count device connections and disconnections.
+    """
+
+    def __init__(self):
+        import synexens_sdk
+
+        self._sdk = synexens_sdk
+        synexens_sdk.init_sdk()
+        atexit.register(synexens_sdk.uninit_sdk)
+        synexens_sdk.register_event_observer()
+
+    def __getattr__(self, name: str):
+        return getattr(self._sdk, name)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}>"
+
+
+class _DeviceState:
+    """The settings and streaming state of a device simulated by a host backend."""
+
+    def __init__(self, info: dict, resolution: int):
+        self.info = info
+        self.opened = False
+        self.stream_type = const.SYSTREAMTYPE_NULL
+        self.start_time = None
+        self.resolutions = {
+            const.SYFRAMETYPE_DEPTH: resolution,
+            const.SYFRAMETYPE_IR: resolution,
+            const.SYFRAMETYPE_RGB: resolution,
+        }
+        self.filter = False
+        self.filter_list = []
+        self.filter_params = {}
+        self.mirror = False
+        self.flip = False
+        self.integral_time = info["resolutions"][resolution]["integral_time_max"]
+        self.distance_user_range = None
+        self.frames = None
+        self.sequence = 0
+
+
+class HostBackend:
+    """Base class of the backends simulating devices on the host.
+
+    It keeps the settings of every device, checks calls the way the SDK does, raising a
+    RuntimeError with the SDK's error code, and implements the image processing functions of the
+    SDK with the host-side engines of this package. Subclasses implement :meth:`get_device_info`,
+    :meth:`get_sequence`, :meth:`get_frame_time` and :meth:`make_frame`, and may override
+    :meth:`get_initial_resolution`.
+
+    Parameters
+    ----------
+    device_types : dict
+        a dictionary mapping each simulated device id to its device type
+    """
+
+    def __init__(self, device_types: dict):
+        self._device_types = device_types
+        self._states = {}
+        self._cond = threading.Condition()
+        self._n_interrupts = 0
+        self._colorizer = None
+        self._deprojectors = {}
+        self._undistorters = {}
+        self._registrations = {}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} devices={list(self._device_types)}>"
+
+    def get_device_info(self, nDeviceID: int):
+        """Gets the information of a device, in the format of `Device.info`."""
+        raise NotImplementedError
+
+    def get_initial_resolution(self, info: dict):
+        """Gets the resolution of a device right after it is found."""
+        return min(info["resolutions"])
+
+    def get_sequence(self, state: _DeviceState, elapsed: float):
+        """Gets the sequence number of the frame available a number of seconds after streaming
+        started, starting from 1."""
+        raise NotImplementedError
+
+    def get_frame_time(self, state: _DeviceState, sequence: int):
+        """Gets the number of seconds after streaming started at which a frame becomes available,
+        or None if it never does."""
+        raise NotImplementedError
+
+    def make_frame(self, state: _DeviceState, sequence: int, out: dict):
+        """Writes a frame into a dictionary mapping each frame type to an image, reusing the
+        images of the right shape."""
+        raise NotImplementedError
+
+    def _get_state(self, nDeviceID: int, func: str, opened: bool = True):
+        if nDeviceID not in self._device_types:
+            raise RuntimeError(f"{func}() returns {const.SYERRORCODE_DEVICENOTEXIST}.")
+        state = self._states.get(nDeviceID)
+        if state is None:
+            info = self.get_device_info(nDeviceID)
+            state = _DeviceState(info, self.get_initial_resolution(info))
+            self._states[nDeviceID] = state
+        if opened and not state.opened:
+            raise RuntimeError(f"{func}() returns {const.SYERRORCODE_DEVICENOTOPENED}.")
+        return state
+
+    def _get_stream_frame_types(self, state: _DeviceState, stream_type: int):
+        frame_types = {
+            const.SYSTREAMTYPE_DEPTH: [const.SYFRAMETYPE_DEPTH],
+            const.SYSTREAMTYPE_RGB: [const.SYFRAMETYPE_RGB],
+            const.SYSTREAMTYPE_DEPTHIR: [const.SYFRAMETYPE_DEPTH, const.SYFRAMETYPE_IR],
+            const.SYSTREAMTYPE_DEPTHRGB: [
+                const.SYFRAMETYPE_DEPTH,
+                const.SYFRAMETYPE_RGB,
+            ],
+            const.SYSTREAMTYPE_DEPTHIRRGB: [
+                const.SYFRAMETYPE_DEPTH,
+                const.SYFRAMETYPE_IR,
+                const.SYFRAMETYPE_RGB,
+            ],
+        }.get(stream_type)
+        support_types = state.info["support_frame_types"]
+        if frame_types is None or (
+            const.SYFRAMETYPE_RGB in frame_types
+            and const.SYSUPPORTTYPE_RGB not in support_types
+        ):
+            raise RuntimeError(
+                f"StartStreaming() returns {const.SYERRORCODE_UNKOWNSTREAMTYPE}."
+            )
+        return frame_types
+
+    def _get_resolutions(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetIntric").info["resolutions"]
+
+    def get_sdk_version(self):
+        return type(self).__name__
+
+    def find_device(self):
+        return dict(self._device_types)
+
+    def get_device_event_count(self):
+        return 0
+
+    def open_device(self, nDeviceID: int, deviceType: int):
+        state = self._get_state(nDeviceID, "OpenDevice", opened=False)
+        if deviceType != self._device_types[nDeviceID]:
+            raise RuntimeError(
+                f"OpenDevice() returns {const.SYERRORCODE_UNKOWNDEVICETYPE}."
+            )
+        state.opened = True
+
+    def close_device(self, nDeviceID: int):
+        state = self._get_state(nDeviceID, "CloseDevice")
+        with self._cond:
+            state.stream_type = const.SYSTREAMTYPE_NULL
+            state.opened = False
+            self._cond.notify_all()
+
+    def query_device_support_frame_type(self, nDeviceID: int):
+        state = self._get_state(nDeviceID, "QueryDeviceSupportFrameType")
+        return list(state.info["support_frame_types"])
+
+    def query_device_support_resolution(self, nDeviceID: int, supportType: int):
+        state = self._get_state(nDeviceID, "QueryDeviceSupportResolution")
+        return list(state.info["support_frame_types"].get(supportType, []))
+
+    def get_current_stream_type(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetCurrentStreamType").stream_type
+
+    def start_streaming(self, nDeviceID: int, streamType: int):
+        state = self._get_state(nDeviceID, "StartStreaming")
+        if state.stream_type != const.SYSTREAMTYPE_NULL:
+            raise RuntimeError(
+                f"StartStreaming() returns {const.SYERRORCODE_STREAMINGEXIST}."
+            )
+        self._get_stream_frame_types(state, streamType)
+        with self._cond:
+            state.stream_type = streamType
+            state.start_time = time.monotonic()
+            state.sequence = 0
+            self._cond.notify_all()
+
+    def stop_streaming(self, nDeviceID: int):
+        state = self._get_state(nDeviceID, "StopStreaming")
+        with self._cond:
+            state.stream_type = const.SYSTREAMTYPE_NULL
+            self._cond.notify_all()
+
+    def change_streaming(self, nDeviceID: int, streamType: int):
+        state = self._get_state(nDeviceID, "ChangeStreaming")
+        if state.stream_type == const.SYSTREAMTYPE_NULL:
+            raise RuntimeError(
+                f"ChangeStreaming() returns {const.SYERRORCODE_NOSTREAMING}."
+            )
+        self._get_stream_frame_types(state, streamType)
+        state.stream_type = streamType
+
+    def set_frame_resolution(self, nDeviceID: int, frameType: int, resolution: int):
+        state = self._get_state(nDeviceID, "SetFrameResolution")
+        if resolution not in state.info["resolutions"]:
+            raise RuntimeError(
+                f"SetFrameResolution() returns {const.SYERRORCODE_UNKOWNRESOLUTION}."
+            )
+        if frameType not in state.resolutions:
+            raise RuntimeError(
+                f"SetFrameResolution() returns {const.SYERRORCODE_UNKOWNFRAMETYPE}."
+            )
+        state.resolutions[frameType] = resolution
+
+    def get_frame_resolution(self, nDeviceID: int, frameType: int):
+        state = self._get_state(nDeviceID, "GetFrameResolution")
+        if frameType not in state.resolutions:
+            raise RuntimeError(
+                f"GetFrameResolution() returns {const.SYERRORCODE_UNKOWNFRAMETYPE}."
+            )
+        return state.resolutions[frameType]
+
+    def get_filter(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetFilter").filter
+
+    def set_filter(self, nDeviceID: int, bFilter: bool):
+        self._get_state(nDeviceID, "SetFilter").filter = bFilter
+
+    def get_filter_list(self, nDeviceID: int):
+        return list(self._get_state(nDeviceID, "GetFilterList").filter_list)
+
+    def set_default_filter(self, nDeviceID: int):
+        state = self._get_state(nDeviceID, "SetDefaultFilter")
+        state.filter_list = [
+            const.SYFILTERTYPE_MEDIAN,
+            const.SYFILTERTYPE_AMPLITUDE,
+            const.SYFILTERTYPE_SPECKLE,
+        ]
+        state.filter_params = {}
+
+    def add_filter(self, nDeviceID: int, filterType: int):
+        self._get_state(nDeviceID, "AddFilter").filter_list.append(filterType)
+
+    def delete_filter(self, nDeviceID: int, nIndex: int):
+        state = self._get_state(nDeviceID, "DeleteFilter")
+        if not 0 <= nIndex < len(state.filter_list):
+            raise RuntimeError(f"DeleteFilter() returns {const.SYERRORCODE_FAILED}.")
+        del state.filter_list[nIndex]
+
+    def clear_filter(self, nDeviceID: int):
+        self._get_state(nDeviceID, "ClearFilter").filter_list = []
+
+    def set_filter_params(self, nDeviceID: int, filterType: int, filterParams):
+        state = self._get_state(nDeviceID, "SetFilterParam")
+        state.filter_params[filterType] = np.array(filterParams, dtype=np.float32)
+
+    def get_filter_params(self, nDeviceID: int, filterType: int):
+        state = self._get_state(nDeviceID, "GetFilterParam")
+        params = state.filter_params.get(filterType)
+        return np.empty(0, dtype=np.float32) if params is None else params.copy()
+
+    def get_mirror(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetMirror").mirror
+
+    def set_mirror(self, nDeviceID: int, bMirror: bool):
+        self._get_state(nDeviceID, "SetMirror").mirror = bMirror
+
+    def get_flip(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetFlip").flip
+
+    def set_flip(self, nDeviceID: int, bFlip: bool):
+        self._get_state(nDeviceID, "SetFlip").flip = bFlip
+
+    def get_integral_time(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetIntegralTime").integral_time
+
+    def set_integral_time(self, nDeviceID: int, nIntegralTime: int):
+        state = self._get_state(nDeviceID, "SetIntegralTime")
+        res = state.info["resolutions"][state.resolutions[const.SYFRAMETYPE_DEPTH]]
+        if not res["integral_time_min"] <= nIntegralTime <= res["integral_time_max"]:
+            raise RuntimeError(f"SetIntegralTime() returns {const.SYERRORCODE_FAILED}.")
+        state.integral_time = nIntegralTime
+
+    def get_integral_time_range(self, nDeviceID: int, depthResolution: int):
+        state = self._get_state(nDeviceID, "GetIntegralTimeRange")
+        res = state.info["resolutions"].get(depthResolution)
+        if res is None:
+            raise RuntimeError(
+                f"GetIntegralTimeRange() returns {const.SYERRORCODE_UNKOWNRESOLUTION}."
+            )
+        return res["integral_time_min"], res["integral_time_max"]
+
+    def get_distance_measure_range(self, nDeviceID: int):
+        info = self._get_state(nDeviceID, "GetDistanceMeasureRange").info
+        return info["distance_measure_min"], info["distance_measure_max"]
+
+    def get_distance_user_range(self, nDeviceID: int):
+        state = self._get_state(nDeviceID, "GetDistanceUserRange")
+        if state.distance_user_range is None:
+            return self.get_distance_measure_range(nDeviceID)
+        return state.distance_user_range
+
+    def set_distance_user_range(self, nDeviceID: int, nMin: int, nMax: int):
+        self._get_state(nDeviceID, "SetDistanceUserRange").distance_user_range = (
+            nMin,
+            nMax,
+        )
+
+    def get_device_sn(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetDeviceSN").info["serial_number"]
+
+    def get_device_hw_version(self, nDeviceID: int):
+        return self._get_state(nDeviceID, "GetDeviceHWVersion").info["hw_version"]
+
+    def get_intrinsics(self, nDeviceID: int, resolution: int):
+        res = self._get_resolutions(nDeviceID).get(resolution)
+        if res is None:
+            raise RuntimeError(
+                f"GetIntric() returns {const.SYERRORCODE_UNKOWNRESOLUTION}."
+            )
+        return dict(res["intrinsics"])
+
+    def get_depth_color(self, nDeviceID: int, pDepth: np.ndarray):
+        self._get_state(nDeviceID, "GetDepthColor")
+        if self._colorizer is None:
+            self._colorizer = DepthColorizer.from_colormap("jet")
+        return self._colorizer.colorize(pDepth)
+
+    def get_depth_point_cloud(
+        self, nDeviceID: int, pDepth: np.ndarray, bUndistort: bool
+    ):
+        key = (nDeviceID, bool(bUndistort))
+        deprojector = self._deprojectors.get(key)
+        if deprojector is None:
+            deprojector = Deprojector(
+                self._get_resolutions(nDeviceID), undistort=bUndistort
+            )
+            self._deprojectors[key] = deprojector
+        return deprojector.deproject(pDepth)
+
+    def _undistort(
+        self,
+        nDeviceID: int,
+        image: np.ndarray,
+        interpolation: str,
+        out: tp.Optional[np.ndarray] = None,
+    ):
+        key = (nDeviceID, interpolation)
+        undistorter = self._undistorters.get(key)
+        if undistorter is None:
+            undistorter = Undistorter(self._get_resolutions(nDeviceID), interpolation)
+            self._undistorters[key] = undistorter
+        return undistorter.undistort(image, out=out)
+
+    def undistort_depth(self, nDeviceID: int, pDepth: np.ndarray):
+        return self._undistort(nDeviceID, pDepth, "nearest")
+
+    def get_rgbd(
+        self,
+        nDeviceID: int,
+        pDepth: np.ndarray,
+        pRGB: np.ndarray,
+        pTargetDepth: tp.Optional[np.ndarray] = None,
+        pTargetRGB: tp.Optional[np.ndarray] = None,
+    ):
+        state = self._get_state(nDeviceID, "GetRGBD")
+        if const.SYSUPPORTTYPE_RGB not in state.info["support_frame_types"]:
+            raise RuntimeError(
+                f"GetRGBD() returns {const.SYERRORCODE_UNKOWNFRAMETYPE}."
+            )
+        registration = self._registrations.get(nDeviceID)
+        if registration is None:
+            registration = Registration(self._get_resolutions(nDeviceID))
+            self._registrations[nDeviceID] = registration
+        return registration.get_rgbd(
+            pDepth, pRGB, out_depth=pTargetDepth, out_color=pTargetRGB
+        )
+
+    def undistort_ir(self, nDeviceID: int, pIr: np.ndarray):
+        return self._undistort(nDeviceID, pIr, "bilinear")
+
+    def get_depth_color_batch(
+        self, nDeviceID: int, pDepth: np.ndarray, pColor: np.ndarray
+    ):
+        self._get_state(nDeviceID, "GetDepthColor")
+        if self._colorizer is None:
+            self._colorizer = DepthColorizer.from_colormap("jet")
+        self._colorizer.colorize(pDepth, out=pColor)
+
+    def get_depth_point_cloud_batch(
+        self, nDeviceID: int, pDepth: np.ndarray, pPos: np.ndarray, bUndistort: bool
+    ):
+        key = (nDeviceID, bool(bUndistort))
+        deprojector = self._deprojectors.get(key)
+        if deprojector is None:
+            deprojector = Deprojector(
+                self._get_resolutions(nDeviceID), undistort=bUndistort
+            )
+            self._deprojectors[key] = deprojector
+        deprojector.deproject(pDepth, out=pPos)
+
+    def undistort_depth_batch(
+        self, nDeviceID: int, pDepth: np.ndarray, pDepth2: np.ndarray
+    ):
+        self._undistort(nDeviceID, pDepth, "nearest", out=pDepth2)
+
+    def undistort_ir_batch(self, nDeviceID: int, pIr: np.ndarray, pIr2: np.ndarray):
+        self._undistort(nDeviceID, pIr, "bilinear", out=pIr2)
+
+    def _get_frame(self, state: _DeviceState, sequence: int, out: tp.Optional[dict]):
+        if state.frames is None or state.sequence != sequence:
+            state.frames = {} if state.frames is None else state.frames
+            self.make_frame(state, sequence, state.frames)
+            state.sequence = sequence
+        d_frames = {} if out is None else out
+        for frame_type in list(d_frames):
+            if frame_type not in state.frames:
+                del d_frames[frame_type]
+        for frame_type, image in state.frames.items():
+            img = d_frames.get(frame_type)
+            if (
+                img is None
+                or img.shape != image.shape
+                or img.dtype != image.dtype
+                or not img.flags.c_contiguous
+                or not img.flags.writeable
+            ):
+                img = np.empty(image.shape, dtype=image.dtype)
+                d_frames[frame_type] = img
+            np.copyto(img, image)
+        return d_frames
+
+    def get_last_frame_data(self, nDeviceID: int, out: tp.Optional[dict] = None):
+        state = self._get_state(nDeviceID, "GetLastFrameData")
+        with self._cond:
+            if state.stream_type == const.SYSTREAMTYPE_NULL:
+                raise RuntimeError(
+                    f"GetLastFrameData() returns {const.SYERRORCODE_NOSTREAMING}."
+                )
+            sequence = self.get_sequence(state, time.monotonic() - state.start_time)
+            if sequence <= 0:
+                return None
+            return self._get_frame(state, sequence, out)
+
+    def register_frame_observer(self):
+        pass
+
+    def unregister_frame_observer(self):
+        self.interrupt_frame_observer()
+
+    def interrupt_frame_observer(self):
+        with self._cond:
+            self._n_interrupts += 1
+            self._cond.notify_all()
+
+    def wait_frame_notify(
+        self, nDeviceID: int, nLastSequence: int, fltTimeout: float = -1
+    ):
+        state = self._get_state(nDeviceID, "WaitFrameNotify", opened=False)
+        deadline = None if fltTimeout < 0 else time.monotonic() + fltTimeout
+        with self._cond:
+            n_interrupts = self._n_interrupts
+            while self._n_interrupts == n_interrupts:
+                now = time.monotonic()
+                if state.stream_type != const.SYSTREAMTYPE_NULL:
+                    elapsed = now - state.start_time
+                    sequence = self.get_sequence(state, elapsed)
+                    if sequence > 0 and sequence != nLastSequence:
+                        return sequence, self._get_frame(state, sequence, None)
+                    frame_time = self.get_frame_time(state, sequence + 1)
+                    delay = None if frame_time is None else frame_time - elapsed
+                else:
+                    delay = None
+                if deadline is not None:
+                    if now >= deadline:
+                        break
+                    delay = (
+                        deadline - now if delay is None else min(delay, deadline - now)
+                    )
+                self._cond.wait(delay)
+        return None
+
+
+class SyntheticBackend(HostBackend):
+    """Simulates devices generating moving depth and IR ramps at a fixed rate.
+
+    Frames are generated on demand by shifting a precomputed pattern, so generating a frame costs
+    a copy.
+
+    Parameters
+    ----------
+    fps : float
+        number of frames per second
+    resolution : SYResolution
+        the initial resolution of every device
+    resolutions : list, optional
+        the resolutions the devices support. Default is all resolutions up to `resolution`.
+    n_devices : int
+        number of simulated devices, with ids 1 to `n_devices`
+    device_type : SYDeviceType
+        the device type of the simulated devices
+    rgb : bool
+        whether the devices also have an RGB sensor
+    distortion_coeffs : list, optional
+        the 5 distortion coefficients `(k1, k2, p1, p2, k3)` of the simulated intrinsics
+    """
+
+    # period in pixels of the depth and IR ramps
+    RAMP_PERIOD = 1024
+
+    def __init__(
+        self,
+        fps: float = 30.0,
+        resolution: int = const.SYRESOLUTION_640_480,
+        resolutions: tp.Optional[list] = None,
+        n_devices: int = 1,
+        device_type: int = const.SYDEVICETYPE_CS30_DUAL,
+        rgb: bool = False,
+        distortion_coeffs: tp.Optional[tp.Sequence[float]] = None,
+    ):
+        super().__init__({i + 1: device_type for i in range(n_devices)})
+        if fps <= 0:
+            raise ValueError(f"Argument 'fps' must be positive. Got: {fps}.")
+        self.fps = fps
+        self.resolution = resolution
+        if resolutions is None:
+            resolutions = [
+                x
+                for x in const.RESOLUTION_SIZES
+                if x != const.SYRESOLUTION_NULL and x <= resolution
+            ]
+        self.resolutions = sorted(resolutions)
+        self.rgb = rgb
+        self.distortion_coeffs = distortion_coeffs
+        self._patterns = {}
+
+    def get_device_info(self, nDeviceID: int):
+        support_frame_types = {const.SYSUPPORTTYPE_DEPTH: list(self.resolutions)}
+        if self.rgb:
+            support_frame_types[const.SYSUPPORTTYPE_RGB] = list(self.resolutions)
+        return {
+            "device_type": self._device_types[nDeviceID],
+            "hw_version": "synthetic",
+            "serial_number": f"SYNTHETIC{nDeviceID:04d}".encode(),
+            "support_frame_types": support_frame_types,
+            "resolutions": {
+                resolution: {
+                    "intrinsics": make_intrinsics(
+                        resolution, distortion_coeffs=self.distortion_coeffs
+                    ),
+                    "integral_time_min": 0,
+                    "integral_time_max": 2000,
+                }
+                for resolution in self.resolutions
+            },
+            "distance_measure_min": 0,
+            "distance_measure_max": 7500,
+        }
+
+    def get_initial_resolution(self, info: dict):
+        return self.resolution
+
+    def get_sequence(self, state: _DeviceState, elapsed: float):
+        return int(elapsed * self.fps) + 1
+
+    def get_frame_time(self, state: _DeviceState, sequence: int):
+        return (sequence - 1) / self.fps
+
+    def _get_pattern(self, frame_type: int, resolution: int):
+        key = (frame_type, resolution)
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            width, height = const.RESOLUTION_SIZES[resolution]
+            x = np.arange(width + self.RAMP_PERIOD, dtype=np.uint32)[np.newaxis, :]
+            y = np.arange(height, dtype=np.uint32)[:, np.newaxis]
+            if frame_type == const.SYFRAMETYPE_DEPTH:
+                pattern = 500 + ((x + y) % self.RAMP_PERIOD) * 6
+            elif frame_type == const.SYFRAMETYPE_IR:
+                pattern = ((x * 2) % self.RAMP_PERIOD) * 2 + y * 0
+            else:
+                pattern = np.stack(
+                    [x % 256 + y * 0, y % 256 + x * 0, (x + y) % 256], axis=-1
+                )
+            dtype = np.uint8 if frame_type == const.SYFRAMETYPE_RGB else np.uint16
+            pattern = pattern.astype(dtype).reshape(
+                height, width + self.RAMP_PERIOD, -1
+            )
+            self._patterns[key] = pattern
+        return pattern
+
+    def make_frame(self, state: _DeviceState, sequence: int, out: dict):
+        frame_types = self._get_stream_frame_types(state, state.stream_type)
+        for frame_type in list(out):
+            if frame_type not in frame_types:
+                del out[frame_type]
+        shift = (sequence * 4) % self.RAMP_PERIOD
+        for frame_type in frame_types:
+            pattern = self._get_pattern(frame_type, state.resolutions[frame_type])
+            width = pattern.shape[1] - self.RAMP_PERIOD
+            view = pattern[:, shift : shift + width]
+            img = out.get(frame_type)
+            if img is None or img.shape != view.shape:
+                img = np.empty(view.shape, dtype=view.dtype)
+                out[frame_type] = img
+            np.copyto(img, view)
+
+
+class ReplayBackend(HostBackend):
+    """Simulates a device streaming the frames of a recording with their original timing.
+
+    The device has the information and the resolution of the recorded device. Settings can be
+    changed but do not affect the recorded frames.
+
+    Parameters
+    ----------
+    filepath : str
+        path to a recording made with :class:`synexens.recording.Recorder`
+    speed : float
+        playback speed relative to the recorded timing
+    loop : bool
+        whether to restart from the first frame after the last frame. Otherwise, the last frame is
+        repeated.
+    """
+
+    def __init__(self, filepath: str, speed: float = 1.0, loop: bool = True):
+        from .recording import Playback
+
+        self.playback = Playback(filepath)
+        if len(self.playback) == 0:
+            raise ValueError(f"Recording '{filepath}' has no frames.")
+        if speed <= 0:
+            raise ValueError(f"Argument 'speed' must be positive. Got: {speed}.")
+        self.speed = speed
+        self.loop = loop
+
+        info = self.playback.info
+        device_type = (
+            const.SYDEVICETYPE_CS30_DUAL if info is None else info["device_type"]
+        )
+        super().__init__({1: device_type})
+
+        timestamps = (self.playback.timestamps - self.playback.timestamps[0]) * 1e-9
+        period = float(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 0.0
+        self._timestamps = timestamps
+        self._duration = timestamps[-1] + period
+
+    def get_device_info(self, nDeviceID: int):
+        info = self.playback.info
+        stream = self.playback.streams[0]
+        resolution = self.playback.metadata.get("resolution")
+        if resolution is None:
+            resolution = find_resolution(*stream["shape"][:2])
+        if info is None:
+            info = {
+                "device_type": self._device_types[nDeviceID],
+                "hw_version": "replay",
+                "serial_number": b"REPLAY",
+                "support_frame_types": {const.SYSUPPORTTYPE_DEPTH: [resolution]},
+                "resolutions": {
+                    resolution: {
+                        "intrinsics": make_intrinsics(resolution),
+                        "integral_time_min": 0,
+                        "integral_time_max": 2000,
+                    }
+                },
+            }
+        if isinstance(info["serial_number"], str):
+            info = dict(info, serial_number=info["serial_number"].encode())
+        info = dict(
+            info,
+            support_frame_types={k: [resolution] for k in info["support_frame_types"]},
+            resolutions={resolution: info["resolutions"][resolution]},
+        )
+        info.setdefault("distance_measure_min", 0)
+        info.setdefault("distance_measure_max", 7500)
+        return info
+
+    def get_sequence(self, state: _DeviceState, elapsed: float):
+        n = len(self._timestamps)
+        t = elapsed * self.speed
+        n_loops = 0
+        if self._duration > 0:
+            n_loops, t = divmod(t, self._duration)
+        if n_loops > 0 and not self.loop:
+            return n
+        index = int(np.searchsorted(self._timestamps, t, side="right")) - 1
+        return int(n_loops) * n + index + 1
+
+    def get_frame_time(self, state: _DeviceState, sequence: int):
+        n = len(self._timestamps)
+        n_loops, index = divmod(sequence - 1, n)
+        if n_loops > 0 and not self.loop:
+            return None
+        return (n_loops * self._duration + self._timestamps[index]) / self.speed
+
+    def make_frame(self, state: _DeviceState, sequence: int, out: dict):
+        out.clear()
+        out.update(self.playback[(sequence - 1) % len(self.playback)])
+
+
+def make_backend(spec: str):
+    """Makes a backend from a specification string.
+
+    Parameters
+    ----------
+    spec : str
+        'sdk', 'synthetic', or 'replay:' followed by the path to a recording
+
+    Returns
+    -------
+    object
+        the backend
+    """
+    if spec == "sdk":
+        return SDKBackend()
+    if spec == "synthetic":
+        return SyntheticBackend()
+    if spec.startswith("replay:"):
+        return ReplayBackend(spec[len("replay:") :])
+    raise ValueError(
+        f"Unknown backend '{spec}'. Expected 'sdk', 'synthetic' or 'replay:<path>'."
+    )
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_default_backend():
+    """Gets the default backend, creating it on first use.
+
+    The default backend is made from environment variable `SYNEXENS_BACKEND` if it is set, or is
+    the SDK backend otherwise. It records into the default metrics registry if environment variable
+    `SYNEXENS_METRICS` is set to 1.
+    """
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            backend = make_backend(os.environ.get("SYNEXENS_BACKEND", "sdk"))
+            if os.environ.get("SYNEXENS_METRICS", "0") == "1":
+                from .metrics import InstrumentedBackend
+
+                backend = InstrumentedBackend(backend)
+            _default_backend = backend
+        return _default_backend
+
+
+def set_default_backend(backend):
+    """Sets the default backend used by devices created without an explicit backend."""
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
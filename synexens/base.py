@@ -3,39 +3,87 @@
 
 import errno
 import functools
-import atexit
-import v4l2py as v4l2
-
-import synexens_sdk as sdk
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from mt import tp, np
 
-sdk.init_sdk()
-atexit.register(sdk.uninit_sdk)
+from .backends import SDKBackend, get_default_backend
+from .cache import DeviceInfoCache, get_default_info_cache
+from .colorize import DepthColorizer
+from .config import DeviceConfig
+from .const import SYFRAMETYPE_IR, SYFRAMETYPE_DEPTH, SYFRAMETYPE_RGB
+from .const import SYSUPPORTTYPE_DEPTH, SYSUPPORTTYPE_RGB, SYSTREAMTYPE_NULL
+from .observer import FrameObserver, SDKFrameDriver
+from .pool import FramePool, PooledFrames
+from .registration import Registration
+from .undistort import Undistorter
 
 
 @functools.cache
-def get_sdk_version():
+def _get_sdk_version(backend):
+    return backend.get_sdk_version()
+
+
+def get_sdk_version(backend=None):
     """Retrieves the SDK version being used.
 
+    Parameters
+    ----------
+    backend : object, optional
+        the backend. If not provided, the default backend is used.
+
     Returns
     -------
     str
         the sdk version
     """
-    return sdk.get_sdk_version()
+    return _get_sdk_version(get_default_backend() if backend is None else backend)
 
 
-@functools.cache
-def find_devices():
+# number of seconds after which a device list is refreshed even if no device event was notified
+DEVICE_LIST_TTL = 10.0
+
+# backend -> (device event count, monotonic time, device list)
+_device_lists = {}
+_device_lists_lock = threading.Lock()
+
+
+def find_devices(backend=None, refresh: bool = False):
     """Finds all Synexens devices attached to the machine.
 
+    The device list of each backend is cached. It is refreshed when the SDK notifies that a device
+    has been connected or disconnected, when it is older than `DEVICE_LIST_TTL` seconds, or on
+    request.
+
+    Parameters
+    ----------
+    backend : object, optional
+        the backend. If not provided, the default backend is used.
+    refresh : bool
+        whether to search for devices again regardless of the cached list
+
     Returns
     -------
     dict
         a dictionary mapping each found device id to device type
     """
-    return sdk.find_device()
+    if backend is None:
+        backend = get_default_backend()
+    event_count = backend.get_device_event_count()
+    with _device_lists_lock:
+        entry = _device_lists.get(backend)
+        now = time.monotonic()
+        if (
+            refresh
+            or entry is None
+            or entry[0] != event_count
+            or now - entry[1] > DEVICE_LIST_TTL
+        ):
+            entry = (event_count, now, backend.find_device())
+            _device_lists[backend] = entry
+        return entry[2]
 
 
 def check_depth_image(depth_image: np.ndarray, is_ir: bool = False):
@@ -56,69 +104,226 @@ def check_depth_image(depth_image: np.ndarray, is_ir: bool = False):
         )
 
 
-class Device(v4l2.device.ReentrantContextManager):
-    """A Synexens device."""
+def check_depth_images(
+    depth_images: np.ndarray,
+    is_ir: bool = False,
+    out: tp.Optional[np.ndarray] = None,
+    out_channels: int = 1,
+    out_dtype=np.uint16,
+):
+    """Validates a batch of depth or IR images and allocates or validates its output.
+
+    Parameters
+    ----------
+    depth_images : numpy.ndarray
+        the C-contiguous uint16 images of shape `(N, height, width, 1)`
+    is_ir : bool
+        whether the images are IR images, for the error messages
+    out : numpy.ndarray, optional
+        the output array. If not provided, a new array is allocated.
+    out_channels : int
+        number of channels of the output
+    out_dtype : numpy.dtype
+        dtype of the output
+
+    Returns
+    -------
+    numpy.ndarray
+        the C-contiguous output array of shape `(N, height, width, out_channels)`
+    """
+    depth = "IR" if is_ir else "depth"
+    if len(depth_images.shape) != 4:
+        raise ValueError(
+            f"The {depth} images must have rank 4. Shape: {depth_images.shape}."
+        )
+    if depth_images.shape[3] != 1:
+        raise ValueError(
+            f"The {depth} images must have dim 1 for the last rank. Shape: {depth_images.shape}."
+        )
+    if depth_images.dtype != np.uint16:
+        raise ValueError(
+            f"The {depth} images must have dtype uint16. Dtype: {depth_images.dtype}."
+        )
+    if not depth_images.flags["C_CONTIGUOUS"]:
+        raise ValueError(f"The {depth} images are not C_CONTIGUOUS.")
+
+    shape = depth_images.shape[:3] + (out_channels,)
+    if out is None:
+        return np.empty(shape, dtype=out_dtype)
+    if out.shape != shape or out.dtype != out_dtype or not out.flags["C_CONTIGUOUS"]:
+        raise ValueError(
+            f"Argument 'out' must be a C-contiguous {np.dtype(out_dtype)} array of shape "
+            f"{shape}. Got shape {out.shape} and dtype {out.dtype}."
+        )
+    return out
+
+
+class ReentrantContextManager:
+    """A context manager opening on the outermost `with` and closing on its exit.
+
+    Subclasses implement `open()` and `close()`. Same semantics as
+    `v4l2py.device.ReentrantContextManager`, without importing v4l2py.
+    """
+
+    def __init__(self):
+        self._context_level = 0
+
+    def __enter__(self):
+        if not self._context_level:
+            self.open()
+        self._context_level += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._context_level -= 1
+        if not self._context_level:
+            self.close()
+
+
+class Device(ReentrantContextManager):
+    """A Synexens device.
+
+    Parameters
+    ----------
+    device_id : int, optional
+        the device id. If not provided, the first device found is used.
+    backend : object, optional
+        the backend serving the device, e.g. a :class:`synexens.backends.SyntheticBackend` or a
+        :class:`synexens.backends.ReplayBackend` to run without a camera. If not provided, the
+        default backend is used, see :func:`synexens.backends.get_default_backend`.
+    info_cache : synexens.cache.DeviceInfoCache, optional
+        the on-disk cache of the device information. If not provided, the default cache is used
+        with the SDK backend, see :func:`synexens.cache.get_default_info_cache`, and no cache is
+        used with the host backends.
+    """
 
-    def __init__(self, device_id: tp.Optional[int] = None):
+    def __init__(
+        self,
+        device_id: tp.Optional[int] = None,
+        backend=None,
+        info_cache: tp.Optional[DeviceInfoCache] = None,
+    ):
         super().__init__()
 
+        self.closed = True
+        # set before anything can raise, for close() to work from __del__
+        self._batch_executor = None
+        self._batch_workers = 0
+        self.backend = get_default_backend() if backend is None else backend
+        devices = find_devices(self.backend)
+        missing = device_id not in devices if device_id is not None else not devices
+        if missing:  # maybe just plugged in
+            devices = find_devices(self.backend, refresh=True)
         if device_id is None:
-            device_id = list(find_devices().keys())[0]
-        elif device_id not in find_devices():
+            if not devices:
+                raise OSError(errno.ENXIO, "No Synexens device found.")
+            device_id = list(devices.keys())[0]
+        elif device_id not in devices:
             raise OSError(
                 errno.ENXIO, f"Synexens device with id {device_id} not found."
             )
         self.index = device_id
+        # the metrics registry if the backend is instrumented, see :mod:`synexens.metrics`
+        self.metrics = getattr(self.backend, "metrics", None)
+        if info_cache is None and isinstance(
+            getattr(self.backend, "wrapped", self.backend), SDKBackend
+        ):
+            info_cache = get_default_info_cache()
+        self.info_cache = info_cache
         self.info = None
-        self.closed = True
         self.streaming = False
+        self._frame_observer = None
+        self._frame_driver = None
+        self._frame_pool = None
+        self._undistorters = {}
+        self._registration = None
+        self._settings = {}  # settings cache, see :meth:`configure`
+        self._depth_colorizer = None
 
     def __del__(self):
         self.close()
 
     def open(self):
-        """Opens the device and gets the device information."""
+        """Opens the device and gets the device information.
+
+        Apart from opening the device, only the serial number and the hardware version are queried
+        if the rest of the information is in the device info cache.
+        """
         if self.closed:
-            device_type = find_devices()[self.index]
-            sdk.open_device(self.index, device_type)
+            self._settings = {}
+            device_type = find_devices(self.backend)[self.index]
+            self.backend.open_device(self.index, device_type)
             self.info = {
-                "device_type": sdk.SYDeviceType(device_type),
-                "hw_version": sdk.get_device_hw_version(self.index),
-                "serial_number": sdk.get_device_sn(self.index),
+                "device_type": device_type,
+                "hw_version": self.backend.get_device_hw_version(self.index),
+                "serial_number": self.backend.get_device_sn(self.index),
             }
-            l_supportTypes = sdk.query_device_support_frame_type(self.index)
-            d_supportTypes = {}
-            s_resolutions = set()
-            for supportType in l_supportTypes:
-                l_resolutions = sdk.query_device_support_resolution(
-                    self.index, supportType
+            info = None
+            if self.info_cache is not None:
+                info = self.info_cache.get(
+                    self.info["serial_number"],
+                    self.info["hw_version"],
+                    get_sdk_version(self.backend),
                 )
-                d_supportTypes[supportType] = l_resolutions
-                s_resolutions.update(l_resolutions)
-            self.info["support_frame_types"] = d_supportTypes
-            d_resolutions = {}
-            for resolution in sorted(s_resolutions):
-                res = {}
-                res["intrinsics"] = sdk.get_intrinsics(self.index, resolution)
-                nMin, nMax = sdk.get_integral_time_range(self.index, resolution)
-                res["integral_time_min"] = nMin
-                res["integral_time_max"] = nMax
-                d_resolutions[resolution] = res
-            self.info["resolutions"] = d_resolutions
-            nMin, nMax = sdk.get_distance_measure_range(self.index)
-            res["distance_measure_min"] = nMin
-            res["distance_measure_max"] = nMax
+            if info is None:
+                self._query_info()
+            else:
+                self.info.update((k, v) for k, v in info.items() if k not in self.info)
             self.closed = False
             self.streaming = False
 
+    def refresh_info(self):
+        """Queries the information of the opened device again, updating the device info cache."""
+        self._query_info()
+
+    def _query_info(self):
+        l_supportTypes = self.backend.query_device_support_frame_type(self.index)
+        d_supportTypes = {}
+        s_resolutions = set()
+        for supportType in l_supportTypes:
+            l_resolutions = self.backend.query_device_support_resolution(
+                self.index, supportType
+            )
+            d_supportTypes[supportType] = l_resolutions
+            s_resolutions.update(l_resolutions)
+        self.info["support_frame_types"] = d_supportTypes
+        d_resolutions = {}
+        for resolution in sorted(s_resolutions):
+            res = {}
+            res["intrinsics"] = self.backend.get_intrinsics(self.index, resolution)
+            nMin, nMax = self.backend.get_integral_time_range(self.index, resolution)
+            res["integral_time_min"] = nMin
+            res["integral_time_max"] = nMax
+            d_resolutions[resolution] = res
+        self.info["resolutions"] = d_resolutions
+        nMin, nMax = self.backend.get_distance_measure_range(self.index)
+        self.info["distance_measure_min"] = nMin
+        self.info["distance_measure_max"] = nMax
+        if self.info_cache is not None:
+            self.info_cache.put(
+                self.info["serial_number"],
+                self.info["hw_version"],
+                get_sdk_version(self.backend),
+                self.info,
+            )
+
     def close(self):
         """Closes the device."""
 
         if not self.closed:
+            if self._frame_driver is not None:
+                self._frame_driver.stop()
+                self._frame_driver = None
+                self._frame_observer.close()
+                self._frame_observer = None
             if self.streaming:
                 self.stream_off()
-            sdk.close_device(self.index)
+            self.backend.close_device(self.index)
             self.closed = True
+            self._settings = {}
+        if self._batch_executor is not None:
+            self._batch_executor.shutdown(wait=False)
+            self._batch_executor = None
 
     def __repr__(self):
         return f"<{type(self).__name__} index={self.index}, closed={self.closed}>"
@@ -126,125 +331,598 @@ class Device(v4l2.device.ReentrantContextManager):
     @property
     def stream_type(self):
         """The current stream type."""
-        return sdk.get_current_stream_type(self.index)
+        return self.backend.get_current_stream_type(self.index)
 
     @stream_type.setter
-    def stream_type(self, stream_type: sdk.SYStreamType):
+    def stream_type(self, stream_type: int):
+        self._settings.pop("stream_type", None)
         if self.streaming:
-            return sdk.change_streaming(self.index, stream_type)
-        sdk.start_streaming(self.index, stream_type)
+            return self.backend.change_streaming(self.index, stream_type)
+        self.backend.start_streaming(self.index, stream_type)
         self.streaming = True
 
-    def stream_on(self, stream_type: tp.Optional[sdk.SYStreamType] = None):
+    def stream_on(self, stream_type: tp.Optional[int] = None):
         """Starts streaming."""
         self.stream_type = stream_type
 
     def stream_off(self):
         """Stops streaming."""
-        sdk.stop_streaming(self.index)
+        self.backend.stop_streaming(self.index)
         self.streaming = False
+        self._settings["stream_type"] = SYSTREAMTYPE_NULL
 
     @property
     def resolution(self):
         """The current resolution."""
-        return sdk.get_frame_resolution(self.index, sdk.SYFRAMETYPE_IR)
+        return self.backend.get_frame_resolution(self.index, SYFRAMETYPE_IR)
 
     @resolution.setter
-    def resolution(self, resolution: sdk.SYResolution):
-        l_frameTypes = [sdk.SYFRAMETYPE_IR]
+    def resolution(self, resolution: int):
+        # stops and restarts the stream at most once for all frame types
+        with self.configure() as cfg:
+            cfg.resolution = resolution
+
+    def get_frame_types(self):
+        """Gets the list of frame types the device can deliver."""
+        l_frameTypes = [SYFRAMETYPE_IR]
         for support_frame_type in self.info["support_frame_types"]:
-            if support_frame_type == sdk.SYSUPPORTTYPE_DEPTH:
-                l_frameTypes.append(sdk.SYFRAMETYPE_DEPTH)
-            elif support_frame_type == sdk.SYSUPPORTTYPE_RGB:
-                l_frameTypes.append(sdk.SYFRAMETYPE_RGB)
-
-        for frame_type in l_frameTypes:
-            sdk.set_frame_resolution(self.index, frame_type, resolution)
+            if support_frame_type == SYSUPPORTTYPE_DEPTH:
+                l_frameTypes.append(SYFRAMETYPE_DEPTH)
+            elif support_frame_type == SYSUPPORTTYPE_RGB:
+                l_frameTypes.append(SYFRAMETYPE_RGB)
+        return l_frameTypes
 
     @property
     def filter(self):
         """Whether the filter is on or off."""
-        return sdk.get_filter(self.index)
+        return self.backend.get_filter(self.index)
 
     @filter.setter
     def filter(self, bFilter: bool):
-        sdk.set_filter(self.index, bFilter)
+        self.backend.set_filter(self.index, bFilter)
+        self._settings["filter"] = bool(bFilter)
 
     def get_filter_list(self):
         """Gets the list of filters currently being used."""
-        return sdk.get_filter_list(self.index)
+        return self.backend.get_filter_list(self.index)
 
     def set_default_filter(self):
         """Sets the default filter."""
-        sdk.set_default_filter(self.index)
+        self.backend.set_default_filter(self.index)
+        self._forget_filter_settings()
 
-    def add_filter(self, filter_type: sdk.SYFilterType):
+    def add_filter(self, filter_type: int):
         """Adds a filter of a given type to the filter list."""
-        sdk.add_filter(self.index, filter_type)
+        self.backend.add_filter(self.index, filter_type)
+        self._settings.pop("filter_list", None)
 
     def delete_filter(self, index: int):
         """Deletes a filter at a given position on the filter list."""
-        sdk.delete_filter(self.index, index)
+        self.backend.delete_filter(self.index, index)
+        self._settings.pop("filter_list", None)
 
     def clear_filter(self):
         """Clears all filters on the filter list."""
-        sdk.clear_filter(self.index)
+        self.backend.clear_filter(self.index)
+        self._settings["filter_list"] = []
 
-    def get_filter_params(self, filter_type: sdk.SYFilterType):
+    def get_filter_params(self, filter_type: int):
         """Gets the parameters for a given filter type."""
-        return sdk.get_filter_params(self.index, filter_type)
+        return self.backend.get_filter_params(self.index, filter_type)
 
-    def set_filter_params(self, filter_type: sdk.SYFilterType, params: np.ndarray):
+    def set_filter_params(self, filter_type: int, params: np.ndarray):
         """Sets the parameters for a given filter type."""
-        return sdk.set_filter_params(self.index, filter_type, params)
+        self._settings.pop(("filter_params", filter_type), None)
+        return self.backend.set_filter_params(self.index, filter_type, params)
 
     @property
     def mirror(self):
         """Whether the mirror is on or off."""
-        return sdk.get_mirror(self.index)
+        return self.backend.get_mirror(self.index)
 
     @mirror.setter
     def mirror(self, bMirror: bool):
-        sdk.set_mirror(self.index, bMirror)
+        self.backend.set_mirror(self.index, bMirror)
+        self._settings["mirror"] = bool(bMirror)
 
     @property
     def flip(self):
         """Whether the flip is on or off."""
-        return sdk.get_flip(self.index)
+        return self.backend.get_flip(self.index)
 
     @flip.setter
     def flip(self, bFlip: bool):
-        sdk.set_flip(self.index, bFlip)
+        self.backend.set_flip(self.index, bFlip)
+        self._settings["flip"] = bool(bFlip)
 
     @property
     def integral_time(self):
         """The integral time."""
-        return sdk.get_integral_time(self.index)
+        return self.backend.get_integral_time(self.index)
 
     @integral_time.setter
     def integral_time(self, itime: int):
-        sdk.set_integral_time(self.index, itime)
+        self.backend.set_integral_time(self.index, itime)
+        self._settings["integral_time"] = int(itime)
+
+    @property
+    def distance_user_range(self):
+        """The user distance range as a `(min, max)` pair."""
+        return self.backend.get_distance_user_range(self.index)
+
+    @distance_user_range.setter
+    def distance_user_range(self, distance_range: tp.Tuple[int, int]):
+        nMin, nMax = distance_range
+        self.backend.set_distance_user_range(self.index, nMin, nMax)
+        self._settings["distance_user_range"] = (int(nMin), int(nMax))
+
+    def _forget_filter_settings(self):
+        for key in list(self._settings):
+            if key == "filter_list" or (
+                isinstance(key, tuple) and key[0] == "filter_params"
+            ):
+                del self._settings[key]
+
+    def _get_setting(self, key):
+        # gets a setting from the settings cache, querying the device on a miss
+        if key in self._settings:
+            return self._settings[key]
+        if key == "stream_type":
+            value = (
+                self.backend.get_current_stream_type(self.index)
+                if self.streaming
+                else SYSTREAMTYPE_NULL
+            )
+        elif key == "filter_list":
+            value = list(self.backend.get_filter_list(self.index))
+        elif key == "distance_user_range":
+            value = tuple(self.backend.get_distance_user_range(self.index))
+        elif isinstance(key, tuple) and key[0] == "resolution":
+            value = self.backend.get_frame_resolution(self.index, key[1])
+        elif isinstance(key, tuple) and key[0] == "filter_params":
+            value = np.asarray(
+                self.backend.get_filter_params(self.index, key[1]), dtype=np.float32
+            )
+        else:  # filter, mirror, flip, integral_time
+            value = getattr(self.backend, f"get_{key}")(self.index)
+        self._settings[key] = value
+        return value
+
+    def configure(self):
+        """Starts a configuration transaction, applying many settings at once.
+
+        The settings are cached, so that only those that differ from the desired ones are set.
+        Settings changed through the backend directly, bypassing the device, make the cache stale.
+        Call :meth:`forget_settings` in that case.
+
+        Returns
+        -------
+        synexens.config.DeviceConfig
+            the transaction, applied on exit of the `with` block. Its `calls` and `elapsed`
+            attributes then hold the calls made and the reconfiguration latency in seconds.
+
+        Examples
+        --------
+        >>> with device.configure() as cfg:
+        ...     cfg.resolution = SYRESOLUTION_640_480
+        ...     cfg.stream_type = SYSTREAMTYPE_DEPTHIR
+        ...     cfg.mirror = True
+        """
+        return DeviceConfig(self)
+
+    def forget_settings(self):
+        """Forgets the cached settings, so that the next transaction queries them again."""
+        self._settings = {}
 
     def get_depth_color(self, depth_image: np.ndarray):
         """Gets the depth color for a given depth image."""
         check_depth_image(depth_image)
-        return sdk.get_depth_color(self.index, depth_image)
+        return self.backend.get_depth_color(self.index, depth_image)
+
+    def get_depth_colorizer(self):
+        """Gets a lookup-table colorizer reproducing the SDK's depth colours.
+
+        The lookup table is sampled from the SDK once and cached.
+
+        Returns
+        -------
+        synexens.colorize.DepthColorizer
+            the colorizer
+        """
+        if self._depth_colorizer is None:
+            self._depth_colorizer = DepthColorizer.from_device(self)
+        return self._depth_colorizer
 
     def get_depth_point_cloud(self, depth_image: np.ndarray, undistort: bool):
         """Gets the depth point cloud for a given depth image."""
         check_depth_image(depth_image)
-        return sdk.get_depth_point_cloud(self.index, depth_image, undistort)
+        return self.backend.get_depth_point_cloud(self.index, depth_image, undistort)
+
+    def get_rgbd(
+        self,
+        depth_image: np.ndarray,
+        rgb_image: np.ndarray,
+        out_depth: tp.Optional[np.ndarray] = None,
+        out_rgb: tp.Optional[np.ndarray] = None,
+    ):
+        """Aligns a depth image to an RGB image through the SDK's `GetRGBD`.
+
+        Only devices supporting `SYSUPPORTTYPE_RGB` can do so.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            the C-contiguous uint16 depth image of shape `(height, width, 1)`
+        rgb_image : numpy.ndarray
+            the C-contiguous uint8 RGB image of shape `(rgb_height, rgb_width, 3)`
+        out_depth : numpy.ndarray, optional
+            a C-contiguous uint16 output array of shape `(rgb_height, rgb_width, 1)`. If not
+            provided, a new array is allocated.
+        out_rgb : numpy.ndarray, optional
+            a C-contiguous uint8 output array of shape `(rgb_height, rgb_width, 3)`. If not
+            provided, a new array is allocated.
+
+        Returns
+        -------
+        depth : numpy.ndarray
+            the depth image aligned to the RGB image
+        rgb : numpy.ndarray
+            the RGB image of the RGBD pair
+        """
+        check_depth_image(depth_image)
+        return self.backend.get_rgbd(
+            self.index, depth_image, rgb_image, out_depth, out_rgb
+        )
 
-    def get_last_frame_data(self):
-        """Gets the latest frame(s) of data."""
-        return sdk.get_last_frame_data(self.index)
+    def get_registration(self):
+        """Gets the host-side depth-to-RGB registration of the device, whose mappings are cached.
+
+        Returns
+        -------
+        synexens.registration.Registration
+            the registration
+        """
+        if self._registration is None:
+            self._registration = Registration.from_device(self)
+        return self._registration
+
+    def get_last_frame_data(self, out: tp.Optional[dict] = None, pooled: bool = False):
+        """Gets the latest frame(s) of data.
+
+        Parameters
+        ----------
+        out : dict, optional
+            a dictionary mapping each frame type to an image, typically the output of a previous
+            call. Images of the right shape and dtype are overwritten in place, others are
+            (re)allocated and stored in the dictionary, which is then returned.
+        pooled : bool
+            whether to write the frame(s) into the next free slot of the device's frame pool and
+            return a :class:`synexens.pool.PooledFrames` of read-only views. The pool is created
+            with default settings if :meth:`enable_frame_pool` has not been called. The views are
+            only valid until the returned object is released or garbage collected, after which
+            the slot is recycled: keep the object, not just its images, while using them.
+
+        Returns
+        -------
+        dict or None
+            a dictionary mapping each frame type to an image, or None if no frame is available
+        """
+        if not pooled:
+            return self.backend.get_last_frame_data(self.index, out)
+
+        if self._frame_pool is None:
+            self.enable_frame_pool()
+        slot = self._frame_pool.acquire()
+        if slot is None:  # all slots are in use
+            frames = self.backend.get_last_frame_data(self.index)
+            return None if frames is None else PooledFrames(frames)
+        # a copy, so that frame types absent from the frame are dropped from the result only
+        frames = self.backend.get_last_frame_data(self.index, dict(slot.buffers))
+        if frames is None:
+            self._frame_pool.release(slot)
+            return None
+        return PooledFrames(frames, self._frame_pool, slot)
+
+    def enable_frame_pool(self, n_slots: int = 4):
+        """Preallocates a ring of frame buffers for the current resolution.
+
+        Parameters
+        ----------
+        n_slots : int
+            number of slots, i.e. the maximum number of pooled frames held at the same time
+        """
+        self._frame_pool = FramePool(self.resolution, self.get_frame_types(), n_slots)
+
+    def disable_frame_pool(self):
+        """Drops the frame pool."""
+        self._frame_pool = None
 
-    def undistort_depth(self, depth_image: np.ndarray):
-        """Undistorts the depth image."""
+    @property
+    def frame_observer(self):
+        """The observer receiving the frames pushed by the SDK, started on first access."""
+        if self._frame_observer is None:
+            self._frame_observer = FrameObserver()
+            self._frame_driver = SDKFrameDriver(
+                self._frame_observer, self.index, backend=self.backend
+            )
+            self._frame_driver.start()
+        return self._frame_observer
+
+    def wait_for_frame(self, timeout: tp.Optional[float] = None):
+        """Blocks until the SDK pushes a new frame, without polling.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+
+        Returns
+        -------
+        dict or None
+            the new frame(s) of data in the same format as :meth:`get_last_frame_data`, or None if
+            the timeout expired
+        """
+        observer = self.frame_observer
+        frames = observer.wait_for_frame(timeout)
+        if frames is not None and self.metrics is not None and self.metrics.enabled:
+            timestamp = observer.timestamp
+            if timestamp is not None:
+                self.metrics.record_latency(
+                    self.index, "frame_to_consumer", time.monotonic_ns() - timestamp
+                )
+        return frames
+
+    def subscribe(self, callback: tp.Callable[[dict], None]):
+        """Subscribes a callback to every new frame pushed by the SDK.
+
+        Parameters
+        ----------
+        callback : function
+            a function taking the new frame(s) of data as the only argument. It is invoked from a
+            background thread and must return quickly.
+
+        Returns
+        -------
+        function
+            a function without arguments to unsubscribe the callback
+        """
+        return self.frame_observer.subscribe(callback)
+
+    def get_undistorter(self, interpolation: str = "nearest"):
+        """Gets the host-side undistorter of the device, whose remap tables are cached.
+
+        Parameters
+        ----------
+        interpolation : {'nearest', 'bilinear'}
+            how to sample the distorted image
+
+        Returns
+        -------
+        synexens.undistort.Undistorter
+            the undistorter
+        """
+        undistorter = self._undistorters.get(interpolation)
+        if undistorter is None:
+            undistorter = Undistorter.from_device(self, interpolation=interpolation)
+            self._undistorters[interpolation] = undistorter
+        return undistorter
+
+    def undistort_depth(
+        self,
+        depth_image: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        host: bool = False,
+    ):
+        """Undistorts the depth image.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            the depth image of shape `(height, width, 1)`. With `host=True`, a batch of shape
+            `(N, height, width, 1)` is also accepted.
+        out : numpy.ndarray, optional
+            the output array. If not provided, a new array is allocated.
+        host : bool
+            whether to undistort on the host using cached nearest-neighbour remap tables instead
+            of calling the SDK. The host result is not bit-exact with the SDK's, see
+            :meth:`undistort_ir`.
+
+        Returns
+        -------
+        numpy.ndarray
+            the undistorted depth image(s)
+        """
+        if host:
+            return self.get_undistorter("nearest").undistort(depth_image, out=out)
         check_depth_image(depth_image)
-        return sdk.undistort_depth(depth_image)
-
-    def undistort_ir(self, ir_image: np.ndarray):
-        """Undistorts the IR image."""
+        res = self.backend.undistort_depth(self.index, depth_image)
+        if out is None:
+            return res
+        out[...] = res
+        return out
+
+    def undistort_ir(
+        self,
+        ir_image: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        host: bool = False,
+    ):
+        """Undistorts the IR image.
+
+        Parameters
+        ----------
+        ir_image : numpy.ndarray
+            the IR image of shape `(height, width, 1)`. With `host=True`, a batch of shape
+            `(N, height, width, 1)` is also accepted.
+        out : numpy.ndarray, optional
+            the output array. If not provided, a new array is allocated.
+        host : bool
+            whether to undistort on the host using cached bilinear remap tables instead of
+            calling the SDK. The host result is not bit-exact with the SDK's: it follows the same
+            distortion model but samples it with its own bilinear weights and rounding, so values
+            may differ by a few LSB, more across sharp edges. `benchmarks/bench_undistort.py`
+            checks the host path against a synthetic scene and, with `--sdk`, measures the
+            agreement with the SDK on a camera.
+
+        Returns
+        -------
+        numpy.ndarray
+            the undistorted IR image(s)
+        """
+        if host:
+            return self.get_undistorter("bilinear").undistort(ir_image, out=out)
         check_depth_image(ir_image, is_ir=True)
-        return sdk.undistort_depth(ir_image)
+        res = self.backend.undistort_ir(self.index, ir_image)
+        if out is None:
+            return res
+        out[...] = res
+        return out
+
+    def _run_batch(self, func, images, out, n_threads: int, *args):
+        """Runs a batch function of the backend, splitting the batch across threads."""
+        n_chunks = max(1, min(n_threads, len(images)))
+        if n_chunks == 1:
+            func(self.index, images, out, *args)
+            return out
+
+        executor = self._batch_executor
+        if executor is None or self._batch_workers < n_chunks:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ThreadPoolExecutor(
+                max_workers=n_chunks, thread_name_prefix="synexens-batch"
+            )
+            self._batch_executor = executor
+            self._batch_workers = n_chunks
+        # slices along the first axis of C-contiguous arrays remain C-contiguous
+        bounds = [len(images) * i // n_chunks for i in range(n_chunks + 1)]
+        futures = [
+            executor.submit(func, self.index, images[a:b], out[a:b], *args)
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            future.result()
+        return out
+
+    def get_depth_color_batch(
+        self,
+        depth_images: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        n_threads: int = 1,
+    ):
+        """Gets the depth colors of a batch of depth images.
+
+        Parameters
+        ----------
+        depth_images : numpy.ndarray
+            the C-contiguous uint16 depth images of shape `(N, height, width, 1)`
+        out : numpy.ndarray, optional
+            a C-contiguous uint8 output array of shape `(N, height, width, 3)`. If not provided, a
+            new array is allocated.
+        n_threads : int
+            number of threads the batch is split across
+
+        Returns
+        -------
+        numpy.ndarray
+            the depth colors
+        """
+        out = check_depth_images(
+            depth_images, out=out, out_channels=3, out_dtype=np.uint8
+        )
+        return self._run_batch(
+            self.backend.get_depth_color_batch, depth_images, out, n_threads
+        )
+
+    def get_depth_point_cloud_batch(
+        self,
+        depth_images: np.ndarray,
+        undistort: bool,
+        out: tp.Optional[np.ndarray] = None,
+        n_threads: int = 1,
+    ):
+        """Gets the depth point clouds of a batch of depth images.
+
+        Parameters
+        ----------
+        depth_images : numpy.ndarray
+            the C-contiguous uint16 depth images of shape `(N, height, width, 1)`
+        undistort : bool
+            whether to undistort the point clouds
+        out : numpy.ndarray, optional
+            a C-contiguous float32 output array of shape `(N, height, width, 3)`. If not provided,
+            a new array is allocated.
+        n_threads : int
+            number of threads the batch is split across
+
+        Returns
+        -------
+        numpy.ndarray
+            the point clouds
+        """
+        out = check_depth_images(
+            depth_images, out=out, out_channels=3, out_dtype=np.float32
+        )
+        return self._run_batch(
+            self.backend.get_depth_point_cloud_batch,
+            depth_images,
+            out,
+            n_threads,
+            undistort,
+        )
+
+    def undistort_depth_batch(
+        self,
+        depth_images: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        n_threads: int = 1,
+    ):
+        """Undistorts a batch of depth images with the SDK.
+
+        Parameters
+        ----------
+        depth_images : numpy.ndarray
+            the C-contiguous uint16 depth images of shape `(N, height, width, 1)`
+        out : numpy.ndarray, optional
+            a C-contiguous uint16 output array of the same shape. If not provided, a new array is
+            allocated.
+        n_threads : int
+            number of threads the batch is split across
+
+        Returns
+        -------
+        numpy.ndarray
+            the undistorted depth images
+        """
+        out = check_depth_images(depth_images, out=out)
+        return self._run_batch(
+            self.backend.undistort_depth_batch, depth_images, out, n_threads
+        )
+
+    def undistort_ir_batch(
+        self,
+        ir_images: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        n_threads: int = 1,
+    ):
+        """Undistorts a batch of IR images with the SDK.
+
+        Parameters
+        ----------
+        ir_images : numpy.ndarray
+            the C-contiguous uint16 IR images of shape `(N, height, width, 1)`
+        out : numpy.ndarray, optional
+            a C-contiguous uint16 output array of the same shape. If not provided, a new array is
+            allocated.
+        n_threads : int
+            number of threads the batch is split across
+
+        Returns
+        -------
+        numpy.ndarray
+            the undistorted IR images
+        """
+        out = check_depth_images(ir_images, is_ir=True, out=out)
+        return self._run_batch(
+            self.backend.undistort_ir_batch, ir_images, out, n_threads
+        )
@@ -0,0 +1,184 @@
+"""On-disk cache of device information.
+
+Filling `Device.info` takes dozens of SDK round trips: the supported frame types, the resolutions
+of each of them, and the intrinsics and integral time range of every resolution. None of it
+changes for a given device, firmware and SDK, so :class:`DeviceInfoCache` stores it on disk, keyed
+by serial number, hardware version and SDK version, and lets :meth:`synexens.Device.open` skip
+the queries on later runs.
+"""
+
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from mt import tp
+
+from .recording import info_to_json, info_from_json
+
+
+__all__ = [
+    "DeviceInfoCache",
+    "get_default_info_cache",
+    "set_default_info_cache",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceInfoCache:
+    """A directory of JSON files holding the information of devices.
+
+    Parameters
+    ----------
+    dirpath : str, optional
+        the cache directory, created on first write. If not provided, environment variable
+        `SYNEXENS_CACHE_DIR` is used, or `$XDG_CACHE_HOME/synexens`, or `~/.cache/synexens`.
+    ttl : float
+        number of seconds an entry stays valid
+    """
+
+    def __init__(self, dirpath: tp.Optional[str] = None, ttl: float = 7 * 86400.0):
+        if dirpath is None:
+            dirpath = os.environ.get("SYNEXENS_CACHE_DIR")
+        if dirpath is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            dirpath = os.path.join(cache_home, "synexens")
+        self.dirpath = dirpath
+        self.ttl = ttl
+
+    def __repr__(self):
+        return f"<{type(self).__name__} '{self.dirpath}', ttl={self.ttl}>"
+
+    @staticmethod
+    def make_key(serial_number, hw_version: str, sdk_version: str):
+        """Makes the key of a device, a dictionary of strings."""
+        if isinstance(serial_number, bytes):
+            serial_number = serial_number.decode(errors="replace").rstrip("\x00")
+        return {
+            "serial_number": serial_number,
+            "hw_version": hw_version,
+            "sdk_version": sdk_version,
+        }
+
+    def _get_filepath(self, key: dict):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.dirpath, f"{digest[:20]}.json")
+
+    def _load(self, filepath: str):
+        try:
+            with open(filepath, "rt") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable device info cache file '{filepath}'.")
+            return None
+
+    def get(self, serial_number, hw_version: str, sdk_version: str):
+        """Gets the cached information of a device.
+
+        Parameters
+        ----------
+        serial_number : bytes or str
+            the serial number of the device
+        hw_version : str
+            the hardware version of the device
+        sdk_version : str
+            the SDK version
+
+        Returns
+        -------
+        dict or None
+            the information of the device, or None if it is not cached or has expired
+        """
+        key = self.make_key(serial_number, hw_version, sdk_version)
+        entry = self._load(self._get_filepath(key))
+        if entry is None or entry.get("key") != key:
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            return None
+        return info_from_json(entry["info"])
+
+    def put(self, serial_number, hw_version: str, sdk_version: str, info: dict):
+        """Caches the information of a device.
+
+        The file is written atomically. Failing to write it is logged and otherwise ignored.
+        """
+        key = self.make_key(serial_number, hw_version, sdk_version)
+        filepath = self._get_filepath(key)
+        entry = {"key": key, "created": time.time(), "info": info_to_json(info)}
+        tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.dirpath, exist_ok=True)
+            with open(tmp_filepath, "wt") as f:
+                json.dump(entry, f)
+            os.replace(tmp_filepath, filepath)
+        except OSError as e:
+            logger.warning(f"Unable to write device info cache file '{filepath}': {e}")
+
+    def invalidate(self, serial_number=None):
+        """Removes the entries of a device, or all entries.
+
+        Parameters
+        ----------
+        serial_number : bytes or str, optional
+            the serial number of the device. If not provided, the whole cache is cleared.
+        """
+        if serial_number is not None:
+            serial_number = self.make_key(serial_number, "", "")["serial_number"]
+        try:
+            filenames = os.listdir(self.dirpath)
+        except FileNotFoundError:
+            return
+        for filename in filenames:
+            if not filename.endswith(".json"):
+                continue
+            filepath = os.path.join(self.dirpath, filename)
+            if serial_number is not None:
+                entry = self._load(filepath)
+                if (
+                    entry is not None
+                    and entry.get("key", {}).get("serial_number") != serial_number
+                ):
+                    continue
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+
+
+_default_info_cache = None
+_default_info_cache_set = False
+
+
+def get_default_info_cache():
+    """Gets the default device info cache, used by devices of the SDK backend.
+
+    It is created on first use in the default directory. Environment variable
+    `SYNEXENS_CACHE_TTL` overrides the TTL in seconds, and setting it to 0 disables the cache.
+
+    Returns
+    -------
+    DeviceInfoCache or None
+        the default cache, or None if caching is disabled
+    """
+    global _default_info_cache, _default_info_cache_set
+    if not _default_info_cache_set:
+        ttl = float(os.environ.get("SYNEXENS_CACHE_TTL", 7 * 86400.0))
+        _default_info_cache = DeviceInfoCache(ttl=ttl) if ttl > 0 else None
+        _default_info_cache_set = True
+    return _default_info_cache
+
+
+def set_default_info_cache(cache: tp.Optional[DeviceInfoCache]):
+    """Sets the default device info cache. None disables caching by default."""
+    global _default_info_cache, _default_info_cache_set
+    _default_info_cache = cache
+    _default_info_cache_set = True
@@ -0,0 +1,547 @@
+"""Compact compression of depth and IR frames for storage and network transport.
+
+A :class:`DepthCodec` turns the uint16 images of a `SYFRAMETYPE_DEPTH` or `SYFRAMETYPE_IR` stream
+into self-describing packets. Each image is optionally quantized with a bounded error, predicted
+either spatially from its left, upper and upper-left neighbours or temporally from the previous
+image, and the prediction residuals are zigzag-mapped, split into a high-byte and a low-byte
+plane and deflated. Residuals of depth images are mostly small, so the high-byte plane is nearly
+all zeros and compresses extremely well.
+
+All the heavy lifting is done by NumPy ufuncs and zlib, which release the GIL, so several
+streams can be encoded or decoded in parallel from a thread pool.
+
+A :class:`FrameCodec` encodes a whole frame dictionary as returned by
+:meth:`synexens.Device.get_last_frame_data`, and :func:`compress_records` and
+:func:`decompress_records` plug the codec into the chunks of a :class:`synexens.Recorder`.
+"""
+
+
+import struct
+import zlib
+
+from mt import tp, np
+
+
+__all__ = [
+    "get_quantization_step",
+    "DepthCodec",
+    "FrameCodec",
+    "compress_records",
+    "decompress_records",
+]
+
+
+PACKET_MAGIC = b"SYDC"
+FRAME_MAGIC = b"SYFC"
+
+# packet header: magic, flags, quantization step, height, width, channels, payload length
+PACKET_HEADER = struct.Struct("<4sHHIIII")
+# frame header: magic, number of sections
+FRAME_HEADER = struct.Struct("<4sI")
+# section header: frame type, method, height, width, channels, payload length
+SECTION_HEADER = struct.Struct("<iIIIII")
+
+FLAG_TEMPORAL = 1
+
+METHOD_ZLIB = 0
+METHOD_DEPTH = 1
+
+
+def get_quantization_step(max_error: int):
+    """Gets the quantization step that keeps the reconstruction error within a bound.
+
+    Parameters
+    ----------
+    max_error : int
+        the maximum absolute difference between an original and a decoded pixel, in millimetres
+        for depth images. 0 means lossless.
+
+    Returns
+    -------
+    int
+        the quantization step, `2 * max_error + 1`
+    """
+    if not 0 <= max_error < 0x7FFF:
+        raise ValueError(
+            f"Argument 'max_error' must be in [0, {0x7FFF}). Got: {max_error}."
+        )
+    return 2 * max_error + 1
+
+
+def _quantize(image: np.ndarray, step: int):
+    # 0 (no depth) keeps its own bin, other values are binned by `step` starting from 1
+    if step == 1:
+        return image
+    q = image - np.uint16(1)
+    q //= np.uint16(step)
+    q += np.uint16(1)
+    q[image == 0] = 0
+    return q
+
+
+def _dequantize(q: np.ndarray, step: int, out: np.ndarray):
+    # the centre of each bin, so that the error is at most (step - 1) / 2
+    if step == 1:
+        np.copyto(out, q)
+        return out
+    x = q.astype(np.uint32)
+    x *= step
+    x -= step - (step - 1) // 2 - 1
+    np.minimum(x, 0xFFFF, out=x)
+    x[q == 0] = 0
+    np.copyto(out, x, casting="unsafe")
+    return out
+
+
+def _zigzag(residuals: np.ndarray):
+    r = residuals.view(np.int16)
+    z = r << 1
+    z ^= r >> 15
+    return z.view(np.uint16)
+
+
+def _unzigzag(z: np.ndarray):
+    r = (z >> 1).view(np.int16)
+    r ^= -(z & 1).view(np.int16)
+    return r.view(np.uint16)
+
+
+def _split_planes(z: np.ndarray):
+    # the high bytes first, then the low bytes
+    z_bytes = z.astype("<u2", copy=False).view(np.uint8).reshape(-1, 2)
+    planes = np.empty((2, len(z_bytes)), dtype=np.uint8)
+    planes[0] = z_bytes[:, 1]
+    planes[1] = z_bytes[:, 0]
+    return planes
+
+
+def _merge_planes(data: bytes, shape: tuple):
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(2, -1)
+    z = np.empty(planes.shape[1], dtype="<u2")
+    z_bytes = z.view(np.uint8).reshape(-1, 2)
+    z_bytes[:, 0] = planes[1]
+    z_bytes[:, 1] = planes[0]
+    return z.astype(np.uint16, copy=False).reshape(shape)
+
+
+class DepthCodec:
+    """Stateful encoder and decoder of a stream of uint16 depth or IR images.
+
+    An encoder and its decoder must see the same packets in the same order, because a temporal
+    packet is decoded against the previous decoded image. Every `keyframe_interval`-th packet is
+    spatially predicted, so that a decoder can join a stream or recover from a lost packet at the
+    next keyframe.
+
+    Parameters
+    ----------
+    max_error : int
+        the maximum absolute reconstruction error, in millimetres for depth images. 0, the
+        default, means lossless.
+    temporal : bool
+        whether to predict images from the previous image between keyframes
+    keyframe_interval : int
+        the number of packets between two spatially predicted packets
+    level : int
+        the zlib compression level. 1 is the fastest.
+    """
+
+    def __init__(
+        self,
+        max_error: int = 0,
+        temporal: bool = True,
+        keyframe_interval: int = 30,
+        level: int = 1,
+    ):
+        if keyframe_interval < 1:
+            raise ValueError(
+                f"Argument 'keyframe_interval' must be positive. Got: {keyframe_interval}."
+            )
+        self.max_error = max_error
+        self.step = get_quantization_step(max_error)
+        self.temporal = temporal
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.reset()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} max_error={self.max_error}, temporal={self.temporal}, "
+            f"keyframe_interval={self.keyframe_interval}, level={self.level}>"
+        )
+
+    def reset(self):
+        """Forgets the reference image, so that the next packet is a keyframe."""
+        self._encoder_ref = None  # the last quantized images
+        self._decoder_ref = None
+        self._n_since_keyframe = 0
+
+    @staticmethod
+    def _check_image(image: np.ndarray):
+        if image.dtype != np.uint16 or image.ndim not in (2, 3):
+            raise ValueError(
+                f"The image must be a uint16 array of rank 2 or 3. Got dtype {image.dtype} and "
+                f"shape {image.shape}."
+            )
+
+    def encode(self, image: np.ndarray, keyframe: bool = False):
+        """Encodes an image into a packet.
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            the uint16 image of shape `(height, width)` or `(height, width, channels)`
+        keyframe : bool
+            whether to force a spatially predicted packet
+
+        Returns
+        -------
+        bytes
+            the packet
+        """
+        self._check_image(image)
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 0
+        q = _quantize(image.reshape(height, -1), self.step)
+
+        ref = self._encoder_ref
+        temporal = (
+            self.temporal
+            and not keyframe
+            and ref is not None
+            and ref.shape == q.shape
+            and self._n_since_keyframe < self.keyframe_interval - 1
+        )
+        if temporal:
+            residuals = q - ref
+            self._n_since_keyframe += 1
+        else:
+            # left difference, then the difference of that with the row above, i.e. the residual
+            # of the planar predictor left + up - upper left
+            residuals = q.copy()
+            np.subtract(q[:, 1:], q[:, :-1], out=residuals[:, 1:])
+            residuals[1:] -= residuals[:-1].copy()
+            self._n_since_keyframe = 0
+        if self.temporal:
+            # without quantization, `q` is a view of the caller's image
+            self._encoder_ref = q.copy() if self.step == 1 else q
+
+        payload = zlib.compress(_split_planes(_zigzag(residuals)), self.level)
+        flags = FLAG_TEMPORAL if temporal else 0
+        header = PACKET_HEADER.pack(
+            PACKET_MAGIC, flags, self.step, height, width, channels, len(payload)
+        )
+        return header + payload
+
+    def decode(self, packet, out: tp.Optional[np.ndarray] = None):
+        """Decodes a packet.
+
+        Parameters
+        ----------
+        packet : bytes-like
+            the packet, possibly followed by other data
+        out : numpy.ndarray, optional
+            a uint16 array of the image shape to decode into
+
+        Returns
+        -------
+        numpy.ndarray
+            the decoded image
+        """
+        image, _ = self.decode_from(packet, 0, out=out)
+        return image
+
+    def decode_from(self, buffer, offset: int, out: tp.Optional[np.ndarray] = None):
+        """Decodes the packet at an offset of a buffer.
+
+        Returns
+        -------
+        image : numpy.ndarray
+            the decoded image
+        offset : int
+            the offset just after the packet
+        """
+        (
+            magic,
+            flags,
+            step,
+            height,
+            width,
+            channels,
+            payload_len,
+        ) = PACKET_HEADER.unpack_from(buffer, offset)
+        if magic != PACKET_MAGIC:
+            raise ValueError(f"Invalid depth packet magic {magic!r}.")
+        offset += PACKET_HEADER.size
+        shape = (height, width, channels) if channels else (height, width)
+        flat_shape = (height, width * max(channels, 1))
+        data = zlib.decompress(memoryview(buffer)[offset : offset + payload_len])
+        residuals = _unzigzag(_merge_planes(data, flat_shape))
+
+        if flags & FLAG_TEMPORAL:
+            ref = self._decoder_ref
+            if ref is None or ref.shape != flat_shape:
+                raise RuntimeError(
+                    "Cannot decode a temporal packet without the previous image. Decoding must "
+                    "resume at a keyframe."
+                )
+            q = residuals
+            q += ref
+        else:
+            q = np.cumsum(residuals, axis=0, dtype=np.uint16)
+            np.cumsum(q, axis=1, dtype=np.uint16, out=q)
+        self._decoder_ref = q
+
+        if out is None:
+            out = np.empty(shape, dtype=np.uint16)
+        elif (
+            out.shape != shape
+            or out.dtype != np.uint16
+            or not out.flags["C_CONTIGUOUS"]
+        ):
+            raise ValueError(
+                f"Argument 'out' must be a C-contiguous uint16 array of shape {shape}. Got shape "
+                f"{out.shape} and dtype {out.dtype}."
+            )
+        _dequantize(q, step, out.reshape(flat_shape))
+        return out, offset + payload_len
+
+
+class FrameCodec:
+    """Encodes frame dictionaries, e.g. for a network stream.
+
+    Depth and IR images go through a :class:`DepthCodec` per frame type. Other images, like RGB
+    ones, are deflated as is.
+
+    Parameters
+    ----------
+    max_error : int or dict
+        the maximum absolute reconstruction error of the uint16 images, or a dictionary mapping
+        each frame type to one. Frame types not in the dictionary are lossless.
+    temporal : bool
+        whether to predict images from the previous frame between keyframes
+    keyframe_interval : int
+        the number of frames between two keyframes
+    level : int
+        the zlib compression level
+    """
+
+    def __init__(
+        self,
+        max_error: tp.Union[int, dict] = 0,
+        temporal: bool = True,
+        keyframe_interval: int = 30,
+        level: int = 1,
+    ):
+        self.max_error = max_error
+        self.temporal = temporal
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self._codecs = {}
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} max_error={self.max_error}, temporal={self.temporal}, "
+            f"keyframe_interval={self.keyframe_interval}, level={self.level}>"
+        )
+
+    def reset(self):
+        """Forgets the reference frames, so that the next frame is a keyframe."""
+        for codec in self._codecs.values():
+            codec.reset()
+
+    def _get_codec(self, frame_type: int):
+        codec = self._codecs.get(frame_type)
+        if codec is None:
+            if isinstance(self.max_error, dict):
+                max_error = self.max_error.get(frame_type, 0)
+            else:
+                max_error = self.max_error
+            codec = DepthCodec(
+                max_error=max_error,
+                temporal=self.temporal,
+                keyframe_interval=self.keyframe_interval,
+                level=self.level,
+            )
+            self._codecs[frame_type] = codec
+        return codec
+
+    def encode(self, frames: dict, keyframe: bool = False):
+        """Encodes a frame.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping each frame type to a uint16 or uint8 image of rank 2 or 3
+        keyframe : bool
+            whether to force keyframe packets
+
+        Returns
+        -------
+        bytes
+            the encoded frame
+        """
+        parts = [FRAME_HEADER.pack(FRAME_MAGIC, len(frames))]
+        for frame_type, img in frames.items():
+            if img.ndim not in (2, 3):
+                raise ValueError(
+                    f"The image of frame type {frame_type} must have rank 2 or 3. Shape: "
+                    f"{img.shape}."
+                )
+            channels = img.shape[2] if img.ndim == 3 else 0
+            if img.dtype == np.uint16:
+                method = METHOD_DEPTH
+                payload = self._get_codec(frame_type).encode(img, keyframe=keyframe)
+            elif img.dtype == np.uint8:
+                method = METHOD_ZLIB
+                payload = zlib.compress(np.ascontiguousarray(img), self.level)
+            else:
+                raise ValueError(
+                    f"The image of frame type {frame_type} must be uint16 or uint8. Dtype: "
+                    f"{img.dtype}."
+                )
+            parts.append(
+                SECTION_HEADER.pack(
+                    frame_type,
+                    method,
+                    img.shape[0],
+                    img.shape[1],
+                    channels,
+                    len(payload),
+                )
+            )
+            parts.append(payload)
+        return b"".join(parts)
+
+    def decode(self, data, out: tp.Optional[dict] = None):
+        """Decodes a frame.
+
+        Parameters
+        ----------
+        data : bytes-like
+            the encoded frame
+        out : dict, optional
+            a dictionary of images to decode into, like the one of
+            :meth:`synexens.Device.get_last_frame_data`. Images of the right shape and dtype are
+            overwritten in place, others are replaced.
+
+        Returns
+        -------
+        dict
+            a dictionary mapping each frame type to its image
+        """
+        magic, n_sections = FRAME_HEADER.unpack_from(data, 0)
+        if magic != FRAME_MAGIC:
+            raise ValueError(f"Invalid frame magic {magic!r}.")
+        offset = FRAME_HEADER.size
+        frames = {} if out is None else out
+        for _ in range(n_sections):
+            (
+                frame_type,
+                method,
+                height,
+                width,
+                channels,
+                payload_len,
+            ) = SECTION_HEADER.unpack_from(data, offset)
+            offset += SECTION_HEADER.size
+            shape = (height, width, channels) if channels else (height, width)
+            dtype = np.uint16 if method == METHOD_DEPTH else np.uint8
+            img = frames.get(frame_type)
+            if img is None or img.shape != shape or img.dtype != dtype:
+                img = np.empty(shape, dtype=dtype)
+            if method == METHOD_DEPTH:
+                self._get_codec(frame_type).decode_from(data, offset, out=img)
+            else:
+                raw = zlib.decompress(memoryview(data)[offset : offset + payload_len])
+                img[...] = np.frombuffer(raw, dtype=np.uint8).reshape(shape)
+            frames[frame_type] = img
+            offset += payload_len
+        return frames
+
+
+def _get_image_fields(record_dtype: np.dtype):
+    return [
+        name
+        for name in record_dtype.names
+        if record_dtype[name].base == np.uint16
+        and len(record_dtype[name].shape) in (2, 3)
+    ]
+
+
+def compress_records(
+    raw: bytes,
+    level: int,
+    record_dtype: np.dtype,
+    max_error: int = 0,
+    temporal: bool = True,
+):
+    """Compresses the records of a recording chunk with a :class:`DepthCodec` per image field.
+
+    The first image of every chunk is a keyframe, so chunks can still be decoded independently.
+    The other fields, like timestamps and RGB images, are deflated.
+
+    Parameters
+    ----------
+    raw : bytes
+        the raw records
+    level : int
+        the zlib compression level
+    record_dtype : numpy.dtype
+        the structured dtype of the records
+    max_error : int
+        the maximum absolute reconstruction error of the uint16 images. 0 means lossless.
+    temporal : bool
+        whether to predict images from the previous image of the chunk
+
+    Returns
+    -------
+    bytes
+        the compressed chunk
+    """
+    records = np.frombuffer(raw, dtype=record_dtype)
+    image_fields = _get_image_fields(record_dtype)
+    other_fields = [name for name in record_dtype.names if name not in image_fields]
+    others = np.empty(
+        len(records), dtype=[(name, record_dtype[name]) for name in other_fields]
+    )
+    for name in other_fields:
+        others[name] = records[name]
+    parts = [zlib.compress(others.tobytes(), level)]
+    for name in image_fields:
+        codec = DepthCodec(
+            max_error=max_error,
+            temporal=temporal,
+            keyframe_interval=len(records) + 1,
+            level=level,
+        )
+        parts.extend(codec.encode(img) for img in records[name])
+    return struct.pack("<I", len(parts[0])) + b"".join(parts)
+
+
+def decompress_records(payload, record_dtype: np.dtype):
+    """Decompresses the output of :func:`compress_records`.
+
+    Returns
+    -------
+    bytes-like
+        the raw records
+    """
+    (others_len,) = struct.unpack_from("<I", payload, 0)
+    offset = 4 + others_len
+    image_fields = _get_image_fields(record_dtype)
+    other_fields = [name for name in record_dtype.names if name not in image_fields]
+    others = np.frombuffer(
+        zlib.decompress(memoryview(payload)[4:offset]),
+        dtype=[(name, record_dtype[name]) for name in other_fields],
+    )
+    records = np.empty(len(others), dtype=record_dtype)
+    for name in other_fields:
+        records[name] = others[name]
+    for name in image_fields:
+        codec = DepthCodec()
+        images = records[name]
+        for i in range(len(records)):
+            img = np.empty(record_dtype[name].shape, dtype=np.uint16)
+            _, offset = codec.decode_from(payload, offset, out=img)
+            images[i] = img
+    return records.view(np.uint8).reshape(-1)
@@ -0,0 +1,208 @@
+"""Lookup-table colorization of depth images.
+
+Depth images are uint16, so a 65536-entry RGB lookup table turns colorizing into a single gather.
+A :class:`DepthColorizer` is built once, either by sampling the SDK's colour scheme through
+`GetDepthColor` or from a named colormap, and then applied to frames or batches of frames.
+"""
+
+
+from mt import tp, np
+
+
+__all__ = ["COLORMAPS", "DepthColorizer"]
+
+
+# anchor colours of the built-in colormaps, evenly spaced over [0, 1]
+COLORMAPS = {
+    "gray": [(0, 0, 0), (255, 255, 255)],
+    "jet": [
+        (0, 0, 128),
+        (0, 0, 255),
+        (0, 255, 255),
+        (255, 255, 0),
+        (255, 0, 0),
+        (128, 0, 0),
+    ],
+    "rainbow": [
+        (128, 0, 255),
+        (0, 0, 255),
+        (0, 255, 255),
+        (0, 255, 0),
+        (255, 255, 0),
+        (255, 0, 0),
+    ],
+}
+
+
+def _sample_colormap(name: str, t: np.ndarray):
+    """Samples a colormap at positions in [0, 1], returning float RGB values in [0, 255]."""
+    if name in COLORMAPS:
+        anchors = np.array(COLORMAPS[name], dtype=np.float64)
+        xp = np.linspace(0.0, 1.0, len(anchors))
+        return np.stack([np.interp(t, xp, anchors[:, c]) for c in range(3)], axis=-1)
+
+    try:
+        from matplotlib import colormaps
+    except ImportError:
+        raise ValueError(
+            f"Unknown colormap '{name}'. Expected one of {list(COLORMAPS)}, or install "
+            "matplotlib to use its colormaps."
+        )
+    return colormaps[name](t)[:, :3] * 255.0
+
+
+class DepthColorizer:
+    """Colorizes uint16 depth images with a 65536-entry lookup table.
+
+    Parameters
+    ----------
+    lut : numpy.ndarray
+        a uint8 array of shape `(65536, 3)` holding the RGB colour of every depth value
+    """
+
+    def __init__(self, lut: np.ndarray):
+        if lut.shape != (65536, 3) or lut.dtype != np.uint8:
+            raise ValueError(
+                f"The lookup table must be a uint8 array of shape (65536, 3). Got shape {lut.shape} "
+                f"and dtype {lut.dtype}."
+            )
+        self.lut = np.ascontiguousarray(lut)
+        self.lut.flags.writeable = False
+        self._blend_luts = {}
+
+    @classmethod
+    def from_device(cls, device):
+        """Builds the lookup table from the SDK's colour scheme of an opened device.
+
+        Every depth value is sampled with a single `GetDepthColor` call over a 256x256 ramp.
+        """
+        ramp = np.arange(65536, dtype=np.uint16).reshape(256, 256, 1)
+        return cls(device.get_depth_color(ramp).reshape(65536, 3))
+
+    @classmethod
+    def from_colormap(
+        cls,
+        name: str = "jet",
+        min_depth: int = 0,
+        max_depth: int = 7000,
+        invalid_color: tp.Tuple[int, int, int] = (0, 0, 0),
+    ):
+        """Builds the lookup table from a named colormap stretched over a depth range.
+
+        Parameters
+        ----------
+        name : str
+            one of the built-in colormaps 'gray', 'jet' and 'rainbow', or the name of a matplotlib
+            colormap if matplotlib is installed
+        min_depth : int
+            the depth mapped to the start of the colormap. Smaller depths are clamped.
+        max_depth : int
+            the depth mapped to the end of the colormap. Larger depths are clamped.
+        invalid_color : tuple
+            the RGB colour of depth 0, which marks invalid pixels
+        """
+        if max_depth <= min_depth:
+            raise ValueError(
+                f"Argument 'max_depth' ({max_depth}) must be greater than 'min_depth' ({min_depth})."
+            )
+        depths = np.arange(65536, dtype=np.float64)
+        t = np.clip((depths - min_depth) / (max_depth - min_depth), 0.0, 1.0)
+        lut = np.rint(_sample_colormap(name, t)).astype(np.uint8)
+        lut[0] = invalid_color
+        return cls(lut)
+
+    def colorize(self, depth_image: np.ndarray, out: tp.Optional[np.ndarray] = None):
+        """Colorizes a depth image or a batch of depth images.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            a uint16 array of shape `(..., height, width, 1)`
+        out : numpy.ndarray, optional
+            a uint8 output array of shape `(..., height, width, 3)`. If not provided, a new array
+            is allocated.
+
+        Returns
+        -------
+        numpy.ndarray
+            the RGB image(s)
+        """
+        self._check_image(depth_image, "depth")
+        return np.take(self.lut, depth_image[..., 0], axis=0, out=out, mode="clip")
+
+    def colorize_blend(
+        self,
+        depth_image: np.ndarray,
+        ir_image: np.ndarray,
+        color_weight: float = 0.3,
+        ir_max: int = 2048,
+        out: tp.Optional[np.ndarray] = None,
+    ):
+        """Colorizes a depth image and blends it with the IR image in integer arithmetic.
+
+        The result is `(ir / ir_max + color_weight * colour / 256) / (1 + color_weight)` scaled to
+        [0, 255], i.e. the blending done by the demo script, with both terms precomputed as 8.8
+        fixed-point lookup tables.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            a uint16 array of shape `(..., height, width, 1)`
+        ir_image : numpy.ndarray
+            a uint16 array of the same shape
+        color_weight : float
+            the weight of the depth colour relative to the IR intensity
+        ir_max : int
+            the IR value mapped to full intensity. Larger values are clamped.
+        out : numpy.ndarray, optional
+            a uint8 output array of shape `(..., height, width, 3)`. If not provided, a new array
+            is allocated.
+
+        Returns
+        -------
+        numpy.ndarray
+            the blended RGB image(s)
+        """
+        self._check_image(depth_image, "depth")
+        self._check_image(ir_image, "IR")
+        if ir_image.shape != depth_image.shape:
+            raise ValueError(
+                f"The IR image must have the same shape as the depth image. Shapes: "
+                f"{ir_image.shape} and {depth_image.shape}."
+            )
+        color_lut, ir_lut = self._get_blend_luts(color_weight, ir_max)
+        acc = np.take(color_lut, depth_image[..., 0], axis=0, mode="clip")
+        acc += np.take(ir_lut, ir_image, mode="clip")
+        acc >>= 8
+        shape = depth_image.shape[:-1] + (3,)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        np.copyto(out, acc, casting="unsafe")
+        return out
+
+    def _get_blend_luts(self, color_weight: float, ir_max: int):
+        key = (color_weight, ir_max)
+        luts = self._blend_luts.get(key)
+        if luts is None:
+            # weights in 1/256 units, summing to 256 so that the result never exceeds 255
+            color_q = int(round(256 * color_weight / (1 + color_weight)))
+            ir_q = 256 - color_q
+            color_lut = self.lut.astype(np.uint16) * np.uint16(color_q)
+            ir_levels = np.minimum(
+                np.arange(65536, dtype=np.uint32) * 255 // ir_max, 255
+            )
+            ir_lut = (ir_levels * ir_q).astype(np.uint16)
+            luts = (color_lut, ir_lut)
+            self._blend_luts[key] = luts
+        return luts
+
+    @staticmethod
+    def _check_image(image: np.ndarray, name: str):
+        if image.ndim < 3 or image.shape[-1] != 1:
+            raise ValueError(
+                f"The {name} image must have shape (..., H, W, 1). Shape: {image.shape}."
+            )
+        if image.dtype != np.uint16:
+            raise ValueError(
+                f"The {name} image must have dtype uint16. Dtype: {image.dtype}."
+            )
@@ -0,0 +1,375 @@
+"""Transactional device configuration.
+
+Every setting of a device is changed through its own SDK call, and `SetFrameResolution` restarts
+the stream internally once per frame type. A :class:`DeviceConfig`, obtained from
+:meth:`synexens.Device.configure`, collects the desired settings instead and applies them all at
+once when the `with` block exits, issuing only the calls needed to go from the current settings,
+cached by the device, to the desired ones, with at most one stream stop/start::
+
+    with device.configure() as cfg:
+        cfg.resolution = SYRESOLUTION_640_480
+        cfg.stream_type = SYSTREAMTYPE_DEPTHIR
+        cfg.filter_list = [SYFILTERTYPE_MEDIAN, SYFILTERTYPE_SPECKLE]
+        cfg.mirror = True
+    print(cfg.calls, cfg.elapsed)
+
+If the `with` block raises an exception, nothing is applied.
+"""
+
+
+import logging
+import time
+
+from mt import tp, np
+
+from .const import SYFRAMETYPE_DEPTH, SYSTREAMTYPE_NULL
+
+
+__all__ = [
+    "DeviceConfig",
+    "get_filter_list_calls",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_filter_list_calls(current: list, target: list):
+    """Gets the shortest sequence of filter list edits turning a filter list into another.
+
+    Parameters
+    ----------
+    current : list
+        the current list of SYFilterType values
+    target : list
+        the desired list of SYFilterType values
+
+    Returns
+    -------
+    list
+        a list of `(function name, args)` pairs among `('clear_filter', ())`,
+        `('delete_filter', (index,))` and `('add_filter', (filter_type,))`, to be called in order
+    """
+    current = list(current)
+    target = list(target)
+    if current == target:
+        return []
+
+    # rebuild from scratch
+    best = [("clear_filter", ())] if current else []
+    best += [("add_filter", (x,)) for x in target]
+
+    # keep the longest prefix of the target obtainable from the current list by deletions
+    deleted = []
+    j = 0
+    for i, filter_type in enumerate(current):
+        if j < len(target) and filter_type == target[j]:
+            j += 1
+        else:
+            deleted.append(i)
+    calls = [("delete_filter", (i,)) for i in reversed(deleted)]
+    calls += [("add_filter", (x,)) for x in target[j:]]
+    return calls if len(calls) < len(best) else best
+
+
+class DeviceConfig:
+    """A configuration transaction of a device.
+
+    The desired settings are set as attributes. Settings left untouched keep their current value.
+    The transaction is applied by :meth:`apply`, which the `with` statement calls on exit.
+
+    Parameters
+    ----------
+    device : synexens.Device
+        the opened device to configure
+
+    Attributes
+    ----------
+    calls : list
+        the `(function name, args)` pairs of the backend calls made by the last :meth:`apply`,
+        without the device id
+    elapsed : float
+        the number of seconds the last :meth:`apply` took
+    restarted : bool
+        whether the last :meth:`apply` stopped and restarted the stream
+    """
+
+    def __init__(self, device):
+        if device.closed:
+            raise ValueError("The device must be opened to be configured.")
+        self.device = device
+        self._desired = {}
+        self.calls = []
+        self.elapsed = None
+        self.restarted = False
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} device={self.device!r}, desired={self._desired}>"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
+
+    def _get(self, key):
+        if key in self._desired:
+            return self._desired[key]
+        return self.device._get_setting(key)
+
+    @property
+    def stream_type(self):
+        """The stream type, `SYSTREAMTYPE_NULL` meaning not streaming."""
+        return self._get("stream_type")
+
+    @stream_type.setter
+    def stream_type(self, stream_type: int):
+        self._desired["stream_type"] = stream_type
+
+    @property
+    def resolution(self):
+        """The resolution of every frame type."""
+        return self._get(("resolution", self.device.get_frame_types()[0]))
+
+    @resolution.setter
+    def resolution(self, resolution: int):
+        if resolution not in self.device.info["resolutions"]:
+            raise ValueError(
+                f"Resolution {resolution} is not supported by the device. Supported: "
+                f"{list(self.device.info['resolutions'])}."
+            )
+        for frame_type in self.device.get_frame_types():
+            self._desired[("resolution", frame_type)] = resolution
+
+    @property
+    def integral_time(self):
+        """The integral time."""
+        return self._get("integral_time")
+
+    @integral_time.setter
+    def integral_time(self, itime: int):
+        self._desired["integral_time"] = int(itime)
+
+    @property
+    def distance_user_range(self):
+        """The user distance range as a `(min, max)` pair."""
+        return self._get("distance_user_range")
+
+    @distance_user_range.setter
+    def distance_user_range(self, distance_range: tp.Tuple[int, int]):
+        nMin, nMax = (int(x) for x in distance_range)
+        if nMin > nMax:
+            raise ValueError(
+                f"The minimum distance {nMin} is greater than the maximum distance {nMax}."
+            )
+        self._desired["distance_user_range"] = (nMin, nMax)
+
+    @property
+    def filter(self):
+        """Whether the filter is on or off."""
+        return self._get("filter")
+
+    @filter.setter
+    def filter(self, bFilter: bool):
+        self._desired["filter"] = bool(bFilter)
+
+    @property
+    def filter_list(self):
+        """The list of filters, as SYFilterType values."""
+        return list(self._get("filter_list"))
+
+    @filter_list.setter
+    def filter_list(self, filter_list: tp.Sequence[int]):
+        self._desired["filter_list"] = list(filter_list)
+
+    def set_filter_params(self, filter_type: int, params: np.ndarray):
+        """Sets the parameters of a filter type."""
+        self._desired[("filter_params", filter_type)] = np.ascontiguousarray(
+            params, dtype=np.float32
+        )
+
+    def get_filter_params(self, filter_type: int):
+        """Gets the parameters of a filter type."""
+        return self._get(("filter_params", filter_type)).copy()
+
+    @property
+    def mirror(self):
+        """Whether the mirror is on or off."""
+        return self._get("mirror")
+
+    @mirror.setter
+    def mirror(self, bMirror: bool):
+        self._desired["mirror"] = bool(bMirror)
+
+    @property
+    def flip(self):
+        """Whether the flip is on or off."""
+        return self._get("flip")
+
+    @flip.setter
+    def flip(self, bFlip: bool):
+        self._desired["flip"] = bool(bFlip)
+
+    def _is_changed(self, key):
+        if key not in self._desired:
+            return False
+        current = self.device._get_setting(key)
+        if isinstance(key, tuple) and key[0] == "filter_params":
+            return not np.array_equal(current, self._desired[key])
+        return current != self._desired[key]
+
+    def _call(self, name: str, *args):
+        device = self.device
+        getattr(device.backend, name)(device.index, *args)
+        self.calls.append((name, args))
+
+    def _validate(self):
+        # checks what can be checked before the stream is stopped, not to leave it stopped
+        info = self.device.info
+        if "integral_time" in self._desired:
+            resolution = self._get(("resolution", SYFRAMETYPE_DEPTH))
+            res = info["resolutions"].get(resolution, {})
+            itime = self._desired["integral_time"]
+            nMin = res.get("integral_time_min")
+            nMax = res.get("integral_time_max")
+            if nMin is not None and nMax is not None and not nMin <= itime <= nMax:
+                raise ValueError(
+                    f"Integral time {itime} is out of range [{nMin}, {nMax}] at resolution "
+                    f"{resolution}."
+                )
+        if "distance_user_range" in self._desired:
+            nMin, nMax = self._desired["distance_user_range"]
+            rMin = info.get("distance_measure_min")
+            rMax = info.get("distance_measure_max")
+            if (
+                rMin is not None
+                and rMax is not None
+                and not rMin <= nMin <= nMax <= rMax
+            ):
+                raise ValueError(
+                    f"User distance range ({nMin}, {nMax}) is out of the measure range "
+                    f"[{rMin}, {rMax}]."
+                )
+
+    def apply(self):
+        """Applies the desired settings to the device.
+
+        The calls are made in this order: stop the stream if a resolution changes while streaming,
+        set the resolutions, the integral time, the user distance range, the filter list, the
+        filter parameters, the filter, mirror and flip switches, and finally start, restart, change
+        or stop the stream. A setting equal to its current value is not set.
+
+        Raises
+        ------
+        ValueError
+            if the integral time or the user distance range is out of range, before any call
+        RuntimeError
+            if an SDK call fails, in which case the cached settings of the device are discarded and
+            the stream is restarted if it was stopped
+        """
+        device = self.device
+        settings = device._settings
+        self._validate()
+        self.calls = []
+        self.restarted = False
+        current_stream = SYSTREAMTYPE_NULL
+        t0 = time.perf_counter_ns()
+        try:
+            current_stream = device._get_setting("stream_type")
+            target_stream = self._desired.get("stream_type", current_stream)
+            resolution_keys = [
+                ("resolution", x)
+                for x in device.get_frame_types()
+                if self._is_changed(("resolution", x))
+            ]
+            streaming = current_stream != SYSTREAMTYPE_NULL
+
+            if streaming and resolution_keys:
+                # stop once rather than letting every SetFrameResolution() restart the stream
+                self._call("stop_streaming")
+                device.streaming = False
+                settings["stream_type"] = SYSTREAMTYPE_NULL
+                streaming = False
+                self.restarted = target_stream != SYSTREAMTYPE_NULL
+
+            for key in resolution_keys:
+                self._call("set_frame_resolution", key[1], self._desired[key])
+                settings[key] = self._desired[key]
+            if resolution_keys:
+                # the integral time range depends on the resolution
+                settings.pop("integral_time", None)
+                if device._frame_pool is not None:
+                    device._frame_pool.reset(self._desired[resolution_keys[0]])
+
+            if "integral_time" in self._desired and (
+                resolution_keys or self._is_changed("integral_time")
+            ):
+                self._call("set_integral_time", self._desired["integral_time"])
+                settings["integral_time"] = self._desired["integral_time"]
+
+            if self._is_changed("distance_user_range"):
+                self._call(
+                    "set_distance_user_range", *self._desired["distance_user_range"]
+                )
+                settings["distance_user_range"] = self._desired["distance_user_range"]
+
+            if self._is_changed("filter_list"):
+                calls = get_filter_list_calls(
+                    device._get_setting("filter_list"), self._desired["filter_list"]
+                )
+                for name, args in calls:
+                    self._call(name, *args)
+                settings["filter_list"] = list(self._desired["filter_list"])
+
+            for key in self._desired:
+                if (
+                    isinstance(key, tuple)
+                    and key[0] == "filter_params"
+                    and self._is_changed(key)
+                ):
+                    self._call("set_filter_params", key[1], self._desired[key])
+                    settings[key] = self._desired[key].copy()
+
+            for key, func in (
+                ("filter", "set_filter"),
+                ("mirror", "set_mirror"),
+                ("flip", "set_flip"),
+            ):
+                if self._is_changed(key):
+                    self._call(func, self._desired[key])
+                    settings[key] = self._desired[key]
+
+            if target_stream == SYSTREAMTYPE_NULL:
+                if streaming:
+                    self._call("stop_streaming")
+            elif not streaming:
+                self._call("start_streaming", target_stream)
+            elif target_stream != current_stream:
+                self._call("change_streaming", target_stream)
+            device.streaming = target_stream != SYSTREAMTYPE_NULL
+            settings["stream_type"] = target_stream
+        except Exception:
+            settings.clear()
+            if current_stream != SYSTREAMTYPE_NULL and not device.streaming:
+                # do not leave the stream stopped for the resolution change
+                try:
+                    device.backend.start_streaming(device.index, current_stream)
+                    device.streaming = True
+                except Exception:
+                    logger.exception(
+                        f"Could not restart the stream of device {device.index}."
+                    )
+            raise
+        finally:
+            elapsed_ns = time.perf_counter_ns() - t0
+            self.elapsed = elapsed_ns * 1e-9
+            if device.metrics is not None and device.metrics.enabled:
+                device.metrics.record_latency(device.index, "reconfigure", elapsed_ns)
+
+        logger.debug(
+            f"Reconfigured device {device.index} with {len(self.calls)} call(s) in "
+            f"{self.elapsed * 1e3:.3f} ms{', restarting the stream' if self.restarted else ''}."
+        )
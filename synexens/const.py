@@ -181,3 +181,12 @@ SYERRORCODE_DATABUFFEREMPTY = 26
     # 备用2
     SYFILTERTYPE_EXTRA2,
 ) = range(0, 10)
+
+# 分辨率对应的宽和高 - (width, height) of each SYResolution
+RESOLUTION_SIZES = {
+    SYRESOLUTION_NULL: (0, 0),
+    SYRESOLUTION_320_240: (320, 240),
+    SYRESOLUTION_640_480: (640, 480),
+    SYRESOLUTION_960_540: (960, 540),
+    SYRESOLUTION_1920_1080: (1920, 1080),
+}
@@ -0,0 +1,156 @@
+"""Host-side deprojection of depth images into point clouds.
+
+Unlike :meth:`synexens.Device.get_depth_point_cloud`, which goes through the SDK, a
+:class:`Deprojector` only needs the intrinsics stored in `Device.info["resolutions"]`. It can
+therefore deproject recorded frames with no SDK present, and whole batches of frames at once.
+"""
+
+
+from mt import tp, np
+
+from .intrinsics import (
+    get_distortion_coeffs,
+    get_pixel_grid,
+    undistort_normalized,
+    find_resolution,
+)
+
+
+__all__ = ["UNIT_SCALES", "Deprojector"]
+
+
+# number of output units per millimetre, the unit of depth images
+UNIT_SCALES = {
+    "mm": 1.0,
+    "cm": 0.1,
+    "m": 0.001,
+}
+
+
+class Deprojector:
+    """Turns depth images into point clouds using cached per-resolution ray tables.
+
+    The ray table of a resolution holds `(x/z, y/z, 1)` for every pixel, already undistorted and
+    scaled to the output unit. Deprojecting is then a single multiplication of the ray table by
+    the depth image.
+
+    Parameters
+    ----------
+    resolutions : dict
+        a dictionary mapping each resolution to a dictionary with an "intrinsics" key, like
+        `Device.info["resolutions"]`
+    unit : {'mm', 'cm', 'm'}
+        the unit of the output coordinates. The SDK uses millimetres.
+    dtype : numpy.dtype
+        the floating-point dtype of the output coordinates
+    undistort : bool
+        whether to correct lens distortion when building the ray tables
+    """
+
+    def __init__(
+        self,
+        resolutions: dict,
+        unit: str = "mm",
+        dtype: tp.Any = np.float32,
+        undistort: bool = True,
+    ):
+        if unit not in UNIT_SCALES:
+            raise ValueError(
+                f"Unknown unit '{unit}'. Expected one of {list(UNIT_SCALES)}."
+            )
+        self.resolutions = resolutions
+        self.unit = unit
+        self.dtype = np.dtype(dtype)
+        self.undistort = undistort
+        self._ray_tables = {}
+
+    @classmethod
+    def from_device(cls, device, **kwargs):
+        """Creates a deprojector from the intrinsics of an opened device."""
+        return cls(device.info["resolutions"], **kwargs)
+
+    def get_ray_table(self, resolution: int):
+        """Gets the ray table of a resolution, computing and caching it on first use.
+
+        Parameters
+        ----------
+        resolution : SYResolution
+            the resolution
+
+        Returns
+        -------
+        numpy.ndarray
+            a read-only array of shape `(height, width, 3)`
+        """
+        table = self._ray_tables.get(resolution)
+        if table is not None:
+            return table
+
+        intrinsics = self.resolutions[resolution]["intrinsics"]
+        x, y = get_pixel_grid(intrinsics)
+        if self.undistort:
+            x, y = undistort_normalized(x, y, get_distortion_coeffs(intrinsics))
+        scale = UNIT_SCALES[self.unit]
+        table = np.empty(x.shape + (3,), dtype=self.dtype)
+        table[:, :, 0] = x * scale
+        table[:, :, 1] = y * scale
+        table[:, :, 2] = scale
+        table.flags.writeable = False
+        self._ray_tables[resolution] = table
+        return table
+
+    def clear_cache(self):
+        """Drops all cached ray tables."""
+        self._ray_tables = {}
+
+    def deproject(
+        self,
+        depth_image: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        resolution: tp.Optional[int] = None,
+    ):
+        """Deprojects a depth image or a batch of depth images.
+
+        Pixels with zero depth are mapped to the origin, like in the SDK.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            a uint16 depth image of shape `(height, width, 1)` or a batch of them of shape
+            `(N, height, width, 1)`
+        out : numpy.ndarray, optional
+            the output array of shape `(height, width, 3)` or `(N, height, width, 3)` and of the
+            deprojector's dtype. If not provided, a new array is allocated.
+        resolution : SYResolution, optional
+            the resolution of the depth image. If not provided, it is inferred from the shape.
+
+        Returns
+        -------
+        numpy.ndarray
+            the point cloud, in the deprojector's unit
+        """
+        if depth_image.ndim not in (3, 4) or depth_image.shape[-1] != 1:
+            raise ValueError(
+                f"The depth image must have shape (H, W, 1) or (N, H, W, 1). Shape: {depth_image.shape}."
+            )
+        if depth_image.dtype != np.uint16:
+            raise ValueError(
+                f"The depth image must have dtype uint16. Dtype: {depth_image.dtype}."
+            )
+        if resolution is None:
+            resolution = find_resolution(
+                depth_image.shape[-3], depth_image.shape[-2], self.resolutions
+            )
+        rays = self.get_ray_table(resolution)
+
+        shape = depth_image.shape[:-1] + (3,)
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape or out.dtype != self.dtype:
+            raise ValueError(
+                f"Argument 'out' must have shape {shape} and dtype {self.dtype}. "
+                f"Got shape {out.shape} and dtype {out.dtype}."
+            )
+
+        np.multiply(rays, depth_image, out=out)
+        return out
@@ -0,0 +1,572 @@
+"""Host-side depth filters.
+
+The SDK filter chain runs inside the vendor library, cannot be inspected and cannot be applied to
+recorded frames. This module provides vectorized equivalents of its main filters, plus temporal
+smoothing and hole filling, working on uint16 depth images of shape `(height, width, 1)` where 0
+marks invalid pixels. A :class:`FilterEngine` chains them, times every stage, and can be
+configured from the filter list and the parameter arrays of a device, i.e. the arrays passed to
+:meth:`synexens.Device.set_filter_params`.
+
+The SDK does not document the meaning of the parameter arrays. Every filter documents the layout
+it expects, and missing trailing parameters take their default values.
+"""
+
+
+import logging
+import time
+
+from mt import tp, np
+
+from .const import SYFRAMETYPE_DEPTH, SYFRAMETYPE_IR
+from .const import (
+    SYFILTERTYPE_MEDIAN,
+    SYFILTERTYPE_AMPLITUDE,
+    SYFILTERTYPE_EDGE,
+    SYFILTERTYPE_SPECKLE,
+)
+
+
+__all__ = [
+    "DepthFilter",
+    "MedianFilter",
+    "AmplitudeFilter",
+    "FlyingPixelFilter",
+    "SpeckleFilter",
+    "TemporalFilter",
+    "HoleFillingFilter",
+    "FILTER_CLASSES",
+    "make_filter",
+    "FilterEngine",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_params(params, defaults: list):
+    """Completes a parameter array with default values."""
+    res = list(defaults)
+    if params is not None:
+        for i, value in enumerate(list(params)[: len(defaults)]):
+            res[i] = float(value)
+    return res
+
+
+def _get_neighbours(image: np.ndarray, offsets: list):
+    """Gets views of the image shifted by each (dy, dx) offset, replicating the border pixels."""
+    height, width = image.shape
+    r = max(max(abs(dy), abs(dx)) for dy, dx in offsets)
+    padded = np.pad(image, r, mode="edge")
+    return [
+        padded[r + dy : r + dy + height, r + dx : r + dx + width] for dy, dx in offsets
+    ]
+
+
+# offsets of the 4-connected and 8-connected neighbours
+NEIGHBOURS_4 = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+NEIGHBOURS_8 = NEIGHBOURS_4 + [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+class DepthFilter:
+    """Base class of the host-side depth filters.
+
+    Subclasses implement :meth:`filter` on 2D depth images and the conversions to and from
+    parameter arrays.
+    """
+
+    # the matching SYFilterType, or None for the filters without SDK equivalent
+    filter_type = None
+
+    # the name of the stage in the timings of a filter engine
+    name = "filter"
+
+    @classmethod
+    def from_params(cls, params=None):
+        """Creates the filter from a parameter array. None means default parameters."""
+        raise NotImplementedError
+
+    def to_params(self):
+        """Gets the parameter array of the filter."""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{type(self).__name__} params={self.to_params().tolist()}>"
+
+    def reset(self):
+        """Forgets the state of a stateful filter."""
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        """Filters a 2D uint16 depth image.
+
+        Parameters
+        ----------
+        depth : numpy.ndarray
+            the depth image of shape `(height, width)`. It must not be modified.
+        ir : numpy.ndarray, optional
+            the IR image of the same shape, for the filters using the amplitude
+
+        Returns
+        -------
+        numpy.ndarray
+            the filtered depth image of shape `(height, width)`
+        """
+        raise NotImplementedError
+
+
+class MedianFilter(DepthFilter):
+    """Replaces every valid pixel by the median of its neighbourhood.
+
+    Parameters: `[size]`.
+
+    Parameters
+    ----------
+    size : int
+        the odd width of the square neighbourhood
+    """
+
+    filter_type = SYFILTERTYPE_MEDIAN
+    name = "median"
+
+    def __init__(self, size: int = 3):
+        size = int(size)
+        if size < 1 or size % 2 == 0:
+            raise ValueError(
+                f"Argument 'size' must be a positive odd integer. Got: {size}."
+            )
+        self.size = size
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [3]))
+
+    def to_params(self):
+        return np.array([self.size], dtype=np.float32)
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        r = self.size // 2
+        if r == 0:
+            return depth.copy()
+        offsets = [(dy, dx) for dy in range(-r, r + 1) for dx in range(-r, r + 1)]
+        window = np.stack(_get_neighbours(depth, offsets))
+        k = len(window) // 2
+        res = np.partition(window, k, axis=0)[k]
+        res[depth == 0] = 0
+        return res
+
+
+class AmplitudeFilter(DepthFilter):
+    """Invalidates the pixels whose IR amplitude is too low to be trusted.
+
+    Parameters: `[min_amplitude]`. The filter is a no-op without an IR image.
+
+    Parameters
+    ----------
+    min_amplitude : float
+        the minimum IR value of a valid pixel
+    """
+
+    filter_type = SYFILTERTYPE_AMPLITUDE
+    name = "amplitude"
+
+    def __init__(self, min_amplitude: float = 20.0):
+        self.min_amplitude = min_amplitude
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [20.0]))
+
+    def to_params(self):
+        return np.array([self.min_amplitude], dtype=np.float32)
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        if ir is None:
+            return depth.copy()
+        return np.where(ir >= self.min_amplitude, depth, 0).astype(np.uint16)
+
+
+class FlyingPixelFilter(DepthFilter):
+    """Invalidates the flying pixels, which lie between a foreground and a background edge.
+
+    A pixel is invalidated if its depth differs from both its left and right valid neighbours, or
+    from both its top and bottom valid neighbours, by more than `max_diff` plus `relative_diff`
+    times its depth. Pixels on either side of a genuine depth step differ from a single
+    neighbour only, and are kept. Parameters: `[max_diff, relative_diff]`.
+
+    Parameters
+    ----------
+    max_diff : float
+        the absolute depth difference in millimetres
+    relative_diff : float
+        the depth difference relative to the depth of the pixel
+    """
+
+    filter_type = SYFILTERTYPE_EDGE
+    name = "flying_pixel"
+
+    def __init__(self, max_diff: float = 100.0, relative_diff: float = 0.02):
+        self.max_diff = max_diff
+        self.relative_diff = relative_diff
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [100.0, 0.02]))
+
+    def to_params(self):
+        return np.array([self.max_diff, self.relative_diff], dtype=np.float32)
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        d = depth.astype(np.int32)
+        threshold = self.max_diff + self.relative_diff * d
+        far = [
+            (n > 0) & (np.abs(d - n) > threshold)
+            for n in _get_neighbours(d, NEIGHBOURS_4)
+        ]
+        flying = (far[0] & far[1]) | (far[2] & far[3])
+        res = depth.copy()
+        res[flying] = 0
+        return res
+
+
+class SpeckleFilter(DepthFilter):
+    """Invalidates the small blobs of pixels disconnected from their surroundings.
+
+    Pixels are connected if they are 4-connected neighbours, both valid, and their depths differ by
+    at most `max_diff`. The connected regions smaller than `max_size` pixels are invalidated, like
+    OpenCV's `filterSpeckles`. Parameters: `[max_size, max_diff]`.
+
+    Parameters
+    ----------
+    max_size : int
+        the maximum number of pixels of a speckle
+    max_diff : float
+        the maximum depth difference in millimetres between connected pixels
+    """
+
+    filter_type = SYFILTERTYPE_SPECKLE
+    name = "speckle"
+
+    def __init__(self, max_size: int = 50, max_diff: float = 30.0):
+        self.max_size = int(max_size)
+        self.max_diff = max_diff
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [50, 30.0]))
+
+    def to_params(self):
+        return np.array([self.max_size, self.max_diff], dtype=np.float32)
+
+    def label(self, depth: np.ndarray):
+        """Labels the connected regions of a 2D depth image.
+
+        Returns
+        -------
+        numpy.ndarray
+            the flat array of the labels of the pixels, each label being the smallest flat index
+            of the pixels of the region
+        """
+        height, width = depth.shape
+        d = depth.astype(np.int32).ravel()
+        index = np.arange(height * width).reshape(height, width)
+        a = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+        b = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+        connected = (d[a] > 0) & (d[b] > 0) & (np.abs(d[a] - d[b]) <= self.max_diff)
+        a = a[connected]
+        b = b[connected]
+
+        # union-find with min-label hooking and pointer jumping
+        parent = np.arange(height * width)
+        while len(a):
+            pa = parent[a]
+            pb = parent[b]
+            differ = pa != pb
+            a, b, pa, pb = a[differ], b[differ], pa[differ], pb[differ]
+            if not len(a):
+                break
+            np.minimum.at(parent, np.maximum(pa, pb), np.minimum(pa, pb))
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+        return parent
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        labels = self.label(depth)
+        sizes = np.bincount(labels, minlength=len(labels))
+        res = depth.copy()
+        res[(sizes[labels] < self.max_size).reshape(depth.shape)] = 0
+        return res
+
+
+class TemporalFilter(DepthFilter):
+    """Smooths depth over time with an exponential moving average, reset on motion.
+
+    A pixel restarts from its current depth when it was invalid in the previous output, or when
+    its depth moves away from the average by more than `motion_threshold`, so that moving objects
+    do not leave trails. Invalid pixels stay invalid. Parameters: `[alpha, motion_threshold]`.
+
+    Parameters
+    ----------
+    alpha : float
+        the weight of the current frame, in (0, 1]
+    motion_threshold : float
+        the depth difference in millimetres above which a pixel is considered moving
+    """
+
+    name = "temporal"
+
+    def __init__(self, alpha: float = 0.4, motion_threshold: float = 50.0):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f"Argument 'alpha' must be in (0, 1]. Got: {alpha}.")
+        self.alpha = alpha
+        self.motion_threshold = motion_threshold
+        self._average = None
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [0.4, 50.0]))
+
+    def to_params(self):
+        return np.array([self.alpha, self.motion_threshold], dtype=np.float32)
+
+    def reset(self):
+        self._average = None
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        d = depth.astype(np.float32)
+        average = self._average
+        if average is None or average.shape != d.shape:
+            average = d
+        else:
+            restart = (average == 0) | (np.abs(d - average) > self.motion_threshold)
+            average = np.where(restart, d, average + self.alpha * (d - average))
+            average[depth == 0] = 0
+        self._average = average
+        return np.rint(average).astype(np.uint16)
+
+
+class HoleFillingFilter(DepthFilter):
+    """Fills the small holes of a depth image from their valid neighbours.
+
+    Every iteration fills the invalid pixels having a valid 8-connected neighbour, with the
+    nearest (smallest) or the farthest (largest) neighbouring depth, so holes up to twice the
+    number of iterations wide are filled. Parameters: `[n_iterations, farthest]`.
+
+    Parameters
+    ----------
+    n_iterations : int
+        the number of iterations
+    farthest : bool
+        whether to fill with the farthest neighbouring depth, which avoids growing foreground
+        objects, instead of the nearest
+    """
+
+    name = "hole_filling"
+
+    def __init__(self, n_iterations: int = 1, farthest: bool = True):
+        self.n_iterations = int(n_iterations)
+        self.farthest = bool(farthest)
+
+    @classmethod
+    def from_params(cls, params=None):
+        return cls(*_get_params(params, [1, 1]))
+
+    def to_params(self):
+        return np.array([self.n_iterations, self.farthest], dtype=np.float32)
+
+    def filter(self, depth: np.ndarray, ir: tp.Optional[np.ndarray] = None):
+        res = depth.copy()
+        for _ in range(self.n_iterations):
+            holes = res == 0
+            if not holes.any():
+                break
+            if self.farthest:
+                fill = np.zeros_like(res)
+                for n in _get_neighbours(res, NEIGHBOURS_8):
+                    np.maximum(fill, n, out=fill)
+            else:
+                # invalid neighbours become the largest value so that they are never the minimum
+                fill = np.full_like(res, 0xFFFF)
+                for n in _get_neighbours(res, NEIGHBOURS_8):
+                    np.minimum(fill, np.where(n == 0, 0xFFFF, n), out=fill)
+                fill[fill == 0xFFFF] = 0
+            res[holes] = fill[holes]
+        return res
+
+
+# SYFilterType -> filter class
+FILTER_CLASSES = {
+    SYFILTERTYPE_MEDIAN: MedianFilter,
+    SYFILTERTYPE_AMPLITUDE: AmplitudeFilter,
+    SYFILTERTYPE_EDGE: FlyingPixelFilter,
+    SYFILTERTYPE_SPECKLE: SpeckleFilter,
+}
+
+
+def make_filter(filter_type: int, params=None):
+    """Makes the host-side equivalent of an SDK filter.
+
+    Parameters
+    ----------
+    filter_type : SYFilterType
+        the filter type
+    params : numpy.ndarray, optional
+        the parameter array of the filter, as passed to `set_filter_params`. If not provided or
+        empty, default parameters are used.
+
+    Returns
+    -------
+    DepthFilter
+        the filter
+    """
+    cls = FILTER_CLASSES.get(filter_type)
+    if cls is None:
+        raise ValueError(
+            f"Filter type {filter_type} has no host-side equivalent. Expected one of "
+            f"{list(FILTER_CLASSES)}."
+        )
+    return cls.from_params(None if params is None or len(params) == 0 else params)
+
+
+class FilterEngine:
+    """A chain of host-side depth filters, timing each stage.
+
+    Parameters
+    ----------
+    filters : list
+        the filters, applied in order
+    """
+
+    def __init__(self, filters: list):
+        self.filters = list(filters)
+        self.reset_stats()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} filters={[x.name for x in self.filters]}>"
+
+    @classmethod
+    def from_device(cls, device, temporal=None, hole_filling=None):
+        """Mirrors the filter list and parameters of an opened device.
+
+        Filter types without host-side equivalent are skipped with a warning.
+
+        Parameters
+        ----------
+        device : synexens.Device
+            the device
+        temporal : TemporalFilter, optional
+            a temporal filter appended to the chain
+        hole_filling : HoleFillingFilter, optional
+            a hole filling filter appended to the chain
+
+        Returns
+        -------
+        FilterEngine
+            the filter engine
+        """
+        filters = []
+        for filter_type in device.get_filter_list():
+            if filter_type not in FILTER_CLASSES:
+                logger.warning(
+                    f"Skipping filter type {filter_type} without host-side equivalent."
+                )
+                continue
+            filters.append(
+                make_filter(filter_type, device.get_filter_params(filter_type))
+            )
+        filters.extend(x for x in (temporal, hole_filling) if x is not None)
+        return cls(filters)
+
+    def reset(self):
+        """Forgets the state of the stateful filters, e.g. when the scene changes."""
+        for x in self.filters:
+            x.reset()
+
+    def reset_stats(self):
+        """Resets the timings."""
+        self._timings = [[0, 0.0, 0.0] for _ in self.filters]
+
+    @property
+    def stats(self):
+        """Timings of the stages.
+
+        A dictionary mapping the name of each stage, suffixed with its position if the name is
+        repeated, to a dictionary with keys "calls", "total" and "last", the latter two in seconds.
+        """
+        res = {}
+        for x, (calls, total, last) in zip(self.filters, self._timings):
+            name = x.name if x.name not in res else f"{x.name}_{len(res)}"
+            res[name] = {"calls": calls, "total": total, "last": last}
+        return res
+
+    def apply(
+        self,
+        depth_image: np.ndarray,
+        ir_image: tp.Optional[np.ndarray] = None,
+        out: tp.Optional[np.ndarray] = None,
+    ):
+        """Filters a depth image.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            the uint16 depth image of shape `(height, width, 1)`
+        ir_image : numpy.ndarray, optional
+            the IR image of the same shape, used by the amplitude filter
+        out : numpy.ndarray, optional
+            the output array of the same shape and dtype. If not provided, a new array is
+            allocated.
+
+        Returns
+        -------
+        numpy.ndarray
+            the filtered depth image
+        """
+        if depth_image.ndim != 3 or depth_image.shape[2] != 1:
+            raise ValueError(
+                f"The depth image must have shape (H, W, 1). Shape: {depth_image.shape}."
+            )
+        if depth_image.dtype != np.uint16:
+            raise ValueError(
+                f"The depth image must have dtype uint16. Dtype: {depth_image.dtype}."
+            )
+        depth = depth_image[:, :, 0]
+        ir = None if ir_image is None else ir_image[:, :, 0]
+        for x, timing in zip(self.filters, self._timings):
+            t0 = time.perf_counter()
+            depth = x.filter(depth, ir)
+            elapsed = time.perf_counter() - t0
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = elapsed
+        if out is None:
+            # the filters return new arrays, so only an empty chain returns a view of the input
+            return (
+                depth[:, :, np.newaxis].copy()
+                if not self.filters
+                else depth[:, :, np.newaxis]
+            )
+        out[:, :, 0] = depth
+        return out
+
+    def apply_frames(self, frames: dict):
+        """Filters the depth image of the frame(s) of data of a device or a playback.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping each frame type to an image, as returned by
+            :meth:`synexens.Device.get_last_frame_data`
+
+        Returns
+        -------
+        dict
+            a new dictionary whose depth image is filtered, the other images being shared
+        """
+        res = dict(frames)
+        if SYFRAMETYPE_DEPTH in frames:
+            res[SYFRAMETYPE_DEPTH] = self.apply(
+                frames[SYFRAMETYPE_DEPTH], frames.get(SYFRAMETYPE_IR)
+            )
+        return res
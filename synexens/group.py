@@ -0,0 +1,412 @@
+"""Synchronized capture from several devices.
+
+A :class:`DeviceGroup` opens a set of devices in parallel and runs one capture worker per device.
+Every frame is stamped with the monotonic host time at which it was received and with its
+sequence number. Frames of different devices whose timestamps fall within a tolerance window are
+grouped into a :class:`FrameSet`.
+"""
+
+
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mt import tp
+
+from .base import ReentrantContextManager, Device, find_devices
+from .backends import get_default_backend
+from .const import SYSTREAMTYPE_DEPTHIR
+from .observer import SDKFrameDriver
+
+
+__all__ = ["CapturedFrame", "FrameSet", "DeviceGroup"]
+
+
+logger = logging.getLogger(__name__)
+
+
+class CapturedFrame:
+    """A frame of a device, stamped on arrival.
+
+    Parameters
+    ----------
+    device_id : int
+        the device id
+    sequence : int
+        the sequence number of the frame, as notified for the device
+    timestamp : int
+        the monotonic host time at which the frame was received, in nanoseconds, as returned by
+        :func:`time.monotonic_ns`
+    frames : dict
+        a dictionary mapping each frame type to an image
+    """
+
+    __slots__ = ("device_id", "sequence", "timestamp", "frames")
+
+    def __init__(self, device_id: int, sequence: int, timestamp: int, frames: dict):
+        self.device_id = device_id
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.frames = frames
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} device_id={self.device_id}, sequence={self.sequence}, "
+            f"timestamp={self.timestamp}>"
+        )
+
+
+class FrameSet:
+    """Time-aligned frames of the devices of a group.
+
+    Parameters
+    ----------
+    index : int
+        the index of the frame set, starting from 0
+    frames : dict
+        a dictionary mapping each device id to a :class:`CapturedFrame`. Devices without a frame
+        close enough in time are missing from partial frame sets.
+    """
+
+    def __init__(self, index: int, frames: dict):
+        self.index = index
+        self.frames = frames
+        timestamps = [x.timestamp for x in frames.values()]
+        self.timestamp = min(timestamps)
+        self.spread = max(timestamps) - self.timestamp
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} index={self.index}, devices={list(self.frames)}, "
+            f"timestamp={self.timestamp}, spread={self.spread}>"
+        )
+
+    def __getitem__(self, device_id: int):
+        return self.frames[device_id]
+
+
+class _DeviceSink:
+    """Receives the frames of a device from its frame driver."""
+
+    def __init__(self, group, device_id: int):
+        self.group = group
+        self.device_id = device_id
+
+    def publish(self, frames: dict, sequence: tp.Optional[int] = None):
+        frame = CapturedFrame(self.device_id, sequence, time.monotonic_ns(), frames)
+        self.group._push(frame)
+
+
+class DeviceGroup(ReentrantContextManager):
+    """A group of devices capturing synchronized frame sets.
+
+    A frame set is emitted as soon as every device has a pending frame and all of them are within
+    the tolerance window. Pending frames too old to be matched are dropped. If a device stalls, a
+    partial frame set without it is emitted once the oldest pending frame is older than
+    `max_latency`, and frames arriving afterwards that would have belonged to it are counted as
+    late and dropped.
+
+    Parameters
+    ----------
+    device_ids : list, optional
+        the ids of the devices. If not provided, all devices found are used.
+    backend : object, optional
+        the backend serving the devices. If not provided, the default backend is used.
+    tolerance : float
+        maximum difference in seconds between the timestamps of the frames of a frame set
+    max_latency : float
+        maximum number of seconds a frame waits for the frames of the other devices before a
+        partial frame set is emitted
+    queue_size : int
+        maximum number of frame sets waiting to be consumed. The oldest ones are dropped.
+    max_pending : int
+        maximum number of frames per device waiting to be matched. The oldest ones are dropped.
+    """
+
+    def __init__(
+        self,
+        device_ids: tp.Optional[list] = None,
+        backend=None,
+        tolerance: float = 0.01,
+        max_latency: float = 0.2,
+        queue_size: int = 4,
+        max_pending: int = 8,
+    ):
+        super().__init__()
+
+        self.closed = True
+        self.streaming = False
+        self.backend = get_default_backend() if backend is None else backend
+        if device_ids is None:
+            device_ids = list(find_devices(self.backend))
+        if not device_ids:
+            raise ValueError("A device group needs at least one device.")
+        self.device_ids = list(device_ids)
+        self.tolerance_ns = int(tolerance * 1e9)
+        self.max_latency_ns = int(max_latency * 1e9)
+        self.max_pending = max_pending
+        self.devices = {}
+
+        self._lock = threading.Lock()
+        self._drivers = {}
+        self._pending = {}
+        self._frame_sets = queue.Queue(queue_size)
+        self._subscribers = []
+        self._emit_queue = (
+            collections.deque()
+        )  # matched frame sets waiting to be emitted
+        self._emit_lock = threading.Lock()
+        self._n_frame_sets = 0
+        self._last_frame_set = None
+        self._reset_stats()
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} devices={self.device_ids}, closed={self.closed}>"
+        )
+
+    def _map(self, func, items):
+        with ThreadPoolExecutor(max_workers=len(items)) as executor:
+            return list(executor.map(func, items))
+
+    def open(self):
+        """Opens all devices in parallel."""
+        if self.closed:
+
+            def open_device(device_id):
+                device = Device(device_id, backend=self.backend)
+                device.open()
+                return device
+
+            devices = self._map(open_device, self.device_ids)
+            self.devices = dict(zip(self.device_ids, devices))
+            self.closed = False
+
+    def close(self):
+        """Stops capturing and closes all devices in parallel."""
+        if not self.closed:
+            self.stop()
+            self._map(lambda x: x.close(), list(self.devices.values()))
+            self.devices = {}
+            self.closed = True
+
+    def start(
+        self,
+        stream_type: int = SYSTREAMTYPE_DEPTHIR,
+        resolution: tp.Optional[int] = None,
+    ):
+        """Starts streaming on all devices in parallel and starts the capture workers.
+
+        Parameters
+        ----------
+        stream_type : SYStreamType
+            the stream type of every device
+        resolution : SYResolution, optional
+            the resolution of every device. If not provided, resolutions are left unchanged.
+        """
+        self.open()
+        if self.streaming:
+            return
+
+        def start_device(device):
+            if resolution is not None:
+                device.resolution = resolution
+            device.stream_on(stream_type)
+
+        self._map(start_device, list(self.devices.values()))
+        with self._lock:
+            self._pending = {x: collections.deque() for x in self.device_ids}
+            self._last_frame_set = None
+        for device_id, device in self.devices.items():
+            driver = SDKFrameDriver(
+                _DeviceSink(self, device_id), device.index, backend=self.backend
+            )
+            self._drivers[device_id] = driver
+            driver.start()
+        self.streaming = True
+
+    def stop(self):
+        """Stops the capture workers and streaming on all devices."""
+        if not self.streaming:
+            return
+        for driver in self._drivers.values():
+            driver.stop()
+        self._drivers = {}
+        self._map(lambda x: x.stream_off(), list(self.devices.values()))
+        self.streaming = False
+
+    def _reset_stats(self):
+        self._device_stats = {
+            device_id: {"captured": 0, "skipped": 0, "dropped": 0, "late": 0}
+            for device_id in self.device_ids
+        }
+        self._stats = {"frame_sets": 0, "partial_frame_sets": 0, "overflows": 0}
+        self._last_sequences = {}
+
+    @property
+    def stats(self):
+        """Counters of the group.
+
+        A dictionary with keys:
+
+        - "frame_sets": number of frame sets emitted
+        - "partial_frame_sets": number of frame sets emitted without some devices
+        - "overflows": number of frame sets dropped because they were not consumed in time
+        - "devices": a dictionary mapping each device id to a dictionary of counters: "captured"
+          for the frames received, "skipped" for the gaps in sequence numbers, "dropped" for the
+          frames left unmatched and "late" for the frames arriving after their frame set was
+          emitted
+        """
+        with self._lock:
+            res = dict(self._stats)
+            res["devices"] = {k: dict(v) for k, v in self._device_stats.items()}
+        return res
+
+    def reset_stats(self):
+        """Resets all counters."""
+        with self._lock:
+            self._reset_stats()
+
+    def _push(self, frame: CapturedFrame):
+        with self._lock:
+            stats = self._device_stats[frame.device_id]
+            stats["captured"] += 1
+            last_sequence = self._last_sequences.get(frame.device_id)
+            if last_sequence is not None and frame.sequence > last_sequence + 1:
+                stats["skipped"] += frame.sequence - last_sequence - 1
+            self._last_sequences[frame.device_id] = frame.sequence
+
+            last_frame_set = self._last_frame_set
+            if (
+                last_frame_set is not None
+                and frame.device_id not in last_frame_set.frames
+                and frame.timestamp <= last_frame_set.timestamp + self.tolerance_ns
+            ):
+                stats["late"] += 1
+                return
+            pending = self._pending[frame.device_id]
+            if len(pending) >= self.max_pending:
+                pending.popleft()
+                stats["dropped"] += 1
+            pending.append(frame)
+            # queued under the lock, so in the order of their sequence numbers
+            self._emit_queue.extend(self._match(frame.timestamp))
+
+        # Emit without holding the lock, so that callbacks can use the group. Only one thread
+        # drains the queue at a time, keeping the order. A thread finding the emit lock taken
+        # leaves its frame sets to the holder, which checks the queue again after releasing it.
+        n_overflows = 0
+        while self._emit_queue:
+            if not self._emit_lock.acquire(blocking=False):
+                break
+            try:
+                while self._emit_queue:
+                    n_overflows += self._emit(self._emit_queue.popleft())
+            finally:
+                self._emit_lock.release()
+        if n_overflows:
+            with self._lock:
+                self._stats["overflows"] += n_overflows
+
+    def _match(self, now: int):
+        """Pops the frame sets that can be emitted. Must be called with the lock held."""
+        frame_sets = []
+        pendings = self._pending
+        while True:
+            heads = [x[0] for x in pendings.values() if x]
+            if not heads:
+                break
+            t_min = min(x.timestamp for x in heads)
+            if len(heads) == len(pendings):
+                if max(x.timestamp for x in heads) - t_min <= self.tolerance_ns:
+                    frame_sets.append(self._pop_frame_set(t_min))
+                    continue
+                # frames arrive in order, so the oldest head cannot be matched anymore
+                oldest = min(pendings, key=lambda x: pendings[x][0].timestamp)
+                pendings[oldest].popleft()
+                self._device_stats[oldest]["dropped"] += 1
+                continue
+            if now - t_min <= self.max_latency_ns:
+                break
+            frame_sets.append(self._pop_frame_set(t_min))
+            self._stats["partial_frame_sets"] += 1
+        return frame_sets
+
+    def _pop_frame_set(self, t_min: int):
+        frames = {}
+        for device_id, pending in self._pending.items():
+            if pending and pending[0].timestamp <= t_min + self.tolerance_ns:
+                frames[device_id] = pending.popleft()
+        frame_set = FrameSet(self._n_frame_sets, frames)
+        self._n_frame_sets += 1
+        self._stats["frame_sets"] += 1
+        self._last_frame_set = frame_set
+        return frame_set
+
+    def _emit(self, frame_set: FrameSet):
+        """Queues a frame set and invokes the callbacks. Returns the number of frame sets dropped
+        from the full queue. Must be called with the emit lock held and not the lock."""
+        n_overflows = 0
+        while True:
+            try:
+                self._frame_sets.put_nowait(frame_set)
+                break
+            except queue.Full:
+                try:
+                    self._frame_sets.get_nowait()
+                    n_overflows += 1
+                except queue.Empty:
+                    pass
+
+        for callback in list(self._subscribers):
+            try:
+                callback(frame_set)
+            except Exception:
+                logger.exception(f"Frame set callback {callback} raised an exception.")
+        return n_overflows
+
+    def wait_for_frame_set(self, timeout: tp.Optional[float] = None):
+        """Blocks until a frame set is available.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+
+        Returns
+        -------
+        FrameSet or None
+            the oldest frame set not consumed yet, or None if the timeout expired
+        """
+        try:
+            return self._frame_sets.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def subscribe(self, callback: tp.Callable[[FrameSet], None]):
+        """Subscribes a callback to every frame set.
+
+        Parameters
+        ----------
+        callback : function
+            a function taking the frame set as the only argument. It is invoked from a capture
+            worker and must return quickly.
+
+        Returns
+        -------
+        function
+            a function without arguments to unsubscribe the callback
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
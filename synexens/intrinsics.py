@@ -0,0 +1,189 @@
+"""Camera models built from the intrinsics returned by :func:`synexens_sdk.get_intrinsics`.
+
+The distortion model is the Brown-Conrady model with coefficients `(k1, k2, p1, p2, k3)`, in the
+order of the `m_fltCoeffs` field of `SYIntrinsics`.
+"""
+
+
+from mt import tp, np
+
+from .const import RESOLUTION_SIZES
+
+
+__all__ = [
+    "make_intrinsics",
+    "get_distortion_coeffs",
+    "get_pixel_grid",
+    "distort_normalized",
+    "undistort_normalized",
+    "find_resolution",
+]
+
+
+def make_intrinsics(
+    resolution: int,
+    fov_x: float = 70.0,
+    fov_y: float = 50.0,
+    distortion_coeffs: tp.Optional[tp.Sequence[float]] = None,
+):
+    """Makes an ideal intrinsics dictionary, for simulation and testing without a camera.
+
+    Parameters
+    ----------
+    resolution : SYResolution
+        the resolution
+    fov_x : float
+        horizontal field of view, in degrees
+    fov_y : float
+        vertical field of view, in degrees
+    distortion_coeffs : list, optional
+        the 5 distortion coefficients `(k1, k2, p1, p2, k3)`. Default is no distortion.
+
+    Returns
+    -------
+    dict
+        a dictionary in the format of :func:`synexens_sdk.get_intrinsics`, with the centre point
+        in the middle of the image
+    """
+    width, height = RESOLUTION_SIZES[resolution]
+    coeffs = [0.0] * 5 if distortion_coeffs is None else list(distortion_coeffs)
+    return {
+        "fov_x": fov_x,
+        "fov_y": fov_y,
+        "distortion_coeff_x": coeffs[0],
+        "distortion_coeff_y": coeffs[1],
+        "distortion_coeffs": coeffs,
+        "focal_length_x": width / 2 / np.tan(np.radians(fov_x) / 2),
+        "focal_length_y": height / 2 / np.tan(np.radians(fov_y) / 2),
+        "center_point_x": (width - 1) / 2,
+        "center_point_y": (height - 1) / 2,
+        "width": width,
+        "height": height,
+    }
+
+
+def get_distortion_coeffs(intrinsics: dict):
+    """Gets the 5 distortion coefficients `(k1, k2, p1, p2, k3)` from an intrinsics dictionary.
+
+    Dictionaries from older versions only carry the first two coefficients, in which case the
+    remaining ones are zero.
+    """
+    if "distortion_coeffs" in intrinsics:
+        coeffs = list(intrinsics["distortion_coeffs"])
+    else:
+        coeffs = [intrinsics["distortion_coeff_x"], intrinsics["distortion_coeff_y"]]
+    coeffs += [0.0] * (5 - len(coeffs))
+    return np.array(coeffs[:5], dtype=np.float64)
+
+
+def get_pixel_grid(intrinsics: dict):
+    """Gets the normalized image coordinates of every pixel centre, ignoring distortion.
+
+    Returns
+    -------
+    x : numpy.ndarray
+        array of shape `(height, width)` containing `(u - cx) / fx`
+    y : numpy.ndarray
+        array of shape `(height, width)` containing `(v - cy) / fy`
+    """
+    width = intrinsics["width"]
+    height = intrinsics["height"]
+    u = np.arange(width, dtype=np.float64)
+    v = np.arange(height, dtype=np.float64)
+    x = (u - intrinsics["center_point_x"]) / intrinsics["focal_length_x"]
+    y = (v - intrinsics["center_point_y"]) / intrinsics["focal_length_y"]
+    return np.broadcast_to(x[np.newaxis, :], (height, width)), np.broadcast_to(
+        y[:, np.newaxis], (height, width)
+    )
+
+
+def distort_normalized(x: np.ndarray, y: np.ndarray, coeffs: np.ndarray):
+    """Applies lens distortion to undistorted normalized image coordinates.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        undistorted normalized image coordinates
+    coeffs : numpy.ndarray
+        the 5 distortion coefficients `(k1, k2, p1, p2, k3)`
+
+    Returns
+    -------
+    xd, yd : numpy.ndarray
+        distorted normalized image coordinates
+    """
+    k1, k2, p1, p2, k3 = coeffs
+    r2 = x * x + y * y
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+    return xd, yd
+
+
+def undistort_normalized(
+    xd: np.ndarray, yd: np.ndarray, coeffs: np.ndarray, n_iters: int = 8
+):
+    """Removes lens distortion from distorted normalized image coordinates.
+
+    The inverse has no closed form and is computed by fixed-point iteration, like OpenCV's
+    `undistortPoints`.
+
+    Parameters
+    ----------
+    xd, yd : numpy.ndarray
+        distorted normalized image coordinates
+    coeffs : numpy.ndarray
+        the 5 distortion coefficients `(k1, k2, p1, p2, k3)`
+    n_iters : int
+        number of iterations
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        undistorted normalized image coordinates
+    """
+    k1, k2, p1, p2, k3 = coeffs
+    x = np.array(xd, dtype=np.float64)
+    y = np.array(yd, dtype=np.float64)
+    if not coeffs.any():
+        return x, y
+    for _ in range(n_iters):
+        r2 = x * x + y * y
+        radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+        dx = 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+        dy = p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+        x = (xd - dx) / radial
+        y = (yd - dy) / radial
+    return x, y
+
+
+def find_resolution(
+    height: int, width: int, resolutions: tp.Optional[tp.Iterable[int]] = None
+):
+    """Finds the resolution matching an image size.
+
+    Parameters
+    ----------
+    height : int
+        image height
+    width : int
+        image width
+    resolutions : iterable, optional
+        the candidate resolutions. If not provided, all known resolutions are tried.
+
+    Returns
+    -------
+    SYResolution
+        the matching resolution
+
+    Raises
+    ------
+    ValueError
+        if no candidate resolution matches
+    """
+    if resolutions is None:
+        resolutions = RESOLUTION_SIZES.keys()
+    for resolution in resolutions:
+        if RESOLUTION_SIZES.get(resolution) == (width, height):
+            return resolution
+    raise ValueError(f"No resolution matches an image of size {width}x{height}.")
@@ -0,0 +1,364 @@
+"""Triangle meshes and normals from organized point clouds.
+
+The demo's geometry shader turns every 2x2 block of the organized point image into a quad and
+discards the quads whose extent exceeds 5 cm, so that depth discontinuities are not bridged. A
+:class:`OrganizedMesher` does the same on the CPU with vectorized NumPy, computes per-pixel
+normals, and packs the result into a compact :class:`Mesh` that can be written as a PLY file.
+"""
+
+
+from mt import tp, np
+
+
+__all__ = ["OrganizedMesher", "Mesh"]
+
+
+class Mesh:
+    """A triangle mesh with compact vertex and index buffers.
+
+    Parameters
+    ----------
+    vertices : numpy.ndarray
+        the float32 vertex positions of shape `(V, 3)`
+    faces : numpy.ndarray
+        the int32 vertex indices of the triangles, of shape `(F, 3)`, counter-clockwise when seen
+        from the camera
+    normals : numpy.ndarray, optional
+        the float32 unit vertex normals of shape `(V, 3)`
+    colors : numpy.ndarray, optional
+        the uint8 RGB vertex colours of shape `(V, 3)`
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        faces: np.ndarray,
+        normals: tp.Optional[np.ndarray] = None,
+        colors: tp.Optional[np.ndarray] = None,
+    ):
+        self.vertices = vertices
+        self.faces = faces
+        self.normals = normals
+        self.colors = colors
+
+    def __repr__(self):
+        return f"<{type(self).__name__} vertices={len(self.vertices)}, faces={len(self.faces)}>"
+
+    def get_vertex_dtype(self):
+        """Gets the structured dtype of the interleaved vertex records."""
+        fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+        if self.normals is not None:
+            fields += [("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4")]
+        if self.colors is not None:
+            fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+        return np.dtype(fields)
+
+    def get_vertex_buffer(self):
+        """Interleaves the vertex attributes into a structured array, e.g. for a GPU upload."""
+        buf = np.empty(len(self.vertices), dtype=self.get_vertex_dtype())
+        for i, name in enumerate("xyz"):
+            buf[name] = self.vertices[:, i]
+        if self.normals is not None:
+            for i, name in enumerate(["nx", "ny", "nz"]):
+                buf[name] = self.normals[:, i]
+        if self.colors is not None:
+            for i, name in enumerate(["red", "green", "blue"]):
+                buf[name] = self.colors[:, i]
+        return buf
+
+    def write_ply(self, filepath: str, binary: bool = True):
+        """Writes the mesh as a PLY file.
+
+        Parameters
+        ----------
+        filepath : str
+            the path of the file
+        binary : bool
+            whether to write the little-endian binary format instead of ASCII
+        """
+        vertex_dtype = self.get_vertex_dtype()
+        ply_types = {"<f4": "float", "|u1": "uchar"}
+        header = [
+            "ply",
+            f"format {'binary_little_endian' if binary else 'ascii'} 1.0",
+            "comment written by synexens",
+            f"element vertex {len(self.vertices)}",
+        ]
+        header += [
+            f"property {ply_types[vertex_dtype[name].str]} {name}"
+            for name in vertex_dtype.names
+        ]
+        header += [
+            f"element face {len(self.faces)}",
+            "property list uchar int vertex_indices",
+            "end_header",
+        ]
+        vertices = self.get_vertex_buffer()
+        faces = np.empty(len(self.faces), dtype=[("n", "u1"), ("v", "<i4", (3,))])
+        faces["n"] = 3
+        faces["v"] = self.faces
+
+        with open(filepath, "wb") as f:
+            f.write(("\n".join(header) + "\n").encode("ascii"))
+            if binary:
+                vertices.tofile(f)
+                faces.tofile(f)
+                return
+            fmt = " ".join(
+                "%d" if vertex_dtype[name].kind == "u" else "%.6g"
+                for name in vertex_dtype.names
+            )
+            np.savetxt(f, vertices, fmt=fmt)
+            np.savetxt(f, self.faces, fmt="3 %d %d %d")
+
+
+class OrganizedMesher:
+    """Triangulates organized point clouds like the demo's geometry shader.
+
+    Every 2x2 block of pixels becomes two triangles unless the extent of its 4 points along x, y
+    or z exceeds `max_edge`, or one of its pixels has no depth.
+
+    The quad masks and the normals are computed in work buffers reused across calls, which avoids
+    allocating about 20 temporary images per mesh. A mesher must therefore not be shared by threads
+    meshing concurrently.
+
+    Parameters
+    ----------
+    max_edge : float
+        the maximum extent of a quad, in the unit of the points. The default of 50 matches the
+        5 cm of the demo for point clouds in millimetres.
+    """
+
+    def __init__(self, max_edge: float = 50.0):
+        if max_edge <= 0:
+            raise ValueError(f"Argument 'max_edge' must be positive. Got: {max_edge}.")
+        self.max_edge = max_edge
+        self._buffers = None
+        self._buffer_shape = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} max_edge={self.max_edge}>"
+
+    @staticmethod
+    def _check_points(points: np.ndarray):
+        if points.ndim != 3 or points.shape[2] != 3:
+            raise ValueError(
+                f"The point cloud must have shape (H, W, 3). Shape: {points.shape}."
+            )
+
+    def get_quad_mask(self, points: np.ndarray):
+        """Gets the mask of the quads kept.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            the organized point cloud of shape `(height, width, 3)`, as returned by
+            :meth:`synexens.Device.get_depth_point_cloud`
+
+        Returns
+        -------
+        numpy.ndarray
+            a boolean array of shape `(height - 1, width - 1)`, true for the quads whose top-left
+            corner is the pixel at the same position
+        """
+        self._check_points(points)
+        return self._get_quad_mask(self._get_planes(points)).copy()
+
+    @staticmethod
+    def _get_planes(points: np.ndarray):
+        # contiguous coordinate planes are much faster to operate on than interleaved points
+        return np.ascontiguousarray(points.transpose(2, 0, 1), dtype=np.float32)
+
+    def _get_buffers(self, shape: tuple):
+        """Gets the work buffers for images of a given shape, allocating them on first use."""
+        if self._buffer_shape != shape:
+            height, width = shape
+            quads = (height - 1, width - 1)
+            inner = (height - 2, width - 2)
+            # the borders of the normals are never written and stay zero
+            self._buffers = {
+                "quad_extents": np.empty((3,) + quads, dtype=np.float32),
+                "quad_masks": np.empty((2,) + quads, dtype=bool),
+                "normals": np.zeros((3, height, width), dtype=np.float32),
+                "diffs": np.empty((6,) + inner, dtype=np.float32),
+                "normal_temps": np.empty((2,) + inner, dtype=np.float32),
+                "has_depth": np.empty(shape, dtype=bool),
+                "normal_masks": np.empty((2,) + inner, dtype=bool),
+            }
+            self._buffer_shape = shape
+        return self._buffers
+
+    def _get_quad_mask(self, planes: np.ndarray):
+        """Gets the mask of the quads kept, in a reused buffer."""
+        buffers = self._get_buffers(planes.shape[1:])
+        hi, lo, tmp = buffers["quad_extents"]
+        keep, mask = buffers["quad_masks"]
+        for c, plane in enumerate(planes):
+            tl, tr = plane[:-1, :-1], plane[:-1, 1:]
+            bl, br = plane[1:, :-1], plane[1:, 1:]
+            np.maximum(tl, tr, out=hi)
+            np.maximum(bl, br, out=tmp)
+            np.maximum(hi, tmp, out=hi)
+            np.minimum(tl, tr, out=lo)
+            np.minimum(bl, br, out=tmp)
+            np.minimum(lo, tmp, out=lo)
+            hi -= lo
+            if c == 2:
+                # pixels without depth are deprojected to the origin
+                np.less_equal(lo, 0, out=mask)
+                np.copyto(hi, np.inf, where=mask)
+            if c == 0:
+                np.less_equal(hi, self.max_edge, out=keep)
+            else:
+                np.less_equal(hi, self.max_edge, out=mask)
+                keep &= mask
+        return keep
+
+    @staticmethod
+    def _make_faces(keep: np.ndarray, indices: np.ndarray):
+        """Makes the triangles of the quads kept, given the vertex index of every pixel.
+
+        The indices of two horizontally adjacent pixels of a quad kept must be consecutive, which
+        holds for pixel indices and for vertex indices numbered in raster order.
+        """
+        tl = indices[:-1, :-1][keep]
+        bl = indices[1:, :-1][keep]
+        faces = np.empty((len(tl), 2, 3), dtype=np.int32)
+        # the two triangles of the triangle strip tl, tr, bl, br of the shader
+        faces[:, 0, 0] = tl
+        faces[:, 0, 1] = bl
+        np.add(tl, 1, out=faces[:, 0, 2])
+        faces[:, 1, 0] = faces[:, 0, 2]
+        faces[:, 1, 1] = bl
+        np.add(bl, 1, out=faces[:, 1, 2])
+        return faces.reshape(-1, 3)
+
+    def triangulate(self, points: np.ndarray):
+        """Gets the triangles of an organized point cloud.
+
+        Returns
+        -------
+        numpy.ndarray
+            the int32 array of shape `(F, 3)` of the flat pixel indices of the triangles,
+            counter-clockwise when seen from the camera
+        """
+        self._check_points(points)
+        keep = self._get_quad_mask(self._get_planes(points))
+        height, width = points.shape[:2]
+        indices = np.arange(height * width, dtype=np.int32).reshape(height, width)
+        return self._make_faces(keep, indices)
+
+    def compute_normals(self, points: np.ndarray):
+        """Computes per-pixel unit normals, facing the camera.
+
+        The normal of a pixel is the cross product of the central differences of its vertical
+        and horizontal neighbours. Pixels on the border, next to a pixel without depth, or whose
+        opposite neighbours are more than `2 * max_edge` apart get a zero normal.
+
+        Returns
+        -------
+        numpy.ndarray
+            the float32 normals of shape `(height, width, 3)`
+        """
+        self._check_points(points)
+        normals = self._compute_normals(self._get_planes(points))
+        return np.ascontiguousarray(np.moveaxis(normals, 0, -1))
+
+    def _compute_normals(self, planes: np.ndarray):
+        """Computes the normals as 3 planes of shape `(height, width)`, in a reused buffer."""
+        buffers = self._get_buffers(planes.shape[1:])
+        normals = buffers["normals"]
+        diffs = buffers["diffs"]
+        has_depth = buffers["has_depth"]
+        dxx, dxy, dxz, dyx, dyy, dyz = diffs
+        for a, dx, dy in zip(planes, diffs[:3], diffs[3:]):
+            np.subtract(a[1:-1, 2:], a[1:-1, :-2], out=dx)
+            np.subtract(a[2:, 1:-1], a[:-2, 1:-1], out=dy)
+        nx, ny, nz = (n[1:-1, 1:-1] for n in normals)
+        t0, t1 = buffers["normal_temps"]
+        for n, a0, b0, a1, b1 in (
+            (nx, dyy, dxz, dyz, dxy),
+            (ny, dyz, dxx, dyx, dxz),
+            (nz, dyx, dxy, dyy, dxx),
+        ):
+            np.multiply(a0, b0, out=n)
+            np.multiply(a1, b1, out=t0)
+            n -= t0
+
+        limit = (2 * self.max_edge) ** 2
+        valid, invalid = buffers["normal_masks"]
+        np.greater(planes[2], 0, out=has_depth)
+        np.logical_and(has_depth[1:-1, 2:], has_depth[1:-1, :-2], out=valid)
+        valid &= has_depth[2:, 1:-1]
+        valid &= has_depth[:-2, 1:-1]
+        for v0, v1, v2 in ((dxx, dxy, dxz), (dyx, dyy, dyz), (nx, ny, nz)):
+            np.multiply(v0, v0, out=t0)
+            np.multiply(v1, v1, out=t1)
+            t0 += t1
+            np.multiply(v2, v2, out=t1)
+            t0 += t1
+            if v0 is nx:
+                np.greater(t0, 0, out=invalid)
+            else:
+                np.less_equal(t0, limit, out=invalid)
+            valid &= invalid
+        # t0 holds the squared lengths of the normals
+        np.sqrt(t0, out=t0)
+        np.logical_not(valid, out=invalid)
+        np.copyto(t0, np.inf, where=invalid)
+        np.reciprocal(t0, out=t0)
+        nx *= t0
+        ny *= t0
+        nz *= t0
+        return normals
+
+    def mesh(
+        self,
+        points: np.ndarray,
+        colors: tp.Optional[np.ndarray] = None,
+        normals: bool = True,
+    ):
+        """Builds the compact mesh of an organized point cloud.
+
+        Only the vertices used by a triangle are kept, and the triangles are reindexed.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            the organized point cloud of shape `(height, width, 3)`
+        colors : numpy.ndarray, optional
+            the uint8 RGB colours of the pixels, of shape `(height, width, 3)`
+        normals : bool
+            whether to compute the vertex normals
+
+        Returns
+        -------
+        Mesh
+            the mesh
+        """
+        self._check_points(points)
+        planes = self._get_planes(points)
+        keep = self._get_quad_mask(planes)
+        used = np.zeros(points.shape[:2], dtype=bool)
+        used[:-1, :-1] = keep
+        used[:-1, 1:] |= keep
+        used[1:, :-1] |= keep
+        used[1:, 1:] |= keep
+        remap = np.cumsum(used, dtype=np.int32).reshape(used.shape)
+        remap -= 1
+        faces = self._make_faces(keep, remap)
+
+        # gathering rows by index is much faster than boolean indexing
+        indices = np.flatnonzero(used)
+        vertices = np.take(points.reshape(-1, 3), indices, axis=0).astype(
+            np.float32, copy=False
+        )
+        vertex_normals = None
+        if normals:
+            vertex_normals = np.take(
+                self._compute_normals(planes).reshape(3, -1), indices, axis=1
+            ).T
+        vertex_colors = None
+        if colors is not None:
+            vertex_colors = np.take(colors.reshape(-1, 3), indices, axis=0)
+        return Mesh(vertices, faces, vertex_normals, vertex_colors)
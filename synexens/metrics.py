@@ -0,0 +1,518 @@
+"""Opt-in instrumentation of the SDK calls made by :class:`synexens.Device`.
+
+An :class:`InstrumentedBackend` wraps any backend of :mod:`synexens.backends` and records, for
+every call, its wall time into a log-linear :class:`Histogram` per device and per function, and
+tallies the failures per `SYErrorCode`. Frames delivered by `get_last_frame_data` and
+`wait_frame_notify` are counted, as are the polls that found no frame, and devices record the
+latency between the arrival of a frame and its hand-over to a consumer of
+:meth:`synexens.Device.wait_for_frame`.
+
+Instrumentation is off unless a device is given an instrumented backend, or environment variable
+`SYNEXENS_METRICS` is set to 1, in which case the default backend is instrumented with the
+default :class:`Metrics`. The recorded metrics can be exported as a dictionary with
+:meth:`Metrics.snapshot` or in the Prometheus text format with :meth:`Metrics.to_prometheus`,
+which :func:`start_http_server` serves over HTTP.
+"""
+
+
+import http.server
+import re
+import threading
+import time
+
+from mt import tp
+
+from . import const
+
+
+__all__ = [
+    "Histogram",
+    "Metrics",
+    "InstrumentedBackend",
+    "get_default_metrics",
+    "start_http_server",
+]
+
+
+# SYErrorCode value -> name
+ERROR_NAMES = {
+    value: name
+    for name, value in vars(const).items()
+    if name.startswith("SYERRORCODE_") and isinstance(value, int)
+}
+
+_ERROR_PATTERN = re.compile(r"returns (?:SYErrorCode\.)?(\w+)")
+
+# functions without a device id as first argument
+_GLOBAL_FUNCS = {
+    "get_sdk_version",
+    "find_device",
+    "get_device_event_count",
+    "register_frame_observer",
+    "unregister_frame_observer",
+    "register_event_observer",
+    "unregister_event_observer",
+    "interrupt_frame_observer",
+    "init_sdk",
+    "uninit_sdk",
+}
+
+# functions returning None when no frame is available
+_FRAME_FUNCS = {"get_last_frame_data", "wait_frame_notify"}
+
+# the function frames are counted from, by decreasing priority. With push delivery, the frames
+# notified are also fetched, so counting both would count them twice.
+_FRAME_SOURCES = ["wait_frame_notify", "get_last_frame_data"]
+
+
+def get_error_name(exc: BaseException):
+    """Gets the `SYErrorCode` name of an error raised by an SDK call, or its type name."""
+    match = _ERROR_PATTERN.search(str(exc)) if isinstance(exc, RuntimeError) else None
+    if match is None:
+        return type(exc).__name__
+    code = match.group(1)
+    if code.isdigit():
+        return ERROR_NAMES.get(int(code), code)
+    return code
+
+
+def get_device_label(device_id: tp.Optional[int]):
+    """Gets the Prometheus label value of a device id, empty for calls not bound to a device."""
+    return "" if device_id is None else str(device_id)
+
+
+class Histogram:
+    """A log-linear histogram of non-negative integers, like HdrHistogram.
+
+    Values below 32 have their own bucket. Above, every power of two is split into 16 buckets, so
+    that the relative error of a quantile is at most 1/16.
+    """
+
+    SUB_BITS = 4
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} count={self.count}>"
+
+    @classmethod
+    def get_bucket(cls, value: int):
+        """Gets the bucket index of a value."""
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << cls.SUB_BITS) + (value >> shift)
+
+    @classmethod
+    def get_bucket_range(cls, bucket: int):
+        """Gets the `[low, high)` range of values of a bucket."""
+        shift = (bucket >> cls.SUB_BITS) - 1
+        if shift <= 0:
+            return bucket, bucket + 1
+        low = ((bucket & ((1 << cls.SUB_BITS) - 1)) | (1 << cls.SUB_BITS)) << shift
+        return low, low + (1 << shift)
+
+    def record(self, value: int):
+        """Records a value."""
+        bucket = self.get_bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q: float):
+        """Gets an approximate quantile, the midpoint of the bucket holding it.
+
+        Parameters
+        ----------
+        q : float
+            the quantile in [0, 1]
+
+        Returns
+        -------
+        float or None
+            the quantile, or None if no value has been recorded
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                low, high = self.get_bucket_range(bucket)
+                return min(max((low + high - 1) / 2, self.min), self.max)
+        return self.max
+
+    def get_cumulative_counts(self, bounds: list):
+        """Gets the number of values not above each bound, up to the bucket resolution."""
+        res = []
+        items = sorted(self.counts.items())
+        i = 0
+        seen = 0
+        for bound in bounds:
+            while i < len(items) and self.get_bucket_range(items[i][0])[0] <= bound:
+                seen += items[i][1]
+                i += 1
+            res.append(seen)
+        return res
+
+    def snapshot(self, scale: float = 1.0):
+        """Summarizes the histogram, multiplying the values by `scale`."""
+        res = {"count": self.count, "total": self.total * scale}
+        if self.count:
+            res["min"] = self.min * scale
+            res["max"] = self.max * scale
+            res["mean"] = self.total / self.count * scale
+            for q in (0.5, 0.9, 0.99, 0.999):
+                res[f"p{q * 100:g}"] = self.quantile(q) * scale
+        return res
+
+
+class _CallStats:
+    __slots__ = ("histogram", "errors", "frames", "no_frames")
+
+    def __init__(self):
+        self.histogram = Histogram()
+        self.errors = {}
+        self.frames = 0
+        self.no_frames = 0
+
+
+class Metrics:
+    """A registry of per-device and per-call metrics.
+
+    Parameters
+    ----------
+    enabled : bool
+        whether recording is enabled. It can be toggled at any time.
+    """
+
+    # upper bounds in seconds of the Prometheus histogram buckets
+    PROMETHEUS_BUCKETS = [
+        1e-5,
+        5e-5,
+        1e-4,
+        5e-4,
+        1e-3,
+        2e-3,
+        5e-3,
+        1e-2,
+        2e-2,
+        5e-2,
+        0.1,
+        0.2,
+        0.5,
+        1.0,
+    ]
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} enabled={self.enabled}>"
+
+    def reset(self):
+        """Forgets everything recorded."""
+        with self._lock:
+            self._calls = {}  # (device id, function name) -> _CallStats
+            self._latencies = {}  # (device id, name) -> Histogram
+            self._start = time.monotonic()
+
+    def record_call(
+        self,
+        device_id: tp.Optional[int],
+        name: str,
+        elapsed_ns: int,
+        error: tp.Optional[str] = None,
+        frame: tp.Optional[bool] = None,
+    ):
+        """Records a call.
+
+        Parameters
+        ----------
+        device_id : int, optional
+            the device id, or None for functions not bound to a device
+        name : str
+            the function name
+        elapsed_ns : int
+            the wall time of the call in nanoseconds
+        error : str, optional
+            the `SYErrorCode` name of the error raised by the call
+        frame : bool, optional
+            for calls polling frames, whether a frame was returned
+        """
+        key = (device_id, name)
+        with self._lock:
+            stats = self._calls.get(key)
+            if stats is None:
+                stats = self._calls[key] = _CallStats()
+            stats.histogram.record(elapsed_ns)
+            if error is not None:
+                stats.errors[error] = stats.errors.get(error, 0) + 1
+            if frame is not None:
+                if frame:
+                    stats.frames += 1
+                else:
+                    stats.no_frames += 1
+
+    def record_latency(self, device_id: tp.Optional[int], name: str, latency_ns: int):
+        """Records a latency, like the frame-to-consumer latency."""
+        key = (device_id, name)
+        with self._lock:
+            histogram = self._latencies.get(key)
+            if histogram is None:
+                histogram = self._latencies[key] = Histogram()
+            histogram.record(max(latency_ns, 0))
+
+    def snapshot(self):
+        """Gets all metrics as a dictionary.
+
+        Returns
+        -------
+        dict
+            a dictionary with keys "elapsed", the number of seconds since the creation or the last
+            reset, and "devices", mapping each device id, None for calls not bound to a device, to
+            a dictionary with keys:
+
+            - "calls": a dictionary mapping each function name to the summary of its wall times
+              in seconds (count, total, min, max, mean and quantiles), its "errors" per
+              `SYErrorCode` name and, for frame polling functions, the numbers of "frames" and
+              "no_frames" and the "no_frame_ratio"
+            - "frames": the number of frames received, counted from `wait_frame_notify` if it
+              returned any frame, or from `get_last_frame_data` otherwise
+            - "fps": the number of frames received per second
+            - "latencies": a dictionary mapping each latency name to its summary in seconds
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._start
+            devices = {}
+            for (device_id, name), stats in self._calls.items():
+                device = devices.setdefault(
+                    device_id, {"calls": {}, "frames": 0, "latencies": {}}
+                )
+                call = stats.histogram.snapshot(1e-9)
+                call["errors"] = dict(stats.errors)
+                if name in _FRAME_FUNCS:
+                    call["frames"] = stats.frames
+                    call["no_frames"] = stats.no_frames
+                    polls = stats.frames + stats.no_frames
+                    call["no_frame_ratio"] = stats.no_frames / polls if polls else 0.0
+                device["calls"][name] = call
+            for (device_id, name), histogram in self._latencies.items():
+                device = devices.setdefault(
+                    device_id, {"calls": {}, "frames": 0, "latencies": {}}
+                )
+                device["latencies"][name] = histogram.snapshot(1e-9)
+        for device in devices.values():
+            for name in _FRAME_SOURCES:
+                frames = device["calls"].get(name, {}).get("frames", 0)
+                if frames:
+                    device["frames"] = frames
+                    break
+            device["fps"] = device["frames"] / elapsed if elapsed > 0 else 0.0
+        return {"elapsed": elapsed, "devices": devices}
+
+    def _write_histogram(
+        self, lines: list, name: str, labels: str, histogram: Histogram
+    ):
+        bounds_ns = [int(x * 1e9) for x in self.PROMETHEUS_BUCKETS]
+        counts = histogram.get_cumulative_counts(bounds_ns)
+        for bound, count in zip(self.PROMETHEUS_BUCKETS, counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.total * 1e-9:.9g}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def to_prometheus(self, prefix: str = "synexens"):
+        """Exports the metrics in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            the metrics, with histograms of the call durations and latencies in seconds, and
+            counters of the errors, frames and polls without frame
+        """
+        with self._lock:
+            calls = sorted(self._calls.items(), key=lambda x: (str(x[0][0]), x[0][1]))
+            latencies = sorted(
+                self._latencies.items(), key=lambda x: (str(x[0][0]), x[0][1])
+            )
+            lines = [
+                f"# HELP {prefix}_call_duration_seconds Wall time of the SDK calls.",
+                f"# TYPE {prefix}_call_duration_seconds histogram",
+            ]
+            for (device_id, name), stats in calls:
+                labels = f'device="{get_device_label(device_id)}",call="{name}"'
+                self._write_histogram(
+                    lines, f"{prefix}_call_duration_seconds", labels, stats.histogram
+                )
+            lines += [
+                f"# HELP {prefix}_call_errors_total Failed SDK calls per error code.",
+                f"# TYPE {prefix}_call_errors_total counter",
+            ]
+            for (device_id, name), stats in calls:
+                for error, count in sorted(stats.errors.items()):
+                    lines.append(
+                        f'{prefix}_call_errors_total{{device="'
+                        f'{get_device_label(device_id)}",call="{name}",'
+                        f'code="{error}"}} {count}'
+                    )
+            lines += [
+                f"# HELP {prefix}_frames_total Frames returned by the frame polling calls.",
+                f"# TYPE {prefix}_frames_total counter",
+            ]
+            for (device_id, name), stats in calls:
+                if name in _FRAME_FUNCS:
+                    lines.append(
+                        f'{prefix}_frames_total{{device="{get_device_label(device_id)}",'
+                        f'call="{name}"}} {stats.frames}'
+                    )
+            lines += [
+                f"# HELP {prefix}_no_frames_total Frame polls that found no frame.",
+                f"# TYPE {prefix}_no_frames_total counter",
+            ]
+            for (device_id, name), stats in calls:
+                if name in _FRAME_FUNCS:
+                    lines.append(
+                        f'{prefix}_no_frames_total{{device="{get_device_label(device_id)}",'
+                        f'call="{name}"}} {stats.no_frames}'
+                    )
+            lines += [
+                f"# HELP {prefix}_latency_seconds Frame latencies.",
+                f"# TYPE {prefix}_latency_seconds histogram",
+            ]
+            for (device_id, name), histogram in latencies:
+                labels = f'device="{get_device_label(device_id)}",name="{name}"'
+                self._write_histogram(
+                    lines, f"{prefix}_latency_seconds", labels, histogram
+                )
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedBackend:
+    """A backend recording the calls it forwards to another backend.
+
+    Parameters
+    ----------
+    wrapped : object
+        the backend to instrument, see :mod:`synexens.backends`
+    metrics : Metrics, optional
+        the registry to record into. If not provided, the default registry is used.
+    """
+
+    def __init__(self, wrapped, metrics: tp.Optional[Metrics] = None):
+        self.wrapped = wrapped
+        self.metrics = get_default_metrics() if metrics is None else metrics
+
+    def __repr__(self):
+        return f"<{type(self).__name__} wrapped={self.wrapped!r}>"
+
+    def __getattr__(self, name: str):
+        func = getattr(self.wrapped, name)
+        if not callable(func) or name.startswith("_"):
+            return func
+
+        metrics = self.metrics
+        is_frame_func = name in _FRAME_FUNCS
+        has_device = name not in _GLOBAL_FUNCS
+        perf_counter_ns = time.perf_counter_ns
+
+        def instrumented(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            device_id = args[0] if has_device and args else None
+            t0 = perf_counter_ns()
+            try:
+                res = func(*args, **kwargs)
+            except Exception as e:
+                metrics.record_call(
+                    device_id, name, perf_counter_ns() - t0, error=get_error_name(e)
+                )
+                raise
+            metrics.record_call(
+                device_id,
+                name,
+                perf_counter_ns() - t0,
+                frame=(res is not None) if is_frame_func else None,
+            )
+            return res
+
+        instrumented.__name__ = name
+        # cache the wrapper, so that later lookups skip __getattr__
+        self.__dict__[name] = instrumented
+        return instrumented
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_default_metrics():
+    """Gets the default metrics registry, creating it on first use."""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+        return _default_metrics
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        data = self.metrics.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(
+    port: int,
+    host: str = "127.0.0.1",
+    metrics: tp.Optional[Metrics] = None,
+):
+    """Serves the metrics in the Prometheus text format from a background thread.
+
+    Parameters
+    ----------
+    port : int
+        the port to listen on, 0 picking a free one
+    host : str
+        the address to listen on
+    metrics : Metrics, optional
+        the registry to serve. If not provided, the default registry is used.
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+        the server, whose `server_address` holds the actual port and whose `shutdown` method
+        stops it
+    """
+    handler = type(
+        "MetricsHandler",
+        (_MetricsHandler,),
+        {"metrics": get_default_metrics() if metrics is None else metrics},
+    )
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
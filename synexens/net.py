@@ -0,0 +1,728 @@
+"""Streaming frames to other hosts over TCP.
+
+A :class:`FrameServer` publishes the frames of one or more devices, or of any other frame source,
+to TCP clients. The wire protocol is little-endian and made of length-prefixed messages::
+
+    server -> client   info message: magic, JSON length, JSON dictionary mapping each device
+                       serial number to its `Device.info`
+    client -> server   subscribe message: magic, version, number of frame types, serial length,
+                       the frame types (none means all) and the serial number (empty means all)
+    server -> client   image messages: a fixed-size header (serial number, frame type,
+                       resolution, sequence, timestamp, shape, encoding) and the payload
+
+All images of a frame are sent back to back, the last one flagged. Every client has its own
+bounded send queue of frames. When a client reads too slowly, its oldest queued frame is dropped,
+so that it never delays the other clients nor the devices. With `max_error` set, depth and IR
+images are encoded by a per-client :class:`synexens.codec.DepthCodec`, whose temporal references
+stay consistent with the frames that are actually sent.
+
+A :class:`RemoteDevice` connects to a server and mimics the frame interface of
+:class:`synexens.Device`: :meth:`RemoteDevice.get_last_frame_data`,
+:meth:`RemoteDevice.wait_for_frame` and :meth:`RemoteDevice.subscribe`. Timestamps are wall-clock
+times of the server, so latencies are only meaningful with synchronized clocks, e.g. over
+localhost.
+"""
+
+
+import collections
+import functools
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+
+from mt import tp, np
+
+from .base import ReentrantContextManager
+from .codec import DepthCodec
+from .const import RESOLUTION_SIZES, SYFRAMETYPE_DEPTH, SYFRAMETYPE_IR
+from .intrinsics import find_resolution
+from .observer import FrameObserver
+from .recording import info_to_json, info_from_json
+
+
+__all__ = ["FrameServer", "RemoteDevice"]
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PORT = 7350
+PROTOCOL_VERSION = 1
+INFO_MAGIC = b"SYNI"
+SUBSCRIBE_MAGIC = b"SYNS"
+IMAGE_MAGIC = b"SYNF"
+
+# info header: magic, JSON length
+INFO_HEADER = struct.Struct("<4sI")
+# subscribe header: magic, version, number of frame types, serial length
+SUBSCRIBE_HEADER = struct.Struct("<4sHHH")
+# image header: magic, serial, frame type, resolution, sequence, timestamp, height, width,
+# channels, item size, encoding, flags, payload length
+IMAGE_HEADER = struct.Struct("<4s16siIQqIIIBBBxI")
+
+ENCODING_RAW = 0
+ENCODING_DEPTH = 1
+
+FLAG_LAST = 1
+
+
+def _recv_into(sock: socket.socket, buf):
+    view = memoryview(buf).cast("B")
+    while len(view):
+        n = sock.recv_into(view)
+        if n == 0:
+            raise ConnectionError("Connection closed by the peer.")
+        view = view[n:]
+    return buf
+
+
+def _recv(sock: socket.socket, n: int):
+    return _recv_into(sock, bytearray(n))
+
+
+def _get_serial(info: dict):
+    serial = info["serial_number"]
+    return serial.decode() if isinstance(serial, bytes) else str(serial)
+
+
+class _Client:
+    """A connection of the server, with its send queue and sender thread."""
+
+    def __init__(self, server, sock: socket.socket, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.frame_types = set()
+        self.serial = ""
+        self.stats = {"sent": 0, "dropped": 0, "bytes": 0}
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._codecs = {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} address={self.address}, serial={self.serial!r}>"
+
+    def wants(self, serial: str):
+        return not self.serial or self.serial == serial
+
+    def put(self, item: tuple):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.server.queue_size:
+                self._queue.popleft()
+                self.stats["dropped"] += 1
+            self._queue.append(item)
+            self._cond.notify()
+
+    def _get_codec(self, serial: str, frame_type: int):
+        key = (serial, frame_type)
+        codec = self._codecs.get(key)
+        if codec is None:
+            codec = DepthCodec(
+                max_error=self.server.max_error,
+                keyframe_interval=self.server.keyframe_interval,
+            )
+            self._codecs[key] = codec
+        return codec
+
+    def _send_frame(self, item: tuple):
+        serial, resolution, sequence, timestamp, frames = item
+        images = [
+            (frame_type, img)
+            for frame_type, img in frames.items()
+            if not self.frame_types or frame_type in self.frame_types
+        ]
+        if not images:
+            return
+        n_bytes = 0
+        for i, (frame_type, img) in enumerate(images):
+            if self.server.max_error is not None and img.dtype == np.uint16:
+                encoding = ENCODING_DEPTH
+                payload = self._get_codec(serial, frame_type).encode(img)
+            else:
+                encoding = ENCODING_RAW
+                payload = memoryview(np.ascontiguousarray(img)).cast("B")
+            header = IMAGE_HEADER.pack(
+                IMAGE_MAGIC,
+                serial.encode()[:16],
+                frame_type,
+                resolution,
+                sequence,
+                timestamp,
+                img.shape[0],
+                img.shape[1],
+                img.shape[2] if img.ndim == 3 else 0,
+                img.dtype.itemsize,
+                encoding,
+                FLAG_LAST if i == len(images) - 1 else 0,
+                len(payload),
+            )
+            self.sock.sendall(header)
+            self.sock.sendall(payload)
+            n_bytes += len(header) + len(payload)
+        with self._cond:
+            self.stats["sent"] += 1
+            self.stats["bytes"] += n_bytes
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._closed)
+                    if self._closed:
+                        return
+                    item = self._queue.popleft()
+                self._send_frame(item)
+        except OSError as e:
+            logger.info(f"Client {self.address} disconnected: {e}")
+        finally:
+            self.server._remove_client(self)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class FrameServer(ReentrantContextManager):
+    """Publishes frames to TCP clients.
+
+    The server subscribes to the frames pushed by its devices, see
+    :meth:`synexens.Device.subscribe`. The devices must be opened and streaming. Frames from
+    other sources, like a :class:`synexens.recording.Playback`, can be sent with :meth:`publish`.
+
+    Parameters
+    ----------
+    devices : list, optional
+        the :class:`synexens.Device` instances whose frames are published
+    host : str
+        the address to listen on. The default only accepts local clients.
+    port : int
+        the port to listen on. 0 picks a free port, see :attr:`address`.
+    queue_size : int
+        maximum number of frames waiting to be sent per client. The oldest ones are dropped.
+    max_error : int, optional
+        if provided, depth and IR images are encoded with a :class:`synexens.codec.DepthCodec`
+        with this maximum reconstruction error, 0 meaning lossless. Otherwise they are sent raw.
+    keyframe_interval : int
+        the number of frames between two keyframes of the codec
+    """
+
+    def __init__(
+        self,
+        devices: tp.Optional[list] = None,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        queue_size: int = 4,
+        max_error: tp.Optional[int] = None,
+        keyframe_interval: int = 30,
+    ):
+        super().__init__()
+        if queue_size < 1:
+            raise ValueError(
+                f"Argument 'queue_size' must be positive. Got: {queue_size}."
+            )
+        self.devices = [] if devices is None else list(devices)
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.max_error = max_error
+        self.keyframe_interval = keyframe_interval
+        self.address = None
+        self.infos = {}
+
+        self._lock = threading.Lock()
+        self._clients = []
+        self._socket = None
+        self._accept_thread = None
+        self._unsubscribes = []
+        self._resolutions = (
+            {}
+        )  # the current resolution of each device, by serial number
+        self._stats = {"published": 0, "clients": 0}
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} address={self.address}, devices={list(self.infos)}>"
+
+    def open(self):
+        """Starts listening and publishing the frames of the devices."""
+        if self._socket is not None:
+            return
+        for device in self.devices:
+            self.infos[_get_serial(device.info)] = device.info
+        self._socket = socket.create_server((self.host, self.port))
+        self.address = self._socket.getsockname()[:2]
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+        for device in self.devices:
+            serial = _get_serial(device.info)
+            self._resolutions[serial] = device.resolution
+            callback = functools.partial(self._on_device_frame, device, serial)
+            self._unsubscribes.append(device.subscribe(callback))
+
+    def close(self):
+        """Stops publishing and disconnects all clients."""
+        if self._socket is None:
+            return
+        for unsubscribe in self._unsubscribes:
+            unsubscribe()
+        self._unsubscribes = []
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)  # wakes up the accept thread
+        except OSError:
+            pass
+        self._socket.close()
+        self._socket = None
+        self._accept_thread.join()
+        self._accept_thread = None
+        with self._lock:
+            clients = self._clients
+            self._clients = []
+        for client in clients:
+            client.close()
+
+    def _accept(self):
+        sock = self._socket
+        while True:
+            try:
+                conn, address = sock.accept()
+            except OSError:  # closed
+                return
+            try:
+                self._handshake(conn, address)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Handshake with {address} failed: {e}")
+                conn.close()
+
+    def _handshake(self, conn: socket.socket, address):
+        conn.settimeout(5.0)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        data = json.dumps(
+            {serial: info_to_json(info) for serial, info in self.infos.items()}
+        ).encode()
+        conn.sendall(INFO_HEADER.pack(INFO_MAGIC, len(data)) + data)
+
+        magic, version, n_frame_types, serial_len = SUBSCRIBE_HEADER.unpack(
+            _recv(conn, SUBSCRIBE_HEADER.size)
+        )
+        if magic != SUBSCRIBE_MAGIC or version != PROTOCOL_VERSION:
+            raise ValueError(
+                f"Invalid subscribe message with magic {magic!r} and version {version}"
+            )
+        client = _Client(self, conn, address)
+        client.frame_types = set(
+            struct.unpack(f"<{n_frame_types}i", _recv(conn, 4 * n_frame_types))
+        )
+        client.serial = _recv(conn, serial_len).decode()
+        conn.settimeout(None)
+        with self._lock:
+            self._clients.append(client)
+            self._stats["clients"] += 1
+        client.start()
+        logger.info(f"Client {address} subscribed.")
+
+    def _remove_client(self, client: _Client):
+        with self._lock:
+            if client not in self._clients:
+                return
+            self._clients.remove(client)
+        client.close()
+
+    def _get_resolution(self, device, serial: str, frames: dict):
+        """Gets the resolution of a frame of a device without calling the SDK, unless it changed
+        to a size the device does not report."""
+        resolution = self._resolutions[serial]
+        image = frames.get(SYFRAMETYPE_IR, frames.get(SYFRAMETYPE_DEPTH))
+        if image is None:
+            return resolution
+        height, width = image.shape[:2]
+        if RESOLUTION_SIZES.get(resolution) != (width, height):
+            try:
+                resolution = find_resolution(height, width, device.info["resolutions"])
+            except ValueError:
+                resolution = device.resolution
+            self._resolutions[serial] = resolution
+        return resolution
+
+    def _on_device_frame(self, device, serial: str, frames: dict):
+        self.publish(
+            serial,
+            frames,
+            device.frame_observer.sequence,
+            self._get_resolution(device, serial, frames),
+        )
+
+    def publish(
+        self,
+        serial: str,
+        frames: dict,
+        sequence: int,
+        resolution: int = 0,
+        timestamp: tp.Optional[int] = None,
+    ):
+        """Queues a frame for every client subscribed to its device.
+
+        The images must not be modified afterwards, since they are sent from the sender threads.
+
+        Parameters
+        ----------
+        serial : str
+            the serial number of the device, at most 16 bytes long once encoded
+        frames : dict
+            a dictionary mapping each frame type to an image
+        sequence : int
+            the sequence number of the frame
+        resolution : SYResolution
+            the resolution of the frame
+        timestamp : int, optional
+            the wall-clock time of the frame in nanoseconds, as returned by :func:`time.time_ns`.
+            If not provided, the current time is used.
+        """
+        if timestamp is None:
+            timestamp = time.time_ns()
+        item = (serial, int(resolution), sequence, timestamp, frames)
+        with self._lock:
+            self._stats["published"] += 1
+            clients = [x for x in self._clients if x.wants(serial)]
+        for client in clients:
+            client.put(item)
+
+    @property
+    def stats(self):
+        """Counters of the server.
+
+        A dictionary with keys:
+
+        - "published": number of frames published
+        - "clients": number of clients that have connected
+        - "connected": a dictionary mapping the address of each connected client to a dictionary
+          with the numbers of frames "sent" and "dropped" and the number of "bytes" sent
+        """
+        with self._lock:
+            res = dict(self._stats)
+            res["connected"] = {x.address: dict(x.stats) for x in self._clients}
+        return res
+
+
+class RemoteDevice(ReentrantContextManager):
+    """A device served by a remote :class:`FrameServer`.
+
+    Parameters
+    ----------
+    host : str
+        the address of the server
+    port : int
+        the port of the server
+    frame_types : list, optional
+        the frame types to receive. If not provided, all frame types are received.
+    serial : str, optional
+        the serial number of the device to receive. If not provided, the first device of the
+        server is used.
+    timeout : float
+        maximum number of seconds to wait for the connection and the handshake
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        frame_types: tp.Optional[list] = None,
+        serial: tp.Optional[str] = None,
+        timeout: float = 5.0,
+    ):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.frame_types = [] if frame_types is None else list(frame_types)
+        self.serial = serial
+        self.timeout = timeout
+        self.info = None
+        self.infos = None
+        self.closed = True
+
+        self._socket = None
+        self._thread = None
+        self._observer = None
+        self._lock = threading.Lock()
+        self._frames = None
+        self._sequence = 0
+        self._resolution = None
+        self._timestamp = None
+        self._error = None
+        self._reset_stats()
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} address={self.host}:{self.port}, serial={self.serial!r}, "
+            f"closed={self.closed}>"
+        )
+
+    def open(self):
+        """Connects to the server and starts receiving frames."""
+        if not self.closed:
+            return
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            magic, json_len = INFO_HEADER.unpack(_recv(sock, INFO_HEADER.size))
+            if magic != INFO_MAGIC:
+                raise ConnectionError(f"Invalid info message magic {magic!r}.")
+            self.infos = info_from_json(json.loads(_recv(sock, json_len)))
+            if self.serial is None:
+                if not self.infos:
+                    raise ConnectionError("The server does not publish any device.")
+                self.serial = next(iter(self.infos))
+            self.info = self.infos.get(self.serial)
+
+            serial = self.serial.encode()
+            sock.sendall(
+                SUBSCRIBE_HEADER.pack(
+                    SUBSCRIBE_MAGIC,
+                    PROTOCOL_VERSION,
+                    len(self.frame_types),
+                    len(serial),
+                )
+                + struct.pack(f"<{len(self.frame_types)}i", *self.frame_types)
+                + serial
+            )
+            sock.settimeout(None)
+        except BaseException:
+            sock.close()
+            raise
+        self._socket = sock
+        self._observer = FrameObserver()
+        self._error = None
+        self._reset_stats()
+        self.closed = False
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Disconnects from the server."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._observer.close()
+
+    def _receive(self):
+        codecs = {}
+        header = bytearray(IMAGE_HEADER.size)
+        frames = {}
+        n_wire = 0
+        try:
+            while True:
+                _recv_into(self._socket, header)
+                (
+                    magic,
+                    _,
+                    frame_type,
+                    resolution,
+                    sequence,
+                    timestamp,
+                    height,
+                    width,
+                    channels,
+                    itemsize,
+                    encoding,
+                    flags,
+                    payload_len,
+                ) = IMAGE_HEADER.unpack(header)
+                if magic != IMAGE_MAGIC:
+                    raise ConnectionError(f"Invalid image message magic {magic!r}.")
+                shape = (height, width, channels) if channels else (height, width)
+                img = np.empty(shape, dtype=np.uint16 if itemsize == 2 else np.uint8)
+                if encoding == ENCODING_DEPTH:
+                    codec = codecs.get(frame_type)
+                    if codec is None:
+                        codec = codecs[frame_type] = DepthCodec()
+                    codec.decode(_recv(self._socket, payload_len), out=img)
+                else:
+                    _recv_into(self._socket, img)
+                frames[frame_type] = img
+                n_wire += IMAGE_HEADER.size + payload_len
+                if flags & FLAG_LAST:
+                    self._on_frame(frames, sequence, resolution, timestamp, n_wire)
+                    frames = {}
+                    n_wire = 0
+        except (OSError, ValueError, RuntimeError) as e:
+            if not self.closed:
+                logger.warning(f"Connection to {self.host}:{self.port} lost: {e}")
+                self._error = e
+                self._observer.close()
+
+    def _on_frame(
+        self,
+        frames: dict,
+        sequence: int,
+        resolution: int,
+        timestamp: int,
+        n_wire: int,
+    ):
+        latency = (time.time_ns() - timestamp) * 1e-9
+        n_bytes = sum(x.nbytes for x in frames.values())
+        with self._lock:
+            self._frames = frames
+            self._sequence = sequence
+            self._resolution = resolution
+            self._timestamp = timestamp
+            stats = self._stats
+            stats["frames"] += 1
+            stats["bytes"] += n_bytes
+            stats["wire_bytes"] += n_wire
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+        self._observer.publish(frames, sequence=sequence)
+
+    def _reset_stats(self):
+        self._stats = {
+            "frames": 0,
+            "bytes": 0,
+            "wire_bytes": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+        self._stats_start = time.monotonic()
+
+    @property
+    def stats(self):
+        """Reception statistics since the connection or the last :meth:`reset_stats`.
+
+        A dictionary with keys:
+
+        - "frames": number of frames received
+        - "bytes": number of bytes of decoded images received
+        - "wire_bytes": number of bytes received from the socket
+        - "elapsed": number of seconds elapsed
+        - "fps": number of frames received per second
+        - "throughput": number of bytes of decoded images received per second
+        - "latency_mean": mean number of seconds between the timestamp of a frame and its
+          reception
+        - "latency_max": maximum latency in seconds
+        """
+        with self._lock:
+            res = dict(self._stats)
+            res["elapsed"] = time.monotonic() - self._stats_start
+        latency_total = res.pop("latency_total")
+        res["fps"] = res["frames"] / res["elapsed"] if res["elapsed"] > 0 else 0.0
+        res["throughput"] = res["bytes"] / res["elapsed"] if res["elapsed"] > 0 else 0.0
+        res["latency_mean"] = latency_total / res["frames"] if res["frames"] else 0.0
+        return res
+
+    def reset_stats(self):
+        """Resets the reception statistics."""
+        with self._lock:
+            self._reset_stats()
+
+    @property
+    def resolution(self):
+        """The resolution of the latest frame, or None if no frame has been received."""
+        return self._resolution
+
+    @property
+    def sequence(self):
+        """The sequence number of the latest frame. 0 means no frame yet."""
+        return self._sequence
+
+    @property
+    def timestamp(self):
+        """The server timestamp of the latest frame in nanoseconds, or None."""
+        return self._timestamp
+
+    def _check_connection(self):
+        if self.closed:
+            raise RuntimeError("The remote device is not opened.")
+        if self._error is not None:
+            raise ConnectionError(f"Connection to the server lost: {self._error}")
+
+    def get_last_frame_data(self, out: tp.Optional[dict] = None):
+        """Gets the latest frame received.
+
+        Parameters
+        ----------
+        out : dict, optional
+            a dictionary mapping each frame type to an image, typically the output of a previous
+            call. Images of the right shape and dtype are overwritten in place, others are
+            replaced.
+
+        Returns
+        -------
+        dict or None
+            a dictionary mapping each frame type to an image, or None if no frame has been
+            received yet
+        """
+        self._check_connection()
+        with self._lock:
+            frames = self._frames
+        if frames is None:
+            return None
+        if out is None:
+            return dict(frames)
+        for frame_type, img in frames.items():
+            dst = out.get(frame_type)
+            if dst is not None and dst.shape == img.shape and dst.dtype == img.dtype:
+                np.copyto(dst, img)
+            else:
+                out[frame_type] = img.copy()
+        return out
+
+    def wait_for_frame(self, timeout: tp.Optional[float] = None):
+        """Blocks until a new frame is received.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+
+        Returns
+        -------
+        dict or None
+            the new frame, or None if the timeout expired or the connection was lost
+        """
+        self._check_connection()
+        return self._observer.wait_for_frame(timeout)
+
+    def subscribe(self, callback: tp.Callable[[dict], None]):
+        """Subscribes a callback to every frame received.
+
+        Parameters
+        ----------
+        callback : function
+            a function taking the new frame as the only argument. It is invoked from the
+            receiver thread and must return quickly.
+
+        Returns
+        -------
+        function
+            a function without arguments to unsubscribe the callback
+        """
+        self._check_connection()
+        return self._observer.subscribe(callback)
@@ -0,0 +1,289 @@
+"""Push-based frame delivery.
+
+Frames are pushed by a frame driver into a :class:`FrameObserver`, which wakes up threads blocked
+in :meth:`FrameObserver.wait_for_frame` and invokes the subscribed callbacks. The
+:class:`SDKFrameDriver` pumps frames notified by the SDK through `RegisterFrameObserver`, or by a
+host backend of :mod:`synexens.backends`, while the
+:class:`FakeFrameDriver` generates synthetic frames so that the whole path can be exercised without
+a camera.
+"""
+
+
+import logging
+import threading
+import time
+
+from mt import tp, np
+
+from .const import SYFRAMETYPE_DEPTH, SYFRAMETYPE_IR
+
+
+__all__ = [
+    "FrameObserver",
+    "FrameDriver",
+    "SDKFrameDriver",
+    "FakeFrameDriver",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class FrameObserver:
+    """Dispatches the frames of one device to blocking waiters and subscribers.
+
+    Only the latest frame is kept. Consumers that fall behind skip frames rather than queue them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frames = None
+        self._sequence = 0
+        self._timestamp = None
+        self._closed = False
+        self._subscribers = []
+
+    @property
+    def sequence(self):
+        """The sequence number of the latest frame, starting from 1. 0 means no frame yet."""
+        return self._sequence
+
+    @property
+    def timestamp(self):
+        """The `time.monotonic_ns` value at which the latest frame was published, or None."""
+        return self._timestamp
+
+    def publish(self, frames: dict, sequence: tp.Optional[int] = None):
+        """Publishes a new frame.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping each frame type to an image, like the output of
+            :meth:`synexens.Device.get_last_frame_data`
+        sequence : int, optional
+            the sequence number of the frame. If not provided, the previous sequence number plus 1
+            is used.
+        """
+        with self._cond:
+            self._sequence = self._sequence + 1 if sequence is None else sequence
+            self._frames = frames
+            self._timestamp = time.monotonic_ns()
+            subscribers = list(self._subscribers)
+            self._cond.notify_all()
+
+        for callback in subscribers:
+            try:
+                callback(frames)
+            except Exception:
+                logger.exception(f"Frame callback {callback} raised an exception.")
+
+    def wait_for_frame(
+        self,
+        timeout: tp.Optional[float] = None,
+        after_sequence: tp.Optional[int] = None,
+    ):
+        """Blocks until a new frame arrives.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+        after_sequence : int, optional
+            if provided, any frame with a sequence number different from it is returned right away.
+            Otherwise, the call waits for the next frame to be published.
+
+        Returns
+        -------
+        dict or None
+            the new frame, or None if the timeout expired or the observer has been closed
+        """
+        with self._cond:
+            if after_sequence is None:
+                after_sequence = self._sequence
+            ready = lambda: self._sequence != after_sequence or self._closed
+            if (
+                not self._cond.wait_for(ready, timeout)
+                or self._sequence == after_sequence
+            ):
+                return None
+            return self._frames
+
+    def subscribe(self, callback: tp.Callable[[dict], None]):
+        """Subscribes a callback to every new frame.
+
+        The callback is invoked from the thread of the frame driver and must therefore return
+        quickly.
+
+        Parameters
+        ----------
+        callback : function
+            a function taking the new frame as the only argument
+
+        Returns
+        -------
+        function
+            a function without arguments to unsubscribe the callback
+        """
+        with self._cond:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def close(self):
+        """Closes the observer, waking up all waiting threads."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FrameDriver(threading.Thread):
+    """A background thread pushing frames to a frame observer.
+
+    Subclasses implement :meth:`next_frame`.
+
+    Parameters
+    ----------
+    observer : FrameObserver
+        the observer to publish frames to
+    """
+
+    def __init__(self, observer: FrameObserver):
+        super().__init__(daemon=True)
+        self.observer = observer
+        self._stop_event = threading.Event()
+
+    def next_frame(self):
+        """Blocks for a short while until a new frame is available.
+
+        Returns
+        -------
+        tuple or None
+            a `(sequence, frames)` pair, or None if no frame arrived in time
+        """
+        raise NotImplementedError
+
+    def run(self):
+        while not self._stop_event.is_set():
+            res = self.next_frame()
+            if res is not None and not self._stop_event.is_set():
+                self.observer.publish(res[1], sequence=res[0])
+
+    def stop(self):
+        """Stops the driver and waits for its thread to end."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class SDKFrameDriver(FrameDriver):
+    """Pushes the frames that the SDK notifies for a device.
+
+    Parameters
+    ----------
+    observer : FrameObserver
+        the observer to publish frames to
+    device_id : int
+        the device id
+    poll_interval : float
+        maximum number of seconds to block inside the SDK, so that :meth:`stop` stays responsive
+    backend : object, optional
+        the backend notifying the frames, see :mod:`synexens.backends`. If not provided, the
+        `synexens_sdk` module is used directly.
+    """
+
+    def __init__(
+        self,
+        observer: FrameObserver,
+        device_id: int,
+        poll_interval: float = 0.1,
+        backend=None,
+    ):
+        super().__init__(observer)
+
+        if backend is None:
+            import synexens_sdk as backend
+
+        self._sdk = backend
+        self.device_id = device_id
+        self.poll_interval = poll_interval
+        self._sequence = 0
+        backend.register_frame_observer()
+
+    def next_frame(self):
+        res = self._sdk.wait_frame_notify(
+            self.device_id, self._sequence, self.poll_interval
+        )
+        if res is not None:
+            self._sequence = res[0]
+        return res
+
+    def stop(self):
+        self._stop_event.set()
+        self._sdk.interrupt_frame_observer()
+        super().stop()
+
+
+class FakeFrameDriver(FrameDriver):
+    """Pushes synthetic frames at a fixed rate, without any camera.
+
+    Parameters
+    ----------
+    observer : FrameObserver
+        the observer to publish frames to
+    fps : float
+        number of frames per second
+    width : int
+        frame width
+    height : int
+        frame height
+    frame_factory : function, optional
+        a function taking the sequence number and returning the frame, a dictionary mapping each
+        frame type to an image. If not provided, a depth image and an IR image with moving ramps
+        are generated.
+    """
+
+    def __init__(
+        self,
+        observer: FrameObserver,
+        fps: float = 30.0,
+        width: int = 640,
+        height: int = 480,
+        frame_factory: tp.Optional[tp.Callable[[int], dict]] = None,
+    ):
+        super().__init__(observer)
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frame_factory = (
+            self.make_ramp_frame if frame_factory is None else frame_factory
+        )
+        self._sequence = 0
+        self._next_ts = None
+
+    def make_ramp_frame(self, sequence: int):
+        """Makes a frame with a depth ramp and an IR ramp shifting with the sequence number."""
+        x = np.arange(self.width, dtype=np.uint32)[np.newaxis, :]
+        y = np.arange(self.height, dtype=np.uint32)[:, np.newaxis]
+        depth = 500 + (x + y + sequence * 4) % 6500
+        ir = (x * 2 + sequence * 8) % 2048 + y * 0
+        return {
+            SYFRAMETYPE_DEPTH: depth.astype(np.uint16)[:, :, np.newaxis],
+            SYFRAMETYPE_IR: ir.astype(np.uint16)[:, :, np.newaxis],
+        }
+
+    def next_frame(self):
+        now = time.monotonic()
+        if self._next_ts is None:
+            self._next_ts = now
+        delay = self._next_ts - now
+        if delay > 0 and self._stop_event.wait(delay):
+            return None
+        self._next_ts += 1.0 / self.fps
+        self._sequence += 1
+        return self._sequence, self.frame_factory(self._sequence)
@@ -0,0 +1,651 @@
+"""Multi-process frame processing over shared memory.
+
+CPU-heavy per-frame work does not scale within one interpreter, and pickling frames to worker
+processes costs more than the work itself. A :class:`Pipeline` copies every submitted frame into a
+slot of a :class:`SharedSlotPool`, a block of shared memory holding preallocated arrays, and only
+sends the slot indices to its worker processes. The workers run the user stages, which write their
+results into a slot of a second pool, and the results are handed back as :class:`PipelineResult`
+views. Slots are reference-counted in the submitting process and recycled once released.
+"""
+
+
+import collections
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+
+from mt import tp, np
+
+from .base import ReentrantContextManager
+from .pool import get_frame_shape, get_frame_dtype
+
+
+__all__ = [
+    "POLICIES",
+    "get_frame_layout",
+    "SharedSlotPool",
+    "PipelineResult",
+    "Pipeline",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+# what to do with a new frame when no slot is free
+POLICIES = ["drop-newest", "block"]
+
+# alignment in bytes of every array in a slot
+ALIGNMENT = 64
+
+
+def get_frame_layout(resolution: int, frame_types: list):
+    """Gets the slot layout of the frames of some frame types at a given resolution.
+
+    Returns
+    -------
+    dict
+        a dictionary mapping each frame type to a `(shape, dtype)` pair
+    """
+    return {
+        frame_type: (
+            get_frame_shape(frame_type, resolution),
+            get_frame_dtype(frame_type),
+        )
+        for frame_type in frame_types
+    }
+
+
+class SharedSlotPool:
+    """Slots of named arrays in a single block of shared memory.
+
+    The process creating the pool owns the shared memory and the reference counts of the slots.
+    Other processes attach to it with :meth:`attach` and only access the arrays.
+
+    Parameters
+    ----------
+    layout : dict
+        a dictionary mapping the name of each array of a slot to a `(shape, dtype)` pair
+    n_slots : int
+        number of slots
+    name : str, optional
+        the name of an existing shared memory block to attach to. If not provided, a new block
+        is created.
+    """
+
+    def __init__(self, layout: dict, n_slots: int, name: tp.Optional[str] = None):
+        if n_slots < 1:
+            raise ValueError(f"Argument 'n_slots' must be positive. Got: {n_slots}.")
+        self.layout = {
+            key: (tuple(shape), np.dtype(dtype))
+            for key, (shape, dtype) in layout.items()
+        }
+        self.n_slots = n_slots
+
+        offsets = {}
+        nbytes = 0
+        for key, (shape, dtype) in self.layout.items():
+            offsets[key] = nbytes
+            size = int(np.prod(shape)) * dtype.itemsize
+            nbytes += -(-size // ALIGNMENT) * ALIGNMENT
+        self.slot_nbytes = nbytes
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=max(1, n_slots * nbytes)
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._slots = [
+            {
+                key: np.ndarray(
+                    shape,
+                    dtype=dtype,
+                    buffer=self.shm.buf,
+                    offset=slot * nbytes + offsets[key],
+                )
+                for key, (shape, dtype) in self.layout.items()
+            }
+            for slot in range(n_slots)
+        ]
+
+        self._cond = threading.Condition()
+        self._refcounts = [0] * n_slots
+        self._free = collections.deque(range(n_slots))
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} '{self.shm.name}', n_slots={self.n_slots}, "
+            f"slot_nbytes={self.slot_nbytes}>"
+        )
+
+    @property
+    def spec(self):
+        """A picklable tuple to attach to the pool from another process."""
+        return (self.layout, self.n_slots, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        """Attaches to the pool of another process, given its :attr:`spec`."""
+        layout, n_slots, name = spec
+        return cls(layout, n_slots, name=name)
+
+    def __getitem__(self, slot: int):
+        """Gets a dictionary mapping the name of each array of a slot to a writable array."""
+        return self._slots[slot]
+
+    @property
+    def n_free(self):
+        """Number of free slots."""
+        return len(self._free)
+
+    def acquire(self, timeout: tp.Optional[float] = 0.0):
+        """Takes a free slot, with a reference count of 1.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait for a slot to be released. None means waiting
+            forever.
+
+        Returns
+        -------
+        int or None
+            the slot, or None if no slot became free in time
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout):
+                return None
+            slot = self._free.popleft()
+            self._refcounts[slot] = 1
+            return slot
+
+    def incref(self, slot: int):
+        """Adds a reference to a slot in use."""
+        with self._cond:
+            if self._refcounts[slot] < 1:
+                raise ValueError(f"Slot {slot} is not in use.")
+            self._refcounts[slot] += 1
+
+    def release(self, slot: int):
+        """Drops a reference to a slot, freeing it when no reference is left."""
+        with self._cond:
+            if self._refcounts[slot] < 1:
+                raise ValueError(f"Slot {slot} is not in use.")
+            self._refcounts[slot] -= 1
+            if self._refcounts[slot] == 0:
+                self._free.append(slot)
+                self._cond.notify()
+
+    def close(self):
+        """Detaches from the shared memory, which is also destroyed by the owner."""
+        if self._slots is None:
+            return
+        self._slots = None
+        try:
+            self.shm.close()
+        except BufferError:  # views still alive, the mapping goes away with them
+            logger.warning(f"Closing {self} while some of its arrays are in use.")
+        if self.owner:
+            self.shm.unlink()
+
+
+def _run_worker(in_spec, out_spec, stages, tasks, results):
+    """The loop of a worker process."""
+    in_pool = SharedSlotPool.attach(in_spec)
+    out_pool = SharedSlotPool.attach(out_spec)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, in_slot, out_slot = task
+            t0 = time.perf_counter()
+            try:
+                frames = in_pool[in_slot]
+                outputs = out_pool[out_slot]
+                value = None
+                for stage in stages:
+                    value = stage(frames, outputs)
+                results.put((index, value, time.perf_counter() - t0, None))
+            except Exception:
+                results.put(
+                    (index, None, time.perf_counter() - t0, traceback.format_exc())
+                )
+    finally:
+        in_pool.close()
+        out_pool.close()
+
+
+class PipelineResult(Mapping):
+    """Read-only views of the results of a frame, held in a slot of the pipeline.
+
+    It behaves like a dictionary mapping the name of each output to an array. The views must not
+    be used after :meth:`release`, because the slot may be overwritten by the results of a newer
+    frame. It can be used as a context manager to release the slot on exit.
+
+    Attributes
+    ----------
+    index : int
+        the index of the frame in submission order, starting from 0
+    source : object
+        the source of the frame, as given to :meth:`Pipeline.submit`
+    sequence : int or None
+        the sequence number of the frame, as given to :meth:`Pipeline.submit`
+    value : object
+        the value returned by the last stage
+    elapsed : float
+        number of seconds the stages took
+    latency : float
+        number of seconds from the submission of the frame to the reception of its results
+    frames : dict or None
+        read-only views of the submitted frame if the pipeline keeps the frames, else None
+    """
+
+    def __init__(self, pipeline, job, value, elapsed: float):
+        self.index = job.index
+        self.source = job.source
+        self.sequence = job.sequence
+        self.value = value
+        self.elapsed = elapsed
+        self.latency = (time.monotonic_ns() - job.timestamp) / 1e9
+        self._pipeline = pipeline
+        self._slots = (job.in_slot, job.out_slot)
+        self._views = _make_read_only(pipeline.out_pool[job.out_slot])
+        self.frames = (
+            _make_read_only(pipeline.in_pool[job.in_slot])
+            if job.in_slot is not None
+            else None
+        )
+
+    def __del__(self):
+        self.release()
+
+    def __getitem__(self, name):
+        return self._views[name]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} index={self.index}, source={self.source}, "
+            f"outputs={list(self._views)}, released={self.released}>"
+        )
+
+    @property
+    def released(self):
+        """Whether the slots have been given back to the pipeline."""
+        return self._slots is None
+
+    def release(self):
+        """Gives the slots back to the pipeline."""
+        if self._slots is not None:
+            in_slot, out_slot = self._slots
+            self._slots = None
+            if in_slot is not None:
+                self._pipeline.in_pool.release(in_slot)
+            self._pipeline.out_pool.release(out_slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def _make_read_only(arrays: dict):
+    views = {}
+    for key, arr in arrays.items():
+        view = arr.view()
+        view.flags.writeable = False
+        views[key] = view
+    return views
+
+
+class _Job:
+    __slots__ = ("index", "source", "sequence", "timestamp", "in_slot", "out_slot")
+
+    def __init__(self, index, source, sequence, in_slot, out_slot):
+        self.index = index
+        self.source = source
+        self.sequence = sequence
+        self.timestamp = time.monotonic_ns()
+        self.in_slot = in_slot
+        self.out_slot = out_slot
+
+
+class _PipelineSink:
+    """Submits the frames published by a frame driver on behalf of a source."""
+
+    def __init__(self, pipeline, source):
+        self.pipeline = pipeline
+        self.source = source
+
+    def publish(self, frames: dict, sequence: tp.Optional[int] = None):
+        self.pipeline.submit(frames, sequence=sequence, source=self.source)
+
+
+class Pipeline(ReentrantContextManager):
+    """A pool of worker processes running stages on frames held in shared memory.
+
+    Every stage is a function `stage(frames, outputs)` taking a dictionary mapping each frame type
+    to a read-only image, and a dictionary mapping the name of each output to a writable array to
+    fill. The value returned by the last stage is pickled back with the results, so it should be
+    small. Stages are pickled to the workers, so they must be defined at module level.
+
+    Parameters
+    ----------
+    stages : list
+        the stages, run in order on every frame
+    outputs : dict
+        a dictionary mapping the name of each output to a `(shape, dtype)` pair
+    resolution : SYResolution
+        the resolution of the frames
+    frame_types : list
+        the frame types of the frames
+    n_workers : int, optional
+        number of worker processes. If not provided, the number of CPUs is used.
+    n_slots : int, optional
+        number of frames and results that can be in flight or held at the same time. If not
+        provided, twice the number of workers plus 2.
+    policy : {'drop-newest', 'block'}
+        what to do with a new frame when no slot is free: drop it, or block until one is released
+    keep_frames : bool
+        whether the results hold the frame they were computed from, in which case the frame slot
+        is released with the results instead of as soon as the stages are done
+    mp_context : str
+        the start method of the worker processes. Forking a process running SDK threads is unsafe,
+        hence 'spawn' by default.
+    """
+
+    def __init__(
+        self,
+        stages: list,
+        outputs: dict,
+        resolution: int,
+        frame_types: list,
+        n_workers: tp.Optional[int] = None,
+        n_slots: tp.Optional[int] = None,
+        policy: str = "drop-newest",
+        keep_frames: bool = False,
+        mp_context: str = "spawn",
+    ):
+        super().__init__()
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Expected one of {POLICIES}.")
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if n_workers < 1:
+            raise ValueError(
+                f"Argument 'n_workers' must be positive. Got: {n_workers}."
+            )
+        self.stages = list(stages)
+        self.outputs = dict(outputs)
+        self.resolution = resolution
+        self.frame_types = list(frame_types)
+        self.n_workers = n_workers
+        self.n_slots = 2 * n_workers + 2 if n_slots is None else n_slots
+        self.policy = policy
+        self.keep_frames = keep_frames
+        self.mp_context = mp_context
+        self.closed = True
+        self.in_pool = None
+        self.out_pool = None
+
+        self._lock = threading.Lock()
+        self._workers = []
+        self._jobs = {}
+        self._results = queue.Queue()
+        self._collector = None
+        self._n_jobs = 0
+        self._reset_stats()
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} n_workers={self.n_workers}, n_slots={self.n_slots}, "
+            f"closed={self.closed}>"
+        )
+
+    @classmethod
+    def from_device(cls, device, stages: list, outputs: dict, **kwargs):
+        """Creates a pipeline for the current resolution and frame types of a device."""
+        return cls(
+            stages, outputs, device.resolution, device.get_frame_types(), **kwargs
+        )
+
+    def open(self):
+        """Allocates the slot pools and starts the worker processes."""
+        if not self.closed:
+            return
+        ctx = multiprocessing.get_context(self.mp_context)
+        self.in_pool = SharedSlotPool(
+            get_frame_layout(self.resolution, self.frame_types), self.n_slots
+        )
+        self.out_pool = SharedSlotPool(self.outputs, self.n_slots)
+        self._tasks = ctx.SimpleQueue()
+        self._done = ctx.SimpleQueue()
+        self._workers = [
+            ctx.Process(
+                target=_run_worker,
+                args=(
+                    self.in_pool.spec,
+                    self.out_pool.spec,
+                    self.stages,
+                    self._tasks,
+                    self._done,
+                ),
+                name=f"synexens-pipeline-{i}",
+                daemon=True,
+            )
+            for i in range(self.n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._collector = threading.Thread(
+            target=self._collect, name="synexens-pipeline-collector", daemon=True
+        )
+        self._collector.start()
+        self.closed = False
+
+    def close(self, timeout: float = 5.0):
+        """Stops the worker processes and frees the shared memory.
+
+        Frames in flight are abandoned and results not consumed yet are dropped.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f"Terminating unresponsive worker {worker.name}.")
+                worker.terminate()
+                worker.join()
+        self._workers = []
+        self._done.put(None)
+        self._collector.join()
+        self._collector = None
+        with self._lock:
+            self._jobs = {}
+        while True:
+            try:
+                self._results.get_nowait()
+            except queue.Empty:
+                break
+        self.in_pool.close()
+        self.out_pool.close()
+
+    def _reset_stats(self):
+        self._stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "completed": 0,
+            "failed": 0,
+            "busy_time": 0.0,
+        }
+
+    @property
+    def stats(self):
+        """Counters of the pipeline.
+
+        A dictionary with keys:
+
+        - "submitted": number of frames accepted
+        - "dropped": number of frames dropped because no slot was free
+        - "completed": number of frames processed successfully
+        - "failed": number of frames on which a stage raised an exception
+        - "busy_time": total number of seconds the workers spent running stages
+        - "in_flight": number of frames submitted and not processed yet
+        """
+        with self._lock:
+            res = dict(self._stats)
+            res["in_flight"] = len(self._jobs)
+        return res
+
+    def reset_stats(self):
+        """Resets all counters."""
+        with self._lock:
+            self._reset_stats()
+
+    def submit(
+        self,
+        frames: dict,
+        sequence: tp.Optional[int] = None,
+        source=None,
+        timeout: tp.Optional[float] = None,
+    ):
+        """Copies a frame into shared memory and queues it for processing.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping each frame type of the pipeline to an image
+        sequence : int, optional
+            the sequence number of the frame, passed through to the results
+        source : object, optional
+            the source of the frame, e.g. a device id, passed through to the results
+        timeout : float, optional
+            with the 'block' policy, maximum number of seconds to wait for a free slot. None means
+            waiting forever.
+
+        Returns
+        -------
+        int or None
+            the index of the frame, or None if it was dropped
+        """
+        if self.closed:
+            raise RuntimeError("The pipeline is closed.")
+        missing = [x for x in self.frame_types if x not in frames]
+        if missing:
+            raise ValueError(f"The frames miss frame types {missing}.")
+
+        wait = timeout if self.policy == "block" else 0.0
+        in_slot = self.in_pool.acquire(wait)
+        out_slot = None
+        if in_slot is not None:
+            out_slot = self.out_pool.acquire(wait)
+            if out_slot is None:
+                self.in_pool.release(in_slot)
+        if out_slot is None:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return None
+
+        buffers = self.in_pool[in_slot]
+        for frame_type in self.frame_types:
+            np.copyto(buffers[frame_type], frames[frame_type])
+        with self._lock:
+            index = self._n_jobs
+            self._n_jobs += 1
+            self._jobs[index] = _Job(index, source, sequence, in_slot, out_slot)
+            self._stats["submitted"] += 1
+        self._tasks.put((index, in_slot, out_slot))
+        return index
+
+    def publish(self, frames: dict, sequence: tp.Optional[int] = None):
+        """Submits a frame without a source, to act as the observer of a frame driver."""
+        self.submit(frames, sequence=sequence)
+
+    def sink(self, source):
+        """Gets an observer submitting the frames published to it on behalf of a source.
+
+        Parameters
+        ----------
+        source : object
+            the source of the frames, e.g. a device id
+
+        Returns
+        -------
+        object
+            an object with a `publish(frames, sequence)` method, to be driven by a
+            :class:`synexens.observer.SDKFrameDriver`
+        """
+        return _PipelineSink(self, source)
+
+    def _collect(self):
+        """Receives the results from the workers."""
+        while True:
+            message = self._done.get()
+            if message is None:
+                break
+            index, value, elapsed, error = message
+            with self._lock:
+                job = self._jobs.pop(index, None)
+                if job is None:
+                    continue
+                self._stats["busy_time"] += elapsed
+                self._stats["failed" if error else "completed"] += 1
+            if not self.keep_frames or error:
+                self.in_pool.release(job.in_slot)
+                job.in_slot = None
+            if error:
+                self.out_pool.release(job.out_slot)
+                self._results.put((job, error))
+            else:
+                self._results.put((PipelineResult(self, job, value, elapsed), None))
+
+    def get(self, timeout: tp.Optional[float] = None):
+        """Waits for the results of a frame, in completion order.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+
+        Returns
+        -------
+        PipelineResult or None
+            the results of the first frame processed and not consumed yet, or None if the timeout
+            expired
+
+        Raises
+        ------
+        RuntimeError
+            if a stage raised an exception on that frame
+        """
+        try:
+            result, error = self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if error:
+            raise RuntimeError(
+                f"A stage failed on frame {result.index} of source {result.source}:\n{error}"
+            )
+        return result
@@ -0,0 +1,444 @@
+"""Point cloud downsampling and spatial queries.
+
+A 640x480 depth frame deprojects to 307200 points, far more than obstacle detection or network
+streaming need. :class:`VoxelGrid` bins points into cubic voxels and keeps the centroid, and
+optionally the average colour, of every occupied voxel. :class:`GridIndex` bins points into
+cells to answer radius and k-nearest-neighbour queries.
+
+Both bin points with a vectorized open-addressing hash table over packed voxel coordinates, so
+binning runs in expected linear time instead of sorting. The hash table is kept and reused across
+frames, and is only reallocated when a frame has more points than any before.
+"""
+
+
+from mt import tp, np
+
+
+__all__ = [
+    "get_valid_mask",
+    "VoxelGrid",
+    "GridIndex",
+]
+
+
+# number of bits of each packed voxel coordinate
+COORD_BITS = 21
+COORD_OFFSET = 1 << (COORD_BITS - 1)
+
+# marks the empty slots of a hash table
+EMPTY = np.int64(-1)
+
+# Fibonacci hashing multiplier
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def get_valid_mask(points: np.ndarray, depth_range: tp.Optional[tuple] = None):
+    """Gets the mask of the valid points of a point cloud.
+
+    Pixels with zero depth are deprojected to the origin, so points with a non-positive z are
+    invalid, as are points whose z falls out of the depth range.
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        the points of shape `(..., 3)`, in millimetres like the SDK's point clouds
+    depth_range : tuple, optional
+        a `(min, max)` pair of depths in millimetres, e.g. the distance measure range of the
+        device. If not provided, only zero depth is masked.
+
+    Returns
+    -------
+    numpy.ndarray
+        a boolean array of shape `points.shape[:-1]`
+    """
+    z = points[..., 2]
+    valid = z > 0
+    if depth_range is not None:
+        valid &= (z >= depth_range[0]) & (z <= depth_range[1])
+    return valid
+
+
+def _get_depth_range(device):
+    return (device.info["distance_measure_min"], device.info["distance_measure_max"])
+
+
+class _HashTable:
+    """An open-addressing hash table of non-negative int64 keys with vectorized linear probing."""
+
+    def __init__(self, capacity: int = 0):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.reserve(capacity)
+
+    def reserve(self, n_keys: int):
+        """Empties the table, growing it to hold `n_keys` keys at a load factor of at most 0.5."""
+        size = 1 << max(4, int(2 * max(n_keys, 1) - 1).bit_length())
+        if size > len(self.keys):
+            self.keys = np.empty(size, dtype=np.int64)
+        self.keys.fill(EMPTY)
+
+    def _hash(self, keys: np.ndarray):
+        shift = np.uint64(64 - (len(self.keys).bit_length() - 1))
+        return ((keys.astype(np.uint64) * HASH_MULTIPLIER) >> shift).astype(np.int64)
+
+    def insert(self, keys: np.ndarray):
+        """Inserts keys, returning the slot of each of them. The table must have room for them."""
+        mask = len(self.keys) - 1
+        table = self.keys
+        slots = self._hash(keys)
+        res = np.empty(len(keys), dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            k = keys[pending]
+            s = slots[pending]
+            empty = table[s] == EMPTY
+            # among colliding keys claiming the same empty slot, the last one wins
+            table[s[empty]] = k[empty]
+            hit = table[s] == k
+            res[pending[hit]] = s[hit]
+            pending = pending[~hit]
+            slots[pending] = (s[~hit] + 1) & mask
+        return res
+
+    def lookup(self, keys: np.ndarray):
+        """Gets the slot of each key, or -1 for the keys not in the table."""
+        mask = len(self.keys) - 1
+        table = self.keys
+        slots = self._hash(keys)
+        res = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            s = slots[pending]
+            k = table[s]
+            hit = k == keys[pending]
+            res[pending[hit]] = s[hit]
+            more = ~hit & (k != EMPTY)
+            pending = pending[more]
+            slots[pending] = (s[more] + 1) & mask
+        return res
+
+    def get_ranks(self):
+        """Gets the rank of every slot among the occupied slots, and the number of them."""
+        occupied = self.keys != EMPTY
+        ranks = np.cumsum(occupied) - 1
+        return ranks, int(ranks[-1]) + 1 if len(ranks) else 0
+
+
+def _pack(cells: np.ndarray):
+    """Packs integer voxel coordinates of shape `(N, 3)` into non-negative int64 keys."""
+    shifted = cells + COORD_OFFSET
+    if len(shifted) and (shifted.min() < 0 or shifted.max() >= (1 << COORD_BITS)):
+        raise ValueError(
+            f"Point coordinates span more than {1 << COORD_BITS} voxels. Use larger voxels."
+        )
+    return (
+        (shifted[:, 0] << (2 * COORD_BITS))
+        | (shifted[:, 1] << COORD_BITS)
+        | shifted[:, 2]
+    )
+
+
+def _get_cells(points: np.ndarray, size: float):
+    return np.floor(points / size).astype(np.int64)
+
+
+class VoxelGrid:
+    """Downsamples point clouds to the centroids of the occupied voxels of a grid.
+
+    Parameters
+    ----------
+    voxel_size : float
+        the side of the voxels, in the unit of the points
+    depth_range : tuple, optional
+        a `(min, max)` pair of depths out of which points are dropped. Points with zero depth are
+        always dropped.
+    """
+
+    def __init__(self, voxel_size: float, depth_range: tp.Optional[tuple] = None):
+        if voxel_size <= 0:
+            raise ValueError(
+                f"Argument 'voxel_size' must be positive. Got: {voxel_size}."
+            )
+        self.voxel_size = voxel_size
+        self.depth_range = depth_range
+        self._table = _HashTable()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} voxel_size={self.voxel_size}, depth_range={self.depth_range}>"
+
+    @classmethod
+    def from_device(cls, device, voxel_size: float):
+        """Creates a voxel grid dropping the points out of the distance measure range of a device."""
+        return cls(voxel_size, depth_range=_get_depth_range(device))
+
+    def downsample(
+        self,
+        points: np.ndarray,
+        colors: tp.Optional[np.ndarray] = None,
+        min_count: int = 1,
+    ):
+        """Downsamples a point cloud.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            the points of shape `(..., 3)`, e.g. an organized point cloud of shape
+            `(height, width, 3)` as returned by :meth:`synexens.Device.get_depth_point_cloud`
+        colors : numpy.ndarray, optional
+            the uint8 RGB colours of the points, of the same shape
+        min_count : int
+            the minimum number of points of a voxel to keep it, to drop isolated noise
+
+        Returns
+        -------
+        centroids : numpy.ndarray
+            the float32 centroids of shape `(K, 3)` of the K occupied voxels
+        colors : numpy.ndarray or None
+            the uint8 average colours of shape `(K, 3)`, if colours were provided
+        counts : numpy.ndarray
+            the number of points of each voxel
+        """
+        points = points.reshape(-1, 3)
+        valid = get_valid_mask(points, self.depth_range)
+        if not valid.all():
+            points = points[valid]
+            if colors is not None:
+                colors = colors.reshape(-1, 3)[valid]
+        elif colors is not None:
+            colors = colors.reshape(-1, 3)
+
+        self._table.reserve(len(points))
+        slots = self._table.insert(_pack(_get_cells(points, self.voxel_size)))
+        ranks, n_voxels = self._table.get_ranks()
+        ids = ranks[slots]
+
+        counts = np.bincount(ids, minlength=n_voxels)
+        keep = counts >= min_count if min_count > 1 else slice(None)
+        counts = counts[keep]
+        centroids = np.empty((len(counts), 3), dtype=np.float32)
+        for c in range(3):
+            sums = np.bincount(ids, weights=points[:, c], minlength=n_voxels)[keep]
+            np.divide(sums, counts, out=centroids[:, c], casting="unsafe")
+        if colors is None:
+            return centroids, None, counts
+
+        avg_colors = np.empty((len(counts), 3), dtype=np.uint8)
+        for c in range(3):
+            sums = np.bincount(ids, weights=colors[:, c], minlength=n_voxels)[keep]
+            np.copyto(avg_colors[:, c], np.rint(sums / counts), casting="unsafe")
+        return centroids, avg_colors, counts
+
+
+class GridIndex:
+    """A uniform grid over a point cloud for radius and k-nearest-neighbour queries.
+
+    The index is rebuilt for every frame with :meth:`build`, reusing its hash table. Queries only
+    visit the cells around the query points, so they are fast when the cell size is close to the
+    query radius.
+
+    Parameters
+    ----------
+    cell_size : float
+        the side of the cells, in the unit of the points
+    depth_range : tuple, optional
+        a `(min, max)` pair of depths out of which points are not indexed. Points with zero depth
+        are never indexed.
+    """
+
+    # number of rings of cells visited by k-nearest-neighbour queries before brute force
+    max_rings = 8
+
+    def __init__(self, cell_size: float, depth_range: tp.Optional[tuple] = None):
+        if cell_size <= 0:
+            raise ValueError(
+                f"Argument 'cell_size' must be positive. Got: {cell_size}."
+            )
+        self.cell_size = cell_size
+        self.depth_range = depth_range
+        self.points = np.empty((0, 3), dtype=np.float32)
+        self.indices = np.empty(0, dtype=np.int64)
+        self._table = _HashTable()
+        self._starts = np.zeros(1, dtype=np.int64)
+        self._cell_min = self._cell_max = np.zeros(3, dtype=np.int64)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} cell_size={self.cell_size}, n_points={len(self.points)}>"
+
+    @classmethod
+    def from_device(cls, device, cell_size: float):
+        """Creates an index ignoring the points out of the distance measure range of a device."""
+        return cls(cell_size, depth_range=_get_depth_range(device))
+
+    def build(self, points: np.ndarray):
+        """Indexes a point cloud, replacing the previous one.
+
+        Parameters
+        ----------
+        points : numpy.ndarray
+            the points of shape `(..., 3)`. Query results refer to them by their flat index.
+        """
+        points = points.reshape(-1, 3)
+        indices = np.flatnonzero(get_valid_mask(points, self.depth_range))
+        valid_points = points[indices]
+        cells = _get_cells(valid_points, self.cell_size)
+
+        self._table.reserve(len(valid_points))
+        slots = self._table.insert(_pack(cells))
+        ranks, n_cells = self._table.get_ranks()
+        ids = ranks[slots]
+        self._ranks = ranks
+
+        order = np.argsort(ids, kind="stable")
+        self.points = valid_points[order]
+        self.indices = indices[order]
+        self._starts = np.zeros(n_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ids, minlength=n_cells), out=self._starts[1:])
+        if len(cells):
+            self._cell_min = cells.min(axis=0)
+            self._cell_max = cells.max(axis=0)
+
+    def _get_candidates(self, queries: np.ndarray, ring: int):
+        """Gets the (query, sorted point) pairs of the points in the cells around each query.
+
+        Only the shell of cells at Chebyshev distance `ring` is visited when `ring` > 0 and the
+        inner cells were visited before, see :meth:`query_knn`.
+        """
+        r = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+        if ring > 0:
+            offsets = offsets[np.abs(offsets).max(axis=1) == ring]
+        query_cells = _get_cells(queries, self.cell_size)
+        cells = (query_cells[:, np.newaxis, :] + offsets[np.newaxis, :, :]).reshape(
+            -1, 3
+        )
+        inside = np.all((cells >= self._cell_min) & (cells <= self._cell_max), axis=1)
+        pair_queries = np.repeat(np.arange(len(queries)), len(offsets))[inside]
+        slots = self._table.lookup(_pack(cells[inside]))
+        found = slots >= 0
+        pair_queries = pair_queries[found]
+        ids = self._ranks[slots[found]]
+        starts = self._starts[ids]
+        counts = self._starts[ids + 1] - starts
+
+        # expand the [start, start + count) ranges into the positions of the points
+        total = int(counts.sum())
+        ends = np.cumsum(counts)
+        positions = np.arange(total) - np.repeat(ends - counts - starts, counts)
+        return np.repeat(pair_queries, counts), positions
+
+    def query_radius(
+        self,
+        queries: np.ndarray,
+        radius: float,
+        return_distances: bool = False,
+    ):
+        """Finds the points within a radius of each query point.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            the query points of shape `(Q, 3)`
+        radius : float
+            the radius
+        return_distances : bool
+            whether to also return the distances
+
+        Returns
+        -------
+        indices : list
+            for each query, the int64 array of the flat indices of the points within the radius,
+            sorted by distance
+        distances : list
+            for each query, the array of the distances, if requested
+        """
+        queries = np.asarray(queries).reshape(-1, 3)
+        ring = int(np.ceil(radius / self.cell_size))
+        pairs = [self._get_candidates(queries, x) for x in range(ring + 1)]
+        pair_queries = np.concatenate([x[0] for x in pairs])
+        positions = np.concatenate([x[1] for x in pairs])
+        d2 = ((self.points[positions] - queries[pair_queries]) ** 2).sum(axis=1)
+        within = d2 <= radius * radius
+        pair_queries, positions, d2 = (
+            pair_queries[within],
+            positions[within],
+            d2[within],
+        )
+
+        order = np.lexsort((d2, pair_queries))
+        pair_queries, positions, d2 = pair_queries[order], positions[order], d2[order]
+        splits = np.cumsum(np.bincount(pair_queries, minlength=len(queries)))[:-1]
+        indices = np.split(self.indices[positions], splits)
+        if not return_distances:
+            return indices
+        return indices, np.split(np.sqrt(d2), splits)
+
+    def query_knn(self, queries: np.ndarray, k: int):
+        """Finds the k nearest points of each query point.
+
+        Rings of cells around the queries are visited until the k-th nearest candidate is closer
+        than the distance to the unvisited cells. Queries still unresolved after `max_rings` rings
+        are compared against all indexed points.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            the query points of shape `(Q, 3)`
+        k : int
+            the number of neighbours
+
+        Returns
+        -------
+        indices : numpy.ndarray
+            the int64 array of shape `(Q, k)` of the flat indices of the neighbours, sorted by
+            distance. It is padded with -1 if fewer than k points are indexed.
+        distances : numpy.ndarray
+            the array of shape `(Q, k)` of the distances, padded with infinity
+        """
+        queries = np.asarray(queries).reshape(-1, 3)
+        n = len(queries)
+        indices = np.full((n, k), -1, dtype=np.int64)
+        distances = np.full((n, k), np.inf)
+        if not len(self.points):
+            return indices, distances
+
+        pair_queries = np.empty(0, dtype=np.int64)
+        positions = np.empty(0, dtype=np.int64)
+        pending = np.arange(n)
+        for ring in range(self.max_rings):
+            q, p = self._get_candidates(queries[pending], ring)
+            pair_queries = np.concatenate([pair_queries, pending[q]])
+            positions = np.concatenate([positions, p])
+
+            d2 = ((self.points[positions] - queries[pair_queries]) ** 2).sum(axis=1)
+            order = np.lexsort((d2, pair_queries))
+            pair_queries, positions, d2 = (
+                pair_queries[order],
+                positions[order],
+                d2[order],
+            )
+            counts = np.bincount(pair_queries, minlength=n)
+            starts = np.cumsum(counts) - counts
+            rank = np.arange(len(pair_queries)) - starts[pair_queries]
+            best = rank < k
+            pair_queries, positions, d2 = pair_queries[best], positions[best], d2[best]
+            rank = rank[best]
+
+            # the unvisited cells are at least `ring * cell_size` away from the query
+            kth = np.full(n, np.inf)
+            full = rank == k - 1
+            kth[pair_queries[full]] = d2[full]
+            done = np.sqrt(kth[pending]) <= ring * self.cell_size
+            pending = pending[~done]
+            if not len(pending):
+                break
+
+        indices[pair_queries, rank] = self.indices[positions]
+        distances[pair_queries, rank] = np.sqrt(d2)
+
+        # queries far from the indexed points, compared against all of them
+        for i in pending:
+            d2 = ((self.points - queries[i]) ** 2).sum(axis=1)
+            best = np.argpartition(d2, k - 1)[:k] if k < len(d2) else np.arange(len(d2))
+            best = best[np.argsort(d2[best])]
+            indices[i, : len(best)] = self.indices[best]
+            distances[i, : len(best)] = np.sqrt(d2[best])
+        return indices, distances
@@ -0,0 +1,190 @@
+"""Reusable frame buffers.
+
+A :class:`FramePool` owns a ring of preallocated images per frame type, shaped for the current
+resolution. Frames are written into the next free slot and handed out as read-only views wrapped in
+a :class:`PooledFrames`, which gives the slot back to the pool when released.
+"""
+
+
+import threading
+import weakref
+from collections.abc import Mapping
+
+from mt import tp, np
+
+from .const import SYFRAMETYPE_RGB, RESOLUTION_SIZES
+
+
+__all__ = [
+    "get_frame_shape",
+    "get_frame_dtype",
+    "FramePool",
+    "PooledFrames",
+]
+
+
+def get_frame_shape(frame_type: int, resolution: int):
+    """Gets the image shape of a frame type at a given resolution.
+
+    Parameters
+    ----------
+    frame_type : SYFrameType
+        the frame type
+    resolution : SYResolution
+        the resolution
+
+    Returns
+    -------
+    tuple
+        the `(height, width, channels)` shape
+    """
+    width, height = RESOLUTION_SIZES[resolution]
+    return (height, width, 3 if frame_type == SYFRAMETYPE_RGB else 1)
+
+
+def get_frame_dtype(frame_type: int):
+    """Gets the image dtype of a frame type."""
+    return np.uint8 if frame_type == SYFRAMETYPE_RGB else np.uint16
+
+
+class _Slot:
+    def __init__(self, generation: int, buffers: dict):
+        self.generation = generation
+        self.buffers = buffers
+
+
+class FramePool:
+    """A ring of preallocated frame buffers.
+
+    Parameters
+    ----------
+    resolution : SYResolution
+        the resolution of the frames
+    frame_types : list
+        the frame types to preallocate images for
+    n_slots : int
+        number of slots in the ring, i.e. the maximum number of frames that can be held at the
+        same time without falling back to fresh allocations
+    """
+
+    def __init__(self, resolution: int, frame_types: list, n_slots: int = 4):
+        if n_slots < 1:
+            raise ValueError(f"Argument 'n_slots' must be positive. Got: {n_slots}.")
+        self.frame_types = list(frame_types)
+        self.n_slots = n_slots
+        self.n_misses = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.reset(resolution)
+
+    def reset(self, resolution: int):
+        """Reallocates all slots for a new resolution.
+
+        Frames leased before the reset stay valid, but their slots are not recycled.
+        """
+        with self._lock:
+            self._generation += 1
+            self.resolution = resolution
+            self._free = [
+                _Slot(
+                    self._generation,
+                    {
+                        frame_type: np.empty(
+                            get_frame_shape(frame_type, resolution),
+                            dtype=get_frame_dtype(frame_type),
+                        )
+                        for frame_type in self.frame_types
+                    },
+                )
+                for _ in range(self.n_slots)
+            ]
+
+    @property
+    def n_free(self):
+        """Number of free slots."""
+        return len(self._free)
+
+    def acquire(self):
+        """Takes the next free slot out of the ring.
+
+        Returns
+        -------
+        _Slot or None
+            the slot whose `buffers` attribute is a dictionary mapping each frame type to a
+            writable image, or None if all slots are in use
+        """
+        with self._lock:
+            if not self._free:
+                self.n_misses += 1
+                return None
+            return self._free.pop(0)
+
+    def release(self, slot: _Slot):
+        """Puts a slot back into the ring."""
+        with self._lock:
+            if slot.generation == self._generation:
+                self._free.append(slot)
+
+
+class PooledFrames(Mapping):
+    """Read-only views of a frame held in a pool slot.
+
+    It behaves like the dictionary returned by :meth:`synexens.Device.get_last_frame_data`. The
+    slot is given back to the pool by :meth:`release`, on exit of a `with` block, or when the
+    object is garbage collected. The views, and any array derived from them without copying, must
+    not be used after that, because the slot may be overwritten by a newer frame.
+
+    Parameters
+    ----------
+    frames : dict
+        a dictionary mapping each frame type to an image
+    pool : FramePool, optional
+        the pool the slot belongs to
+    slot : _Slot, optional
+        the slot holding the images. If not provided, the images are not pooled and releasing is
+        a no-op.
+    """
+
+    def __init__(
+        self,
+        frames: dict,
+        pool: tp.Optional[FramePool] = None,
+        slot: tp.Optional[_Slot] = None,
+    ):
+        self._views = {}
+        for frame_type, img in frames.items():
+            view = img.view()
+            view.flags.writeable = False
+            self._views[frame_type] = view
+        self._pool = pool
+        self._finalizer = (
+            None if slot is None else weakref.finalize(self, pool.release, slot)
+        )
+
+    def __getitem__(self, frame_type):
+        return self._views[frame_type]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} frame_types={list(self._views)}, released={self.released}>"
+
+    @property
+    def released(self):
+        """Whether the slot has been given back to the pool."""
+        return self._finalizer is not None and not self._finalizer.alive
+
+    def release(self):
+        """Gives the slot back to the pool."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,547 @@
+"""Binary recordings of depth/IR/RGB streams.
+
+A recording is a chunked, append-only file::
+
+    file header   magic, JSON header length, JSON header (device info, streams, metadata)
+    chunk 0       chunk header, payload of `n_frames` fixed-stride frame records
+    chunk 1       ...
+    index         chunk offsets and the timestamp/sequence of every frame
+    trailer       index offset, end magic
+
+A frame record holds a timestamp, a sequence number and one image per stream, where each stream is
+a frame type with a fixed shape and dtype. Uncompressed chunks are exposed by :class:`Playback` as
+zero-copy views into a memory-mapped file. Compressed chunks are decompressed on access. If the
+trailer is missing, e.g. because the recorder was killed, the chunks are rescanned on open.
+"""
+
+
+import json
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from mt import tp, np
+
+from .codec import compress_records, decompress_records
+
+
+__all__ = [
+    "COMPRESSIONS",
+    "info_to_json",
+    "info_from_json",
+    "Recorder",
+    "Playback",
+]
+
+
+FILE_MAGIC = b"SYREC\x00\x01\x00"
+CHUNK_MAGIC = b"SYCK"
+INDEX_MAGIC = b"SYIX"
+END_MAGIC = b"SYEND\x00\x00\x00"
+ALIGNMENT = 64
+
+# file header: magic, JSON length
+FILE_HEADER = struct.Struct("<8sQ")
+# chunk header: magic, compression, number of frames, payload length, raw length
+CHUNK_HEADER = struct.Struct("<4sIQQQ")
+# index header: magic, number of chunks, number of frames
+INDEX_HEADER = struct.Struct("<4sIQ")
+# index entry: chunk offset, first frame, number of frames
+INDEX_ENTRY = struct.Struct("<QQQ")
+# trailer: index offset, magic
+TRAILER = struct.Struct("<Q8s")
+
+
+def _zlib_compress(raw: bytes, level: int, record_dtype: np.dtype):
+    return zlib.compress(raw, level)
+
+
+def _zlib_decompress(payload, record_dtype: np.dtype):
+    return zlib.decompress(payload)
+
+
+# compression id -> (name, compress function, decompress function), where the compress function
+# takes the raw records, the compression level, the record dtype and the compression options, and
+# the decompress function takes the payload and the record dtype
+COMPRESSIONS = {
+    0: (None, None, None),
+    1: ("zlib", _zlib_compress, _zlib_decompress),
+    2: ("depth", compress_records, decompress_records),
+}
+
+
+def _get_compression_id(name: tp.Optional[str]):
+    for compression_id, (compression_name, _, _) in COMPRESSIONS.items():
+        if compression_name == name:
+            return compression_id
+    names = [x[0] for x in COMPRESSIONS.values()]
+    raise ValueError(f"Unknown compression '{name}'. Expected one of {names}.")
+
+
+def _pad(n: int):
+    return (ALIGNMENT - n % ALIGNMENT) % ALIGNMENT
+
+
+def info_to_json(obj):
+    """Converts a `Device.info` dictionary into a JSON-serializable object.
+
+    Dictionary keys become strings, enums become integers, bytes are decoded and numpy values
+    become Python values.
+    """
+    if isinstance(obj, dict):
+        return {
+            str(int(k) if isinstance(k, int) else k): info_to_json(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [info_to_json(x) for x in obj]
+    if isinstance(obj, bytes):
+        return obj.decode(errors="replace").rstrip("\x00")
+    if isinstance(obj, bool):
+        return obj
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def info_from_json(obj):
+    """Converts the output of :func:`info_to_json` back, turning integer-like keys into integers."""
+    if isinstance(obj, dict):
+        return {
+            (int(k) if k.lstrip("-").isdigit() else k): info_from_json(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, list):
+        return [info_from_json(x) for x in obj]
+    return obj
+
+
+def _make_record_dtype(streams: list):
+    fields = [("timestamp", "<i8"), ("sequence", "<u8")]
+    for stream in streams:
+        fields.append(
+            (f"frame{stream['frame_type']}", stream["dtype"], tuple(stream["shape"]))
+        )
+    return np.dtype(fields)
+
+
+class Recorder:
+    """Writes frames to a recording from a background thread.
+
+    The stream layout is taken from the first frame written. Later frames must have the same frame
+    types, shapes and dtypes.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the output file, which is overwritten
+    info : dict, optional
+        the device information to store in the header, typically `Device.info`
+    metadata : dict, optional
+        additional JSON-serializable information to store in the header, like the resolution or
+        the filter settings
+    compression : {None, 'zlib', 'depth'}
+        per-chunk compression. Uncompressed recordings can be played back without any copy.
+        'depth' compresses the uint16 images with :func:`synexens.codec.compress_records`, which
+        is several times smaller than 'zlib' for depth images.
+    compression_level : int
+        the compression level
+    compression_options : dict, optional
+        keyword arguments of the compress function, like `max_error` for a lossy 'depth'
+        compression
+    chunk_frames : int
+        number of frames per chunk
+    queue_size : int
+        maximum number of frames waiting to be written
+    block : bool
+        whether :meth:`write` blocks when the queue is full. Otherwise the frame is dropped and
+        counted in `n_dropped`.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        info: tp.Optional[dict] = None,
+        metadata: tp.Optional[dict] = None,
+        compression: tp.Optional[str] = None,
+        compression_level: int = 1,
+        compression_options: tp.Optional[dict] = None,
+        chunk_frames: int = 32,
+        queue_size: int = 64,
+        block: bool = True,
+    ):
+        self.filepath = filepath
+        self.info = info
+        self.metadata = {} if metadata is None else metadata
+        self.compression_id = _get_compression_id(compression)
+        self.compression_level = compression_level
+        self.compression_options = (
+            {} if compression_options is None else compression_options
+        )
+        self.chunk_frames = chunk_frames
+        self.block = block
+        self.n_written = 0
+        self.n_dropped = 0
+
+        self._file = open(filepath, "wb")
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._streams = None
+        self._record_dtype = None
+        self._chunk = None
+        self._chunk_len = 0
+        self._chunks = []  # (offset, first frame, number of frames)
+        self._timestamps = []
+        self._sequences = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_device(cls, device, filepath: str, **kwargs):
+        """Creates a recorder storing the information and the current settings of a device."""
+        metadata = {
+            "resolution": int(device.resolution),
+            "stream_type": int(device.stream_type),
+            "filter": bool(device.filter),
+            "filter_list": [int(x) for x in device.get_filter_list()],
+            "mirror": bool(device.mirror),
+            "flip": bool(device.flip),
+        }
+        metadata.update(kwargs.pop("metadata", {}))
+        return cls(filepath, info=device.info, metadata=metadata, **kwargs)
+
+    def write(
+        self,
+        frames: dict,
+        timestamp: tp.Optional[int] = None,
+        sequence: tp.Optional[int] = None,
+    ):
+        """Queues a frame for writing.
+
+        The images are copied into the chunk buffer by the writer thread, so they must not be
+        modified until written. Pass copies if the images come from a reused buffer.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping each frame type to an image, like the output of
+            :meth:`synexens.Device.get_last_frame_data`
+        timestamp : int, optional
+            the timestamp in nanoseconds. Default is the current time.
+        sequence : int, optional
+            the sequence number. Default is the number of frames queued so far.
+
+        Returns
+        -------
+        bool
+            whether the frame was queued
+        """
+        if self._closed:
+            raise ValueError("The recorder is closed.")
+        if self._error is not None:
+            raise self._error
+        if timestamp is None:
+            timestamp = time.time_ns()
+        if sequence is None:
+            sequence = self.n_written + self.n_dropped
+        try:
+            self._queue.put((frames, timestamp, sequence), block=self.block)
+        except queue.Full:
+            self.n_dropped += 1
+            return False
+        self.n_written += 1
+        return True
+
+    def close(self):
+        """Writes the remaining frames and the index, then closes the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._error is None:
+                self._flush_chunk()
+                self._write_index()
+        finally:
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._append(*item)
+            except Exception as e:
+                self._error = e
+
+    def _write_header(self, frames: dict):
+        self._streams = [
+            {
+                "frame_type": int(frame_type),
+                "shape": list(img.shape),
+                "dtype": img.dtype.str,
+            }
+            for frame_type, img in sorted(frames.items(), key=lambda x: int(x[0]))
+        ]
+        self._record_dtype = _make_record_dtype(self._streams)
+        self._chunk = np.zeros(self.chunk_frames, dtype=self._record_dtype)
+        header = {
+            "version": 1,
+            "info": info_to_json(self.info),
+            "metadata": info_to_json(self.metadata),
+            "streams": self._streams,
+            "chunk_frames": self.chunk_frames,
+        }
+        data = json.dumps(header).encode()
+        data += b" " * _pad(FILE_HEADER.size + len(data))
+        self._file.write(FILE_HEADER.pack(FILE_MAGIC, len(data)))
+        self._file.write(data)
+
+    def _append(self, frames: dict, timestamp: int, sequence: int):
+        if self._streams is None:
+            self._write_header(frames)
+        i = self._chunk_len
+        self._chunk["timestamp"][i] = timestamp
+        self._chunk["sequence"][i] = sequence
+        for stream in self._streams:
+            self._chunk[f"frame{stream['frame_type']}"][i] = frames[
+                stream["frame_type"]
+            ]
+        self._timestamps.append(timestamp)
+        self._sequences.append(sequence)
+        self._chunk_len += 1
+        if self._chunk_len == self.chunk_frames:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if self._chunk_len == 0:
+            return
+        raw = self._chunk[: self._chunk_len].tobytes()
+        compress = COMPRESSIONS[self.compression_id][1]
+        if compress is None:
+            payload = raw
+        else:
+            payload = compress(
+                raw,
+                self.compression_level,
+                self._record_dtype,
+                **self.compression_options,
+            )
+        offset = self._file.tell()
+        self._file.write(
+            CHUNK_HEADER.pack(
+                CHUNK_MAGIC,
+                self.compression_id,
+                self._chunk_len,
+                len(payload),
+                len(raw),
+            )
+        )
+        self._file.write(b"\x00" * _pad(CHUNK_HEADER.size))
+        self._file.write(payload)
+        self._file.write(b"\x00" * _pad(len(payload)))
+        first_frame = self._chunks[-1][1] + self._chunks[-1][2] if self._chunks else 0
+        self._chunks.append((offset, first_frame, self._chunk_len))
+        self._chunk_len = 0
+
+    def _write_index(self):
+        if self._streams is None:  # no frame at all
+            self._write_header({})
+        offset = self._file.tell()
+        self._file.write(
+            INDEX_HEADER.pack(INDEX_MAGIC, len(self._chunks), len(self._timestamps))
+        )
+        for entry in self._chunks:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(np.array(self._timestamps, dtype="<i8").tobytes())
+        self._file.write(np.array(self._sequences, dtype="<u8").tobytes())
+        self._file.write(TRAILER.pack(offset, END_MAGIC))
+
+
+class Playback:
+    """Random access to the frames of a recording.
+
+    Frames of uncompressed chunks are zero-copy views into the memory-mapped file. Looking a frame
+    up by index is O(1), by timestamp it is a binary search over the in-memory timestamp index.
+
+    Parameters
+    ----------
+    filepath : str
+        path to the recording
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._mmap = np.memmap(filepath, dtype=np.uint8, mode="r")
+
+        magic, header_len = FILE_HEADER.unpack_from(self._mmap, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"File '{filepath}' is not a Synexens recording.")
+        header = json.loads(
+            bytes(self._mmap[FILE_HEADER.size : FILE_HEADER.size + header_len])
+        )
+        self._data_offset = FILE_HEADER.size + header_len
+        self.version = header["version"]
+        self.info = info_from_json(header["info"])
+        self.metadata = info_from_json(header["metadata"])
+        self.streams = header["streams"]
+        self.chunk_frames = header["chunk_frames"]
+        self.frame_types = [stream["frame_type"] for stream in self.streams]
+        self._record_dtype = _make_record_dtype(self.streams)
+
+        if not self._read_index():
+            self._scan_chunks()
+        self._cached_chunk = (None, None)
+
+    def _read_index(self):
+        if len(self._mmap) < self._data_offset + TRAILER.size:
+            return False
+        index_offset, magic = TRAILER.unpack_from(
+            self._mmap, len(self._mmap) - TRAILER.size
+        )
+        if magic != END_MAGIC:
+            return False
+        magic, n_chunks, n_frames = INDEX_HEADER.unpack_from(self._mmap, index_offset)
+        if magic != INDEX_MAGIC:
+            return False
+        ofs = index_offset + INDEX_HEADER.size
+        self._chunks = [
+            INDEX_ENTRY.unpack_from(self._mmap, ofs + i * INDEX_ENTRY.size)
+            for i in range(n_chunks)
+        ]
+        ofs += n_chunks * INDEX_ENTRY.size
+        self.timestamps = np.frombuffer(
+            self._mmap, dtype="<i8", count=n_frames, offset=ofs
+        )
+        ofs += n_frames * 8
+        self.sequences = np.frombuffer(
+            self._mmap, dtype="<u8", count=n_frames, offset=ofs
+        )
+        return True
+
+    def _scan_chunks(self):
+        self._chunks = []
+        timestamps = []
+        sequences = []
+        ofs = self._data_offset
+        n_frames = 0
+        while ofs + CHUNK_HEADER.size <= len(self._mmap):
+            magic, compression_id, n, payload_len, raw_len = CHUNK_HEADER.unpack_from(
+                self._mmap, ofs
+            )
+            payload_ofs = ofs + CHUNK_HEADER.size + _pad(CHUNK_HEADER.size)
+            if magic != CHUNK_MAGIC or payload_ofs + payload_len > len(self._mmap):
+                break  # a truncated chunk or the index
+            self._chunks.append((ofs, n_frames, n))
+            records = self._load_chunk(len(self._chunks) - 1)
+            timestamps.append(np.array(records["timestamp"]))
+            sequences.append(np.array(records["sequence"]))
+            n_frames += n
+            ofs = payload_ofs + payload_len + _pad(payload_len)
+        self.timestamps = (
+            np.concatenate(timestamps) if timestamps else np.empty(0, "<i8")
+        )
+        self.sequences = np.concatenate(sequences) if sequences else np.empty(0, "<u8")
+
+    def _load_chunk(self, chunk_index: int):
+        offset, _, n_frames = self._chunks[chunk_index]
+        _, compression_id, _, payload_len, raw_len = CHUNK_HEADER.unpack_from(
+            self._mmap, offset
+        )
+        payload_ofs = offset + CHUNK_HEADER.size + _pad(CHUNK_HEADER.size)
+        payload = self._mmap[payload_ofs : payload_ofs + payload_len]
+        decompress = COMPRESSIONS[compression_id][2]
+        if decompress is not None:
+            payload = np.frombuffer(
+                decompress(payload, self._record_dtype), dtype=np.uint8
+            )
+        return payload.view(self._record_dtype)[:n_frames]
+
+    def _get_chunk(self, chunk_index: int):
+        cached_index, records = self._cached_chunk
+        if cached_index != chunk_index:
+            records = self._load_chunk(chunk_index)
+            self._cached_chunk = (chunk_index, records)
+        return records
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} '{self.filepath}', {len(self)} frames>"
+
+    def _locate(self, index: int):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(f"Frame index {index} out of range for {n} frames.")
+        chunk_index = index // self.chunk_frames
+        return self._get_chunk(chunk_index), index - self._chunks[chunk_index][1]
+
+    def __getitem__(self, index: int):
+        """Gets a frame as a dictionary mapping each frame type to an image.
+
+        The images are read-only views, into the file for uncompressed chunks.
+        """
+        records, i = self._locate(index)
+        return {
+            frame_type: records[f"frame{frame_type}"][i]
+            for frame_type in self.frame_types
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, timestamp: int):
+        """Finds the index of the last frame whose timestamp is not after a given timestamp.
+
+        Parameters
+        ----------
+        timestamp : int
+            the timestamp in nanoseconds
+
+        Returns
+        -------
+        int
+            the frame index, or -1 if all frames are after the timestamp
+        """
+        return int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+
+    def at(self, timestamp: int):
+        """Gets the frame at a given timestamp, i.e. the last frame not after it."""
+        index = self.find(timestamp)
+        if index < 0:
+            raise IndexError(f"No frame at or before timestamp {timestamp}.")
+        return self[index]
+
+    def close(self):
+        """Releases the memory map. Views handed out before keep it alive."""
+        self._cached_chunk = (None, None)
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
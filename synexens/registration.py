@@ -0,0 +1,352 @@
+"""Host-side registration of depth images to colour images.
+
+On RGB-capable models, :meth:`synexens.Device.get_rgbd` asks the SDK for the depth image aligned
+to the colour image. A :class:`Registration` does the same on the host from the intrinsics
+stored in `Device.info["resolutions"]`, so that recorded frames can be registered without the
+SDK.
+
+For every pair of depth and colour resolutions, the rays of the depth pixels, undistorted and
+rotated into the colour camera, are computed once and cached. Without translation between the
+cameras, the target pixel of every depth pixel does not depend on its depth and is cached as
+well, so that registering a frame is a single scatter. Depth pixels landing on the same colour
+pixel are resolved by z-buffering: the nearest one wins.
+"""
+
+
+from mt import tp, np
+
+from .intrinsics import (
+    get_distortion_coeffs,
+    get_pixel_grid,
+    distort_normalized,
+    undistort_normalized,
+    find_resolution,
+)
+
+
+__all__ = ["Registration"]
+
+
+class Registration:
+    """Aligns depth images to colour images using cached per-resolution-pair mappings.
+
+    Parameters
+    ----------
+    resolutions : dict
+        a dictionary mapping each resolution to a dictionary with an "intrinsics" key, like
+        `Device.info["resolutions"]`, for the depth camera
+    color_resolutions : dict, optional
+        the same for the colour camera. If not provided, `resolutions` is used.
+    rotation : numpy.ndarray, optional
+        the 3x3 rotation matrix from the depth camera frame to the colour camera frame. Default is
+        the identity.
+    translation : numpy.ndarray, optional
+        the position of the depth camera origin in the colour camera frame, in millimetres.
+        Default is zero.
+    undistort : bool
+        whether to correct the lens distortion of both cameras
+    """
+
+    def __init__(
+        self,
+        resolutions: dict,
+        color_resolutions: tp.Optional[dict] = None,
+        rotation: tp.Optional[np.ndarray] = None,
+        translation: tp.Optional[np.ndarray] = None,
+        undistort: bool = True,
+    ):
+        self.resolutions = resolutions
+        self.color_resolutions = (
+            resolutions if color_resolutions is None else color_resolutions
+        )
+        self.rotation = np.eye(3) if rotation is None else np.asarray(rotation, float)
+        self.translation = (
+            np.zeros(3) if translation is None else np.asarray(translation, float)
+        )
+        if self.rotation.shape != (3, 3):
+            raise ValueError(
+                f"Argument 'rotation' must have shape (3, 3). Shape: {self.rotation.shape}."
+            )
+        if self.translation.shape != (3,):
+            raise ValueError(
+                f"Argument 'translation' must have shape (3,). Shape: {self.translation.shape}."
+            )
+        self.undistort = undistort
+        self._mappings = {}
+
+    @classmethod
+    def from_device(cls, device, **kwargs):
+        """Creates a registration from the intrinsics of an opened device."""
+        return cls(device.info["resolutions"], **kwargs)
+
+    def get_mapping(self, depth_resolution: int, color_resolution: int):
+        """Gets the mapping of a resolution pair, computing and caching it on first use.
+
+        Parameters
+        ----------
+        depth_resolution : SYResolution
+            the resolution of the depth images
+        color_resolution : SYResolution
+            the resolution of the colour images
+
+        Returns
+        -------
+        dict
+            a dictionary with keys "rays", the float32 array of shape `(3, N)` of the depth rays
+            in the colour camera frame, "color_shape", the `(height, width)` of the colour images
+            and, without translation, "index", the int32 array of the flat colour pixel index of
+            every depth pixel, -1 for pixels outside of the colour image
+        """
+        key = (depth_resolution, color_resolution)
+        mapping = self._mappings.get(key)
+        if mapping is not None:
+            return mapping
+
+        intrinsics = self.resolutions[depth_resolution]["intrinsics"]
+        x, y = get_pixel_grid(intrinsics)
+        if self.undistort:
+            x, y = undistort_normalized(x, y, get_distortion_coeffs(intrinsics))
+        rays = np.stack([x.ravel(), y.ravel(), np.ones(x.size)])
+        rays = self.rotation @ rays
+
+        color_intrinsics = self.color_resolutions[color_resolution]["intrinsics"]
+        mapping = {
+            "rays": rays.astype(np.float32),
+            "color_shape": (color_intrinsics["height"], color_intrinsics["width"]),
+            "color_intrinsics": color_intrinsics,
+        }
+        if not self.translation.any():
+            # the target pixel only depends on the direction of the ray
+            with np.errstate(divide="ignore", invalid="ignore"):
+                index = self._project(rays[0], rays[1], rays[2], color_intrinsics)
+            mapping["index"] = index
+        self._mappings[key] = mapping
+        return mapping
+
+    def clear_cache(self):
+        """Drops all cached mappings."""
+        self._mappings = {}
+
+    def _project(self, x, y, z, color_intrinsics: dict):
+        """Projects points of the colour camera frame to flat pixel indices, -1 if outside."""
+        xn = x / z
+        yn = y / z
+        if self.undistort:
+            xn, yn = distort_normalized(xn, yn, get_distortion_coeffs(color_intrinsics))
+        u = xn * color_intrinsics["focal_length_x"] + (
+            color_intrinsics["center_point_x"] + 0.5
+        )
+        v = yn * color_intrinsics["focal_length_y"] + (
+            color_intrinsics["center_point_y"] + 0.5
+        )
+        width = color_intrinsics["width"]
+        height = color_intrinsics["height"]
+        inside = (z > 0) & (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        index = np.full(z.shape, -1, dtype=np.int32)
+        index[inside] = v[inside].astype(np.int32) * width + u[inside].astype(np.int32)
+        return index
+
+    def _check_depth(self, depth_image: np.ndarray):
+        if (
+            depth_image.ndim != 3
+            or depth_image.shape[2] != 1
+            or depth_image.dtype != np.uint16
+        ):
+            raise ValueError(
+                f"The depth image must be a uint16 array of shape (H, W, 1). Got dtype "
+                f"{depth_image.dtype} and shape {depth_image.shape}."
+            )
+
+    def _find_color_resolution(self, color_shape: tuple):
+        return find_resolution(color_shape[0], color_shape[1], self.color_resolutions)
+
+    def _scatter(self, depth_image: np.ndarray, color_resolution: int):
+        """Maps the depth pixels to the colour image.
+
+        Returns
+        -------
+        source : numpy.ndarray
+            the flat indices of the depth pixels landing inside the colour image
+        target : numpy.ndarray
+            their flat colour pixel indices
+        z : numpy.ndarray
+            their uint16 depths in the colour camera frame
+        mapping : dict
+            the mapping of the resolution pair
+        """
+        self._check_depth(depth_image)
+        depth_resolution = find_resolution(
+            depth_image.shape[0], depth_image.shape[1], self.resolutions
+        )
+        mapping = self.get_mapping(depth_resolution, color_resolution)
+        depth = depth_image.reshape(-1)
+        rays = mapping["rays"]
+
+        index = mapping.get("index")
+        if index is not None:
+            source = np.flatnonzero((depth > 0) & (index >= 0))
+            target = index[source]
+            z = depth[source] * rays[2, source]
+        else:
+            source = np.flatnonzero(depth)
+            d = depth[source].astype(np.float32)
+            x, y, z = (
+                d * rays[i, source] + np.float32(self.translation[i]) for i in range(3)
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                target = self._project(x, y, z, mapping["color_intrinsics"])
+            keep = np.flatnonzero(target >= 0)
+            source, target, z = source[keep], target[keep], z[keep]
+        z = np.clip(np.rint(z), 1, 0xFFFF).astype(np.uint16)
+        return source, target, z, mapping
+
+    @staticmethod
+    def _z_buffer(target: np.ndarray, z: np.ndarray):
+        """Keeps the nearest depth pixel per colour pixel.
+
+        Returns
+        -------
+        numpy.ndarray
+            the sorted uint64 keys `target << 16 | z` of the visible depth pixels
+        """
+        keys = target.astype(np.uint64)
+        keys <<= np.uint64(16)
+        keys |= z
+        keys.sort()
+        first = np.empty(len(keys), dtype=bool)
+        first[:1] = True
+        np.not_equal(
+            keys[1:] >> np.uint64(16), keys[:-1] >> np.uint64(16), out=first[1:]
+        )
+        return keys[first]
+
+    def align_depth(
+        self,
+        depth_image: np.ndarray,
+        color_resolution: tp.Optional[int] = None,
+        out: tp.Optional[np.ndarray] = None,
+    ):
+        """Aligns a depth image to the colour image.
+
+        Colour pixels not hit by any depth pixel get zero depth. When the colour image has a
+        higher resolution than the depth image, these holes can be closed with a
+        :class:`synexens.filters.HoleFillingFilter`.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            the uint16 depth image of shape `(height, width, 1)`
+        color_resolution : SYResolution, optional
+            the resolution of the colour image. If not provided, it is inferred from `out`, or
+            taken equal to the depth resolution.
+        out : numpy.ndarray, optional
+            the C-contiguous uint16 output array of shape `(color_height, color_width, 1)`
+
+        Returns
+        -------
+        numpy.ndarray
+            the depth image in the colour camera frame, in millimetres along its optical axis
+        """
+        if color_resolution is None:
+            shape = depth_image.shape if out is None else out.shape
+            color_resolution = self._find_color_resolution(shape)
+        source, target, z, mapping = self._scatter(depth_image, color_resolution)
+        shape = mapping["color_shape"] + (1,)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint16)
+        elif (
+            out.shape != shape
+            or out.dtype != np.uint16
+            or not out.flags["C_CONTIGUOUS"]
+        ):
+            raise ValueError(
+                f"Argument 'out' must be a C-contiguous uint16 array of shape {shape}. Got "
+                f"shape {out.shape} and dtype {out.dtype}."
+            )
+        keys = self._z_buffer(target, z)
+        flat = out.reshape(-1)
+        flat.fill(0)
+        flat[(keys >> np.uint64(16)).astype(np.intp)] = keys & np.uint64(0xFFFF)
+        return out
+
+    def align_color(
+        self,
+        depth_image: np.ndarray,
+        color_image: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        tolerance: int = 20,
+    ):
+        """Samples the colour of every depth pixel.
+
+        Depth pixels without depth, outside of the colour image, or hidden from the colour camera
+        by a nearer depth pixel get black.
+
+        Parameters
+        ----------
+        depth_image : numpy.ndarray
+            the uint16 depth image of shape `(height, width, 1)`
+        color_image : numpy.ndarray
+            the uint8 colour image of shape `(color_height, color_width, 3)`
+        out : numpy.ndarray, optional
+            the C-contiguous uint8 output array of shape `(height, width, 3)`
+        tolerance : int
+            the depth difference in millimetres under which a depth pixel is considered visible
+            despite a nearer one on the same colour pixel
+
+        Returns
+        -------
+        numpy.ndarray
+            the colour image in the depth camera frame
+        """
+        if color_image.ndim != 3 or color_image.shape[2] != 3:
+            raise ValueError(
+                f"The colour image must have shape (H, W, 3). Shape: {color_image.shape}."
+            )
+        color_resolution = self._find_color_resolution(color_image.shape)
+        source, target, z, mapping = self._scatter(depth_image, color_resolution)
+        shape = depth_image.shape[:2] + (3,)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif (
+            out.shape != shape or out.dtype != np.uint8 or not out.flags["C_CONTIGUOUS"]
+        ):
+            raise ValueError(
+                f"Argument 'out' must be a C-contiguous uint8 array of shape {shape}. Got "
+                f"shape {out.shape} and dtype {out.dtype}."
+            )
+
+        keys = self._z_buffer(target, z)
+        z_buffer = np.zeros(
+            mapping["color_shape"][0] * mapping["color_shape"][1], np.int32
+        )
+        z_buffer[(keys >> np.uint64(16)).astype(np.intp)] = keys & np.uint64(0xFFFF)
+        visible = z.astype(np.int32) <= z_buffer[target] + tolerance
+        flat = out.reshape(-1, 3)
+        flat.fill(0)
+        flat[source[visible]] = color_image.reshape(-1, 3)[target[visible]]
+        return out
+
+    def get_rgbd(
+        self,
+        depth_image: np.ndarray,
+        color_image: np.ndarray,
+        out_depth: tp.Optional[np.ndarray] = None,
+        out_color: tp.Optional[np.ndarray] = None,
+    ):
+        """Registers a depth image to a colour image like the SDK's `GetRGBD`.
+
+        Returns
+        -------
+        depth : numpy.ndarray
+            the uint16 depth image aligned to the colour image, of shape
+            `(color_height, color_width, 1)`
+        color : numpy.ndarray
+            a copy of the colour image, or `out_color`
+        """
+        color_resolution = self._find_color_resolution(color_image.shape)
+        depth = self.align_depth(depth_image, color_resolution, out=out_depth)
+        if out_color is None:
+            out_color = color_image.copy()
+        else:
+            np.copyto(out_color, color_image)
+        return depth, out_color
@@ -0,0 +1,397 @@
+"""A bounded single-producer, multi-consumer frame queue.
+
+A :class:`FrameRing` holds a fixed number of preallocated frame slots. The producer, typically a
+capture thread, copies each frame into the next slot and never waits for the consumers. Every
+consumer, a :class:`RingConsumer`, reads the frames in order with its own cursor, so that a slow
+consumer does not hold back the fast ones. When the ring is full, the policy decides whether the
+oldest frames are overwritten or the new frame is dropped, and every drop is counted. The age of
+every frame when it is consumed is recorded to report queue-age percentiles.
+"""
+
+
+import threading
+import time
+
+from mt import tp, np
+
+from .pool import get_frame_shape, get_frame_dtype
+
+
+__all__ = ["POLICIES", "RingFrame", "FrameRing", "RingConsumer"]
+
+
+# what to do with a new frame when the slowest consumer is `capacity` frames behind
+POLICIES = ["drop-oldest", "drop-newest"]
+
+
+class RingFrame:
+    """A frame read from a frame ring.
+
+    Parameters
+    ----------
+    index : int
+        the index of the frame in the ring, i.e. the number of frames written before it
+    sequence : int
+        the sequence number given by the producer
+    timestamp : int
+        the monotonic time at which the frame was written, in nanoseconds
+    frames : dict
+        a dictionary mapping each frame type to an image
+    """
+
+    __slots__ = ("index", "sequence", "timestamp", "frames")
+
+    def __init__(self, index: int, sequence: int, timestamp: int, frames: dict):
+        self.index = index
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.frames = frames
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} index={self.index}, sequence={self.sequence}, "
+            f"timestamp={self.timestamp}>"
+        )
+
+
+class FrameRing:
+    """A ring of preallocated frame slots with one producer and any number of consumers.
+
+    Parameters
+    ----------
+    resolution : SYResolution
+        the resolution of the frames
+    frame_types : list
+        the frame types to preallocate images for. Frames may contain a subset of them.
+    capacity : int
+        number of slots
+    policy : {'drop-oldest', 'drop-newest'}
+        what to do with a new frame when the slowest consumer is `capacity` frames behind:
+        overwrite its oldest unread frame, which the consumer then skips, or drop the new frame
+    n_age_samples : int
+        number of most recent queue ages kept per consumer to compute percentiles
+    """
+
+    def __init__(
+        self,
+        resolution: int,
+        frame_types: list,
+        capacity: int = 8,
+        policy: str = "drop-oldest",
+        n_age_samples: int = 1024,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Expected one of {POLICIES}.")
+        if capacity < 1:
+            raise ValueError(f"Argument 'capacity' must be positive. Got: {capacity}.")
+        self.resolution = resolution
+        self.frame_types = list(frame_types)
+        self.capacity = capacity
+        self.policy = policy
+        self.n_age_samples = n_age_samples
+        self.buffers = {
+            frame_type: np.empty(
+                (capacity,) + get_frame_shape(frame_type, resolution),
+                dtype=get_frame_dtype(frame_type),
+            )
+            for frame_type in self.frame_types
+        }
+        # index of the frame held by each slot, -1 while the slot is being written
+        self._slot_indices = np.full(capacity, -1, dtype=np.int64)
+        self._slot_sequences = np.zeros(capacity, dtype=np.int64)
+        self._slot_timestamps = np.zeros(capacity, dtype=np.int64)
+        self._slot_frame_types = [()] * capacity
+        self._head = 0  # index of the next frame to write
+        self._cond = threading.Condition()
+        self._consumers = []
+        self._closed = False
+        self.n_produced = 0
+        self.n_dropped = 0
+
+    @classmethod
+    def from_device(cls, device, **kwargs):
+        """Creates a frame ring for the current resolution and frame types of a device."""
+        return cls(device.resolution, device.get_frame_types(), **kwargs)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} capacity={self.capacity}, policy='{self.policy}', "
+            f"produced={self.n_produced}, dropped={self.n_dropped}>"
+        )
+
+    def add_consumer(self, name: tp.Optional[str] = None):
+        """Adds a consumer starting at the next frame to be written.
+
+        Parameters
+        ----------
+        name : str, optional
+            the name of the consumer, reported in the statistics
+
+        Returns
+        -------
+        RingConsumer
+            the consumer
+        """
+        with self._cond:
+            if name is None:
+                name = f"consumer{len(self._consumers)}"
+            consumer = RingConsumer(self, name, self._head)
+            self._consumers.append(consumer)
+        return consumer
+
+    def remove_consumer(self, consumer):
+        """Removes a consumer, which no longer holds back the producer."""
+        with self._cond:
+            if consumer in self._consumers:
+                self._consumers.remove(consumer)
+            consumer._closed = True
+            self._cond.notify_all()
+
+    def write(
+        self,
+        frames: dict,
+        sequence: tp.Optional[int] = None,
+        timestamp: tp.Optional[int] = None,
+    ):
+        """Copies a frame into the next slot.
+
+        Must only be called from one thread at a time.
+
+        Parameters
+        ----------
+        frames : dict
+            a dictionary mapping frame types to images, like the output of
+            :meth:`synexens.Device.get_last_frame_data`. Frame types the ring has no buffers for
+            are ignored.
+        sequence : int, optional
+            the sequence number of the frame. If not provided, the index of the frame is used.
+        timestamp : int, optional
+            the monotonic time of the frame in nanoseconds. If not provided, the current time is
+            used.
+
+        Returns
+        -------
+        bool
+            whether the frame was written, i.e. not dropped by the 'drop-newest' policy
+        """
+        index = self._head
+        slot = index % self.capacity
+        with self._cond:
+            if self.policy == "drop-newest" and self._consumers:
+                tail = min(x._get_tail() for x in self._consumers)
+                if index - tail >= self.capacity:
+                    self.n_dropped += 1
+                    return False
+            # readers of the old frame will see that it changed
+            self._slot_indices[slot] = -1
+
+        frame_types = []
+        for frame_type, image in frames.items():
+            buffer = self.buffers.get(frame_type)
+            if buffer is None:
+                continue
+            if image.shape != buffer.shape[1:]:
+                raise ValueError(
+                    f"Frame type {frame_type} has shape {image.shape} but the ring expects "
+                    f"{buffer.shape[1:]}."
+                )
+            np.copyto(buffer[slot], image)
+            frame_types.append(frame_type)
+
+        with self._cond:
+            self._slot_sequences[slot] = index if sequence is None else sequence
+            self._slot_timestamps[slot] = (
+                time.monotonic_ns() if timestamp is None else timestamp
+            )
+            self._slot_frame_types[slot] = tuple(frame_types)
+            self._slot_indices[slot] = index
+            self._head = index + 1
+            self.n_produced += 1
+            self._cond.notify_all()
+        return True
+
+    def publish(self, frames: dict, sequence: tp.Optional[int] = None):
+        """Writes a frame. Lets the ring take the place of the observer of a frame driver."""
+        self.write(frames, sequence=sequence)
+
+    def close(self):
+        """Wakes up all waiting consumers, which then stop reading."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def stats(self):
+        """Counters of the ring.
+
+        A dictionary with keys "produced" and "dropped" for the frames written and dropped by the
+        producer, and "consumers" mapping each consumer name to its :attr:`RingConsumer.stats`.
+        """
+        with self._cond:
+            consumers = list(self._consumers)
+            res = {"produced": self.n_produced, "dropped": self.n_dropped}
+        res["consumers"] = {x.name: x.stats for x in consumers}
+        return res
+
+
+class RingConsumer:
+    """A reader of a frame ring with its own cursor. Created by :meth:`FrameRing.add_consumer`."""
+
+    def __init__(self, ring: FrameRing, name: str, cursor: int):
+        self.ring = ring
+        self.name = name
+        self.n_consumed = 0
+        self.n_dropped = 0
+        self._cursor = cursor  # index of the next frame to read
+        self._holding = False  # whether the frame before the cursor is still in use
+        self._closed = False
+        self._ages = np.zeros(ring.n_age_samples, dtype=np.int64)
+        self._n_ages = 0
+
+    def __repr__(self):
+        return f"<{type(self).__name__} '{self.name}', cursor={self._cursor}>"
+
+    def _get_tail(self):
+        return self._cursor - 1 if self._holding else self._cursor
+
+    @property
+    def lag(self):
+        """Number of frames written but not read yet."""
+        return self.ring._head - self._cursor
+
+    def get(
+        self,
+        timeout: tp.Optional[float] = None,
+        out: tp.Optional[dict] = None,
+        copy: bool = True,
+    ):
+        """Reads the next frame, blocking until it is written.
+
+        Frames overwritten before being read are skipped and counted as dropped.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait. None means waiting forever.
+        out : dict, optional
+            a dictionary mapping frame types to images to copy the frame into, typically the
+            `frames` of a previous call. Missing or mismatching images are allocated.
+        copy : bool
+            whether to copy the frame. Otherwise, the images are read-only views into the ring.
+            With the 'drop-newest' policy, they stay valid until the next call or
+            :meth:`release`. With the 'drop-oldest' policy, they may be overwritten at any time.
+
+        Returns
+        -------
+        RingFrame or None
+            the frame, or None if the timeout expired or the ring was closed
+        """
+        ring = self.ring
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with ring._cond:
+            self._holding = False
+            while True:
+                if self._closed or ring._closed:
+                    return None
+                if ring._head > self._cursor:
+                    oldest = max(ring._head - ring.capacity, 0)
+                    if self._cursor < oldest:
+                        self.n_dropped += oldest - self._cursor
+                        self._cursor = oldest
+                    index = self._cursor
+                    slot = index % ring.capacity
+                    if ring._slot_indices[slot] == index:
+                        break
+                    # the slot is being overwritten, move on to the next frame
+                    self._cursor += 1
+                    self.n_dropped += 1
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                ring._cond.wait(remaining)
+            sequence = int(ring._slot_sequences[slot])
+            timestamp = int(ring._slot_timestamps[slot])
+            frame_types = ring._slot_frame_types[slot]
+            self._cursor = index + 1
+            self._holding = not copy
+
+        if copy:
+            frames = {} if out is None else out
+            for frame_type in frame_types:
+                buffer = ring.buffers[frame_type][slot]
+                img = frames.get(frame_type)
+                if (
+                    img is None
+                    or img.shape != buffer.shape
+                    or img.dtype != buffer.dtype
+                ):
+                    img = np.empty_like(buffer)
+                    frames[frame_type] = img
+                np.copyto(img, buffer)
+            if ring._slot_indices[slot] != index:  # overwritten while copying
+                self.n_dropped += 1
+                return self.get(
+                    None if deadline is None else max(deadline - time.monotonic(), 0),
+                    out=frames,
+                    copy=copy,
+                )
+        else:
+            frames = {}
+            for frame_type in frame_types:
+                view = ring.buffers[frame_type][slot]
+                view = view.view()
+                view.flags.writeable = False
+                frames[frame_type] = view
+
+        self.n_consumed += 1
+        self._ages[self._n_ages % len(self._ages)] = time.monotonic_ns() - timestamp
+        self._n_ages += 1
+        return RingFrame(index, sequence, timestamp, frames)
+
+    def release(self):
+        """Releases the frame returned by the last call to :meth:`get` with `copy=False`."""
+        with self.ring._cond:
+            self._holding = False
+
+    def close(self):
+        """Removes the consumer from its ring."""
+        self.ring.remove_consumer(self)
+
+    def get_age_percentiles(self, percentiles: tp.Sequence[float] = (50, 90, 99)):
+        """Gets percentiles of the queue age, i.e. the time between writing and reading a frame.
+
+        Parameters
+        ----------
+        percentiles : list
+            the percentiles to compute, in [0, 100]
+
+        Returns
+        -------
+        list
+            the queue ages at the percentiles in seconds, computed over the most recent frames,
+            or None values if no frame has been read yet
+        """
+        n = min(self._n_ages, len(self._ages))
+        if n == 0:
+            return [None] * len(percentiles)
+        return [float(x) * 1e-9 for x in np.percentile(self._ages[:n], percentiles)]
+
+    @property
+    def stats(self):
+        """Counters of the consumer.
+
+        A dictionary with keys "consumed" and "dropped" for the frames read and skipped, "lag" for
+        the frames waiting to be read, and "age_p50", "age_p90", "age_p99" and "age_max" for the
+        queue-age percentiles in seconds.
+        """
+        p50, p90, p99, p100 = self.get_age_percentiles((50, 90, 99, 100))
+        return {
+            "consumed": self.n_consumed,
+            "dropped": self.n_dropped,
+            "lag": self.lag,
+            "age_p50": p50,
+            "age_p90": p90,
+            "age_p99": p99,
+            "age_max": p100,
+        }
@@ -0,0 +1,198 @@
+"""Host-side undistortion of depth and IR images using cached remap tables.
+
+For every pixel of the undistorted image, the remap table of a resolution stores where to sample
+the distorted image, computed once from the intrinsics in `Device.info["resolutions"]`. Undistorting
+an image, or a batch of images, is then a vectorized gather.
+"""
+
+
+from mt import tp, np
+
+from .intrinsics import (
+    get_distortion_coeffs,
+    get_pixel_grid,
+    distort_normalized,
+    find_resolution,
+)
+
+
+__all__ = ["RemapTable", "Undistorter"]
+
+
+class RemapTable:
+    """Sampling positions of an undistorted image in the distorted image.
+
+    Parameters
+    ----------
+    indices : numpy.ndarray
+        flat source pixel indices, of shape `(H*W,)` for nearest-neighbour interpolation or
+        `(4, H*W)` for bilinear interpolation
+    weights : numpy.ndarray or None
+        float32 bilinear weights of shape `(4, H*W)`, or None for nearest-neighbour interpolation
+    invalid : numpy.ndarray
+        flat indices of the output pixels that fall outside of the distorted image and are set
+        to 0
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        weights: tp.Optional[np.ndarray],
+        invalid: np.ndarray,
+    ):
+        self.indices = indices
+        self.weights = weights
+        self.invalid = invalid
+
+    @classmethod
+    def from_intrinsics(cls, intrinsics: dict, interpolation: str = "nearest"):
+        """Builds the remap table of a resolution from its intrinsics."""
+        width = intrinsics["width"]
+        height = intrinsics["height"]
+        x, y = get_pixel_grid(intrinsics)
+        xd, yd = distort_normalized(x, y, get_distortion_coeffs(intrinsics))
+        us = (xd * intrinsics["focal_length_x"] + intrinsics["center_point_x"]).ravel()
+        vs = (yd * intrinsics["focal_length_y"] + intrinsics["center_point_y"]).ravel()
+
+        if interpolation == "nearest":
+            u = np.rint(us).astype(np.intp)
+            v = np.rint(vs).astype(np.intp)
+            valid = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+            indices = np.where(valid, v * width + u, 0)
+            return cls(indices, None, np.flatnonzero(~valid))
+
+        if interpolation == "bilinear":
+            valid = (us >= 0) & (us <= width - 1) & (vs >= 0) & (vs <= height - 1)
+            us = np.where(valid, us, 0)
+            vs = np.where(valid, vs, 0)
+            u0 = np.floor(us).astype(np.intp)
+            v0 = np.floor(vs).astype(np.intp)
+            u1 = np.minimum(u0 + 1, width - 1)
+            v1 = np.minimum(v0 + 1, height - 1)
+            fu = (us - u0).astype(np.float32)
+            fv = (vs - v0).astype(np.float32)
+            indices = np.stack(
+                [v0 * width + u0, v0 * width + u1, v1 * width + u0, v1 * width + u1]
+            )
+            weights = np.stack(
+                [(1 - fu) * (1 - fv), fu * (1 - fv), (1 - fu) * fv, fu * fv]
+            )
+            return cls(indices, weights, np.flatnonzero(~valid))
+
+        raise ValueError(
+            f"Unknown interpolation '{interpolation}'. Expected 'nearest' or 'bilinear'."
+        )
+
+    def apply(self, src: np.ndarray, out: np.ndarray):
+        """Remaps a batch of flattened images.
+
+        Parameters
+        ----------
+        src : numpy.ndarray
+            source images of shape `(N, H*W)`
+        out : numpy.ndarray
+            output images of shape `(N, H*W)` and the same dtype as the source images
+        """
+        if self.weights is None:
+            np.take(src, self.indices, axis=1, out=out, mode="clip")
+        else:
+            acc = src[:, self.indices[0]] * self.weights[0]
+            for k in range(1, 4):
+                acc += src[:, self.indices[k]] * self.weights[k]
+            np.rint(acc, out=acc)
+            np.copyto(out, acc, casting="unsafe")
+        if len(self.invalid):
+            out[:, self.invalid] = 0
+
+
+class Undistorter:
+    """Undistorts depth or IR images using cached per-resolution remap tables.
+
+    Parameters
+    ----------
+    resolutions : dict
+        a dictionary mapping each resolution to a dictionary with an "intrinsics" key, like
+        `Device.info["resolutions"]`
+    interpolation : {'nearest', 'bilinear'}
+        how to sample the distorted image. Nearest-neighbour interpolation is recommended for
+        depth images, because bilinear interpolation blends depths across object boundaries.
+    """
+
+    def __init__(self, resolutions: dict, interpolation: str = "nearest"):
+        if interpolation not in ("nearest", "bilinear"):
+            raise ValueError(
+                f"Unknown interpolation '{interpolation}'. Expected 'nearest' or 'bilinear'."
+            )
+        self.resolutions = resolutions
+        self.interpolation = interpolation
+        self._remap_tables = {}
+
+    @classmethod
+    def from_device(cls, device, **kwargs):
+        """Creates an undistorter from the intrinsics of an opened device."""
+        return cls(device.info["resolutions"], **kwargs)
+
+    def get_remap_table(self, resolution: int):
+        """Gets the remap table of a resolution, computing and caching it on first use."""
+        table = self._remap_tables.get(resolution)
+        if table is None:
+            table = RemapTable.from_intrinsics(
+                self.resolutions[resolution]["intrinsics"], self.interpolation
+            )
+            self._remap_tables[resolution] = table
+        return table
+
+    def clear_cache(self):
+        """Drops all cached remap tables."""
+        self._remap_tables = {}
+
+    def undistort(
+        self,
+        image: np.ndarray,
+        out: tp.Optional[np.ndarray] = None,
+        resolution: tp.Optional[int] = None,
+    ):
+        """Undistorts an image or a batch of images.
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            a uint16 depth or IR image of shape `(height, width, 1)` or a batch of them of shape
+            `(N, height, width, 1)`
+        out : numpy.ndarray, optional
+            a C-contiguous uint16 output array of the same shape. If not provided, a new array is
+            allocated.
+        resolution : SYResolution, optional
+            the resolution of the image. If not provided, it is inferred from the shape.
+
+        Returns
+        -------
+        numpy.ndarray
+            the undistorted image(s)
+        """
+        if image.ndim not in (3, 4) or image.shape[-1] != 1:
+            raise ValueError(
+                f"The image must have shape (H, W, 1) or (N, H, W, 1). Shape: {image.shape}."
+            )
+        if image.dtype != np.uint16:
+            raise ValueError(f"The image must have dtype uint16. Dtype: {image.dtype}.")
+        height, width = image.shape[-3:-1]
+        if resolution is None:
+            resolution = find_resolution(height, width, self.resolutions)
+        table = self.get_remap_table(resolution)
+
+        if out is None:
+            out = np.empty(image.shape, dtype=np.uint16)
+        elif (
+            out.shape != image.shape
+            or out.dtype != np.uint16
+            or not out.flags["C_CONTIGUOUS"]
+        ):
+            raise ValueError(
+                f"Argument 'out' must be a C-contiguous uint16 array of shape {image.shape}. "
+                f"Got shape {out.shape} and dtype {out.dtype}."
+            )
+
+        src = np.ascontiguousarray(image).reshape(-1, height * width)
+        table.apply(src, out.reshape(-1, height * width))
+        return out
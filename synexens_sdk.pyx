@@ -230,6 +230,14 @@ cdef extern from "SYSDKInterface.h" namespace "Synexens" nogil:
         #  高度
         int m_nHeight
 
+    # ----- observers -----
+
+    cdef cppclass ISYEventObserver:  # 事件通知接口类
+        pass
+
+    cdef cppclass ISYFrameObserver:  # 帧数据通知接口类
+        pass
+
     # ----- functions -----
 
     # 获取SDK版本号
@@ -246,6 +254,26 @@ cdef extern from "SYSDKInterface.h" namespace "Synexens" nogil:
     # @ return 错误码
     SYErrorCode UnInitSDK()
 
+    # 注册事件通知对象指针
+    # @ param [in] pObserver 事件通知对象指针
+    # @ return 错误码
+    SYErrorCode RegisterEventObserver(ISYEventObserver* pObserver)
+
+    # 注册数据帧通知对象指针
+    # @ param [in] pObserver 数据帧通知对象指针
+    # @ return 错误码
+    SYErrorCode RegisterFrameObserver(ISYFrameObserver* pObserver)
+
+    # 注销事件通知对象指针
+    # @ param [in] pObserver 事件通知对象指针
+    # @ return 错误码
+    SYErrorCode UnRegisterEventObserver(ISYEventObserver* pObserver)
+
+    # 注销数据帧通知对象指针
+    # @ param [in] pObserver 数据帧通知对象指针
+    # @ return 错误码
+    SYErrorCode UnRegisterFrameObserver(ISYFrameObserver* pObserver)
+
     # 查找设备
     # @ param [in/out] nCount 设备数量
     # @ param [in/out] pDevice 设备信息，由外部分配内存，pDevice传入nullptr时仅获取nCount
@@ -510,6 +538,151 @@ cdef extern from "SYSDKInterface.h" namespace "Synexens" nogil:
     # @ param [in/out] intrinsics 相机参数
     SYErrorCode GetIntric(unsigned int nDeviceID, SYResolution resolution, SYIntrinsics& intrinsics)
 
+# ----- observers -----
+
+cdef extern from * namespace "Synexens" nogil:
+    """
+    #include <atomic>
+    #include <chrono>
+    #include <condition_variable>
+    #include <cstring>
+    #include <map>
+    #include <mutex>
+    #include <vector>
+
+    namespace Synexens
+    {
+        // Slot holding a private copy of the latest frame notified for a device.
+        // The vectors keep their capacity, so after the first frame no allocation
+        // happens on the notification path.
+        struct SYPyFrameSlot
+        {
+            unsigned long long m_nSequence = 0;
+            std::vector<SYFrameInfo> m_frameInfos;
+            std::vector<char> m_data;
+        };
+
+        // Frame observer copying each notified frame into the slot of its device
+        // and waking up any thread waiting for it. It never touches the GIL.
+        class SYPyFrameObserver : public ISYFrameObserver
+        {
+        public:
+            void OnFrameNotify(unsigned int nDeviceID, SYFrameData* pFrameData = nullptr) override
+            {
+                if (pFrameData == nullptr || pFrameData->m_pData == nullptr)
+                    return;
+                {
+                    std::lock_guard<std::mutex> lock(m_mutex);
+                    SYPyFrameSlot& slot = m_slots[nDeviceID];
+                    slot.m_frameInfos.assign(pFrameData->m_pFrameInfo, pFrameData->m_pFrameInfo + pFrameData->m_nFrameCount);
+                    slot.m_data.resize(pFrameData->m_nBuffferLength);
+                    std::memcpy(slot.m_data.data(), pFrameData->m_pData, pFrameData->m_nBuffferLength);
+                    ++slot.m_nSequence;
+                }
+                m_cond.notify_all();
+            }
+
+            // Waits until the slot of a device moves past a given sequence number,
+            // the timeout (in seconds, negative means forever) expires or Interrupt()
+            // is called. Returns the current sequence number of the slot.
+            unsigned long long Wait(unsigned int nDeviceID, unsigned long long nLastSequence, double fltTimeout)
+            {
+                std::unique_lock<std::mutex> lock(m_mutex);
+                const unsigned long long nInterrupts = m_nInterrupts;
+                SYPyFrameSlot& slot = m_slots[nDeviceID];
+                auto ready = [&] { return slot.m_nSequence != nLastSequence || m_nInterrupts != nInterrupts; };
+                if (fltTimeout < 0)
+                    m_cond.wait(lock, ready);
+                else
+                    m_cond.wait_for(lock, std::chrono::duration<double>(fltTimeout), ready);
+                return slot.m_nSequence;
+            }
+
+            // Locks the observer and returns the slot of a device. Unlock() must follow.
+            SYPyFrameSlot* Lock(unsigned int nDeviceID)
+            {
+                m_mutex.lock();
+                return &m_slots[nDeviceID];
+            }
+
+            void Unlock()
+            {
+                m_mutex.unlock();
+            }
+
+            // Wakes up all waiting threads.
+            void Interrupt()
+            {
+                {
+                    std::lock_guard<std::mutex> lock(m_mutex);
+                    ++m_nInterrupts;
+                }
+                m_cond.notify_all();
+            }
+
+            // Reference counting, so that the observer outlives the threads still inside
+            // Wait() or between Lock() and Unlock() when it is unregistered. A new observer
+            // holds one reference, released on unregistration.
+            void Retain()
+            {
+                ++m_nRefs;
+            }
+
+            void Release()
+            {
+                if (--m_nRefs == 0)
+                    delete this;
+            }
+
+        private:
+            std::mutex m_mutex;
+            std::condition_variable m_cond;
+            std::map<unsigned int, SYPyFrameSlot> m_slots;
+            unsigned long long m_nInterrupts = 0;
+            std::atomic<unsigned long long> m_nRefs{1};
+        };
+
+        // Event observer counting the device connection and disconnection events,
+        // so that device lists can be refreshed when a device is hot-plugged.
+        class SYPyEventObserver : public ISYEventObserver
+        {
+        public:
+            void OnEventNotify(int nEventType, void* pParam = nullptr) override
+            {
+                if (nEventType == SYEVENTTYPE_DEVICECONNECT || nEventType == SYEVENTTYPE_DEVICEDISCONNECT)
+                    ++m_nDeviceEvents;
+            }
+
+            unsigned long long GetDeviceEventCount() const
+            {
+                return m_nDeviceEvents.load();
+            }
+
+        private:
+            std::atomic<unsigned long long> m_nDeviceEvents{0};
+        };
+    }
+    """
+
+    cdef cppclass SYPyFrameSlot:
+        unsigned long long m_nSequence
+        vector[SYFrameInfo] m_frameInfos
+        vector[char] m_data
+
+    cdef cppclass SYPyFrameObserver(ISYFrameObserver):
+        unsigned long long Wait(unsigned int nDeviceID, unsigned long long nLastSequence, double fltTimeout)
+        SYPyFrameSlot* Lock(unsigned int nDeviceID)
+        void Unlock()
+        void Interrupt()
+        void Retain()
+        void Release()
+
+    cdef cppclass SYPyEventObserver(ISYEventObserver):
+        unsigned long long GetDeviceEventCount()
+
+cdef SYPyFrameObserver* g_pFrameObserver = NULL
+cdef SYPyEventObserver* g_pEventObserver = NULL
+
 # ----- functions -----
 
 def get_sdk_version():
@@ -517,7 +690,8 @@ def get_sdk_version():
     cdef int nLength = 256
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetSDKVersion(nLength, &arr[0]))
+    with nogil:
+        ret = GetSDKVersion(nLength, &arr[0])
     if ret != 0:
         raise RuntimeError(f"GetSDKVersion() returns {ret}.")
 
@@ -525,13 +699,17 @@ def get_sdk_version():
 
 def init_sdk():
     cdef SYErrorCode ret
-    ret = SYErrorCode(InitSDK())
+    with nogil:
+        ret = InitSDK()
     if ret != 0:
         raise RuntimeError(f"InitSDK() returns {ret}.")
 
 def uninit_sdk():
     cdef SYErrorCode ret
-    ret = SYErrorCode(UnInitSDK())
+    unregister_frame_observer()
+    unregister_event_observer()
+    with nogil:
+        ret = UnInitSDK()
     if ret != 0:
         raise RuntimeError(f"UnInitSDK() returns {ret}.")
 
@@ -541,14 +719,16 @@ def find_device():
     cdef SYErrorCode ret
 
     if True:
-        ret = SYErrorCode(FindDevice(nCount, NULL))
+        with nogil:
+            ret = FindDevice(nCount, NULL)
         if ret != 0:
             raise RuntimeError(f"First FindDevice() returns {ret}.")
         devices.resize(nCount)
     else:
         devices.resize(1)
 
-    ret = SYErrorCode(FindDevice(nCount, &devices[0]))
+    with nogil:
+        ret = FindDevice(nCount, devices.data())
     if ret != 0:
         raise RuntimeError(f"Second FindDevice() returns {ret}.")
     res = {}
@@ -565,13 +745,15 @@ def open_device(unsigned int nDeviceID, SYDeviceType deviceType):
     di.m_nDeviceID = nDeviceID
     di.m_deviceType = deviceType
 
-    ret = SYErrorCode(OpenDevice(di))
+    with nogil:
+        ret = OpenDevice(di)
     if ret != 0:
         raise RuntimeError(f"OpenDevice() returns {ret}.")
 
 def close_device(unsigned int nDeviceID):
     cdef SYErrorCode ret
-    ret = SYErrorCode(CloseDevice(nDeviceID))
+    with nogil:
+        ret = CloseDevice(nDeviceID)
     if ret != 0:
         raise RuntimeError(f"CloseDevice() returns {ret}.")
 
@@ -580,12 +762,14 @@ def query_device_support_frame_type(unsigned int nDeviceID):
     cdef vector[SYSupportType] supportTypes
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(QueryDeviceSupportFrameType(nDeviceID, nCount, NULL))
+    with nogil:
+        ret = QueryDeviceSupportFrameType(nDeviceID, nCount, NULL)
     if ret != 0:
         raise RuntimeError(f"First QueryDeviceSupportFrameType() returns {ret}.")
     supportTypes.resize(nCount)
 
-    ret = SYErrorCode(QueryDeviceSupportFrameType(nDeviceID, nCount, &supportTypes[0]))
+    with nogil:
+        ret = QueryDeviceSupportFrameType(nDeviceID, nCount, supportTypes.data())
     if ret != 0:
         raise RuntimeError(f"Second QueryDeviceSupportFrameType() returns {ret}.")
     res = []
@@ -599,12 +783,14 @@ def query_device_support_resolution(unsigned int nDeviceID, SYSupportType suppor
     cdef vector[SYResolution] resolutions
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(QueryDeviceSupportResolution(nDeviceID, supportType, nCount, NULL))
+    with nogil:
+        ret = QueryDeviceSupportResolution(nDeviceID, supportType, nCount, NULL)
     if ret != 0:
         raise RuntimeError(f"First QueryDeviceSupportResolution() returns {ret}.")
     resolutions.resize(nCount)
 
-    ret = SYErrorCode(QueryDeviceSupportResolution(nDeviceID, supportType, nCount, &resolutions[0]))
+    with nogil:
+        ret = QueryDeviceSupportResolution(nDeviceID, supportType, nCount, resolutions.data())
     if ret != 0:
         raise RuntimeError(f"Second QueryDeviceSupportFrameType() returns {ret}.")
     res = []
@@ -614,29 +800,36 @@ def query_device_support_resolution(unsigned int nDeviceID, SYSupportType suppor
     return res
 
 def get_current_stream_type(unsigned int nDeviceID):
-    return SYStreamType(GetCurrentStreamType(nDeviceID))
+    cdef SYStreamType streamType
+    with nogil:
+        streamType = GetCurrentStreamType(nDeviceID)
+    return SYStreamType(streamType)
 
 def start_streaming(unsigned int nDeviceID, SYStreamType streamType):
     cdef SYErrorCode ret
-    ret = SYErrorCode(StartStreaming(nDeviceID, streamType))
+    with nogil:
+        ret = StartStreaming(nDeviceID, streamType)
     if ret != 0:
         raise RuntimeError(f"StartStreaming() returns {ret}.")
 
 def stop_streaming(unsigned int nDeviceID):
     cdef SYErrorCode ret
-    ret = SYErrorCode(StopStreaming(nDeviceID))
+    with nogil:
+        ret = StopStreaming(nDeviceID)
     if ret != 0:
         raise RuntimeError(f"StopStreaming() returns {ret}.")
 
 def change_streaming(unsigned int nDeviceID, SYStreamType streamType):
     cdef SYErrorCode ret
-    ret = SYErrorCode(ChangeStreaming(nDeviceID, streamType))
+    with nogil:
+        ret = ChangeStreaming(nDeviceID, streamType)
     if ret != 0:
         raise RuntimeError(f"ChangeStreaming() returns {ret}.")
 
 def set_frame_resolution(unsigned int nDeviceID, SYFrameType frameType, SYResolution resolution):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetFrameResolution(nDeviceID, frameType, resolution))
+    with nogil:
+        ret = SetFrameResolution(nDeviceID, frameType, resolution)
     if ret != 0:
         raise RuntimeError(f"SetFrameResolution() returns {ret}.")
 
@@ -644,7 +837,8 @@ def get_frame_resolution(unsigned int nDeviceID, SYFrameType frameType):
     cdef SYResolution resolution
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetFrameResolution(nDeviceID, frameType, resolution))
+    with nogil:
+        ret = GetFrameResolution(nDeviceID, frameType, resolution)
     if ret != 0:
         raise RuntimeError(f"GetFrameResolution() returns {ret}.")
 
@@ -654,7 +848,8 @@ def get_filter(unsigned int nDeviceID):
     cdef bool bFilter
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetFilter(nDeviceID, bFilter))
+    with nogil:
+        ret = GetFilter(nDeviceID, bFilter)
     if ret != 0:
         raise RuntimeError(f"GetFilter() returns {ret}.")
 
@@ -662,7 +857,8 @@ def get_filter(unsigned int nDeviceID):
 
 def set_filter(unsigned int nDeviceID, bool bFilter):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetFilter(nDeviceID, bFilter))
+    with nogil:
+        ret = SetFilter(nDeviceID, bFilter)
     if ret != 0:
         raise RuntimeError(f"SetFilter() returns {ret}.")
 
@@ -671,12 +867,14 @@ def get_filter_list(unsigned int nDeviceID):
     cdef vector[SYFilterType] filterTypes
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetFilterList(nDeviceID, nCount, NULL))
+    with nogil:
+        ret = GetFilterList(nDeviceID, nCount, NULL)
     if ret != 0:
         raise RuntimeError(f"First GetFilterList() returns {ret}.")
     filterTypes.resize(nCount)
 
-    ret = SYErrorCode(GetFilterList(nDeviceID, nCount, &filterTypes[0]))
+    with nogil:
+        ret = GetFilterList(nDeviceID, nCount, filterTypes.data())
     if ret != 0:
         raise RuntimeError(f"Second GetFilterList() returns {ret}.")
     res = []
@@ -687,33 +885,41 @@ def get_filter_list(unsigned int nDeviceID):
 
 def set_default_filter(unsigned int nDeviceID):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetDefaultFilter(nDeviceID))
+    with nogil:
+        ret = SetDefaultFilter(nDeviceID)
     if ret != 0:
         raise RuntimeError(f"SetDefaultFilter() returns {ret}.")
 
 def add_filter(unsigned int nDeviceID, SYFilterType filterType):
     cdef SYErrorCode ret
-    ret = SYErrorCode(AddFilter(nDeviceID, filterType))
+    with nogil:
+        ret = AddFilter(nDeviceID, filterType)
     if ret != 0:
         raise RuntimeError(f"AddFilter() returns {ret}.")
 
 def delete_filter(unsigned int nDeviceID, int nIndex):
     cdef SYErrorCode ret
-    ret = SYErrorCode(DeleteFilter(nDeviceID, nIndex))
+    with nogil:
+        ret = DeleteFilter(nDeviceID, nIndex)
     if ret != 0:
         raise RuntimeError(f"DeleteFilter() returns {ret}.")
 
 def clear_filter(unsigned int nDeviceID):
     cdef SYErrorCode ret
-    ret = SYErrorCode(ClearFilter(nDeviceID))
+    with nogil:
+        ret = ClearFilter(nDeviceID)
     if ret != 0:
         raise RuntimeError(f"ClearFilter() returns {ret}.")
 
 def set_filter_params(unsigned int nDeviceID, SYFilterType filterType, float[:] filterParams):
     cdef SYErrorCode ret
+    cdef int nParamCount = filterParams.shape[0]
+    cdef float* pFilterParam
     if filterParams.strides[0] != 4:
         raise ValueError("Argument 'filterParams' is not contiguous.")
-    ret = SYErrorCode(SetFilterParam(nDeviceID, filterType, filterParams.shape[0], &filterParams[0]))
+    pFilterParam = &filterParams[0]
+    with nogil:
+        ret = SetFilterParam(nDeviceID, filterType, nParamCount, pFilterParam)
     if ret != 0:
         raise RuntimeError(f"SetFitlerParam() returns {ret}.")
 
@@ -722,12 +928,14 @@ def get_filter_params(unsigned int nDeviceID, SYFilterType filterType):
     cdef vector[float] filterParams
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetFilterParam(nDeviceID, filterType, nCount, NULL))
+    with nogil:
+        ret = GetFilterParam(nDeviceID, filterType, nCount, NULL)
     if ret != 0:
         raise RuntimeError(f"First GetFilterParam() returns {ret}.")
     filterParams.resize(nCount)
 
-    ret = SYErrorCode(GetFilterParam(nDeviceID, filterType, nCount, &filterParams[0]))
+    with nogil:
+        ret = GetFilterParam(nDeviceID, filterType, nCount, filterParams.data())
     if ret != 0:
         raise RuntimeError(f"Second GetFilterParam() returns {ret}.")
     res = np.empty(nCount, dtype=np.float32)
@@ -739,7 +947,8 @@ def get_mirror(unsigned int nDeviceID):
     cdef bool bMirror
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetMirror(nDeviceID, bMirror))
+    with nogil:
+        ret = GetMirror(nDeviceID, bMirror)
     if ret != 0:
         raise RuntimeError(f"GetMirror() returns {ret}.")
 
@@ -747,7 +956,8 @@ def get_mirror(unsigned int nDeviceID):
 
 def set_mirror(unsigned int nDeviceID, bool bMirror):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetMirror(nDeviceID, bMirror))
+    with nogil:
+        ret = SetMirror(nDeviceID, bMirror)
     if ret != 0:
         raise RuntimeError(f"SetMirror() returns {ret}.")
 
@@ -755,7 +965,8 @@ def get_flip(unsigned int nDeviceID):
     cdef bool bFlip
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetFlip(nDeviceID, bFlip))
+    with nogil:
+        ret = GetFlip(nDeviceID, bFlip)
     if ret != 0:
         raise RuntimeError(f"GetFlip() returns {ret}.")
 
@@ -763,7 +974,8 @@ def get_flip(unsigned int nDeviceID):
 
 def set_flip(unsigned int nDeviceID, bool bFlip):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetFlip(nDeviceID, bFlip))
+    with nogil:
+        ret = SetFlip(nDeviceID, bFlip)
     if ret != 0:
         raise RuntimeError(f"SetFlip() returns {ret}.")
 
@@ -771,7 +983,8 @@ def get_integral_time(unsigned int nDeviceID):
     cdef int nIntegralTime
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetIntegralTime(nDeviceID, nIntegralTime))
+    with nogil:
+        ret = GetIntegralTime(nDeviceID, nIntegralTime)
     if ret != 0:
         raise RuntimeError(f"GetIntegralTime() returns {ret}.")
 
@@ -779,7 +992,8 @@ def get_integral_time(unsigned int nDeviceID):
 
 def set_integral_time(unsigned int nDeviceID, int nIntegralTime):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetIntegralTime(nDeviceID, nIntegralTime))
+    with nogil:
+        ret = SetIntegralTime(nDeviceID, nIntegralTime)
     if ret != 0:
         raise RuntimeError(f"SetIntegralTime() returns {ret}.")
 
@@ -788,7 +1002,8 @@ def get_integral_time_range(unsigned int nDeviceID, SYResolution depthResolution
     cdef int nMax
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetIntegralTimeRange(nDeviceID, depthResolution, nMin, nMax))
+    with nogil:
+        ret = GetIntegralTimeRange(nDeviceID, depthResolution, nMin, nMax)
     if ret != 0:
         raise RuntimeError(f"GetIntegralTime() returns {ret}.")
 
@@ -799,7 +1014,8 @@ def get_distance_measure_range(unsigned int nDeviceID):
     cdef int nMax
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetDistanceMeasureRange(nDeviceID, nMin, nMax))
+    with nogil:
+        ret = GetDistanceMeasureRange(nDeviceID, nMin, nMax)
     if ret != 0:
         raise RuntimeError(f"GetDistanceMeasureRange() returns {ret}.")
 
@@ -810,7 +1026,8 @@ def get_distance_user_range(unsigned int nDeviceID):
     cdef int nMax
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetDistanceUserRange(nDeviceID, nMin, nMax))
+    with nogil:
+        ret = GetDistanceUserRange(nDeviceID, nMin, nMax)
     if ret != 0:
         raise RuntimeError(f"GetDistanceUserRange() returns {ret}.")
 
@@ -818,7 +1035,8 @@ def get_distance_user_range(unsigned int nDeviceID):
 
 def set_distance_user_range(unsigned int nDeviceID, int nMin, int nMax):
     cdef SYErrorCode ret
-    ret = SYErrorCode(SetDistanceUserRange(nDeviceID, nMin, nMax))
+    with nogil:
+        ret = SetDistanceUserRange(nDeviceID, nMin, nMax)
     if ret != 0:
         raise RuntimeError(f"SetDistanceUserRange() returns {ret}.")
 
@@ -827,7 +1045,8 @@ def get_device_sn(unsigned int nDeviceID):
     cdef int nLength = 256
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetDeviceSN(nDeviceID, nLength, &arr[0]))
+    with nogil:
+        ret = GetDeviceSN(nDeviceID, nLength, &arr[0])
     if ret != 0:
         raise RuntimeError(f"GetDeviceSN() returns {ret}.")
 
@@ -838,40 +1057,83 @@ def get_device_hw_version(unsigned int nDeviceID):
     cdef int nLength = 256
     cdef SYErrorCode ret
 
-    ret = SYErrorCode(GetDeviceHWVersion(nDeviceID, nLength, &arr[0]))
+    with nogil:
+        ret = GetDeviceHWVersion(nDeviceID, nLength, &arr[0])
     if ret != 0:
         raise RuntimeError(f"GetDeviceHWVersion() returns {ret}.")
 
     return arr[:nLength].decode()
 
-def get_depth_color(unsigned int nDeviceID, unsigned short[:,:,:] pDepth):
+def get_depth_color(unsigned int nDeviceID, const unsigned short[:,:,:] pDepth):
     cdef SYErrorCode ret
 
     pColor = np.empty((pDepth.shape[0], pDepth.shape[1], 3), dtype=np.uint8)
 
     cdef unsigned char [:,:,:] pColor_view = pColor
+    cdef int nCount = pDepth.shape[0] * pDepth.shape[1] * pDepth.shape[2]
+    cdef const unsigned short* pDepthData = &pDepth[0,0,0]
+    cdef unsigned char* pColorData = &pColor_view[0,0,0]
 
-    ret = SYErrorCode(GetDepthColor(nDeviceID, pDepth.size, <const unsigned short *>&pDepth[0,0,0], <unsigned char *>&pColor_view[0,0,0]))
+    with nogil:
+        ret = GetDepthColor(nDeviceID, nCount, pDepthData, pColorData)
     if ret != 0:
         raise RuntimeError(f"GetDepthColor() returns {ret}.")
 
     return pColor
 
-def get_depth_point_cloud(unsigned int nDeviceID, unsigned short[:,:,:] pDepth, bool bUndistort):
+def get_depth_point_cloud(unsigned int nDeviceID, const unsigned short[:,:,:] pDepth, bool bUndistort):
     cdef SYErrorCode ret
+    cdef int nHeight = pDepth.shape[0]
+    cdef int nWidth = pDepth.shape[1]
 
-    nHeight = pDepth.shape[0]
-    nWidth = pDepth.shape[1]
     pPos = np.empty((nHeight, nWidth, 3), dtype=np.float32)
 
     cdef float [:,:,:] pPos_view = pPos
+    cdef const unsigned short* pDepthData = &pDepth[0,0,0]
+    cdef SYPointCloudData* pPointCloud = <SYPointCloudData *>&pPos_view[0,0,0]
 
-    ret = SYErrorCode(GetDepthPointCloud(nDeviceID, nWidth, nHeight, <const unsigned short *>&pDepth[0,0,0], <SYPointCloudData *>&pPos_view[0,0,0], bUndistort))
+    with nogil:
+        ret = GetDepthPointCloud(nDeviceID, nWidth, nHeight, pDepthData, pPointCloud, bUndistort)
     if ret != 0:
         raise RuntimeError(f"GetDepthPointCloud() returns {ret}.")
 
     return pPos
 
+def get_rgbd(unsigned int nDeviceID, unsigned short[:,:,::1] pDepth, unsigned char[:,:,::1] pRGB, pTargetDepth = None, pTargetRGB = None):
+    cdef SYErrorCode ret
+    cdef int nDepthHeight = pDepth.shape[0]
+    cdef int nDepthWidth = pDepth.shape[1]
+    cdef int nRGBHeight = pRGB.shape[0]
+    cdef int nRGBWidth = pRGB.shape[1]
+
+    # the RGBD images have the size of the RGB image
+    if pTargetDepth is None:
+        pTargetDepth = np.empty((nRGBHeight, nRGBWidth, 1), dtype=np.uint16)
+    elif pTargetDepth.shape != (nRGBHeight, nRGBWidth, 1):
+        raise ValueError(
+            f"get_rgbd: the target depth must have shape {(nRGBHeight, nRGBWidth, 1)}. Shape: {pTargetDepth.shape}."
+        )
+    if pTargetRGB is None:
+        pTargetRGB = np.empty((nRGBHeight, nRGBWidth, 3), dtype=np.uint8)
+    elif pTargetRGB.shape != (nRGBHeight, nRGBWidth, 3):
+        raise ValueError(
+            f"get_rgbd: the target RGB must have shape {(nRGBHeight, nRGBWidth, 3)}. Shape: {pTargetRGB.shape}."
+        )
+
+    cdef unsigned short [:,:,::1] pTargetDepth_view = pTargetDepth
+    cdef unsigned char [:,:,::1] pTargetRGB_view = pTargetRGB
+    cdef unsigned short* pSourceDepth = &pDepth[0,0,0]
+    cdef unsigned char* pSourceRGB = &pRGB[0,0,0]
+    cdef unsigned short* pTargetDepthData = &pTargetDepth_view[0,0,0]
+    cdef unsigned char* pTargetRGBData = &pTargetRGB_view[0,0,0]
+
+    with nogil:
+        ret = GetRGBD(nDeviceID, nDepthWidth, nDepthHeight, pSourceDepth, nRGBWidth, nRGBHeight, pSourceRGB, nRGBWidth, nRGBHeight, pTargetDepthData, pTargetRGBData)
+    if ret != 0:
+        raise RuntimeError(f"GetRGBD() returns {ret}.")
+
+    return pTargetDepth, pTargetRGB
+
 def extract_resolution(SYResolution resolution):
     if resolution == SYRESOLUTION_NULL:
         return 0, 0
@@ -894,77 +1156,306 @@ def extract_channel_count(SYFrameType frameType):
         return 1
     return 3
 
-def get_last_frame_data(unsigned int nDeviceID):
-    cdef SYErrorCode ret
-    cdef SYFrameData* pFrameData
+cdef dict unpack_frame_data(SYFrameData* pFrameData, dict out = None):
     cdef SYFrameInfo* pFrameInfo
     cdef unsigned short [:,:,:] uint16Data
     cdef unsigned char [:,:,:] uint8Data
+    cdef char* pSource
+    cdef void* pTarget
+    cdef size_t size
+    cdef size_t ofs = 0
 
-    ret = GetLastFrameData(nDeviceID, pFrameData)
-    if ret == SYERRORCODE_NOFRAME:
-        return None
-
-    if ret != 0:
-        raise RuntimeError(f"GetLastFrameData() returns {str(SYErrorCode(ret))}.")
-
-    d_frames = {}
-    ofs = 0
+    d_frames = {} if out is None else out
+    frameTypes = set()
     for i in range(pFrameData[0].m_nFrameCount):
         pFrameInfo = &pFrameData[0].m_pFrameInfo[i]
-        frameType = pFrameInfo[0].m_frameType
+        frameType = SYFrameType(pFrameInfo[0].m_frameType)
+        frameTypes.add(frameType)
         dtype = extract_dtype(frameType)
         nChannels = extract_channel_count(frameType)
         width = pFrameInfo[0].m_nFrameWidth
         height = pFrameInfo[0].m_nFrameHeight
-        size = np.nbytes[dtype]*width*height*nChannels
-        img = np.empty((height, width, nChannels), dtype=dtype)
+        size = np.dtype(dtype).itemsize*width*height*nChannels
+        img = d_frames.get(frameType)
+        if not is_reusable_image(img, (height, width, nChannels), dtype):
+            img = np.empty((height, width, nChannels), dtype=dtype)
+            d_frames[frameType] = img
         if dtype == np.uint8:
             uint8Data = img
-            memcpy(<void *>&uint8Data[0,0,0], &(<char*>pFrameData[0].m_pData)[ofs], size)
+            pTarget = <void *>&uint8Data[0,0,0]
         else:
             uint16Data = img
-            memcpy(<void *>&uint16Data[0,0,0], &(<char*>pFrameData[0].m_pData)[ofs], size)
+            pTarget = <void *>&uint16Data[0,0,0]
+        pSource = &(<char*>pFrameData[0].m_pData)[ofs]
+        with nogil:
+            memcpy(pTarget, pSource, size)
         ofs += size
-        d_frames[SYFrameType(frameType)] = img
 
+    for frameType in list(d_frames):
+        if frameType not in frameTypes:  # stale image of a previous stream type
+            del d_frames[frameType]
     return d_frames
 
-def undistort_depth(unsigned int nDeviceID, unsigned short[:,:,:] pDepth):
+def is_reusable_image(img, shape, dtype):
+    return (
+        img is not None
+        and img.shape == shape
+        and img.dtype == dtype
+        and img.flags.c_contiguous
+        and img.flags.writeable
+    )
+
+def get_last_frame_data(unsigned int nDeviceID, dict out = None):
+    cdef SYErrorCode ret
+    cdef SYFrameData* pFrameData
+
+    with nogil:
+        ret = GetLastFrameData(nDeviceID, pFrameData)
+    if ret == SYERRORCODE_NOFRAME:
+        return None
+
+    if ret != 0:
+        raise RuntimeError(f"GetLastFrameData() returns {str(SYErrorCode(ret))}.")
+
+    return unpack_frame_data(pFrameData, out)
+
+def register_frame_observer():
+    global g_pFrameObserver
+    cdef SYErrorCode ret
+
+    if g_pFrameObserver != NULL:
+        return
+
+    g_pFrameObserver = new SYPyFrameObserver()
+    with nogil:
+        ret = RegisterFrameObserver(g_pFrameObserver)
+    if ret != 0:
+        g_pFrameObserver.Release()
+        g_pFrameObserver = NULL
+        raise RuntimeError(f"RegisterFrameObserver() returns {ret}.")
+
+def unregister_frame_observer():
+    global g_pFrameObserver
+    cdef SYErrorCode ret
+    cdef SYPyFrameObserver* pObserver
+
+    if g_pFrameObserver == NULL:
+        return
+
+    g_pFrameObserver.Interrupt()
+    with nogil:
+        ret = UnRegisterFrameObserver(g_pFrameObserver)
+    if ret != 0:
+        raise RuntimeError(f"UnRegisterFrameObserver() returns {ret}.")
+    # threads still waiting hold their own reference, the last one out deletes the observer
+    pObserver = g_pFrameObserver
+    g_pFrameObserver = NULL
+    pObserver.Release()
+
+def register_event_observer():
+    global g_pEventObserver
+    cdef SYErrorCode ret
+
+    if g_pEventObserver != NULL:
+        return
+
+    g_pEventObserver = new SYPyEventObserver()
+    with nogil:
+        ret = RegisterEventObserver(g_pEventObserver)
+    if ret != 0:
+        del g_pEventObserver
+        g_pEventObserver = NULL
+        raise RuntimeError(f"RegisterEventObserver() returns {ret}.")
+
+def unregister_event_observer():
+    global g_pEventObserver
+    cdef SYErrorCode ret
+
+    if g_pEventObserver == NULL:
+        return
+
+    with nogil:
+        ret = UnRegisterEventObserver(g_pEventObserver)
+    if ret != 0:
+        raise RuntimeError(f"UnRegisterEventObserver() returns {ret}.")
+    del g_pEventObserver
+    g_pEventObserver = NULL
+
+def get_device_event_count():
+    if g_pEventObserver == NULL:
+        raise RuntimeError("The event observer has not been registered.")
+    return g_pEventObserver.GetDeviceEventCount()
+
+def interrupt_frame_observer():
+    if g_pFrameObserver != NULL:
+        g_pFrameObserver.Interrupt()
+
+def wait_frame_notify(unsigned int nDeviceID, unsigned long long nLastSequence, double fltTimeout = -1):
+    cdef SYPyFrameObserver* pObserver = g_pFrameObserver
+    cdef SYPyFrameSlot* pSlot
+    cdef SYFrameData frameData
+    cdef unsigned long long nSequence
+
+    if pObserver == NULL:
+        raise RuntimeError("The frame observer has not been registered.")
+
+    # taken with the GIL held, so unregister_frame_observer() cannot delete it in between
+    pObserver.Retain()
+    try:
+        with nogil:
+            nSequence = pObserver.Wait(nDeviceID, nLastSequence, fltTimeout)
+        if nSequence == nLastSequence:
+            return None
+
+        with nogil:
+            pSlot = pObserver.Lock(nDeviceID)
+        try:
+            frameData.m_nFrameCount = pSlot.m_frameInfos.size()
+            frameData.m_pFrameInfo = pSlot.m_frameInfos.data()
+            frameData.m_pData = pSlot.m_data.data()
+            frameData.m_nBuffferLength = pSlot.m_data.size()
+            nSequence = pSlot.m_nSequence
+            d_frames = unpack_frame_data(&frameData)
+        finally:
+            pObserver.Unlock()
+    finally:
+        pObserver.Release()
+
+    return nSequence, d_frames
+
+def undistort_depth(unsigned int nDeviceID, const unsigned short[:,:,:] pDepth):
     cdef SYErrorCode ret
+    cdef int nHeight = pDepth.shape[0]
+    cdef int nWidth = pDepth.shape[1]
 
-    nHeight = pDepth.shape[0]
-    nWidth = pDepth.shape[1]
     pDepth2 = np.empty((nHeight, nWidth, 1), dtype=np.uint16)
 
     cdef unsigned short [:,:,:] pDepth2_view = pDepth2
+    cdef const unsigned short* pSource = &pDepth[0,0,0]
+    cdef unsigned short* pTarget = &pDepth2_view[0,0,0]
 
-    ret = SYErrorCode(Undistort(nDeviceID, <const unsigned short *>&pDepth[0,0,0], nWidth, nHeight, True, &pDepth2_view[0,0,0]))
+    with nogil:
+        ret = Undistort(nDeviceID, pSource, nWidth, nHeight, True, pTarget)
     if ret != 0:
         raise RuntimeError(f"Undistort() returns {ret}.")
 
     return pDepth2
 
-def undistort_ir(unsigned int nDeviceID, unsigned short[:,:,:] pIr):
+def undistort_ir(unsigned int nDeviceID, const unsigned short[:,:,:] pIr):
     cdef SYErrorCode ret
+    cdef int nHeight = pIr.shape[0]
+    cdef int nWidth = pIr.shape[1]
 
-    nHeight = pIr.shape[0]
-    nWidth = pIr.shape[1]
     pIr2 = np.empty((nHeight, nWidth, 1), dtype=np.uint16)
 
     cdef unsigned short [:,:,:] pIr2_view = pIr2
+    cdef const unsigned short* pSource = &pIr[0,0,0]
+    cdef unsigned short* pTarget = &pIr2_view[0,0,0]
 
-    ret = SYErrorCode(Undistort(nDeviceID, <const unsigned short *>&pIr[0,0,0], nWidth, nHeight, False, &pIr2_view[0,0,0]))
+    with nogil:
+        ret = Undistort(nDeviceID, pSource, nWidth, nHeight, False, pTarget)
     if ret != 0:
         raise RuntimeError(f"Undistort() returns {ret}.")
 
     return pIr2
 
+# ----- batch functions -----
+#
+# They process stacks of N frames of shape (N, H, W, C), looping over the frames without the GIL.
+# The shapes are validated once for the whole batch and the outputs are preallocated by the caller.
+
+cdef tuple get_shape4(Py_ssize_t* shape):
+    return (shape[0], shape[1], shape[2], shape[3])
+
+cdef check_batch_shapes(str func, tuple inShape, tuple outShape, int nOutChannels):
+    if inShape[3] != 1:
+        raise ValueError(f"{func}: the input must have shape (N, H, W, 1). Shape: {inShape}.")
+    if outShape != inShape[:3] + (nOutChannels,):
+        raise ValueError(
+            f"{func}: the output must have shape {inShape[:3] + (nOutChannels,)}. Shape: {outShape}."
+        )
+
+def get_depth_color_batch(unsigned int nDeviceID, const unsigned short[:,:,:,::1] pDepth, unsigned char[:,:,:,::1] pColor):
+    cdef SYErrorCode ret = SYERRORCODE_SUCCESS
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t n = pDepth.shape[0]
+    # GetDepthColor() counts pixels with an int, so convert one frame per call rather than the
+    # whole batch, which could overflow it
+    cdef int nPixels = pDepth.shape[1] * pDepth.shape[2]
+    check_batch_shapes("get_depth_color_batch", get_shape4(pDepth.shape), get_shape4(pColor.shape), 3)
+    if n == 0:
+        return
+
+    cdef const unsigned short* pDepthData = &pDepth[0,0,0,0]
+    cdef unsigned char* pColorData = &pColor[0,0,0,0]
+
+    with nogil:
+        while i < n:
+            ret = GetDepthColor(nDeviceID, nPixels, pDepthData + i * nPixels, pColorData + i * nPixels * 3)
+            if ret != 0:
+                break
+            i += 1
+    if ret != 0:
+        raise RuntimeError(f"GetDepthColor() returns {ret} for frame {i}.")
+
+def get_depth_point_cloud_batch(unsigned int nDeviceID, const unsigned short[:,:,:,::1] pDepth, float[:,:,:,::1] pPos, bool bUndistort):
+    cdef SYErrorCode ret = SYERRORCODE_SUCCESS
+    cdef int i = 0
+    cdef int n = pDepth.shape[0]
+    cdef int nHeight = pDepth.shape[1]
+    cdef int nWidth = pDepth.shape[2]
+    cdef size_t nPixels = nHeight * nWidth
+    check_batch_shapes("get_depth_point_cloud_batch", get_shape4(pDepth.shape), get_shape4(pPos.shape), 3)
+    if n == 0:
+        return
+
+    cdef const unsigned short* pDepthData = &pDepth[0,0,0,0]
+    cdef SYPointCloudData* pPointCloud = <SYPointCloudData *>&pPos[0,0,0,0]
+
+    with nogil:
+        while i < n:
+            ret = GetDepthPointCloud(nDeviceID, nWidth, nHeight, pDepthData + i * nPixels, pPointCloud + i * nPixels, bUndistort)
+            if ret != 0:
+                break
+            i += 1
+    if ret != 0:
+        raise RuntimeError(f"GetDepthPointCloud() returns {ret} for frame {i}.")
+
+cdef undistort_batch(str func, unsigned int nDeviceID, const unsigned short[:,:,:,::1] pSource, unsigned short[:,:,:,::1] pTarget, bool bDepth):
+    cdef SYErrorCode ret = SYERRORCODE_SUCCESS
+    cdef int i = 0
+    cdef int n = pSource.shape[0]
+    cdef int nHeight = pSource.shape[1]
+    cdef int nWidth = pSource.shape[2]
+    cdef size_t nPixels = nHeight * nWidth
+    check_batch_shapes(func, get_shape4(pSource.shape), get_shape4(pTarget.shape), 1)
+    if n == 0:
+        return
+
+    cdef const unsigned short* pSourceData = &pSource[0,0,0,0]
+    cdef unsigned short* pTargetData = &pTarget[0,0,0,0]
+
+    with nogil:
+        while i < n:
+            ret = Undistort(nDeviceID, pSourceData + i * nPixels, nWidth, nHeight, bDepth, pTargetData + i * nPixels)
+            if ret != 0:
+                break
+            i += 1
+    if ret != 0:
+        raise RuntimeError(f"Undistort() returns {ret} for frame {i}.")
+
+def undistort_depth_batch(unsigned int nDeviceID, const unsigned short[:,:,:,::1] pDepth, unsigned short[:,:,:,::1] pDepth2):
+    undistort_batch("undistort_depth_batch", nDeviceID, pDepth, pDepth2, True)
+
+def undistort_ir_batch(unsigned int nDeviceID, const unsigned short[:,:,:,::1] pIr, unsigned short[:,:,:,::1] pIr2):
+    undistort_batch("undistort_ir_batch", nDeviceID, pIr, pIr2, False)
+
 def get_intrinsics(unsigned int nDeviceID, SYResolution resolution):
     cdef SYErrorCode ret
     cdef SYIntrinsics intrinsics
 
-    ret = SYErrorCode(GetIntric(nDeviceID, resolution, intrinsics))
+    with nogil:
+        ret = GetIntric(nDeviceID, resolution, intrinsics)
     if ret != 0:
         raise RuntimeError(f"GetIntric() returns {ret}.")
 
@@ -973,6 +1464,7 @@ def get_intrinsics(unsigned int nDeviceID, SYResolution resolution):
         "fov_y": intrinsics.m_fltFOV[1],
         "distortion_coeff_x": intrinsics.m_fltCoeffs[0],
         "distortion_coeff_y": intrinsics.m_fltCoeffs[1],
+        "distortion_coeffs": [intrinsics.m_fltCoeffs[i] for i in range(5)],
         "focal_length_x": intrinsics.m_fltFocalDistanceX,
         "focal_length_y": intrinsics.m_fltFocalDistanceY,
         "center_point_x": intrinsics.m_fltCenterPointX,